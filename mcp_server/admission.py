@@ -0,0 +1,378 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from .backends import get_backend_pool
+from .fairness import RateLimiter, current_client
+from .priority import HIGH, NORMAL, LaneQueue, current_lane
+from .logger import default_logger
+from .settings import get_settings
+
+# 平均占用时长的平滑系数，用于估算 retry-after
+# Smoothing factor of the average hold time used to estimate retry-after
+_HOLD_SMOOTHING = 0.2
+
+# retry-after 提示的上下限（秒）
+# Bounds (seconds) of the retry-after hint
+_MIN_RETRY_AFTER = 1
+_MAX_RETRY_AFTER = 300
+
+# 当前调用是否为后台任务（由后台任务管理设置）：后台任务没有等待上限，等到准入为止，不会被拒绝
+# Whether the current call is a background job (set by the background job manager): background jobs
+# have no wait limit, they wait until admitted and are never rejected
+background_call = ContextVar("background_call", default=False)
+
+
+class AdmissionRejected(Exception):
+    """
+    准入控制已饱和，调用未提交到ComfyUI
+    Admission control is saturated, the call was not submitted to ComfyUI
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """
+    一次被准入的调用；工作流提交到ComfyUI后调用 submitted()，此后由后端队列快照计入其负载
+    One admitted call; submitted() is called once the workflow is queued on ComfyUI, after which the
+    backend queue snapshot accounts for its load
+    """
+
+    def __init__(self, controller=None, front: bool = False, lane: str = NORMAL):
+        """
+        参数:
+            controller: 准入控制器，未启用准入控制时为None
+            front: 是否以 front 标志提交到ComfyUI队列最前面（高优先级通道）
+            lane: 调用所在的优先级通道
+
+        Args:
+            controller: Admission controller, None when admission control is disabled
+            front: Whether to submit with the front flag to the head of the ComfyUI queue (high lane)
+            lane: Priority lane of the call
+        """
+        self._controller = controller
+        self.front = front
+        self.lane = lane
+
+    def submitted(self) -> None:
+        """释放为提交预留的队列名额 | Release the queue slot reserved for the submission"""
+        controller, self._controller = self._controller, None
+        if controller is not None:
+            controller._reserved -= 1
+
+
+class _Waiter:
+    __slots__ = ("event", "key", "cost", "lane", "enqueued")
+
+    def __init__(self, key: str, cost: float, lane: str):
+        self.event = asyncio.Event()
+        self.key = key
+        self.cost = cost
+        self.lane = lane
+        self.enqueued = time.monotonic()
+
+
+class AdmissionController:
+    """
+    全局准入控制：限制同时进行的ComfyUI任务数和后端队列深度；超出时在有界的等待队列中等待，
+    等待队列已满、等待超时或客户端超过限速时立即拒绝并给出 retry-after 提示。等待队列分为高、普通、低三个优先级通道，
+    通道内按客户端做赤字轮转，按估算的GPU开销分配名额，单个客户端的大批量请求不会让其他客户端饿死。
+    后台任务不受等待队列长度和等待时间限制，一直等到准入。
+    队列深度来自后端池共享的 /api/queue 快照，每个刷新间隔最多查询一次，不按请求查询。
+    Global admission control: caps the number of concurrent ComfyUI jobs and the backend queue depth;
+    beyond that calls wait in a bounded wait queue, and are rejected right away with a retry-after hint
+    once the wait queue is full, the wait times out or the client exceeds its rate limit. The wait queue
+    has high, normal and low priority lanes; within a lane it is served in deficit round robin across
+    clients, sharing slots by estimated GPU cost, so one client's large batches do not starve the others.
+    Background jobs are not limited by the wait queue length or the wait time, they wait until admitted.
+    The queue depth comes from the backend pool's shared /api/queue snapshot, refreshed at most once per
+    refresh interval rather than per request.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_queue_depth: int = 4, max_waiting: int = 128,
+                 max_wait: float = 30.0, quantum: float = 1.0, rate_limit: float = 0.0, rate_burst: int = 10,
+                 starvation_after: float = 10.0, logger=None):
+        """
+        参数:
+            max_concurrent: 同时进行的任务数上限，0表示不限制
+            max_queue_depth: 每个后端的队列深度上限（运行中+等待中），0表示不限制
+            max_waiting: 等待准入的调用数上限（不含后台任务）
+            max_wait: 单个调用等待准入的最长时间（秒）
+            quantum: 轮转时每轮为客户端补充的开销额度
+            rate_limit: 每个客户端每分钟允许的任务数，0表示不限制
+            rate_burst: 每个客户端允许的突发任务数
+            starvation_after: 等待超过该时间（秒）的请求不论通道优先准入，0表示不做防饿死处理
+            logger: 日志记录器
+
+        Args:
+            max_concurrent: Cap on concurrent jobs, 0 for no limit
+            max_queue_depth: Cap on each backend's queue depth (running + pending), 0 for no limit
+            max_waiting: Cap on calls waiting for admission (background jobs excluded)
+            max_wait: Longest time (seconds) one call waits for admission
+            quantum: Cost quantum credited to a client on each round-robin turn
+            rate_limit: Jobs allowed per client per minute, 0 for no limit
+            rate_burst: Jobs allowed per client in a burst
+            starvation_after: Requests waiting longer than this (seconds) are admitted first whatever
+                their lane, 0 disables starvation protection
+            logger: Logger
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue_depth = max_queue_depth
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.rate_limiter = RateLimiter(rate_limit, rate_burst)
+        self.logger = logger or default_logger
+        self._active = 0
+        self._reserved = 0
+        self._waiters = LaneQueue(quantum, starvation_after)
+        self._waiting_calls = 0
+        self._hold_time = None
+        self.admitted = 0
+        self.rejected = 0
+
+    def _has_room(self, pool) -> bool:
+        if self.max_concurrent and self._active >= self.max_concurrent:
+            return False
+        if self.max_queue_depth:
+            # 已准入但尚未提交的调用还不在队列快照中，单独计入
+            # Admitted calls not submitted yet are not in the queue snapshot, count them separately
+            candidates = pool.candidates()
+            load = sum(backend.load for backend in candidates) + self._reserved
+            if load >= self.max_queue_depth * len(candidates):
+                return False
+        return True
+
+    async def _refresh_if_stale(self, pool) -> None:
+        if not self.max_queue_depth:
+            return
+        if pool.refresh_due():
+            await pool.refresh()
+
+    def _take(self) -> None:
+        self._active += 1
+        self._reserved += 1
+
+    def _wake_head(self) -> None:
+        head = self._waiters.peek()
+        if head is not None:
+            head.event.set()
+
+    def retry_after(self) -> int:
+        """
+        估算多久之后重试可能被准入（秒）
+        Estimate in how many seconds a retry may be admitted
+
+        返回:
+            int: 建议的重试等待时间（秒）
+
+        Returns:
+            int: Suggested retry delay (seconds)
+        """
+        hold = self._hold_time or get_backend_pool().queue_refresh_interval
+        slots = self.max_concurrent or max(self._active, 1)
+        estimate = math.ceil(hold * (len(self._waiters) + 1) / slots)
+        return min(max(estimate, _MIN_RETRY_AFTER), _MAX_RETRY_AFTER)
+
+    def _reject(self, reason: str, reason_en: str, retry_after: int = None) -> AdmissionRejected:
+        self.rejected += 1
+        retry_after = retry_after or self.retry_after()
+        self.logger.warning(f"ComfyUI任务准入被拒绝（{reason}），建议 {retry_after} 秒后重试")
+        return AdmissionRejected(
+            f"ComfyUI任务队列已饱和（{reason}），请在 {retry_after} 秒后重试 | "
+            f"ComfyUI job queue is saturated ({reason_en}), retry after {retry_after}s",
+            retry_after
+        )
+
+    async def _acquire(self, pool, key: str, cost: float, lane: str, background: bool = False) -> None:
+        if background:
+            # 后台任务等到有令牌为止 | background jobs wait for the next token
+            wait = self.rate_limiter.acquire(key)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.rate_limiter.acquire(key)
+        admit_now = False
+        if not self._waiters:
+            await self._refresh_if_stale(pool)
+            admit_now = not self._waiters and self._has_room(pool)
+        if not background:
+            # 先检查等待队列容量再扣除令牌，被拒绝的调用不消耗限速额度；后台任务已由任务管理跟踪，
+            # 不受等待队列长度和等待时间限制
+            # Check the wait queue capacity before spending a token so that rejected calls do not use up
+            # the rate limit; background jobs are already tracked by the job manager, neither the wait
+            # queue length nor the wait time limits them
+            if not admit_now and self._waiting_calls >= self.max_waiting:
+                raise self._reject("等待队列已满", "wait queue full")
+            wait = self.rate_limiter.acquire(key)
+            if wait > 0:
+                raise self._reject("超过客户端限速", "client rate limit exceeded", min(math.ceil(wait), _MAX_RETRY_AFTER))
+        if admit_now:
+            self._take()
+            return
+        waiter = _Waiter(key, cost, lane)
+        self._waiters.push(waiter)
+        if not background:
+            self._waiting_calls += 1
+        deadline = time.monotonic() + self.max_wait if not background else None
+        admitted = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic() if deadline is not None else pool.queue_refresh_interval
+                if remaining <= 0:
+                    raise self._reject(f"等待超过 {self.max_wait:g} 秒", f"waited {self.max_wait:g}s")
+                # 队列深度只在快照刷新后才会变化，按刷新间隔重新核对
+                # The queue depth only changes when the snapshot is refreshed, re-check at the refresh interval
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), min(remaining, pool.queue_refresh_interval))
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+                if self._waiters.peek() is not waiter:
+                    # 防饿死可能改变了队首，确保新的队首被唤醒 | starvation protection may have changed the head, make sure it is woken
+                    self._wake_head()
+                    continue
+                await self._refresh_if_stale(pool)
+                if self._has_room(pool):
+                    admitted = True
+                    return
+        finally:
+            if not background:
+                self._waiting_calls -= 1
+            if admitted:
+                # 先占用名额再唤醒下一个等待者，后者据此判断是否还有余量
+                # Take the slot before waking the next waiter so that it sees the remaining room
+                self._waiters.take(waiter)
+                self._take()
+            else:
+                self._waiters.remove(waiter)
+            self._wake_head()
+
+    @asynccontextmanager
+    async def admit(self, key: str = "", cost: float = 1.0, lane: str = NORMAL, front: bool = False,
+                    background: bool = False):
+        """
+        等待准入并在调用结束前占用一个名额
+        Wait for admission and hold a slot until the call ends
+
+        参数:
+            key: 客户端标识，等待队列按客户端轮转
+            cost: 估算的GPU开销
+            lane: 优先级通道（high / normal / low）
+            front: 是否以 front 标志提交到ComfyUI队列最前面
+            background: 是否为后台任务；后台任务一直等到准入，不会被拒绝
+
+        Args:
+            key: Client key, the wait queue takes turns between clients
+            cost: Estimated GPU cost
+            lane: Priority lane (high / normal / low)
+            front: Whether to submit with the front flag to the head of the ComfyUI queue
+            background: Whether this is a background job; background jobs wait until admitted and are
+                never rejected
+
+        返回:
+            Admission: 本次准入，提交到ComfyUI后调用其 submitted()
+
+        Returns:
+            Admission: This admission, call its submitted() once queued on ComfyUI
+
+        Raises:
+            AdmissionRejected: 等待队列已满、等待超时或超过客户端限速 | the wait queue is full, the wait
+                timed out or the client exceeded its rate limit
+        """
+        await self._acquire(get_backend_pool(), key, cost, lane, background)
+        admission = Admission(self, front, lane)
+        self.admitted += 1
+        held_since = time.monotonic()
+        try:
+            yield admission
+        finally:
+            admission.submitted()
+            self._active -= 1
+            hold = time.monotonic() - held_since
+            self._hold_time = hold if self._hold_time is None else self._hold_time + _HOLD_SMOOTHING * (hold - self._hold_time)
+            self._wake_head()
+
+    def stats(self) -> dict:
+        """返回准入统计 | Return admission statistics"""
+        return {
+            'active': self._active,
+            'waiting': len(self._waiters),
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'retry_after': self.retry_after()
+        }
+
+
+_controller = None
+
+
+def get_admission_controller():
+    """
+    获取进程级准入控制器，未启用时返回None
+    Get the process-wide admission controller, None when disabled
+
+    返回:
+        AdmissionController: 准入控制器或None
+
+    Returns:
+        AdmissionController: Admission controller or None
+    """
+    global _controller
+    settings = get_settings()
+    config, fairness, priority = settings.admission, settings.fairness, settings.priority
+    if not config.enabled:
+        return None
+    if _controller is None:
+        _controller = AdmissionController(config.max_concurrent, config.max_queue_depth,
+                                          config.max_waiting, config.max_wait, fairness.quantum,
+                                          fairness.rate_limit, fairness.rate_burst, priority.starvation_after)
+    else:
+        # 热加载后的上限对新的调用立即生效
+        # Reloaded limits apply to new calls right away
+        _controller.max_concurrent, _controller.max_queue_depth = config.max_concurrent, config.max_queue_depth
+        _controller.max_waiting, _controller.max_wait = config.max_waiting, config.max_wait
+        _controller._waiters.quantum = fairness.quantum
+        _controller._waiters.starvation_after = priority.starvation_after
+        _controller.rate_limiter.rate, _controller.rate_limiter.burst = fairness.rate_limit, fairness.rate_burst
+    return _controller
+
+
+@asynccontextmanager
+async def admit(cost: float = 1.0):
+    """
+    经过准入控制后执行一次ComfyUI任务；未启用准入控制时直接执行。
+    按当前调用的优先级通道排队，启用公平调度时通道内按当前MCP会话或API密钥区分客户端，否则按先后顺序等待。
+    后台任务（background_call）一直等到准入，不会被拒绝。
+    Run one ComfyUI job behind admission control; runs directly when admission control is disabled.
+    Calls queue in the priority lane of the current call; with fair scheduling enabled clients within a
+    lane are told apart by the current MCP session or API key, otherwise they wait in arrival order.
+    Background jobs (background_call) wait until admitted instead of being rejected.
+
+    参数:
+        cost: 估算的GPU开销
+
+    Args:
+        cost: Estimated GPU cost
+
+    返回:
+        Admission: 本次准入，提交到ComfyUI后调用其 submitted()
+
+    Returns:
+        Admission: This admission, call its submitted() once queued on ComfyUI
+
+    Raises:
+        AdmissionRejected: 准入控制已饱和 | admission control is saturated
+    """
+    settings = get_settings()
+    lane = current_lane()
+    front = lane == HIGH and settings.priority.front
+    controller = get_admission_controller()
+    if controller is None:
+        yield Admission(front=front, lane=lane)
+        return
+    key = current_client() if settings.fairness.enabled else ""
+    async with controller.admit(key, cost, lane, front, background_call.get()) as admission:
+        yield admission
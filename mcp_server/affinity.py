@@ -0,0 +1,183 @@
+from .backends import Backend, BackendPool, get_backend_pool
+from .http_client import client_manager
+from .logger import default_logger
+from .utils import load_scheduler_config
+
+# 工作流中表示checkpoint的输入名
+# Input name that holds the checkpoint in a workflow
+CHECKPOINT_INPUT = "ckpt_name"
+
+
+def find_checkpoint(prompt: dict):
+    """
+    从API格式工作流中找出使用的checkpoint
+    Find the checkpoint used by an API-format workflow
+
+    参数:
+        prompt: API格式工作流
+
+    Args:
+        prompt: API-format workflow
+
+    返回:
+        str: checkpoint名称，未找到时为None
+
+    Returns:
+        str: Checkpoint name, None if not found
+    """
+    for node in prompt.values():
+        value = node.get("inputs", {}).get(CHECKPOINT_INPUT)
+        if isinstance(value, str):
+            return value
+    return None
+
+
+class CheckpointAffinityRouter:
+    """
+    checkpoint亲和路由：优先把任务发往最近加载过同一checkpoint的后端，避免数GB模型换入显存的开销；
+    当该后端的负载比最空闲后端高出 max_imbalance 以上时，改为选择最空闲后端。
+    Checkpoint-affinity router: prefers backends that last loaded the job's checkpoint, avoiding the
+    cost of swapping a multi-GB model into VRAM; falls back to the least-loaded backend when the warm
+    one is more than max_imbalance jobs busier.
+    """
+
+    def __init__(self, pool: BackendPool, enabled: bool = True, max_imbalance: int = 2, logger=None):
+        """
+        参数:
+            pool: 后端池
+            enabled: 是否启用亲和路由
+            max_imbalance: 亲和后端允许比最空闲后端多出的任务数
+            logger: 日志记录器
+
+        Args:
+            pool: Backend pool
+            enabled: Whether affinity routing is enabled
+            max_imbalance: How many more jobs a warm backend may have than the least-loaded one
+            logger: Logger
+        """
+        self.pool = pool
+        self.enabled = enabled
+        self.max_imbalance = max_imbalance
+        self.logger = logger or default_logger
+        self._metrics = {
+            'requests': 0,
+            'hits': 0,
+            'cold_misses': 0,
+            'imbalance_overrides': 0
+        }
+
+    def select(self, checkpoint: str = None, exclude=()) -> Backend:
+        """
+        为使用指定checkpoint的任务选择后端
+        Pick a backend for a job using the given checkpoint
+
+        参数:
+            checkpoint: 任务使用的checkpoint
+            exclude: 需要排除的后端
+
+        Args:
+            checkpoint: Checkpoint used by the job
+            exclude: Backends to skip
+
+        返回:
+            Backend: 目标后端
+
+        Returns:
+            Backend: Target backend
+        """
+        least_loaded = self.pool.select(exclude)
+        if not self.enabled or not checkpoint or len(self.pool.backends) < 2:
+            return least_loaded
+
+        self._metrics['requests'] += 1
+        warm = [backend for backend in self.pool.candidates(exclude) if backend.expected_checkpoint == checkpoint]
+        if not warm:
+            self._metrics['cold_misses'] += 1
+            self.logger.debug(f"没有已加载 {checkpoint} 的后端，选择最空闲后端: {least_loaded.url}")
+            return least_loaded
+
+        best_warm = min(warm, key=lambda backend: (backend.load, backend.inflight))
+        if best_warm.load - least_loaded.load <= self.max_imbalance:
+            self._metrics['hits'] += 1
+            self.logger.debug(f"checkpoint亲和命中: {checkpoint} -> {best_warm.url}")
+            return best_warm
+
+        self._metrics['imbalance_overrides'] += 1
+        self.logger.debug(f"已加载 {checkpoint} 的后端 {best_warm.url} 负载过高（{best_warm.load} vs {least_loaded.load}），"
+                          f"选择最空闲后端: {least_loaded.url}")
+        return least_loaded
+
+    def record_completion(self, backend: Backend, checkpoint: str) -> None:
+        """
+        记录后端最近完成的任务所用的checkpoint
+        Record the checkpoint of the job a backend most recently completed
+        """
+        if checkpoint:
+            backend.last_checkpoint = checkpoint
+
+    async def bootstrap(self) -> None:
+        """
+        从各后端 /api/history 中最近完成的任务推断其当前加载的checkpoint
+        Infer each backend's loaded checkpoint from the most recently completed job in its /api/history
+        """
+        if not self.enabled or len(self.pool.backends) < 2:
+            return
+        client = client_manager.get_client()
+        for backend in self.pool.backends:
+            if backend.last_checkpoint:
+                continue
+            try:
+                resp = await client.get(f"{backend.url}/api/history", params={"max_items": 1})
+                resp.raise_for_status()
+                history = resp.json()
+            except Exception as e:
+                self.logger.debug(f"读取ComfyUI后端 {backend.url} 的历史记录失败: {str(e)}")
+                continue
+            for entry in reversed(list(history.values())):
+                prompt = entry.get("prompt", [])
+                checkpoint = find_checkpoint(prompt[2]) if len(prompt) > 2 and isinstance(prompt[2], dict) else None
+                if checkpoint:
+                    backend.last_checkpoint = checkpoint
+                    self.logger.debug(f"ComfyUI后端 {backend.url} 最近加载的checkpoint: {checkpoint}")
+                    break
+
+    def metrics(self) -> dict:
+        """
+        返回亲和路由指标，包括命中率
+        Return affinity routing metrics, including the hit rate
+
+        返回:
+            dict: 指标
+
+        Returns:
+            dict: Metrics
+        """
+        metrics = dict(self._metrics)
+        metrics['hit_rate'] = metrics['hits'] / metrics['requests'] if metrics['requests'] else 0.0
+        return metrics
+
+
+_router = None
+
+
+def get_affinity_router() -> CheckpointAffinityRouter:
+    """
+    获取进程级checkpoint亲和路由器
+    Get the process-wide checkpoint-affinity router
+
+    返回:
+        CheckpointAffinityRouter: 亲和路由器
+
+    Returns:
+        CheckpointAffinityRouter: Affinity router
+    """
+    global _router
+    pool = get_backend_pool()
+    if _router is None or _router.pool is not pool:
+        config = load_scheduler_config()
+        _router = CheckpointAffinityRouter(
+            pool,
+            enabled=config['affinity'],
+            max_imbalance=config['affinity_max_imbalance']
+        )
+    return _router
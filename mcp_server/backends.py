@@ -0,0 +1,325 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from .http_client import client_manager
+from .logger import default_logger
+from .priority import LANES
+from .utils import load_comfyui_backends, load_scheduler_config
+
+# 队列刷新失败后的最长退避时间（秒）
+# Longest back-off (seconds) after failed queue refreshes
+_MAX_REFRESH_BACKOFF = 30.0
+
+
+class Backend:
+    """
+    单个ComfyUI后端的实时状态
+    Live state of a single ComfyUI backend
+    """
+
+    def __init__(self, host: str, port: str):
+        self.host = host
+        self.port = str(port)
+        self.url = f"http://{host}:{self.port}"
+        self.healthy = True
+        self.failures = 0
+        self.queue_running = 0
+        self.queue_pending = 0
+        self.inflight = 0
+        self.submitted_since_refresh = 0
+        self.finished_since_refresh = 0
+        self.refreshed_at = 0.0
+        # 下一次刷新队列快照的时间，刷新失败时按退避时间推迟
+        # When the queue snapshot is due for a refresh, pushed back by the back-off after failures
+        self.refresh_due = 0.0
+        self.last_checkpoint = None
+        self.queued_checkpoint = None
+        # 本服务提交到该后端、尚未完成的任务数（按优先级通道） | jobs this server submitted to the backend that have not finished yet, per priority lane
+        self.lanes = {}
+
+    @property
+    def queue_depth(self) -> int:
+        """ComfyUI队列中的任务数（运行中+等待中） | Jobs in the ComfyUI queue (running + pending)"""
+        return self.queue_running + self.queue_pending
+
+    @property
+    def load(self) -> int:
+        """
+        调度用的负载估计：最近一次队列快照加上快照之后本服务提交的任务数，减去快照之后完成的任务数
+        Load estimate used for scheduling: the last queue snapshot plus jobs we submitted since, minus
+        jobs that finished since
+        """
+        return max(self.queue_depth + self.submitted_since_refresh - self.finished_since_refresh, 0)
+
+    @property
+    def expected_checkpoint(self):
+        """
+        下一个任务开始时预计已加载的checkpoint：有在途任务时为最后提交的任务的checkpoint，否则为最近完成任务的checkpoint
+        Checkpoint expected to be loaded when the next job starts: that of the last submitted job while
+        jobs are in flight, otherwise that of the last completed job
+        """
+        if self.inflight and self.queued_checkpoint:
+            return self.queued_checkpoint
+        return self.last_checkpoint
+
+    def has_lower_lane(self, lane: str) -> bool:
+        """
+        本服务提交到该后端、尚未完成的任务中是否有优先级低于 lane 的任务
+        Whether any unfinished job this server submitted to the backend is in a lower lane than lane
+        """
+        rank = LANES.index(lane)
+        return any(count and LANES.index(other) > rank for other, count in self.lanes.items())
+
+    def snapshot(self) -> dict:
+        """返回后端状态快照 | Return a snapshot of the backend state"""
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'queue_running': self.queue_running,
+            'queue_pending': self.queue_pending,
+            'inflight': self.inflight,
+            'load': self.load,
+            'last_checkpoint': self.last_checkpoint
+        }
+
+
+class BackendPool:
+    """
+    多ComfyUI后端池：按实时队列深度、健康状态和在途任务数为每个 /api/prompt 选择目标后端
+    Pool of ComfyUI backends: picks the target of each /api/prompt by live queue depth,
+    health and in-flight count
+    """
+
+    def __init__(self, backends: list, queue_refresh_interval: float = 2.0,
+                 unhealthy_after_failures: int = 1, logger=None):
+        """
+        参数:
+            backends: [(host, port), ...]
+            queue_refresh_interval: 刷新 /api/queue 的间隔（秒）
+            unhealthy_after_failures: 连续失败多少次后视为不健康
+            logger: 日志记录器
+
+        Args:
+            backends: [(host, port), ...]
+            queue_refresh_interval: Interval (seconds) for refreshing /api/queue
+            unhealthy_after_failures: Consecutive failures after which a backend is unhealthy
+            logger: Logger
+        """
+        self.backends = [Backend(host, port) for host, port in backends]
+        self.queue_refresh_interval = queue_refresh_interval
+        self.unhealthy_after_failures = max(unhealthy_after_failures, 1)
+        self.logger = logger or default_logger
+        self._by_url = {backend.url: backend for backend in self.backends}
+        self._refresh_task = None
+        self._refreshing = None
+        self.loop = None
+
+    def get(self, url: str) -> Backend:
+        """按URL获取后端 | Get a backend by URL"""
+        return self._by_url.get(url.rstrip('/'))
+
+    def mark_failure(self, backend: Backend, error: Exception = None) -> None:
+        """
+        记录一次后端失败，达到阈值后标记为不健康
+        Record a backend failure, marking it unhealthy once the threshold is reached
+        """
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.unhealthy_after_failures:
+            backend.healthy = False
+            self.logger.warning(f"ComfyUI后端不可用: {backend.url} ({str(error) if error else '未知错误'})")
+
+    def mark_success(self, backend: Backend) -> None:
+        """记录一次后端成功请求 | Record a successful request to a backend"""
+        backend.failures = 0
+        if not backend.healthy:
+            backend.healthy = True
+            self.logger.info(f"ComfyUI后端已恢复: {backend.url}")
+
+    async def _refresh_backend(self, client, backend):
+        try:
+            resp = await client.get(f"{backend.url}/api/queue", timeout=self.queue_refresh_interval + 3)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            # 队列快照已不可信，直接标记为不可用；记录本次尝试并按连续失败次数退避，
+            # 避免每次调用都等待一个无响应的后端
+            # The queue snapshot can no longer be trusted, so mark the backend unavailable right away;
+            # record the attempt and back off by the number of consecutive failures so that calls do not
+            # all wait on an unresponsive backend
+            backend.failures = max(backend.failures, self.unhealthy_after_failures - 1)
+            self.mark_failure(backend, e)
+            backoff = self.queue_refresh_interval * 2 ** min(backend.failures - 1, 5)
+            backend.refresh_due = time.monotonic() + min(backoff, max(_MAX_REFRESH_BACKOFF, self.queue_refresh_interval))
+            return
+        backend.queue_running = len(data.get("queue_running", []))
+        backend.queue_pending = len(data.get("queue_pending", []))
+        backend.submitted_since_refresh = 0
+        backend.finished_since_refresh = 0
+        backend.refreshed_at = time.monotonic()
+        backend.refresh_due = backend.refreshed_at + self.queue_refresh_interval
+        self.mark_success(backend)
+
+    async def refresh(self) -> None:
+        """
+        并发刷新所有后端的队列深度与健康状态（同一时刻只有一次刷新在进行）
+        Refresh queue depth and health of all backends concurrently (only one refresh runs at a time)
+        """
+        if self._refreshing is not None and not self._refreshing.done():
+            await asyncio.shield(self._refreshing)
+            return
+        client = client_manager.get_client()
+        # 刷新失败的后端在退避时间内不再探测 | backends whose refresh failed are not probed again during their back-off
+        now = time.monotonic()
+        due = [backend for backend in self.backends if backend.healthy or now >= backend.refresh_due]
+        self._refreshing = asyncio.ensure_future(
+            asyncio.gather(*(self._refresh_backend(client, backend) for backend in due))
+        )
+        await asyncio.shield(self._refreshing)
+
+    async def ensure_fresh(self) -> None:
+        """
+        队列快照过期时刷新；只有一个后端时无需选择，直接返回
+        Refresh when the queue snapshot is stale; no-op with a single backend since there is nothing to choose
+        """
+        if len(self.backends) < 2:
+            return
+        if self.refresh_due():
+            await self.refresh()
+
+    def refresh_due(self) -> bool:
+        """
+        是否有后端的队列快照到了刷新时间（刷新失败的后端按退避时间推迟）
+        Whether the queue snapshot of any backend is due for a refresh (failed backends are pushed back by
+        their back-off)
+        """
+        return time.monotonic() >= min(backend.refresh_due for backend in self.backends)
+
+    def candidates(self, exclude=()) -> list:
+        """
+        可供选择的后端：排除指定后端后的健康后端；全部不健康时返回其余全部后端（可能已恢复）
+        Backends eligible for selection: healthy ones not excluded; when none is healthy, all the rest
+        (they may have recovered)
+
+        参数:
+            exclude: 需要排除的后端（如刚提交失败的后端）
+
+        Args:
+            exclude: Backends to skip (e.g. ones that just failed a submission)
+
+        返回:
+            list: 候选后端
+
+        Returns:
+            list: Candidate backends
+        """
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            candidates = list(self.backends)
+        healthy = [backend for backend in candidates if backend.healthy]
+        return healthy or candidates
+
+    def select(self, exclude=()) -> Backend:
+        """
+        选择负载最低的候选后端
+        Pick the least-loaded candidate backend
+
+        参数:
+            exclude: 需要排除的后端
+
+        Args:
+            exclude: Backends to skip
+
+        返回:
+            Backend: 目标后端
+
+        Returns:
+            Backend: Target backend
+        """
+        return min(self.candidates(exclude), key=lambda backend: (backend.load, backend.inflight))
+
+    @asynccontextmanager
+    async def track(self, backend: Backend, checkpoint: str = None, lane: str = None):
+        """
+        在任务提交到完成期间计入后端在途任务数
+        Count a job towards the backend's in-flight jobs from submission until completion
+
+        参数:
+            backend: 执行任务的后端
+            checkpoint: 任务使用的checkpoint
+            lane: 任务的优先级通道
+
+        Args:
+            backend: Backend running the job
+            checkpoint: Checkpoint used by the job
+            lane: Priority lane of the job
+        """
+        backend.inflight += 1
+        backend.submitted_since_refresh += 1
+        if checkpoint:
+            backend.queued_checkpoint = checkpoint
+        if lane:
+            backend.lanes[lane] = backend.lanes.get(lane, 0) + 1
+        try:
+            yield backend
+        finally:
+            backend.inflight -= 1
+            if lane:
+                backend.lanes[lane] -= 1
+            backend.finished_since_refresh += 1
+            if not backend.inflight:
+                backend.queued_checkpoint = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"刷新ComfyUI后端队列状态时出错: {str(e)}")
+            await asyncio.sleep(self.queue_refresh_interval)
+
+    async def start(self) -> None:
+        """启动后台队列刷新任务（多后端时） | Start the background queue refresher (with several backends)"""
+        if self._refresh_task is None and len(self.backends) > 1:
+            self.loop = asyncio.get_running_loop()
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        """停止后台队列刷新任务 | Stop the background queue refresher"""
+        task, self._refresh_task = self._refresh_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> list:
+        """返回所有后端状态快照 | Return snapshots of all backends"""
+        return [backend.snapshot() for backend in self.backends]
+
+
+_pool = None
+
+
+def get_backend_pool() -> BackendPool:
+    """
+    获取进程级后端池（首次调用时按配置创建）
+    Get the process-wide backend pool (created from config on first use)
+
+    返回:
+        BackendPool: 后端池
+
+    Returns:
+        BackendPool: Backend pool
+    """
+    global _pool
+    if _pool is None:
+        config = load_scheduler_config()
+        _pool = BackendPool(
+            load_comfyui_backends(),
+            queue_refresh_interval=config['queue_refresh_interval'],
+            unhealthy_after_failures=config['unhealthy_after_failures']
+        )
+    return _pool
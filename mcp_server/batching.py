@@ -0,0 +1,349 @@
+import asyncio
+import copy
+import json
+from .admission import background_call
+from .executor import recoverable, run_prompt, submission_listener, submit_and_wait
+from .logger import default_logger
+from .priority import higher_lane, priority_lane
+from .templates import SAMPLER_CLASSES, SEED_INPUTS, is_link
+from .settings import get_settings
+
+# 克隆分支节点ID的后缀分隔符
+# Separator of the suffix appended to cloned branch node ids
+BRANCH_SEPARATOR = "_b"
+
+
+def _branch_layout(workflow: dict):
+    """
+    分析文生图工作流：找出采样器、正向提示词节点、空Latent节点以及随采样分支复制的节点集合
+    Analyse a txt2img workflow: find the sampler, positive prompt node, empty latent node and
+    the set of nodes that are duplicated per sampler branch
+    """
+    sampler_id = next((node_id for node_id, node in workflow.items()
+                       if node.get("class_type") in SAMPLER_CLASSES), None)
+    if sampler_id is None:
+        return None
+    sampler_inputs = workflow[sampler_id].get("inputs", {})
+    positive, latent = sampler_inputs.get("positive"), sampler_inputs.get("latent_image")
+    if not is_link(positive) or not is_link(latent):
+        return None
+    positive_id, latent_id = positive[0], latent[0]
+    if workflow.get(latent_id, {}).get("class_type") != "EmptyLatentImage":
+        return None
+    if "text" not in workflow.get(positive_id, {}).get("inputs", {}):
+        return None
+
+    # 采样器下游的所有节点（解码、保存等）都属于分支
+    # Every node downstream of the sampler (decode, save, ...) belongs to the branch
+    consumers = {}
+    for node_id, node in workflow.items():
+        for value in node.get("inputs", {}).values():
+            if is_link(value):
+                consumers.setdefault(value[0], set()).add(node_id)
+    branch, stack = set(), [sampler_id]
+    while stack:
+        node_id = stack.pop()
+        if node_id not in branch:
+            branch.add(node_id)
+            stack.extend(consumers.get(node_id, ()))
+    branch.update((positive_id, latent_id))
+    outputs = [node_id for node_id in branch if not consumers.get(node_id)]
+    return sampler_id, positive_id, latent_id, branch, outputs
+
+
+def batch_key(workflow: dict):
+    """
+    计算工作流的合批键：除正向提示词、seed和batch_size外完全相同的工作流可以合并
+    Compute the batching key of a workflow: workflows identical except for positive prompt,
+    seeds and batch_size can be coalesced
+
+    参数:
+        workflow: 已填充参数的文生图工作流
+
+    Args:
+        workflow: txt2img workflow with parameters filled in
+
+    返回:
+        str: 合批键，无法合批的工作流返回None
+
+    Returns:
+        str: Batching key, None for workflows that cannot be batched
+    """
+    layout = _branch_layout(workflow)
+    if layout is None:
+        return None
+    sampler_id, positive_id, latent_id, _, _ = layout
+    shape = copy.deepcopy(workflow)
+    shape[positive_id]["inputs"].pop("text", None)
+    shape[latent_id]["inputs"].pop("batch_size", None)
+    for name in SEED_INPUTS:
+        shape[sampler_id]["inputs"].pop(name, None)
+    return json.dumps(shape, sort_keys=True, ensure_ascii=False)
+
+
+def _batch_size(workflow: dict) -> int:
+    layout = _branch_layout(workflow)
+    return int(workflow[layout[2]]["inputs"].get("batch_size", 1))
+
+
+def build_batched_workflow(workflows: list) -> tuple:
+    """
+    把多个兼容的文生图工作流合并为一个ComfyUI任务
+    正向提示词相同的请求共用一个采样分支，通过增大EmptyLatentImage的batch_size批量生成；
+    提示词不同的请求各自复制一条采样分支（共享checkpoint加载和负向提示词编码）。
+    Merge several compatible txt2img workflows into one ComfyUI prompt.
+    Requests with the same positive prompt share one sampler branch and are generated as a larger
+    EmptyLatentImage batch; requests with different prompts each get a parallel sampler branch
+    (sharing the checkpoint loader and the negative prompt encoding).
+
+    参数:
+        workflows: 参数兼容（batch_key相同）的工作流列表
+
+    Args:
+        workflows: Workflows with compatible parameters (same batch_key)
+
+    返回:
+        tuple: (合并后的工作流, 分支列表)，每个分支为 (输出节点ID列表, [(请求序号, 图片数), ...])
+
+    Returns:
+        tuple: (merged workflow, branches), each branch being (output node ids, [(request index, image count), ...])
+    """
+    sampler_id, positive_id, latent_id, branch_nodes, outputs = _branch_layout(workflows[0])
+
+    # 按正向提示词分组，保持请求顺序
+    # Group by positive prompt, keeping request order
+    groups = {}
+    for index, workflow in enumerate(workflows):
+        text = workflow[positive_id]["inputs"]["text"]
+        groups.setdefault(text, []).append((index, _batch_size(workflow)))
+
+    merged = copy.deepcopy(workflows[0])
+    for node_id in branch_nodes:
+        del merged[node_id]
+
+    branches = []
+    for group_index, (text, members) in enumerate(groups.items()):
+        first = workflows[members[0][0]]
+        rename = {node_id: node_id if group_index == 0 else f"{node_id}{BRANCH_SEPARATOR}{group_index}"
+                  for node_id in branch_nodes}
+        for node_id in branch_nodes:
+            node = copy.deepcopy(first[node_id])
+            for name, value in node.get("inputs", {}).items():
+                if is_link(value) and value[0] in rename:
+                    node["inputs"][name] = [rename[value[0]], value[1]]
+            merged[rename[node_id]] = node
+        merged[rename[positive_id]]["inputs"]["text"] = text
+        merged[rename[latent_id]]["inputs"]["batch_size"] = sum(count for _, count in members)
+        branches.append(([rename[node_id] for node_id in outputs], members))
+    return merged, branches
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.items = []
+        self.timeouts = []
+        self.listeners = []
+        self.recoverable = False
+        self.background = True
+        self.priority = None
+        self.images = 0
+        self.timer = None
+
+    @property
+    def timeout(self):
+        # 合并任务的截止时间取各请求中最长的一个，任一请求使用默认值时使用默认值
+        # The coalesced job gets the longest deadline of its requests, or the default if any request uses it
+        if any(timeout is None for timeout in self.timeouts):
+            return None
+        if any(not timeout or timeout <= 0 for timeout in self.timeouts):
+            return 0
+        return max(self.timeouts)
+
+
+class Txt2ImgBatcher:
+    """
+    文生图微批处理器：在短时间窗口内收集参数兼容的并发请求，合并为一个ComfyUI任务提交，再把图片拆分回各个调用方
+    txt2img micro-batcher: gathers compatible concurrent requests within a short window, submits them
+    as one ComfyUI prompt and splits the images back to each caller
+    """
+
+    def __init__(self, window: float = 0.05, max_images: int = 8, logger=None):
+        """
+        参数:
+            window: 收集兼容请求的时间窗口（秒）
+            max_images: 单个合并任务的最大图片数
+            logger: 日志记录器
+
+        Args:
+            window: Window (seconds) for gathering compatible requests
+            max_images: Maximum number of images in one coalesced prompt
+            logger: Logger
+        """
+        self.window = window
+        self.max_images = max_images
+        self.logger = logger or default_logger
+        self._pending = {}
+        self._tasks = set()
+        self._stats = {'requests': 0, 'prompts': 0, 'batched_requests': 0}
+
+    async def submit(self, workflow: dict, checkpoint: str = None, timeout: float = None, pinned_seed: bool = False) -> tuple:
+        """
+        提交一个文生图请求，可能与其他兼容请求合并执行；固定seed的请求单独执行，
+        合并后只有第一个请求的seed生效，其他请求得到的图片与其seed不符
+        Submit a txt2img request, possibly coalesced with other compatible requests; pinned-seed
+        requests run on their own, since a merged branch only keeps the seed of its first request and
+        the other callers would get images that do not match their seed
+
+        参数:
+            workflow: 已填充参数的文生图工作流
+            checkpoint: 任务使用的checkpoint
+            timeout: 任务截止时间（秒），为None时使用配置值
+            pinned_seed: 工作流的seed是否由调用方固定
+
+        Args:
+            workflow: txt2img workflow with parameters filled in
+            checkpoint: Checkpoint used by the job
+            timeout: Job deadline (seconds), the configured value when None
+            pinned_seed: Whether the caller pinned the workflow's seeds
+
+        返回:
+            tuple: (comfyui_host, images)
+
+        Returns:
+            tuple: (comfyui_host, images)
+        """
+        self._stats['requests'] += 1
+        key = batch_key(workflow) if not pinned_seed else None
+        size = _batch_size(workflow) if key is not None else 0
+        if key is None or size >= self.max_images:
+            self._stats['prompts'] += 1
+            return await run_prompt(workflow, checkpoint, timeout)
+
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(key)
+        if batch is not None and batch.images + size > self.max_images:
+            self._flush(key, checkpoint)
+            batch = None
+        if batch is None:
+            batch = _PendingBatch()
+            batch.timer = loop.call_later(self.window, self._flush, key, checkpoint)
+            self._pending[key] = batch
+
+        future = loop.create_future()
+        batch.items.append((workflow, future))
+        batch.timeouts.append(timeout)
+        batch.listeners.append(submission_listener.get())
+        batch.recoverable = batch.recoverable or recoverable.get()
+        # 只有全部来自后台任务的合并任务才无限等待准入 | only a batch made of background jobs alone waits for admission without limit
+        batch.background = batch.background and background_call.get()
+        # 合并任务使用各请求中最高的优先级通道 | the coalesced job uses the highest lane of its requests
+        batch.priority = higher_lane(batch.priority, priority_lane.get())
+        batch.images += size
+        if batch.images >= self.max_images:
+            self._flush(key, checkpoint)
+        return await future
+
+    def stats(self) -> dict:
+        """
+        返回微批处理统计：请求数、实际提交的任务数和被合并的请求数
+        Return micro-batching statistics: requests, prompts actually submitted and coalesced requests
+        """
+        return dict(self._stats)
+
+    def _flush(self, key, checkpoint):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.ensure_future(self._run_batch(batch, checkpoint))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        # 所有调用方都已取消时取消合并任务，从而取消ComfyUI上的任务
+        # Cancel the coalesced job (and thus the ComfyUI job) once every caller has been cancelled
+        futures = [future for _, future in batch.items]
+
+        def _on_caller_done(_):
+            if all(future.cancelled() for future in futures):
+                task.cancel()
+
+        for future in futures:
+            future.add_done_callback(_on_caller_done)
+
+    async def _run_batch(self, batch, checkpoint):
+        self._stats['prompts'] += 1
+        futures = [future for _, future in batch.items]
+        # 合并任务的prompt_id通知给每个调用方
+        # Every caller is told the prompt_id of the coalesced job
+        listeners = [listener for listener in batch.listeners if listener is not None]
+
+        def _notify_submitted(comfyui_host, prompt_id):
+            for listener in listeners:
+                listener(comfyui_host, prompt_id)
+
+        submission_listener.set(_notify_submitted if listeners else None)
+        recoverable.set(batch.recoverable)
+        background_call.set(batch.background)
+        priority_lane.set(batch.priority)
+        try:
+            if len(batch.items) == 1:
+                result = await run_prompt(batch.items[0][0], checkpoint, batch.timeout)
+                if not futures[0].done():
+                    futures[0].set_result(result)
+                return
+
+            self._stats['batched_requests'] += len(batch.items)
+            merged, branches = build_batched_workflow([workflow for workflow, _ in batch.items])
+            self.logger.debug(f"合并 {len(batch.items)} 个文生图请求为一个ComfyUI任务，共 {batch.images} 张图片，{len(branches)} 个采样分支")
+            comfyui_host, entry = await submit_and_wait(merged, checkpoint, batch.timeout)
+            outputs = entry.get("outputs", {})
+            for output_ids, members in branches:
+                images = next((outputs[node_id]["images"] for node_id in output_ids
+                               if "images" in outputs.get(node_id, {})), None)
+                if images is None:
+                    raise Exception("未找到包含images的输出节点 | No output node with images found")
+                offset = 0
+                for index, count in members:
+                    future = futures[index]
+                    if not future.done():
+                        future.set_result((comfyui_host, images[offset:offset + count]))
+                    offset += count
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        except asyncio.CancelledError:
+            # 合并任务被取消（例如服务关闭）时，仍在等待的调用方得到错误而不是永远等待
+            # When the coalesced job is cancelled (e.g. on shutdown) callers still waiting get an error
+            # instead of waiting forever
+            for future in futures:
+                if not future.done():
+                    future.set_exception(Exception("合并的文生图任务已取消 | The coalesced txt2img job was cancelled"))
+            raise
+
+
+_batcher = None
+
+
+def get_txt2img_batcher():
+    """
+    获取进程级文生图微批处理器，未启用时返回None
+    Get the process-wide txt2img micro-batcher, None when disabled
+
+    返回:
+        Txt2ImgBatcher: 微批处理器或None
+
+    Returns:
+        Txt2ImgBatcher: Micro-batcher or None
+    """
+    global _batcher
+    config = get_settings().batching
+    if not config.enabled:
+        return None
+    if _batcher is None:
+        _batcher = Txt2ImgBatcher(window=config.window, max_images=config.max_batch_images)
+    else:
+        # 热加载后的窗口和上限对新的批次立即生效
+        # Reloaded window and limit apply to new batches right away
+        _batcher.window, _batcher.max_images = config.window, config.max_batch_images
+    return _batcher
@@ -0,0 +1,142 @@
+import json
+from .logger import default_logger
+from .object_info import get_node_source, input_choices, node_input_spec
+
+# 各目录的来源输入 (节点类型, 输入名) 与标题；多个来源的可选值按顺序合并去重
+# Source inputs (class_type, input_name) and titles of each catalog; options of several sources are
+# merged in order without duplicates
+CATALOG_SOURCES = {
+    "checkpoints": ([("CheckpointLoaderSimple", "ckpt_name")], "Checkpoint模型", "模型"),
+    "loras": ([("LoraLoader", "lora_name"), ("LoraLoaderModelOnly", "lora_name")], "LoRA模型", "模型"),
+    "vaes": ([("VAELoader", "vae_name")], "VAE模型", "模型"),
+    "upscale_models": ([("UpscaleModelLoader", "model_name")], "放大模型", "模型"),
+    "controlnets": ([("ControlNetLoader", "control_net_name")], "ControlNet模型", "模型"),
+    "samplers": ([("KSampler", "sampler_name")], "采样器", "采样器"),
+    "schedulers": ([("KSampler", "scheduler")], "调度器", "调度器"),
+}
+
+CATALOG_CLASSES = sorted({class_type for sources, _, _ in CATALOG_SOURCES.values() for class_type, _ in sources})
+
+
+class CatalogEntry:
+    """
+    单个目录：可选值及预先渲染好的Markdown和JSON文本
+    One catalog: its options with the Markdown and JSON text rendered up front
+    """
+
+    def __init__(self, name: str, title: str, unit: str, choices, tooltip: str = None, found: bool = True):
+        self.name = name
+        self.title = title
+        self.choices = tuple(choices)
+        self.tooltip = tooltip
+        self.found = found
+        if not found:
+            self.markdown = f"未找到{title}的来源节点，无法获取{title}列表。请确保MCP服务已成功从ComfyUI获取节点描述信息。"
+        else:
+            lines = [
+                f"## ComfyUI {title}列表",
+                f"描述: {tooltip or '无描述'}",
+                f"共找到 {len(self.choices)} 个{unit}\n"
+            ]
+            lines.extend(f"{i}. {choice}" for i, choice in enumerate(self.choices, 1))
+            self.markdown = "\n".join(lines)
+        self.json = json.dumps({"name": name, "title": title, "choices": self.choices}, ensure_ascii=False, separators=(',', ':'))
+
+
+class ModelCatalog:
+    """
+    从节点描述中提取的模型和枚举目录（checkpoint、LoRA、VAE、放大模型、采样器、调度器等），构建时一次性渲染
+    Model and enum catalogs extracted from the node descriptions (checkpoints, LoRAs, VAEs, upscale
+    models, samplers, schedulers, ...), all rendered once when built
+    """
+
+    def __init__(self, nodes: dict, version=None):
+        """
+        参数:
+            nodes: {节点类型: 节点描述}，只需包含 CATALOG_CLASSES 中的节点类型
+            version: 来源节点描述的版本标识，用于判断是否需要重建
+
+        Args:
+            nodes: {class_type: node description}, only the classes in CATALOG_CLASSES are needed
+            version: Version marker of the source node descriptions, used to decide on rebuilds
+        """
+        self.version = version
+        self.entries = {}
+        for name, (sources, title, unit) in CATALOG_SOURCES.items():
+            choices, tooltip, found = [], None, False
+            for class_type, input_name in sources:
+                spec = node_input_spec(nodes.get(class_type), input_name)
+                if spec is None:
+                    continue
+                found = True
+                for choice in input_choices(spec):
+                    if choice not in choices:
+                        choices.append(choice)
+                if tooltip is None and isinstance(spec, list) and len(spec) > 1 and isinstance(spec[1], dict):
+                    tooltip = spec[1].get("tooltip")
+            self.entries[name] = CatalogEntry(name, title, unit, choices, tooltip, found)
+        self.index_json = json.dumps(
+            [{"name": name, "title": entry.title, "count": len(entry.choices), "uri": f"info://catalog/{name}"}
+             for name, entry in self.entries.items()],
+            ensure_ascii=False, separators=(',', ':'))
+
+    def get(self, name: str):
+        """返回目录，不存在时为None | Return a catalog, None when unknown"""
+        return self.entries.get(name)
+
+
+class CatalogManager:
+    """
+    目录管理：只在来源节点描述变化时重建目录；完整模式从打包文件解码少数几个来源节点类型，不解析全部节点描述
+    Catalog manager: catalogs are rebuilt only when the source node descriptions change; in full mode
+    the few source classes are decoded from the pack file without parsing all node descriptions
+    """
+
+    def __init__(self, host: str = None, port: str = None, logger=None):
+        self.host = host
+        self.port = port
+        self.logger = logger or default_logger
+        self._catalog = None
+
+    async def get(self) -> ModelCatalog:
+        """
+        获取当前目录，来源节点描述有变化时重建
+        Get the current catalogs, rebuilt when the source node descriptions changed
+
+        返回:
+            ModelCatalog: 模型目录
+
+        Returns:
+            ModelCatalog: Model catalogs
+        """
+        version, get_node = await get_node_source(CATALOG_CLASSES, self.host, self.port)
+        catalog = self._catalog
+        if catalog is not None and catalog.version is version:
+            return catalog
+        catalog = ModelCatalog({class_type: get_node(class_type) for class_type in CATALOG_CLASSES}, version)
+        self._catalog = catalog
+        self.logger.debug("模型目录已重建: " + ", ".join(f"{name} {len(entry.choices)}" for name, entry in catalog.entries.items()))
+        return catalog
+
+
+_managers = {}
+
+
+def get_catalog_manager(host: str = None, port: str = None) -> CatalogManager:
+    """
+    获取指定ComfyUI后端的目录管理（默认第一个后端）
+    Get the catalog manager of the given ComfyUI backend (the first backend by default)
+    """
+    key = (host, str(port) if port is not None else None)
+    manager = _managers.get(key)
+    if manager is None:
+        manager = _managers[key] = CatalogManager(host, port)
+    return manager
+
+
+async def get_catalog(host: str = None, port: str = None) -> ModelCatalog:
+    """
+    获取指定ComfyUI后端当前的模型目录
+    Get the current model catalogs of the given ComfyUI backend
+    """
+    return await get_catalog_manager(host, port).get()
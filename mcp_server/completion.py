@@ -0,0 +1,518 @@
+import asyncio
+import json
+import math
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    from websockets.asyncio.client import connect as ws_connect
+except ImportError:
+    # 未安装websockets时只能使用轮询
+    # Fall back to polling only when websockets is not installed
+    ws_connect = None
+
+from .logger import default_logger
+from .utils import load_completion_config
+
+# 记录已收到完成事件但尚未被等待的prompt_id数量上限
+# Upper bound of prompt_ids whose completion event arrived before anyone waited on them
+_MAX_FINISHED_IDS = 1024
+
+# 收到完成事件但history尚未写入时的重试间隔（秒）
+# Re-check interval (seconds) when a completion event arrived before the history entry was written
+_SETTLE_INTERVAL = 0.25
+
+# 批量查询 /api/history?max_items= 时在等待中任务数之外多取的条数，容纳其他客户端同时完成的任务
+# Extra entries fetched by the bulk /api/history?max_items= query beyond the number of outstanding jobs,
+# leaving room for jobs of other clients that finished at the same time
+_HISTORY_MARGIN = 32
+
+# 连续轮询失败多少次后让所有等待者失败
+# Number of consecutive failed polls after which every waiter fails
+_MAX_POLL_FAILURES = 3
+
+# 表示任务已结束（成功、失败或被中断）的WebSocket事件
+# WebSocket events that mean a job has ended (success, failure or interruption)
+_TERMINAL_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+class ComfyUIJobError(Exception):
+    """
+    ComfyUI任务执行失败、被中断或从队列中丢失
+    A ComfyUI job failed, was interrupted or disappeared from the queue
+    """
+
+    def __init__(self, message: str, prompt_id: str = None):
+        super().__init__(message)
+        self.prompt_id = prompt_id
+
+
+def job_error_message(entry: dict) -> str:
+    """
+    从失败任务的history记录中提取错误描述
+    Extract an error description from a failed job's history entry
+
+    参数:
+        entry: /api/history/{prompt_id} 中的任务记录
+
+    Args:
+        entry: Job entry from /api/history/{prompt_id}
+
+    返回:
+        str: 错误描述
+
+    Returns:
+        str: Error description
+    """
+    for event, data in entry.get("status", {}).get("messages", []):
+        if event == "execution_error":
+            return f"{data.get('node_type', '')}({data.get('node_id', '')}): {data.get('exception_message', '').strip()}"
+        if event == "execution_interrupted":
+            return "任务被中断 | job interrupted"
+    return entry.get("status", {}).get("status_str", "error")
+
+
+class _Outstanding:
+    __slots__ = ("future", "submitted_at", "signalled", "waiters")
+
+    def __init__(self, future, submitted_at: float, signalled: bool):
+        self.future = future
+        self.submitted_at = submitted_at
+        self.signalled = signalled
+        self.waiters = 0
+
+
+class CompletionTracker:
+    """
+    ComfyUI任务完成跟踪器
+    通过 /ws?clientId=... 监听执行事件，在任务完成的瞬间唤醒等待者；所有等待中的任务由同一个后台轮询任务
+    批量核对（每轮一次 /api/history?max_items= 和一次 /api/queue），WebSocket断开时以较短间隔轮询。
+    轮询开销与并发任务数无关。
+    Completion tracker for ComfyUI jobs.
+    Listens for execution events on /ws?clientId=... and wakes waiters the moment a job finishes; every
+    outstanding job is checked in bulk by one background poller (one /api/history?max_items= and one
+    /api/queue request per round), polling at a shorter interval while the WebSocket is down. The
+    polling cost does not grow with the number of concurrent jobs.
+    """
+
+    def __init__(self, comfyui_host: str, client_id: str = None, use_websocket: bool = True,
+                 poll_interval: float = 3.0, safety_poll_interval: float = 30.0,
+                 reconnect_delay: float = 2.0, logger=None):
+        """
+        参数:
+            comfyui_host: ComfyUI服务器URL，如 http://127.0.0.1:8188
+            client_id: 提交任务时使用的client_id，ComfyUI只向该client推送执行事件
+            use_websocket: 是否启用WebSocket监听
+            poll_interval: WebSocket不可用时的轮询间隔（秒）
+            safety_poll_interval: WebSocket正常时的兜底核对间隔（秒）
+            reconnect_delay: WebSocket重连等待时间（秒）
+            logger: 日志记录器
+
+        Args:
+            comfyui_host: ComfyUI server URL, e.g. http://127.0.0.1:8188
+            client_id: client_id used when submitting prompts, ComfyUI only sends execution events to that client
+            use_websocket: Whether to listen on the WebSocket
+            poll_interval: Polling interval (seconds) while the WebSocket is unavailable
+            safety_poll_interval: Safety re-check interval (seconds) while the WebSocket is connected
+            reconnect_delay: Delay (seconds) before reconnecting the WebSocket
+            logger: Logger
+        """
+        self.comfyui_host = comfyui_host.rstrip('/')
+        self.client_id = client_id or str(uuid.uuid4())
+        self.use_websocket = use_websocket and ws_connect is not None
+        self.poll_interval = poll_interval
+        self.safety_poll_interval = safety_poll_interval
+        self.reconnect_delay = reconnect_delay
+        self.logger = logger or default_logger
+        self.ws_url = self.comfyui_host.replace('http', 'ws', 1) + f"/ws?clientId={self.client_id}"
+
+        self.loop = None
+        self._reader_task = None
+        self._closing = False
+        self._connected = False
+        self._connected_event = None
+        self._start_deadline = 0.0
+        self._outstanding = {}
+        self._finished = OrderedDict()
+        self._client = None
+        self._poll_task = None
+        self._poll_now = None
+        self._full_poll = False
+        self._stats = {
+            'completed_via_websocket': 0,
+            'completed_via_poll': 0,
+            'history_requests': 0,
+            'queue_requests': 0,
+            'polls': 0,
+            'saved_seconds': 0.0
+        }
+
+    @property
+    def connected(self) -> bool:
+        """WebSocket当前是否已连接 | Whether the WebSocket is currently connected"""
+        return self._connected
+
+    async def ensure_started(self, connect_timeout: float = 2.0) -> None:
+        """
+        启动WebSocket读取任务，并短暂等待首次连接，避免错过第一个任务的事件；
+        之后连接断开时不再等待，直接轮询，由读取任务在后台重连
+        Start the WebSocket reader task and briefly wait for the first connection
+        so that events of the first job are not missed; later, while the connection
+        is down, submissions fall back to polling at once and the reader reconnects
+        in the background
+
+        参数:
+            connect_timeout: 首次启动时等待连接的最长时间（秒）
+
+        Args:
+            connect_timeout: Maximum time (seconds) to wait for the connection on the first start
+        """
+        if not self.use_websocket:
+            return
+        if self._reader_task is None:
+            self.loop = asyncio.get_running_loop()
+            self._connected_event = asyncio.Event()
+            self._reader_task = asyncio.create_task(self._reader_loop())
+            self._start_deadline = self.loop.time() + connect_timeout
+        # 同时到达的首批提交共用同一个等待窗口 | submissions arriving together with the first one share its wait window
+        remaining = self._start_deadline - self.loop.time()
+        if not self._connected and remaining > 0:
+            try:
+                await asyncio.wait_for(self._connected_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self) -> None:
+        """停止WebSocket读取任务和轮询任务 | Stop the WebSocket reader task and the poller"""
+        task, self._reader_task = self._reader_task, None
+        if task is not None:
+            self._closing = True
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._set_connected(False)
+        poller, self._poll_task = self._poll_task, None
+        if poller is not None:
+            poller.cancel()
+            try:
+                await poller
+            except asyncio.CancelledError:
+                pass
+        self._fail_all(ComfyUIJobError("完成跟踪器已关闭 | Completion tracker closed"))
+
+    async def wait_for(self, prompt_id: str, client, submitted_at: float = None, check_first: bool = False) -> dict:
+        """
+        等待指定任务完成，返回该任务的history记录
+        Wait for the given job to finish and return its history entry
+
+        参数:
+            prompt_id: ComfyUI任务ID
+            client: 用于查询 /api/history 的 httpx.AsyncClient
+            submitted_at: 任务提交时间（time.monotonic()），用于统计节省的延迟
+            check_first: 先查询一次history和队列再开始等待（用于重新关联早先提交的任务）
+
+        Args:
+            prompt_id: ComfyUI prompt id
+            client: httpx.AsyncClient used to query /api/history
+            submitted_at: Submission time (time.monotonic()), used to measure saved latency
+            check_first: Query the history and queue once before waiting (for re-attaching to prompts
+                submitted earlier)
+
+        返回:
+            dict: /api/history/{prompt_id} 中该任务的记录
+
+        Returns:
+            dict: The job's entry from /api/history/{prompt_id}
+
+        Raises:
+            ComfyUIJobError: 任务执行失败、被中断，或既不在队列中也不在history中 | the job failed,
+                was interrupted, or is neither queued nor in the history
+        """
+        if submitted_at is None:
+            submitted_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        self._client = client
+        outstanding = self._outstanding.get(prompt_id)
+        if outstanding is None:
+            signalled = self._finished.pop(prompt_id, None) is not None
+            outstanding = self._outstanding[prompt_id] = _Outstanding(loop.create_future(), submitted_at, signalled)
+            if signalled:
+                self._wake()
+        if check_first:
+            self._wake(full=True)
+        self._ensure_poller()
+        outstanding.waiters += 1
+        try:
+            return await asyncio.shield(outstanding.future)
+        finally:
+            # 最后一个等待者离开（或任务已结束）后不再跟踪该任务，轮询任务在无事可做时退出
+            # Stop tracking the job once its last waiter leaves (or it ended), the poller exits when idle
+            outstanding.waiters -= 1
+            if (outstanding.future.done() or not outstanding.waiters) and self._outstanding.get(prompt_id) is outstanding:
+                del self._outstanding[prompt_id]
+                self._wake()
+
+    def _wake(self, full: bool = False) -> None:
+        if full:
+            self._full_poll = True
+        if self._poll_now is not None:
+            self._poll_now.set()
+
+    def _ensure_poller(self) -> None:
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_now = asyncio.Event()
+            if self._full_poll or any(outstanding.signalled for outstanding in self._outstanding.values()):
+                self._poll_now.set()
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    def _full_poll_interval(self) -> float:
+        return self.safety_poll_interval if self._connected else self.poll_interval
+
+    async def _poll_loop(self):
+        failures = 0
+        next_full = time.monotonic() + self._full_poll_interval()
+        while self._outstanding:
+            if not self._poll_now.is_set():
+                timeout = next_full - time.monotonic()
+                if any(outstanding.signalled for outstanding in self._outstanding.values()):
+                    # 收到事件但history尚未写入（execution_success先于history落盘），短间隔重试
+                    # Event arrived before the history entry was written (execution_success precedes it), re-check shortly
+                    timeout = min(timeout, _SETTLE_INTERVAL)
+                try:
+                    await asyncio.wait_for(self._poll_now.wait(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            self._poll_now.clear()
+            if time.monotonic() >= next_full:
+                self._full_poll = True
+            full, self._full_poll = self._full_poll, False
+            if full:
+                next_full = time.monotonic() + self._full_poll_interval()
+            try:
+                await self._poll(full)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self.logger.warning(f"查询ComfyUI任务状态失败（第 {failures} 次）: {str(e)}")
+                if failures >= _MAX_POLL_FAILURES:
+                    self._fail_all(e)
+                    failures = 0
+
+    async def _poll(self, full: bool) -> None:
+        # 完整轮询核对所有等待中的任务，事件触发的轮询只核对收到结束事件的任务
+        # A full poll checks every outstanding job, an event-triggered poll only the jobs that reported an end event
+        prompt_ids = [prompt_id for prompt_id, outstanding in self._outstanding.items() if full or outstanding.signalled]
+        if not prompt_ids:
+            return
+        self._stats['polls'] += 1
+        history = await self._fetch_history_bulk(len(self._outstanding) + _HISTORY_MARGIN)
+        unresolved = [prompt_id for prompt_id in prompt_ids if not self._resolve(prompt_id, history.get(prompt_id))]
+        # 收到结束事件却不在批量结果中：可能已被更新的记录挤出窗口，单独查询
+        # Reported an end event but missing from the bulk result: it may have been pushed out of the
+        # window by newer entries, query it on its own
+        for prompt_id in [prompt_id for prompt_id in unresolved if self._is_signalled(prompt_id)]:
+            if self._resolve(prompt_id, await self._fetch_history(self._client, prompt_id)):
+                unresolved.remove(prompt_id)
+        unresolved = [prompt_id for prompt_id in unresolved if prompt_id in self._outstanding and not self._is_signalled(prompt_id)]
+        if not full or not unresolved:
+            return
+        queued = await self._queued_ids(self._client)
+        for prompt_id in unresolved:
+            if prompt_id in queued:
+                continue
+            # 任务不在队列中：可能恰好在两次查询之间完成或已超出批量窗口，再单独查一次history，仍没有则视为丢失
+            # Not queued: it may have finished between the two requests or fallen out of the bulk window,
+            # check its history once more and treat the job as lost if it is still missing
+            if not self._resolve(prompt_id, await self._fetch_history(self._client, prompt_id)):
+                self._reject(prompt_id, ComfyUIJobError(f"任务已不在ComfyUI队列中: {prompt_id} | Job is no longer in the ComfyUI queue: {prompt_id}", prompt_id))
+
+    def _is_signalled(self, prompt_id) -> bool:
+        outstanding = self._outstanding.get(prompt_id)
+        return outstanding is not None and outstanding.signalled
+
+    def _resolve(self, prompt_id, entry) -> bool:
+        # 根据history记录结束等待，返回任务是否已结束
+        # End the wait according to the history entry, return whether the job has ended
+        outstanding = self._outstanding.get(prompt_id)
+        if outstanding is None or outstanding.future.done():
+            return True
+        if entry is None:
+            return False
+        status = entry.get("status", {})
+        if status.get("completed") and status.get("status_str") == "success":
+            self._record_completion(prompt_id, outstanding.submitted_at, outstanding.signalled)
+            outstanding.future.set_result(entry)
+            return True
+        if status.get("status_str") == "error":
+            message = job_error_message(entry)
+            self._reject(prompt_id, ComfyUIJobError(f"ComfyUI任务执行失败: {message} | ComfyUI job failed: {message}", prompt_id))
+            return True
+        return False
+
+    def _reject(self, prompt_id, error) -> None:
+        outstanding = self._outstanding.get(prompt_id)
+        if outstanding is not None and not outstanding.future.done():
+            outstanding.future.set_exception(error)
+            # 没有等待者时不再报告未取回的异常
+            # Do not report the exception as never retrieved when nobody is waiting any more
+            outstanding.future.exception()
+
+    def _fail_all(self, error) -> None:
+        for prompt_id in list(self._outstanding):
+            self._reject(prompt_id, error)
+
+    def stats(self) -> dict:
+        """
+        返回完成跟踪统计信息，包括相对于轮询节省的延迟
+        Return completion tracking statistics, including latency saved versus polling
+
+        返回:
+            dict: 统计信息
+
+        Returns:
+            dict: Statistics
+        """
+        stats = dict(self._stats)
+        ws_count = stats['completed_via_websocket']
+        stats['avg_saved_seconds'] = stats['saved_seconds'] / ws_count if ws_count else 0.0
+        stats['websocket_connected'] = self._connected
+        return stats
+
+    async def _fetch_history(self, client, prompt_id):
+        self._stats['history_requests'] += 1
+        resp = await client.get(f"{self.comfyui_host}/api/history/{prompt_id}")
+        resp.raise_for_status()
+        return resp.json().get(prompt_id)
+
+    async def _fetch_history_bulk(self, max_items: int) -> dict:
+        self._stats['history_requests'] += 1
+        resp = await self._client.get(f"{self.comfyui_host}/api/history", params={"max_items": max_items})
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _queued_ids(self, client) -> set:
+        self._stats['queue_requests'] += 1
+        resp = await client.get(f"{self.comfyui_host}/api/queue")
+        resp.raise_for_status()
+        data = resp.json()
+        return {item[1] for item in data.get("queue_running", []) + data.get("queue_pending", []) if len(item) > 1}
+
+    def _record_completion(self, prompt_id, submitted_at, via_websocket):
+        elapsed = time.monotonic() - submitted_at
+        if via_websocket:
+            # 轮询模式下任务会在下一个轮询时刻才被发现
+            # In polling mode the job would only be noticed at the next poll tick
+            polled_at = math.ceil(elapsed / self.poll_interval) * self.poll_interval
+            saved = max(polled_at - elapsed, 0.0)
+            self._stats['completed_via_websocket'] += 1
+            self._stats['saved_seconds'] += saved
+            self.logger.debug(f"ComfyUI任务 {prompt_id} 通过WebSocket完成，耗时 {elapsed:.2f} 秒，比轮询节省约 {saved:.2f} 秒")
+        else:
+            self._stats['completed_via_poll'] += 1
+            self.logger.debug(f"ComfyUI任务 {prompt_id} 通过轮询完成，耗时 {elapsed:.2f} 秒")
+
+    def _set_connected(self, connected):
+        self._connected = connected
+        if self._connected_event is not None:
+            if connected:
+                self._connected_event.set()
+            else:
+                self._connected_event.clear()
+
+    def _signal(self, prompt_id):
+        outstanding = self._outstanding.get(prompt_id)
+        if outstanding is not None:
+            outstanding.signalled = True
+            self._wake()
+        else:
+            # 尚无等待者，先记下，等待者注册时立即核对
+            # No waiter yet, remember it so a later waiter is checked right away
+            self._finished[prompt_id] = time.monotonic()
+            while len(self._finished) > _MAX_FINISHED_IDS:
+                self._finished.popitem(last=False)
+
+    def _handle_message(self, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        msg_type = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        if msg_type in _TERMINAL_EVENTS or (msg_type == "executing" and data.get("node") is None):
+            self._signal(prompt_id)
+
+    async def _reader_loop(self):
+        while True:
+            try:
+                async with ws_connect(self.ws_url, max_size=None, open_timeout=10) as ws:
+                    self._set_connected(True)
+                    self.logger.debug(f"已连接ComfyUI WebSocket: {self.ws_url}")
+                    async for message in ws:
+                        # 二进制消息为预览图，忽略
+                        # Binary messages are previews, ignore them
+                        if isinstance(message, str):
+                            self._handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.debug(f"ComfyUI WebSocket不可用，退化为轮询: {str(e)}")
+            finally:
+                if self._connected and not self._closing:
+                    self.logger.warning(f"ComfyUI WebSocket连接已断开，退化为轮询: {self.ws_url}")
+                self._set_connected(False)
+                # 立即完整轮询一次，之后按轮询间隔核对
+                # Poll everything right away, then keep checking at the polling interval
+                if self._outstanding:
+                    self._wake(full=True)
+            await asyncio.sleep(self.reconnect_delay)
+
+
+_trackers = {}
+
+
+def get_completion_tracker(comfyui_host: str) -> CompletionTracker:
+    """
+    获取指定ComfyUI服务器的完成跟踪器（每个服务器、每个事件循环一个）
+    Get the completion tracker of the given ComfyUI server (one per server per event loop)
+
+    参数:
+        comfyui_host: ComfyUI服务器URL
+
+    Args:
+        comfyui_host: ComfyUI server URL
+
+    返回:
+        CompletionTracker: 完成跟踪器
+
+    Returns:
+        CompletionTracker: Completion tracker
+    """
+    loop = asyncio.get_running_loop()
+    tracker = _trackers.get(comfyui_host)
+    if tracker is None or (tracker.loop is not None and tracker.loop is not loop):
+        config = load_completion_config()
+        tracker = CompletionTracker(
+            comfyui_host,
+            use_websocket=config['websocket'],
+            poll_interval=config['poll_interval'],
+            safety_poll_interval=config['safety_poll_interval'],
+            reconnect_delay=config['reconnect_delay']
+        )
+        _trackers[comfyui_host] = tracker
+    return tracker
+
+
+async def close_completion_trackers() -> None:
+    """关闭所有完成跟踪器 | Close all completion trackers"""
+    trackers = list(_trackers.values())
+    _trackers.clear()
+    for tracker in trackers:
+        await tracker.close()
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+import httpx
+from .admission import admit
+from .affinity import find_checkpoint, get_affinity_router
+from .backends import get_backend_pool
+from .completion import get_completion_tracker
+from .fairness import estimate_cost
+from .http_client import client_manager
+from .logger import default_logger
+from .settings import get_settings
+
+# 调用被取消后在后台进行的ComfyUI任务清理
+# ComfyUI job clean-ups running in the background after a call was cancelled
+_cancel_tasks = set()
+
+# 当前调用的任务提交回调 callback(comfyui_host, prompt_id)，工作流提交到ComfyUI后调用（由后台任务管理设置）
+# Submission callback callback(comfyui_host, prompt_id) of the current call, invoked once the workflow
+# has been queued on ComfyUI (set by the background job manager)
+submission_listener = ContextVar("submission_listener", default=None)
+
+# 当前调用能否在服务重启后由任务日志恢复（由后台任务管理设置）
+# Whether the current call can be recovered from the job journal after a restart (set by the background job manager)
+recoverable = ContextVar("recoverable", default=False)
+_detached = False
+
+
+def detach_recoverable_jobs() -> None:
+    """
+    服务关闭前调用：此后被取消的可恢复调用保留其在ComfyUI上的任务，重启后由任务日志重新关联
+    Called before the server shuts down: recoverable calls cancelled afterwards leave their ComfyUI jobs
+    alone so that the job journal can re-attach to them after the restart
+    """
+    global _detached
+    _detached = True
+
+
+def extract_output_images(entry: dict) -> list:
+    """
+    从任务的history记录中提取第一个包含images的输出节点的图片列表
+    Extract the images of the first output node that contains images from a job's history entry
+
+    参数:
+        entry: /api/history/{prompt_id} 中的任务记录
+
+    Args:
+        entry: Job entry from /api/history/{prompt_id}
+
+    返回:
+        list: 图片描述列表（filename/subfolder/type）
+
+    Returns:
+        list: Image descriptors (filename/subfolder/type)
+    """
+    for node_id, node_data in entry.get("outputs", {}).items():
+        if "images" in node_data:
+            return node_data["images"]
+    error_msg = "未找到包含images的输出节点 | No output node with images found"
+    default_logger.error(error_msg)
+    raise Exception(error_msg)
+
+
+def images_to_markdown(comfyui_host: str, images: list) -> str:
+    """
+    将图片列表转换为Markdown图片格式
+    Convert an image list to Markdown image format
+
+    参数:
+        comfyui_host: 生成图片的ComfyUI服务器URL
+        images: 图片描述列表
+
+    Args:
+        comfyui_host: URL of the ComfyUI server that produced the images
+        images: Image descriptors
+
+    返回:
+        str: Markdown图片格式
+
+    Returns:
+        str: Images in Markdown format
+    """
+    image_urls = [
+        f"{comfyui_host}/api/view?filename={img['filename']}&subfolder={img['subfolder']}&type=output"
+        for img in images
+    ]
+    return "\n".join(f"![image]({url})" for url in image_urls)
+
+
+async def cancel_job(comfyui_host: str, prompt_id: str) -> None:
+    """
+    从ComfyUI队列中删除任务；任务已在执行时中断它，避免为无人读取的结果浪费GPU时间
+    Remove a job from the ComfyUI queue, or interrupt it when it is already running, so that
+    no GPU time is spent on results nobody will read
+
+    参数:
+        comfyui_host: 执行任务的ComfyUI服务器URL
+        prompt_id: ComfyUI任务ID
+
+    Args:
+        comfyui_host: URL of the ComfyUI server running the job
+        prompt_id: ComfyUI prompt id
+    """
+    client = client_manager.get_client()
+    try:
+        resp = await client.post(f"{comfyui_host}/api/queue", json={"delete": [prompt_id]})
+        resp.raise_for_status()
+        resp = await client.get(f"{comfyui_host}/api/queue")
+        resp.raise_for_status()
+        running = [item[1] for item in resp.json().get("queue_running", []) if len(item) > 1]
+        if prompt_id in running:
+            # 新版ComfyUI只中断prompt_id匹配的任务
+            # Recent ComfyUI versions only interrupt the job whose prompt_id matches
+            resp = await client.post(f"{comfyui_host}/api/interrupt", json={"prompt_id": prompt_id})
+            resp.raise_for_status()
+            default_logger.info(f"已中断ComfyUI任务: {prompt_id} ({comfyui_host})")
+        else:
+            default_logger.info(f"已从ComfyUI队列移除任务: {prompt_id} ({comfyui_host})")
+    except Exception as e:
+        default_logger.warning(f"取消ComfyUI任务 {prompt_id} 失败: {str(e)}")
+
+
+async def submit_and_wait(prompt_template: dict, checkpoint: str = None, timeout: float = None) -> tuple:
+    """
+    选择ComfyUI后端，提交工作流并等待执行完成
+    优先选择最近加载过同一checkpoint的后端；完成跟踪与图片URL都固定在实际执行任务的后端上。
+    Pick a ComfyUI backend, submit the workflow and wait for it to finish.
+    Backends that last loaded the same checkpoint are preferred; completion tracking and image URLs
+    stay pinned to the backend that ran the job.
+
+    参数:
+        prompt_template: 已填充参数的API格式工作流
+        checkpoint: 任务使用的checkpoint，为None时从工作流中查找
+        timeout: 任务截止时间（秒），为None时使用配置值，0表示不限制
+
+    Args:
+        prompt_template: API-format workflow with parameters filled in
+        checkpoint: Checkpoint used by the job, looked up in the workflow when None
+        timeout: Job deadline (seconds), the configured value when None, 0 disables it
+
+    返回:
+        tuple: (comfyui_host, entry)，comfyui_host 为执行任务的后端URL，entry 为任务的history记录
+
+    Returns:
+        tuple: (comfyui_host, entry), comfyui_host being the URL of the backend that ran the job
+        and entry the job's history entry
+
+    Raises:
+        AdmissionRejected: 准入控制已饱和，任务未提交 | admission control is saturated, nothing was queued
+        TimeoutError: 超过截止时间仍未完成 | the job did not finish before the deadline
+        ComfyUIJobError: 任务执行失败、被中断或丢失 | the job failed, was interrupted or was lost
+    """
+    config = get_settings().completion
+    if timeout is None:
+        timeout = config.job_timeout
+
+    # 准入控制已饱和时等待或拒绝，避免在ComfyUI上堆积注定超时的任务
+    # Wait or get rejected while admission control is saturated, instead of piling up jobs on ComfyUI
+    # that are bound to time out
+    async with admit(estimate_cost(prompt_template)) as admission:
+        # 截止时间从准入后开始计算，等待准入的时间不占用任务的执行时间
+        # The deadline starts once admitted, time spent waiting for admission does not eat into the job's
+        deadline = time.monotonic() + timeout if timeout and timeout > 0 else None
+        pool = get_backend_pool()
+        router = get_affinity_router()
+        await pool.ensure_fresh()
+        client = client_manager.get_client()
+        if checkpoint is None:
+            checkpoint = find_checkpoint(prompt_template)
+
+        failed = []
+        while True:
+            backend = router.select(checkpoint, exclude=failed)
+            tracker = get_completion_tracker(backend.url)
+            # 先建立WebSocket连接，确保能收到本任务的执行事件
+            # Connect the WebSocket first so that this job's execution events are received
+            await tracker.ensure_started()
+
+            body = {
+                "client_id": tracker.client_id,
+                "prompt": prompt_template
+            }
+            if admission.front and not backend.has_lower_lane(admission.lane):
+                # 高优先级任务插到ComfyUI队列最前面；防饿死只作用于准入等待队列，因此不越过本服务已提交的
+                # 低优先级任务，否则它们会被不断插队直到超时，此时只按准入等待队列的顺序排队
+                # High-priority jobs go to the head of the ComfyUI queue; starvation protection only
+                # applies in the admission wait queue, so lower-lane jobs this server already submitted are
+                # never overtaken (they would keep being jumped until they time out) and the order then
+                # comes from the admission wait queue alone
+                body["front"] = True
+
+            default_logger.debug(f"开始向ComfyUI发送API请求: {backend.url}/api/prompt")
+            default_logger.debug(f"请求体内容: {json.dumps(body, ensure_ascii=False, indent=2)}")
+            try:
+                resp = await client.post(f"{backend.url}/api/prompt", json=body)
+            except httpx.RequestError as e:
+                # 后端不可达时换一个后端重试
+                # Retry on another backend when this one is unreachable
+                pool.mark_failure(backend, e)
+                failed.append(backend)
+                if len(failed) >= len(pool.backends):
+                    raise
+                default_logger.warning(f"向ComfyUI后端 {backend.url} 提交任务失败，尝试其他后端: {str(e)}")
+                continue
+            resp.raise_for_status()
+            pool.mark_success(backend)
+            break
+
+        async with pool.track(backend, checkpoint, admission.lane):
+            # 任务已计入后端负载，释放准入时预留的队列名额
+            # The job now counts towards the backend load, release the queue slot reserved on admission
+            admission.submitted()
+            prompt_id = resp.json()["prompt_id"]
+            submitted_at = time.monotonic()
+            listener = submission_listener.get()
+            if listener is not None:
+                listener(backend.url, prompt_id)
+
+            default_logger.debug(f"成功提交ComfyUI任务, prompt_id: {prompt_id}, 后端: {backend.url}")
+
+            try:
+                remaining = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+                entry = await asyncio.wait_for(tracker.wait_for(prompt_id, client, submitted_at), remaining)
+            except asyncio.TimeoutError:
+                if config.cancel_on_abort:
+                    await cancel_job(backend.url, prompt_id)
+                error_msg = f"ComfyUI任务超过 {timeout:g} 秒未完成: {prompt_id} | ComfyUI job did not finish within {timeout:g}s: {prompt_id}"
+                default_logger.error(error_msg)
+                raise TimeoutError(error_msg)
+            except asyncio.CancelledError:
+                # 调用被取消：在后台清理ComfyUI上的任务，不阻塞取消；服务关闭时保留可恢复的任务
+                # The call was cancelled: clean up the ComfyUI job in the background without delaying
+                # cancellation; recoverable jobs are kept when the server shuts down
+                if config.cancel_on_abort and not (_detached and recoverable.get()):
+                    task = asyncio.ensure_future(cancel_job(backend.url, prompt_id))
+                    _cancel_tasks.add(task)
+                    task.add_done_callback(_cancel_tasks.discard)
+                raise
+            router.record_completion(backend, checkpoint)
+
+    default_logger.debug(f"ComfyUI任务完成: {entry['status']['status_str']}")
+    return backend.url, entry
+
+
+async def run_prompt(prompt_template: dict, checkpoint: str = None, timeout: float = None) -> tuple:
+    """
+    提交工作流并等待执行完成，返回生成的图片
+    Submit a workflow, wait for it to finish and return the generated images
+
+    参数:
+        prompt_template: 已填充参数的API格式工作流
+        checkpoint: 任务使用的checkpoint，为None时从工作流中查找
+        timeout: 任务截止时间（秒），为None时使用配置值，0表示不限制
+
+    Args:
+        prompt_template: API-format workflow with parameters filled in
+        checkpoint: Checkpoint used by the job, looked up in the workflow when None
+        timeout: Job deadline (seconds), the configured value when None, 0 disables it
+
+    返回:
+        tuple: (comfyui_host, images)，comfyui_host 为执行任务的后端URL
+
+    Returns:
+        tuple: (comfyui_host, images), comfyui_host being the URL of the backend that ran the job
+    """
+    comfyui_host, entry = await submit_and_wait(prompt_template, checkpoint, timeout)
+    images = extract_output_images(entry)
+    default_logger.debug(f"生成图片数量: {len(images)}")
+    return comfyui_host, images
@@ -0,0 +1,198 @@
+import hashlib
+import time
+from collections import OrderedDict, deque
+from mcp.server.lowlevel.server import request_ctx
+
+# 估算GPU开销的基准：一张 512×512 图片记为 1
+# Baseline of the GPU cost estimate: one 512×512 image counts as 1
+_BASE_PIXELS = 512 * 512
+
+# 不在MCP请求中（如测试、服务内部调用）时使用的客户端标识
+# Client key used outside an MCP request (tests, calls made by the server itself)
+LOCAL_CLIENT = "local"
+
+# 令牌桶最多保留的客户端数，超出时丢弃已经回满的令牌桶
+# Maximum number of clients with a token bucket, full buckets are dropped beyond it
+_MAX_BUCKETS = 1024
+
+
+def current_client() -> str:
+    """
+    当前MCP请求所属的客户端：优先使用API密钥（X-API-Key 或 Authorization 头，只保留哈希），
+    其次是 streamable-http 的 Mcp-Session-Id，最后是会话对象本身（stdio / sse）
+    Client the current MCP request belongs to: the API key (X-API-Key or Authorization header, only
+    its hash is kept) first, then the streamable-http Mcp-Session-Id, and finally the session object
+    itself (stdio / sse)
+
+    返回:
+        str: 客户端标识，不在MCP请求中时为 local
+
+    Returns:
+        str: Client key, local outside an MCP request
+    """
+    try:
+        context = request_ctx.get()
+    except LookupError:
+        return LOCAL_CLIENT
+    headers = getattr(context.request, "headers", None) or {}
+    api_key = headers.get("x-api-key") or headers.get("authorization")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    session_id = headers.get("mcp-session-id")
+    if session_id:
+        return f"session:{session_id}"
+    return f"session:{id(context.session):x}"
+
+
+def estimate_cost(prompt_template: dict) -> float:
+    """
+    按工作流估算GPU开销：批次数 × 像素数，以一张 512×512 图片为 1；找不到尺寸（如图生图）时按基准尺寸计算
+    Estimate the GPU cost of a workflow: batch size × pixel count, one 512×512 image being 1; the
+    baseline size is assumed when no size is found (e.g. img2img)
+
+    参数:
+        prompt_template: API格式工作流
+
+    Args:
+        prompt_template: API-format workflow
+
+    返回:
+        float: 估算的开销
+
+    Returns:
+        float: Estimated cost
+    """
+    cost = 0.0
+    for node in prompt_template.values():
+        inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+        width, height, batch_size = inputs.get("width"), inputs.get("height"), inputs.get("batch_size", 1)
+        if not all(isinstance(value, (int, float)) for value in (width, height, batch_size)):
+            continue
+        cost += max(batch_size, 1) * width * height / _BASE_PIXELS
+    return max(cost, 1.0)
+
+
+class FairQueue:
+    """
+    按客户端分组的赤字轮转（DRR）等待队列：各客户端轮流获得额度，按开销扣除，
+    高开销请求较多的客户端无法挤占其他客户端的份额；同一客户端内保持先后顺序。
+    队列项需要有 key（客户端）和 cost（开销）属性。
+    Deficit round robin (DRR) wait queue grouped by client: clients take turns receiving a quantum
+    that is charged by cost, so a client sending many expensive requests cannot take other clients'
+    share; arrival order is kept within a client. Items need key (client) and cost attributes.
+    """
+
+    def __init__(self, quantum: float = 1.0):
+        """
+        参数:
+            quantum: 每轮为客户端补充的额度
+
+        Args:
+            quantum: Quantum credited to a client on each turn
+        """
+        self.quantum = quantum
+        self._queues = OrderedDict()
+        self._deficit = {}
+        self._turn = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, item) -> None:
+        """加入队列末尾 | Append to the queue"""
+        self._queues.setdefault(item.key, deque()).append(item)
+        self._size += 1
+
+    def peek(self):
+        """
+        按轮转顺序返回下一个应被处理的项，队列为空时返回None
+        Return the item to be served next in round-robin order, None when the queue is empty
+        """
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            if self._turn != key:
+                # 轮到该客户端，补充额度 | this client's turn, credit its quantum
+                self._turn = key
+                self._deficit[key] = self._deficit.get(key, 0.0) + self.quantum
+            if queue[0].cost <= self._deficit[key]:
+                return queue[0]
+            self._queues.move_to_end(key)
+            self._turn = None
+        return None
+
+    def take(self, item) -> None:
+        """移除被处理的项并扣除其开销 | Remove a served item and charge its cost"""
+        self._deficit[item.key] = self._deficit.get(item.key, 0.0) - item.cost
+        self.remove(item)
+
+    def remove(self, item) -> None:
+        """移除一项（如等待超时或被取消） | Remove an item (e.g. its wait timed out or was cancelled)"""
+        queue = self._queues.get(item.key)
+        if queue is None or item not in queue:
+            return
+        queue.remove(item)
+        self._size -= 1
+        if not queue:
+            # 客户端没有等待的请求时清零额度，空闲期间不积累 | no credit accumulates while a client is idle
+            del self._queues[item.key]
+            self._deficit.pop(item.key, None)
+            if self._turn == item.key:
+                self._turn = None
+
+
+class RateLimiter:
+    """
+    按客户端的令牌桶限速
+    Per-client token bucket rate limiter
+    """
+
+    def __init__(self, rate: float = 0.0, burst: int = 10):
+        """
+        参数:
+            rate: 每分钟允许的任务数，0表示不限制
+            burst: 允许的突发任务数
+
+        Args:
+            rate: Jobs allowed per minute, 0 for no limit
+            burst: Jobs allowed in a burst
+        """
+        self.rate = rate
+        self.burst = burst
+        self._buckets = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """
+        为客户端取一个令牌
+        Take a token for a client
+
+        参数:
+            key: 客户端标识
+
+        Args:
+            key: Client key
+
+        返回:
+            float: 0表示允许；否则为距离下一个令牌的秒数
+
+        Returns:
+            float: 0 when allowed, otherwise the seconds until the next token
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        per_second = self.rate / 60.0
+        tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * per_second)
+        if tokens >= 1.0:
+            tokens -= 1.0
+            wait = 0.0
+        else:
+            wait = (1.0 - tokens) / per_second
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > _MAX_BUCKETS:
+            oldest, (tokens, updated) = next(iter(self._buckets.items()))
+            if tokens + (now - updated) * per_second < self.burst:
+                break
+            del self._buckets[oldest]
+        return wait
@@ -0,0 +1,140 @@
+import asyncio
+import httpx
+from .logger import default_logger
+from .utils import load_http_client_config
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ComfyUIClientManager:
+    """
+    进程级共享的ComfyUI HTTP客户端管理器
+    所有工具调用复用同一个带连接池和keep-alive的 httpx.AsyncClient，
+    服务启动时创建，服务关闭时释放。
+    Process-wide manager of the shared ComfyUI HTTP client.
+    All tool calls reuse one httpx.AsyncClient with connection pooling and keep-alive;
+    it is created when the server starts and closed when it shuts down.
+    """
+
+    def __init__(self, config: dict = None, logger=None):
+        """
+        参数:
+            config: HTTP客户端配置，为None时从config.ini加载
+            logger: 日志记录器
+
+        Args:
+            config: HTTP client configuration, loaded from config.ini when None
+            logger: Logger
+        """
+        self._config = config
+        self.logger = logger or default_logger
+        self._client = None
+        self._loop = None
+        self._stale_tasks = set()
+
+    def _create_client(self) -> httpx.AsyncClient:
+        config = self._config or load_http_client_config()
+        http2 = config['http2']
+        if http2 and not _http2_available():
+            self.logger.warning("未安装HTTP/2依赖（httpx[http2]），ComfyUI客户端使用HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=config['max_connections'],
+            max_keepalive_connections=config['max_keepalive_connections'],
+            keepalive_expiry=config['keepalive_expiry']
+        )
+        timeout = httpx.Timeout(
+            connect=config['connect_timeout'],
+            read=config['read_timeout'],
+            write=config['write_timeout'],
+            pool=config['pool_timeout']
+        )
+        self.logger.debug(f"创建共享ComfyUI HTTP客户端: 最大连接数 {limits.max_connections}, "
+                          f"keep-alive连接数 {limits.max_keepalive_connections}, HTTP/2 {http2}")
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+    async def start(self) -> httpx.AsyncClient:
+        """
+        在当前事件循环中创建共享客户端
+        Create the shared client in the current event loop
+
+        返回:
+            httpx.AsyncClient: 共享客户端
+
+        Returns:
+            httpx.AsyncClient: Shared client
+        """
+        return self.get_client()
+
+    def get_client(self) -> httpx.AsyncClient:
+        """
+        获取当前事件循环的共享客户端，不存在时创建
+        连接池绑定在事件循环上，事件循环变化时会重新创建。
+        Get the shared client of the current event loop, creating it if needed.
+        The connection pool is bound to an event loop and is recreated when the loop changes.
+
+        返回:
+            httpx.AsyncClient: 共享客户端
+
+        Returns:
+            httpx.AsyncClient: Shared client
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._discard(self._client, self._loop)
+            self._client = self._create_client()
+            self._loop = loop
+        return self._client
+
+    def _discard(self, client, loop) -> None:
+        # 关闭绑定在旧事件循环上的客户端，避免连接池泄漏
+        # Close a client bound to a previous event loop so that its connection pool does not leak
+        if client is None or client.is_closed:
+            return
+        if loop is not None and loop.is_running():
+            # 旧事件循环仍在其他线程中运行，在其中关闭 | the old loop still runs in another thread, close it there
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        task = asyncio.ensure_future(self._close_stale(client))
+        self._stale_tasks.add(task)
+        task.add_done_callback(self._stale_tasks.discard)
+
+    async def _close_stale(self, client) -> None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            # 旧事件循环已关闭时仍会关闭底层套接字，只是无法完成关闭回调
+            # With the old loop closed the sockets are still closed, only the close callbacks cannot run
+            self.logger.debug(f"关闭旧的ComfyUI HTTP客户端: {str(e)}")
+
+    async def aclose(self) -> None:
+        """关闭共享客户端并释放所有连接 | Close the shared client and release all connections"""
+        client, self._client = self._client, None
+        loop, self._loop = self._loop, None
+        if client is not None and not client.is_closed:
+            if loop is asyncio.get_running_loop():
+                await client.aclose()
+                self.logger.debug("共享ComfyUI HTTP客户端已关闭")
+            else:
+                self._discard(client, loop)
+        if self._stale_tasks:
+            await asyncio.gather(*self._stale_tasks, return_exceptions=True)
+
+    async def __aenter__(self) -> "ComfyUIClientManager":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+
+# 进程级共享实例
+# Process-wide shared instance
+client_manager = ComfyUIClientManager()
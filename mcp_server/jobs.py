@@ -0,0 +1,383 @@
+import asyncio
+import inspect
+import json
+import time
+import uuid
+from .admission import background_call
+from .completion import CompletionTracker, get_completion_tracker
+from .executor import detach_recoverable_jobs, extract_output_images, images_to_markdown, recoverable, submission_listener
+from .http_client import client_manager
+from .journal import FINISHED_EVENT, PROMPT_EVENT, SUBMITTED_EVENT, get_job_journal
+from .logger import default_logger
+from .priority import priority_lane
+from .settings import get_settings
+from .utils import load_completion_config
+
+# 任务状态 | job states
+PENDING = "pending"
+SUBMITTED = "submitted"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+JOB_URI = "job://{job_id}"
+JOBS_URI = "job://list"
+
+
+class Job:
+    """
+    一个后台生成任务：状态、ComfyUI后端与prompt_id、结果或错误
+    One background generation job: its state, ComfyUI backend and prompt_id, and its result or error
+    """
+
+    def __init__(self, api_name: str, arguments: dict, job_id: str = None, created: float = None, owner: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.api_name = api_name
+        self.arguments = arguments
+        # 提交任务的客户端，不写入状态描述 | client that submitted the job, not part of the state description
+        self.owner = owner
+        self.status = PENDING
+        self.backend = None
+        self.prompt_id = None
+        self.client_id = None
+        self.result = None
+        self.error = None
+        self.created = created or time.time()
+        self.finished = None
+        self.task = None
+        self.done = asyncio.Event()
+
+    @property
+    def uri(self) -> str:
+        return JOB_URI.format(job_id=self.id)
+
+    def to_dict(self) -> dict:
+        """返回任务的状态描述 | Return the job's state description"""
+        return {
+            "job_id": self.id,
+            "tool": self.api_name,
+            "arguments": self.arguments,
+            "status": self.status,
+            "backend": self.backend,
+            "prompt_id": self.prompt_id,
+            "created": self.created,
+            "finished": self.finished,
+            "result": self.result,
+            "error": self.error,
+            "uri": self.uri,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+class JobManager:
+    """
+    后台任务管理：submit 立即返回任务ID，生成工具在后台任务中执行；记录ComfyUI的prompt_id，
+    状态变化时通知订阅者并写入任务日志，按数量和保留时间清理已结束的任务；重启后从任务日志恢复
+    Background job manager: submit returns a job id right away and the generation tool runs in a
+    background task; the ComfyUI prompt_id is recorded, state changes are sent to subscribers and
+    written to the job journal, finished jobs are pruned by count and retention time, and jobs are
+    recovered from the journal after a restart
+    """
+
+    def __init__(self, journal_factory=None, logger=None):
+        """
+        参数:
+            journal_factory: journal_factory() -> JobJournal 或 None，默认使用配置的任务日志
+            logger: 日志记录器
+
+        Args:
+            journal_factory: journal_factory() -> JobJournal or None, the configured job journal by default
+            logger: Logger
+        """
+        self.journal_factory = journal_factory or get_job_journal
+        self.logger = logger or default_logger
+        self._runners = {}
+        self._jobs = {}
+        self._listeners = []
+        self._notify_tasks = set()
+        self._closing = False
+
+    def register_runner(self, api_name: str, runner) -> None:
+        """
+        注册可作为后台任务执行的工具 async runner(**arguments) -> str
+        Register a tool that can run as a background job, async runner(**arguments) -> str
+        """
+        self._runners[api_name] = runner
+
+    def runners(self) -> list:
+        """返回可提交的工具名 | Return the names of the tools that can be submitted"""
+        return sorted(self._runners)
+
+    def subscribe(self, callback) -> None:
+        """
+        注册任务状态变化回调 async callback(job)
+        Register a job state change callback async callback(job)
+        """
+        self._listeners.append(callback)
+
+    def _changed(self, job: Job) -> None:
+        for callback in list(self._listeners):
+            task = asyncio.ensure_future(self._call(callback, job))
+            self._notify_tasks.add(task)
+            task.add_done_callback(self._notify_tasks.discard)
+
+    async def _call(self, callback, job):
+        try:
+            await callback(job)
+        except Exception as e:
+            self.logger.error(f"执行任务状态回调时出错: {str(e)}")
+
+    def _prune(self) -> None:
+        config = get_settings().jobs
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.status in FINISHED_STATES]
+        finished.sort(key=lambda job: job.finished)
+        excess = len(finished) - config.max_jobs
+        dropped = [job.id for i, job in enumerate(finished)
+                   if i < excess or (config.retention > 0 and now - job.finished > config.retention)]
+        for job_id in dropped:
+            del self._jobs[job_id]
+        journal = self.journal_factory()
+        if journal is not None:
+            journal.forget(dropped)
+
+    def submit(self, api_name: str, arguments: dict = None, owner: str = None) -> Job:
+        """
+        提交后台任务
+        Submit a background job
+
+        参数:
+            api_name: 工具名，如 txt2img
+            arguments: 工具参数
+            owner: 提交任务的客户端（可选），之后只有该客户端能查询和取消任务
+
+        Args:
+            api_name: Tool name, e.g. txt2img
+            arguments: Tool arguments
+            owner: Client submitting the job (optional), only that client can query and cancel it later
+
+        返回:
+            Job: 新建的任务
+
+        Returns:
+            Job: The new job
+
+        Raises:
+            ValueError: 工具未知或参数不匹配 | unknown tool or mismatching arguments
+        """
+        runner = self._runners.get(api_name)
+        if runner is None:
+            raise ValueError(f"未知的工具: {api_name}，可提交的工具: {', '.join(self.runners())} | Unknown tool: {api_name}")
+        arguments = dict(arguments or {})
+        try:
+            inspect.signature(runner).bind(**arguments)
+        except TypeError as e:
+            raise ValueError(f"工具 {api_name} 的参数无效: {str(e)} | Invalid arguments for {api_name}: {str(e)}") from None
+        self._prune()
+        job = Job(api_name, arguments, owner=owner)
+        self._jobs[job.id] = job
+        journal = self.journal_factory()
+        if journal is not None:
+            journal.append(job.id, SUBMITTED_EVENT, tool=api_name, arguments=arguments, created=job.created, owner=owner)
+        self._start(job, lambda: runner(**job.arguments), journal)
+        self.logger.info(f"已提交后台任务: {job.id} ({api_name})")
+        return job
+
+    def _start(self, job: Job, call, journal) -> None:
+        job.task = asyncio.ensure_future(self._run(job, call, journal))
+
+    async def _run(self, job: Job, call, journal):
+        def _submitted(comfyui_host, prompt_id):
+            job.backend, job.prompt_id, job.status = comfyui_host, prompt_id, SUBMITTED
+            job.client_id = get_completion_tracker(comfyui_host).client_id
+            if journal is not None:
+                journal.append(job.id, PROMPT_EVENT, backend=comfyui_host, prompt_id=prompt_id, client_id=job.client_id)
+            self._changed(job)
+
+        submission_listener.set(_submitted)
+        recoverable.set(journal is not None)
+        # 后台任务等到准入为止，不因准入控制饱和而失败 | background jobs wait until admitted instead of failing on saturation
+        background_call.set(True)
+        # 后台任务默认使用后台通道，工具参数中的 priority 可覆盖 | background jobs default to the background lane, the priority argument overrides it
+        if priority_lane.get() is None:
+            priority_lane.set(get_settings().priority.background_lane)
+        try:
+            job.result = await call()
+            job.status = COMPLETED
+        except asyncio.CancelledError:
+            if self._closing and journal is not None:
+                # 服务关闭：任务保持未结束状态，重启后从任务日志恢复
+                # Server shutdown: the job stays unfinished and is recovered from the journal after the restart
+                return
+            job.status = CANCELLED
+        except Exception as e:
+            job.status, job.error = FAILED, str(e)
+        job.finished = time.time()
+        job.done.set()
+        if journal is not None:
+            journal.append(job.id, FINISHED_EVENT, status=job.status, result=job.result, error=job.error, finished=job.finished)
+        self.logger.info(f"后台任务结束: {job.id} ({job.status})")
+        self._changed(job)
+
+    async def _reattach(self, job: Job) -> str:
+        # 等待重启前已提交的ComfyUI任务：仍在队列中时等待完成，已完成时直接读取history；
+        # ComfyUI只向提交任务的client_id推送执行事件，因此使用原来的client_id连接
+        # Wait for a ComfyUI prompt submitted before the restart: still queued ones are waited for,
+        # finished ones are read from the history right away; ComfyUI only pushes execution events to
+        # the client_id that submitted the prompt, so the original client_id is used to connect
+        tracker = get_completion_tracker(job.backend)
+        dedicated = bool(job.client_id) and job.client_id != tracker.client_id
+        if dedicated:
+            config = load_completion_config()
+            tracker = CompletionTracker(
+                job.backend,
+                client_id=job.client_id,
+                use_websocket=config['websocket'],
+                poll_interval=config['poll_interval'],
+                safety_poll_interval=config['safety_poll_interval'],
+                reconnect_delay=config['reconnect_delay']
+            )
+        try:
+            await tracker.ensure_started()
+            entry = await tracker.wait_for(job.prompt_id, client_manager.get_client(), check_first=True)
+        finally:
+            if dedicated:
+                await tracker.close()
+        return images_to_markdown(job.backend, extract_output_images(entry))
+
+    async def recover(self) -> int:
+        """
+        从任务日志恢复重启前的任务：已结束的任务恢复其结果，已提交到ComfyUI的任务通过 /api/history
+        和 /api/queue 重新关联，尚未提交的任务重新执行
+        Recover the jobs from before the restart out of the job journal: finished jobs get their
+        results back, jobs already queued on ComfyUI are re-attached through /api/history and
+        /api/queue, and jobs that were never submitted run again
+
+        返回:
+            int: 恢复的未结束任务数
+
+        Returns:
+            int: Number of unfinished jobs recovered
+        """
+        journal = self.journal_factory()
+        if journal is None:
+            return 0
+        resumed = 0
+        for job_id, state in (await journal.load()).items():
+            if job_id in self._jobs:
+                continue
+            job = Job(state.get("tool"), state.get("arguments") or {}, job_id=job_id, created=state.get("created"),
+                      owner=state.get("owner"))
+            job.status, job.backend, job.prompt_id = state["status"], state["backend"], state["prompt_id"]
+            job.client_id = state.get("client_id")
+            job.result, job.error, job.finished = state["result"], state["error"], state["finished"]
+            self._jobs[job_id] = job
+            if job.status in FINISHED_STATES:
+                job.done.set()
+                continue
+            if job.prompt_id is not None:
+                self._start(job, lambda job=job: self._reattach(job), journal)
+                self.logger.info(f"重新关联后台任务: {job.id} (prompt_id {job.prompt_id}, {job.backend})")
+            elif job.api_name in self._runners:
+                runner = self._runners[job.api_name]
+                self._start(job, lambda job=job, runner=runner: runner(**job.arguments), journal)
+                self.logger.info(f"重新执行未提交的后台任务: {job.id} ({job.api_name})")
+            else:
+                self._start(job, lambda job=job: self._unavailable(job), journal)
+            resumed += 1
+        self._prune()
+        if resumed:
+            self.logger.info(f"从任务日志恢复了 {resumed} 个未结束的后台任务")
+        return resumed
+
+    async def _unavailable(self, job: Job):
+        raise RuntimeError(f"工具不可用: {job.api_name} | Tool is not available: {job.api_name}")
+
+    def get(self, job_id: str, owner: str = None):
+        """
+        返回任务，不存在或指定了 owner 但任务属于其他客户端时为None
+        Return a job, None when unknown or when owner is given and the job belongs to another client
+        """
+        job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def list_jobs(self, status: str = None, owner: str = None) -> list:
+        """
+        列出任务（按提交时间排序），可按状态过滤；指定 owner 时只列出该客户端的任务
+        List jobs in submission order, optionally filtered by state; with owner only that client's jobs
+        are listed
+        """
+        self._prune()
+        return [job for job in self._jobs.values()
+                if (status is None or job.status == status) and (owner is None or job.owner == owner)]
+
+    def cancel(self, job_id: str, owner: str = None) -> bool:
+        """
+        取消任务；已在ComfyUI上排队或执行的任务随之被移除或中断
+        Cancel a job; a job already queued or running on ComfyUI is removed or interrupted along with it
+
+        参数:
+            job_id: 任务ID
+            owner: 提交任务的客户端（可选），任务属于其他客户端时不取消
+
+        Args:
+            job_id: Job id
+            owner: Client that submitted the job (optional), jobs of other clients are left alone
+
+        返回:
+            bool: 任务存在且尚未结束
+
+        Returns:
+            bool: Whether the job exists and had not finished yet
+        """
+        job = self.get(job_id, owner)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    async def wait(self, job_id: str, timeout: float = None, owner: str = None):
+        """
+        等待任务结束，最多 timeout 秒
+        Wait for a job to finish, for at most timeout seconds
+
+        返回:
+            Job: 任务，不存在或属于 owner 以外的客户端时为None
+
+        Returns:
+            Job: The job, None when unknown or owned by a client other than owner
+        """
+        job = self.get(job_id, owner)
+        if job is None or job.done.is_set() or not timeout or timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def close(self) -> None:
+        """
+        停止所有未结束的任务；启用任务日志时保留它们在ComfyUI上的任务，重启后恢复
+        Stop every job that has not finished; with the job journal enabled their ComfyUI jobs are kept
+        and recovered after the restart
+        """
+        journal = self.journal_factory()
+        if journal is not None:
+            self._closing = True
+            detach_recoverable_jobs()
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if journal is not None:
+            # 写完排队中的任务事件 | write the queued job events
+            await asyncio.to_thread(journal.close)
+
+
+job_manager = JobManager()
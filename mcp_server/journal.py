@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .logger import default_logger
+from .settings import get_settings
+
+# 任务日志事件 | job journal events
+SUBMITTED_EVENT = "submitted"
+PROMPT_EVENT = "prompt"
+FINISHED_EVENT = "finished"
+FORGOTTEN_EVENT = "forgotten"
+
+
+class JobJournal:
+    """
+    追加写入的本地任务日志（SQLite）：记录后台任务的提交、ComfyUI后端与prompt_id以及结束状态，
+    服务重启后据此重建任务并重新关联ComfyUI上的任务。运行期间只追加事件，不再保留的任务写入
+    forgotten 墓碑事件，加载日志时才压缩删除这些任务的事件；所有SQLite读写都在一个后台线程中按
+    提交顺序执行，不阻塞事件循环
+    Append-only local job journal (SQLite): records background job submissions, the ComfyUI backend and
+    prompt_id and the final state, so that after a restart the jobs can be rebuilt and re-attached to
+    their ComfyUI prompts. While running it only appends events; jobs that are no longer kept get a
+    forgotten tombstone event and their events are compacted away when the journal is loaded. All
+    SQLite reads and writes run in submission order on one background thread, never on the event loop
+    """
+
+    def __init__(self, path: str, logger=None):
+        """
+        参数:
+            path: SQLite日志文件路径
+            logger: 日志记录器
+
+        Args:
+            path: SQLite journal file path
+            logger: Logger
+        """
+        self.path = path
+        self.logger = logger or default_logger
+        self._conn = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, event TEXT NOT NULL, "
+                "data TEXT NOT NULL, at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS events_job ON events (job_id)")
+            self._conn = conn
+        return self._conn
+
+    def _submit(self, fn, *args):
+        # 单线程执行器保证事件按提交顺序写入；关闭后再次使用时重新创建
+        # A single-thread executor keeps events in submission order; it is re-created when used after close
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-journal")
+            return self._writer.submit(fn, *args)
+
+    def _insert(self, rows) -> None:
+        try:
+            self._connection().executemany("INSERT INTO events (job_id, event, data, at) VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            self.logger.warning(f"写入任务日志失败: {str(e)}")
+
+    def append(self, job_id: str, event: str, **data) -> None:
+        """
+        追加一条任务事件；写入在后台线程中进行，本方法立即返回
+        Append one job event; the write happens on the background thread and this method returns at once
+
+        参数:
+            job_id: 任务ID
+            event: 事件类型（submitted / prompt / finished）
+            **data: 事件数据
+
+        Args:
+            job_id: Job id
+            event: Event type (submitted / prompt / finished)
+            **data: Event data
+        """
+        row = (job_id, event, json.dumps(data, ensure_ascii=False, default=str), time.time())
+        self._submit(self._insert, [row])
+
+    def forget(self, job_ids) -> None:
+        """
+        为不再保留的任务追加墓碑事件，下次加载日志时删除它们的全部事件，避免日志无限增长
+        Append a tombstone for jobs that are no longer kept; all their events are deleted the next time
+        the journal is loaded, so that it does not grow forever
+        """
+        now = time.time()
+        rows = [(job_id, FORGOTTEN_EVENT, "{}", now) for job_id in job_ids]
+        if rows:
+            self._submit(self._insert, rows)
+
+    def _load(self) -> dict:
+        jobs, forgotten = {}, set()
+        try:
+            conn = self._connection()
+            rows = conn.execute("SELECT job_id, event, data FROM events ORDER BY seq").fetchall()
+        except sqlite3.Error as e:
+            self.logger.warning(f"读取任务日志失败: {str(e)}")
+            return jobs
+        for job_id, event, data in rows:
+            data = json.loads(data)
+            if event == FORGOTTEN_EVENT:
+                forgotten.add(job_id)
+                jobs.pop(job_id, None)
+            elif event == SUBMITTED_EVENT:
+                jobs[job_id] = dict(data, status="pending", backend=None, prompt_id=None,
+                                    result=None, error=None, finished=None)
+            elif job_id in jobs:
+                jobs[job_id].update(data)
+                if event == PROMPT_EVENT:
+                    jobs[job_id]["status"] = "submitted"
+        if forgotten:
+            # 压缩：删除已遗忘任务的全部事件（包括墓碑） | compaction: delete every event of forgotten jobs, tombstones included
+            try:
+                conn.executemany("DELETE FROM events WHERE job_id = ?", [(job_id,) for job_id in forgotten])
+            except sqlite3.Error as e:
+                self.logger.warning(f"清理任务日志失败: {str(e)}")
+        return jobs
+
+    async def load(self) -> dict:
+        """
+        按事件重放出各任务的最新状态（在此之前追加的事件都已写入），并压缩已遗忘任务的事件
+        Replay the events into the latest state of every job (every event appended before is written
+        first) and compact away the events of forgotten jobs
+
+        返回:
+            dict: {任务ID: 状态字典}，按提交顺序排列
+
+        Returns:
+            dict: {job id: state dict} in submission order
+        """
+        return await asyncio.wrap_future(self._submit(self._load))
+
+    def _close_connection(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self) -> None:
+        """写完排队中的事件并关闭日志文件 | Write the queued events and close the journal file"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.submit(self._close_connection)
+            writer.shutdown(wait=True)
+
+
+_journal = None
+
+
+def get_job_journal():
+    """
+    获取进程级任务日志，未启用时返回None
+    Get the process-wide job journal, None when disabled
+
+    返回:
+        JobJournal: 任务日志或None
+
+    Returns:
+        JobJournal: Job journal or None
+    """
+    global _journal
+    config = get_settings().jobs
+    if not config.journal:
+        return None
+    if _journal is None or _journal.path != config.journal_path:
+        if _journal is not None:
+            _journal.close()
+        _journal = JobJournal(config.journal_path)
+    return _journal
@@ -1,14 +1,20 @@
+import atexit
 import logging
 import os
+import queue
 import sys
 import json
 import datetime
 import socket
 import getpass
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import Any, Dict, Optional, Union
 from .utils import load_logging_config
 
+# 每个日志记录器名称当前对应的MCPLogger，重新创建时先停止旧的写入线程
+# MCPLogger currently owning each logger name, the old writer thread is stopped when it is re-created
+_active_loggers = {}
+
 class JournalctlFormatter(logging.Formatter):
     """
     自定义日志格式化器，输出符合Journalctl格式的日志
@@ -77,13 +83,67 @@ class JournalctlFormatter(logging.Formatter):
         
         return " ".join(parts)
 
+class _BoundedQueueHandler(QueueHandler):
+    """
+    有界队列日志处理器：调用线程只把日志放入队列，队列满时丢弃新日志并计数，从不阻塞
+    Bounded queue log handler: the calling thread only puts records on the queue, new records are
+    dropped and counted when it is full, so it never blocks
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Handler.handle 持有处理器锁，计数无需额外加锁
+        # Handler.handle holds the handler lock, the counter needs no extra locking
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LogWriter(QueueListener):
+    """
+    后台日志写入线程：从队列取出日志交给控制台和文件处理器，并报告被丢弃的日志数
+    Background log writer thread: hands queued records to the console and file handlers and reports
+    how many records were dropped
+    """
+
+    def __init__(self, source: _BoundedQueueHandler, *handlers: logging.Handler):
+        super().__init__(source.queue, *handlers, respect_handler_level=True)
+        self._source = source
+        self._reported = 0
+
+    def _report_dropped(self, name: str) -> None:
+        dropped = self._source.dropped
+        if dropped > self._reported:
+            notice = logging.LogRecord(name, logging.WARNING, __file__, 0,
+                                       "日志队列已满，丢弃了 %d 条日志", (dropped - self._reported,), None)
+            self._reported = dropped
+            super().handle(notice)
+
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        self._report_dropped(record.name)
+
+    def enqueue_sentinel(self) -> None:
+        # 队列可能已满，停止时等待写入线程腾出位置
+        # The queue may be full, wait for the writer thread to make room when stopping
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        super().stop()
+        self._report_dropped(self._source.name or "mcp_logger")
+
+
 class MCPLogger:
     """
     MCP日志记录器，用于记录MCP调用和输出
     MCP logger for recording MCP calls and outputs
     """
     
-    def __init__(self, log_path: Optional[str] = None, console_output: bool = True, log_level: int = logging.INFO, max_file_size: int = 10*1024*1024, backup_count: int = 5):
+    def __init__(self, log_path: Optional[str] = None, console_output: bool = True, log_level: int = logging.INFO, max_file_size: int = 10*1024*1024, backup_count: int = 5, queue_size: int = 10000, name: str = "mcp_logger"):
         """
         初始化MCP日志记录器
         Initialize the MCP logger
@@ -94,6 +154,8 @@ class MCPLogger:
             log_level: 日志级别
             max_file_size: 最大日志文件大小（字节）
             backup_count: 备份文件数量
+            queue_size: 等待后台线程写入的日志条数上限，0表示在调用线程中同步写入
+            name: 日志记录器名称
         
         Args:
             log_path: Path to log file, if None then output to console only
@@ -101,8 +163,15 @@ class MCPLogger:
             log_level: Log level
             max_file_size: Maximum log file size (bytes)
             backup_count: Number of backup files
+            queue_size: Maximum number of records waiting for the background writer thread, 0 writes
+                synchronously on the calling thread
+            name: Logger name
         """
-        self.logger = logging.getLogger("mcp_logger")
+        previous = _active_loggers.get(name)
+        if previous is not None:
+            previous.close()
+        _active_loggers[name] = self
+        self.logger = logging.getLogger(name)
         self.logger.setLevel(log_level)
         
         # 文件用详细格式
@@ -113,13 +182,14 @@ class MCPLogger:
         # 清除现有的处理器
         # Clear existing handlers
         self.logger.handlers = []
+        self._handlers = []
         
         # 添加控制台处理器
         # Add console handler
         if console_output:
             console_handler = logging.StreamHandler(sys.stdout)
             console_handler.setFormatter(formatter_console)
-            self.logger.addHandler(console_handler)
+            self._handlers.append(console_handler)
         
         # 添加文件处理器（如果提供了路径）
         # Add file handler (if path is provided)
@@ -137,8 +207,44 @@ class MCPLogger:
                 encoding='utf-8'
             )
             file_handler.setFormatter(formatter_file)
-            self.logger.addHandler(file_handler)
+            self._handlers.append(file_handler)
             self.logger.propagate = False
+        
+        # 写文件和日志轮转可能因磁盘阻塞，交给后台线程执行，避免拖慢事件循环
+        # Writing and rotating the file can stall on disk, so hand it to a background thread instead
+        # of blocking the event loop
+        self._queue_handler = None
+        self._writer = None
+        if queue_size > 0 and self._handlers:
+            self._queue_handler = _BoundedQueueHandler(queue.Queue(queue_size))
+            self._queue_handler.name = name
+            self._writer = _LogWriter(self._queue_handler, *self._handlers)
+            self._writer.start()
+            self.logger.addHandler(self._queue_handler)
+            atexit.register(self.close)
+        else:
+            for handler in self._handlers:
+                self.logger.addHandler(handler)
+    
+    @property
+    def dropped(self) -> int:
+        """因队列已满被丢弃的日志数 | Number of records dropped because the queue was full"""
+        return self._queue_handler.dropped if self._queue_handler else 0
+    
+    def close(self) -> None:
+        """
+        写完队列中剩余的日志并停止后台写入线程，之后的日志在调用线程中同步写入
+        Write the records left in the queue and stop the background writer thread, later records are
+        written synchronously on the calling thread
+        """
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        writer.stop()
+        self.logger.removeHandler(self._queue_handler)
+        for handler in self._handlers:
+            self.logger.addHandler(handler)
+        atexit.unregister(self.close)
     
     def log_mcp_call(self, 
                      tool_name: str, 
@@ -159,7 +265,7 @@ class MCPLogger:
             level: Log level
         """
         record = logging.LogRecord(
-            name="mcp_logger",
+            name=self.logger.name,
             level=level,
             pathname=__file__,
             lineno=0,
@@ -201,7 +307,7 @@ class MCPLogger:
             result_str = result_str[:997] + "..."
             
         record = logging.LogRecord(
-            name="mcp_logger",
+            name=self.logger.name,
             level=level,
             pathname=__file__,
             lineno=0,
@@ -244,7 +350,8 @@ try:
         console_output=config['console_output'],
         log_level=config['level'],
         max_file_size=config['max_file_size'],
-        backup_count=config['backup_count']
+        backup_count=config['backup_count'],
+        queue_size=config['queue_size']
     )
 except Exception as e:
     # 如果配置加载失败，使用默认配置
@@ -4,6 +4,14 @@ import asyncio
 from mcp.server.fastmcp import FastMCP
 from .logger import default_logger
 from .utils import load_logging_config, init_mcp, get_tools_dir, load_uvicorn_config
+from .http_client import client_manager
+from .completion import close_completion_trackers
+from .backends import get_backend_pool
+from .affinity import get_affinity_router
+from .settings import settings_manager
+from .notifications import resource_notifier
+from .object_info import object_info_refresher
+from .jobs import job_manager
 import logging
 
 # 获取工具目录路径
@@ -15,6 +23,9 @@ tools_dir = get_tools_dir()
 loop = asyncio.get_event_loop()
 try:
     loop.run_until_complete(init_mcp(default_logger))
+    # 初始化使用的连接绑定在该事件循环上，服务启动时会在新的事件循环中重新创建
+    # Connections used during initialization are bound to this loop and are recreated when the server starts
+    loop.run_until_complete(client_manager.aclose())
 except Exception as e:
     default_logger.error(f"初始化MCP服务环境时出错: {str(e)}")
 
@@ -49,10 +60,54 @@ for fname in os.listdir(tools_dir):
         except Exception as e:
             default_logger.error(f"注册MCP工具 {modname} 时出错: {str(e)}")
 
+# 记录会话并支持资源订阅，以便节点描述变化时通知客户端
+# Track sessions and support resource subscriptions so that clients are told when node descriptions change
+resource_notifier.install(mcp)
+
 # 记录服务初始化信息
 # Log service initialization information
 default_logger.info(f"====== MCP服务已初始化完成，共加载 {tool_count} 个工具 ======")
 
+async def serve(transport: str) -> None:
+    """
+    运行MCP服务，服务启动时创建共享资源（如HTTP连接池），关闭时统一释放
+    Run the MCP server, creating shared resources (such as the HTTP connection pool) on start
+    and releasing them on shutdown
+
+    参数:
+        transport: 传输模式 stdio / sse / streamable-http
+
+    Args:
+        transport: Transport mode stdio / sse / streamable-http
+    """
+    await settings_manager.start()
+    await client_manager.start()
+    backend_pool = get_backend_pool()
+    await backend_pool.start()
+    await get_affinity_router().bootstrap()
+    await object_info_refresher.start()
+    # 重新关联重启前提交的后台任务 | re-attach to background jobs submitted before the restart
+    await job_manager.recover()
+    try:
+        if transport == "stdio":
+            await mcp.run_stdio_async()
+        elif transport == "sse":
+            await mcp.run_sse_async()
+        elif transport == "streamable-http":
+            await mcp.run_streamable_http_async()
+        else:
+            raise ValueError(f"未知的传输模式: {transport} | Unknown transport: {transport}")
+    finally:
+        await job_manager.close()
+        await object_info_refresher.close()
+        await backend_pool.close()
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await settings_manager.close()
+        default_logger.info("====== MCP服务已关闭 ======")
+        # 写完排队中的日志 | flush the queued log records
+        default_logger.close()
+
 if __name__ == "__main__":
     try:
         # 记录服务启动信息
@@ -66,7 +121,7 @@ if __name__ == "__main__":
         default_logger.info(f"日志文件: {log_config['log_path']}")
         
 
-        mcp.run(transport=transport)
+        asyncio.run(serve(transport))
         
     except Exception as e:
         # 记录服务异常信息
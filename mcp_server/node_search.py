@@ -0,0 +1,282 @@
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+from .logger import default_logger
+from .object_info import diff_object_info, get_object_info
+
+# 各字段中词项的权重
+# Weight of the terms of each field
+FIELD_WEIGHTS = {
+    "class_type": 5.0,
+    "display_name": 4.0,
+    "category": 2.0,
+    "input": 1.5,
+    "tooltip": 1.0,
+}
+
+# 前缀匹配与模糊匹配相对完全匹配的得分比例
+# Score factors of prefix and fuzzy matches relative to an exact match
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.4
+# 模糊匹配的最小相似度
+# Minimum similarity of a fuzzy match
+FUZZY_CUTOFF = 0.75
+# 单个查询词项最多展开的前缀匹配词项数，避免过短的前缀拖慢查询
+# Maximum number of terms one query term expands to by prefix, so that very short prefixes stay cheap
+MAX_PREFIX_TERMS = 256
+
+_WORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+|[^\W\d_]+")
+
+
+def tokenize(text: str) -> list:
+    """
+    把文本拆分为小写词项，驼峰命名和下划线分隔的名称拆为单词，同时保留完整的名称
+    Split text into lowercase terms; camelCase and snake_case names are split into words and the
+    whole name is kept as well
+
+    参数:
+        text: 文本
+
+    Args:
+        text: Text
+
+    返回:
+        list: 词项列表
+
+    Returns:
+        list: List of terms
+    """
+    if not isinstance(text, str):
+        return []
+    terms = []
+    for chunk in re.split(r"[\s/,.;:()\[\]{}\"'|+-]+", text):
+        if not chunk:
+            continue
+        words = [word.lower() for word in _WORD_RE.findall(chunk)]
+        terms.extend(words)
+        whole = chunk.lower().replace("_", "")
+        if len(words) > 1 and whole.isalnum():
+            terms.append(whole)
+    return terms
+
+
+def _trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _node_terms(class_type: str, node) -> dict:
+    # 计算节点类型的 {词项: 权重}，同一词项取各字段中的最高权重
+    # Compute {term: weight} of a node class, a term keeps its highest field weight
+    fields = [("class_type", class_type)]
+    if isinstance(node, dict):
+        fields.append(("display_name", node.get("display_name")))
+        fields.append(("category", node.get("category")))
+        fields.append(("tooltip", node.get("description")))
+        for section in ("required", "optional"):
+            for input_name, spec in ((node.get("input") or {}).get(section) or {}).items():
+                fields.append(("input", input_name))
+                if isinstance(spec, list) and len(spec) > 1 and isinstance(spec[1], dict):
+                    fields.append(("tooltip", spec[1].get("tooltip")))
+    terms = {}
+    for field, text in fields:
+        weight = FIELD_WEIGHTS[field]
+        for term in tokenize(text):
+            if terms.get(term, 0.0) < weight:
+                terms[term] = weight
+    return terms
+
+
+class NodeSearchIndex:
+    """
+    节点描述的倒排索引：覆盖节点类型名、显示名称、分类、输入名和提示文本，支持前缀和模糊匹配并按相关度排序；
+    节点描述变化时只更新有变化的节点类型
+    Inverted index over node descriptions covering class names, display names, categories, input
+    names and tooltips, with prefix and fuzzy matching and ranked results; when the node descriptions
+    change only the affected classes are re-indexed
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or default_logger
+        self._postings = {}
+        self._doc_terms = {}
+        self._vocabulary = []
+        self._trigram_index = {}
+        self.snapshot = None
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def _add_term(self, term: str):
+        insort(self._vocabulary, term)
+        for gram in _trigrams(term):
+            self._trigram_index.setdefault(gram, set()).add(term)
+
+    def _remove_term(self, term: str):
+        i = bisect_left(self._vocabulary, term)
+        if i < len(self._vocabulary) and self._vocabulary[i] == term:
+            del self._vocabulary[i]
+        for gram in _trigrams(term):
+            terms = self._trigram_index.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._trigram_index[gram]
+
+    def add(self, class_type: str, node) -> None:
+        """索引一个节点类型（已存在时先移除） | Index one node class (removing it first when present)"""
+        self.remove(class_type)
+        terms = _node_terms(class_type, node)
+        self._doc_terms[class_type] = terms
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._add_term(term)
+            postings[class_type] = weight
+
+    def remove(self, class_type: str) -> None:
+        """从索引中移除一个节点类型 | Remove one node class from the index"""
+        terms = self._doc_terms.pop(class_type, None)
+        if not terms:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(class_type, None)
+            if not postings:
+                del self._postings[term]
+                self._remove_term(term)
+
+    def sync(self, snapshot) -> None:
+        """
+        使索引与节点描述快照一致：首次全量建立，之后只更新新增、移除和变化的节点类型
+        Bring the index in line with a node description snapshot: built in full the first time,
+        afterwards only added, removed and changed classes are updated
+
+        参数:
+            snapshot: ObjectInfoSnapshot
+
+        Args:
+            snapshot: ObjectInfoSnapshot
+        """
+        if snapshot is self.snapshot:
+            return
+        old = self.snapshot.data if self.snapshot is not None else {}
+        diff = diff_object_info(old, snapshot.data)
+        for class_type in diff.removed:
+            self.remove(class_type)
+        for class_type in diff.added + diff.changed:
+            self.add(class_type, snapshot.data[class_type])
+        self.snapshot = snapshot
+        if diff:
+            self.logger.debug(f"节点搜索索引已更新: {diff.summary()}，共 {len(self)} 个节点类型")
+
+    def _matches(self, query_term: str) -> dict:
+        # 返回 {索引词项: 匹配系数}：完全匹配、前缀匹配，两者都没有时使用三元组候选做模糊匹配
+        # Return {indexed term: match factor}: exact and prefix matches, fuzzy matches over trigram
+        # candidates when there are neither
+        matches = {}
+        if query_term in self._postings:
+            matches[query_term] = 1.0
+        i = bisect_left(self._vocabulary, query_term)
+        end = min(len(self._vocabulary), i + MAX_PREFIX_TERMS)
+        while i < end and self._vocabulary[i].startswith(query_term):
+            term = self._vocabulary[i]
+            if term != query_term:
+                matches[term] = PREFIX_FACTOR
+            i += 1
+        if matches or len(query_term) < 3:
+            return matches
+        grams = _trigrams(query_term)
+        counts = {}
+        for gram in grams:
+            for term in self._trigram_index.get(gram, ()):
+                counts[term] = counts.get(term, 0) + 1
+        for term, shared in counts.items():
+            # 共享三元组过少的词项不可能达到相似度阈值
+            # Terms sharing too few trigrams cannot reach the similarity cutoff
+            if shared * 2 < len(grams):
+                continue
+            ratio = SequenceMatcher(None, query_term, term).ratio()
+            if ratio >= FUZZY_CUTOFF:
+                matches[term] = FUZZY_FACTOR * ratio
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """
+        搜索节点类型
+        Search node classes
+
+        参数:
+            query: 查询文本，如 "upscale model" 或 "lora"
+            limit: 最多返回的结果数
+
+        Args:
+            query: Query text, e.g. "upscale model" or "lora"
+            limit: Maximum number of results
+
+        返回:
+            list: [(节点类型, 得分), ...]，按得分从高到低排序
+
+        Returns:
+            list: [(class_type, score), ...] sorted by descending score
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms or not self._doc_terms:
+            return []
+        total = len(self._doc_terms)
+        scores, matched = {}, {}
+        for query_term in query_terms:
+            best = {}
+            for term, factor in self._matches(query_term).items():
+                postings = self._postings[term]
+                idf = math.log(1 + total / len(postings))
+                for class_type, weight in postings.items():
+                    score = weight * factor * idf
+                    if score > best.get(class_type, 0.0):
+                        best[class_type] = score
+            for class_type, score in best.items():
+                scores[class_type] = scores.get(class_type, 0.0) + score
+                matched[class_type] = matched.get(class_type, 0) + 1
+        # 命中全部查询词项的节点类型排在前面
+        # Classes matching every query term rank first
+        return heapq.nsmallest(
+            limit,
+            ((class_type, score * matched[class_type] / len(query_terms)) for class_type, score in scores.items()),
+            key=lambda item: (-item[1], item[0])
+        )
+
+
+_indexes = {}
+
+
+def get_node_search_index(host: str = None, port: str = None) -> NodeSearchIndex:
+    """
+    获取与指定ComfyUI后端当前节点描述一致的搜索索引（默认第一个后端）
+    Get the search index matching the current node descriptions of the given ComfyUI backend (the
+    first backend by default)
+
+    参数:
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
+
+    Args:
+        host: ComfyUI server host
+        port: ComfyUI server port
+
+    返回:
+        NodeSearchIndex: 搜索索引
+
+    Returns:
+        NodeSearchIndex: Search index
+    """
+    key = (host, str(port) if port is not None else None)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = NodeSearchIndex()
+    index.sync(get_object_info(host, port))
+    return index
@@ -0,0 +1,141 @@
+import weakref
+import mcp.types as types
+from .logger import default_logger
+
+
+class ResourceNotifier:
+    """
+    MCP资源变化通知：记录已连接的会话及其订阅的资源URI，资源变化时发送
+    notifications/resources/list_changed 与 notifications/resources/updated
+    MCP resource change notifications: tracks connected sessions and the resource URIs they subscribed
+    to, and sends notifications/resources/list_changed and notifications/resources/updated on change
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or default_logger
+        self._sessions = weakref.WeakSet()
+        self._subscriptions = {}
+
+    def track(self, session) -> None:
+        """记录一个活动会话 | Record an active session"""
+        self._sessions.add(session)
+
+    def subscribe(self, session, uri: str) -> None:
+        """会话订阅资源URI | Subscribe a session to a resource URI"""
+        self.track(session)
+        self._subscriptions.setdefault(str(uri), weakref.WeakSet()).add(session)
+
+    def unsubscribe(self, session, uri: str) -> None:
+        """取消会话对资源URI的订阅 | Unsubscribe a session from a resource URI"""
+        subscribers = self._subscriptions.get(str(uri))
+        if subscribers is not None:
+            subscribers.discard(session)
+
+    def subscribed(self, prefix: str = "") -> list:
+        """返回有会话订阅且以指定前缀开头的资源URI | Return the subscribed resource URIs starting with the given prefix"""
+        return [uri for uri, subscribers in self._subscriptions.items() if subscribers and uri.startswith(prefix)]
+
+    def _forget(self, session):
+        self._sessions.discard(session)
+        for subscribers in self._subscriptions.values():
+            subscribers.discard(session)
+
+    async def notify_list_changed(self) -> int:
+        """
+        通知所有会话资源列表已变化
+        Tell every session that the resource list changed
+
+        返回:
+            int: 成功通知的会话数
+
+        Returns:
+            int: Number of sessions notified
+        """
+        notified = 0
+        for session in list(self._sessions):
+            try:
+                await session.send_resource_list_changed()
+                notified += 1
+            except Exception as e:
+                # 会话已断开
+                # The session is gone
+                self.logger.debug(f"发送资源列表变化通知失败，移除会话: {str(e)}")
+                self._forget(session)
+        return notified
+
+    async def notify_updated(self, uris) -> int:
+        """
+        通知订阅了指定资源的会话资源内容已更新
+        Tell sessions subscribed to the given resources that their content changed
+
+        参数:
+            uris: 已更新的资源URI列表
+
+        Args:
+            uris: URIs of the updated resources
+
+        返回:
+            int: 发送的通知数
+
+        Returns:
+            int: Number of notifications sent
+        """
+        notified = 0
+        for uri in uris:
+            for session in list(self._subscriptions.get(str(uri), ())):
+                try:
+                    await session.send_resource_updated(uri)
+                    notified += 1
+                except Exception as e:
+                    self.logger.debug(f"发送资源更新通知失败，移除会话: {str(e)}")
+                    self._forget(session)
+        return notified
+
+    def install(self, mcp) -> None:
+        """
+        接入FastMCP服务器：记录发起请求的会话，注册资源订阅处理器，并声明 subscribe/listChanged 能力
+        Hook into a FastMCP server: record sessions that send requests, register the resource
+        subscription handlers and advertise the subscribe/listChanged capabilities
+
+        参数:
+            mcp: FastMCP实例
+
+        Args:
+            mcp: FastMCP instance
+        """
+        server = mcp._mcp_server
+
+        @server.subscribe_resource()
+        async def _subscribe(uri):
+            self.subscribe(server.request_context.session, uri)
+
+        @server.unsubscribe_resource()
+        async def _unsubscribe(uri):
+            self.unsubscribe(server.request_context.session, uri)
+
+        # 任何请求都会记录其会话，以便发送资源列表变化通知
+        # Every request records its session so that resource list changes can be announced to it
+        def _tracking(handler):
+            async def wrapper(request):
+                try:
+                    self.track(server.request_context.session)
+                except LookupError:
+                    pass
+                return await handler(request)
+            return wrapper
+
+        for request_type, handler in list(server.request_handlers.items()):
+            server.request_handlers[request_type] = _tracking(handler)
+
+        get_capabilities = server.get_capabilities
+
+        def _get_capabilities(notification_options, experimental_capabilities):
+            capabilities = get_capabilities(notification_options, experimental_capabilities)
+            if capabilities.resources is not None:
+                capabilities.resources = types.ResourcesCapability(subscribe=True, listChanged=True)
+            return capabilities
+
+        server.get_capabilities = _get_capabilities
+
+
+resource_notifier = ResourceNotifier()
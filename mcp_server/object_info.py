@@ -0,0 +1,1126 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+import time
+from types import MappingProxyType
+from urllib.parse import quote
+from .http_client import client_manager
+from .logger import default_logger
+from .settings import get_settings
+from .utils import atomic_write, get_object_info_class_dir, get_object_info_path, load_comfyui_backends, write_json_atomic
+
+# 组合框（下拉选项）输入的类型名
+# Type name of combo (drop-down) inputs
+COMBO_TYPE = "COMBO"
+
+
+def input_type(spec) -> str:
+    """
+    返回节点输入定义的类型：旧格式 [[选项...], {...}] 与新格式 ["COMBO", {"options": [...]}] 都视为 COMBO
+    Return the type of a node input spec: both the legacy [[options...], {...}] and the new
+    ["COMBO", {"options": [...]}] formats count as COMBO
+    """
+    if isinstance(spec, list) and spec:
+        if isinstance(spec[0], list):
+            return COMBO_TYPE
+        if isinstance(spec[0], str):
+            return spec[0]
+    return ""
+
+
+def input_choices(spec) -> list:
+    """
+    返回组合框输入的可选值，非组合框输入返回空列表
+    Return the options of a combo input, an empty list for other inputs
+    """
+    if not isinstance(spec, list) or not spec:
+        return []
+    if isinstance(spec[0], list):
+        return spec[0]
+    if spec[0] == COMBO_TYPE and len(spec) > 1 and isinstance(spec[1], dict):
+        return spec[1].get("options", [])
+    return []
+
+
+def node_input_spec(node, input_name: str):
+    """
+    返回节点描述中某个输入（required 或 optional）的定义，不存在时为None
+    Return the spec of one input (required or optional) of a node description, None when missing
+    """
+    if not isinstance(node, dict):
+        return None
+    for section in ("required", "optional"):
+        spec = (node.get("input", {}).get(section) or {}).get(input_name)
+        if spec is not None:
+            return spec
+    return None
+
+
+class ObjectInfoSnapshot:
+    """
+    一次解析得到的节点描述信息及其索引；所有数据在多个请求间共享，只读
+    Node descriptions parsed once together with their indexes; all data is shared between requests and read-only
+    """
+
+    def __init__(self, object_info: dict, mtime_ns: int = None):
+        self.data = object_info
+        self.mtime_ns = mtime_ns
+        self.nodes = MappingProxyType(object_info)
+
+        # 按 (节点类型, 输入名) 索引输入定义，按输入/输出类型和分类索引节点类型
+        # Input specs indexed by (class_type, input_name); class types indexed by input/output type and category
+        inputs, by_input_type, by_output_type, by_category = {}, {}, {}, {}
+        for class_type, node in object_info.items():
+            if not isinstance(node, dict):
+                continue
+            for section in ("required", "optional"):
+                for input_name, spec in (node.get("input", {}).get(section) or {}).items():
+                    inputs[(class_type, input_name)] = spec
+                    by_input_type.setdefault(input_type(spec), []).append((class_type, input_name))
+            for output in node.get("output") or []:
+                if isinstance(output, str):
+                    by_output_type.setdefault(output, []).append(class_type)
+            by_category.setdefault(node.get("category", ""), []).append(class_type)
+        self._inputs = inputs
+        self.by_input_type = MappingProxyType({key: tuple(value) for key, value in by_input_type.items()})
+        self.by_output_type = MappingProxyType({key: tuple(value) for key, value in by_output_type.items()})
+        self.by_category = MappingProxyType({key: tuple(value) for key, value in by_category.items()})
+        self._json = None
+        self._class_types = None
+        # 预先序列化的资源内容，快照替换时随之失效
+        # Pre-serialized resource payloads, dropped together with the snapshot when it is replaced
+        self._views = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.data)
+
+    def __contains__(self, class_type) -> bool:
+        return class_type in self.data
+
+    def node(self, class_type: str):
+        """返回节点类型的描述，不存在时为None | Return a node class description, None when unknown"""
+        node = self.data.get(class_type)
+        return MappingProxyType(node) if isinstance(node, dict) else None
+
+    def input_spec(self, class_type: str, input_name: str):
+        """返回节点输入定义，不存在时为None | Return a node input spec, None when unknown"""
+        return self._inputs.get((class_type, input_name))
+
+    def choices(self, class_type: str, input_name: str) -> list:
+        """返回组合框输入的可选值 | Return the options of a combo input"""
+        return input_choices(self._inputs.get((class_type, input_name)))
+
+    def node_json(self, class_type: str):
+        """
+        返回单个节点类型描述的JSON文本（缓存），不存在时为None
+        Return the description of one node class as JSON text (cached), None when unknown
+        """
+        key = ("node", class_type)
+        text = self._views.get(key)
+        if text is None and class_type in self.data:
+            text = self._views[key] = json.dumps(self.data[class_type], ensure_ascii=False, separators=(',', ':'))
+        return text
+
+    def category_json(self, category: str):
+        """
+        返回某个分类下所有节点类型描述的JSON文本（缓存），分类不存在时为None
+        Return the descriptions of every node class in a category as JSON text (cached), None when the
+        category is unknown
+        """
+        key = ("category", category)
+        text = self._views.get(key)
+        if text is None and category in self.by_category:
+            text = self._views[key] = json.dumps(
+                {"category": category, "nodes": {class_type: self.data[class_type] for class_type in self.by_category[category]}},
+                ensure_ascii=False, separators=(',', ':'))
+        return text
+
+    def page_json(self, cursor: int, page_size: int) -> str:
+        """
+        返回按名称排序的节点类型列表的一页（缓存），每项只包含名称、显示名称、分类和资源URI
+        Return one page of the node classes sorted by name (cached); each item only holds the name,
+        display name, category and resource URI
+
+        参数:
+            cursor: 起始位置
+            page_size: 每页条数
+
+        Args:
+            cursor: Start offset
+            page_size: Items per page
+
+        返回:
+            str: JSON文本，next_cursor 为下一页的起始位置，最后一页时为null；cursor 不是页边界或超出列表时返回None
+
+        Returns:
+            str: JSON text; next_cursor is the next page's offset, null on the last page; None when the
+            cursor is not on a page boundary or past the end of the listing
+        """
+        if self._class_types is None:
+            self._class_types = sorted(self.data)
+        # 只缓存真实存在的页，任意 cursor 不会让缓存无限增长
+        # Only real pages are cached, arbitrary cursors cannot grow the cache without bound
+        if cursor < 0 or cursor % page_size or (cursor and cursor >= len(self._class_types)):
+            return None
+        key = ("page", cursor, page_size)
+        text = self._views.get(key)
+        if text is None:
+            class_types = self._class_types[cursor:cursor + page_size]
+            next_cursor = cursor + page_size if cursor + page_size < len(self._class_types) else None
+            text = self._views[key] = json.dumps({
+                "total": len(self._class_types),
+                "cursor": cursor,
+                "next_cursor": next_cursor,
+                "next": f"info://all/page/{next_cursor}" if next_cursor is not None else None,
+                "nodes": [{
+                    "class_type": class_type,
+                    "display_name": self.data[class_type].get("display_name", class_type),
+                    "category": self.data[class_type].get("category", ""),
+                    "uri": f"info://node/{quote(class_type, safe='')}",
+                } for class_type in class_types],
+            }, ensure_ascii=False, separators=(',', ':'))
+        return text
+
+    def to_json(self) -> str:
+        """
+        返回完整节点描述的JSON文本（首次调用时序列化并缓存）
+        Return the full node descriptions as JSON text (serialized once and cached)
+        """
+        if self._json is None:
+            self._json = json.dumps(self.data, ensure_ascii=False, indent=2)
+        return self._json
+
+
+_EMPTY = ObjectInfoSnapshot({})
+
+# 打包文件格式：文件头（魔数、节点类型数），按名称字节序排序的定长索引项
+# （名称偏移、名称长度、数据偏移、数据长度），名称区，每个节点类型一段紧凑JSON的数据区
+# Pack file layout: header (magic, class count), fixed-width index entries sorted by name bytes
+# (name offset, name length, data offset, data length), the names, then one compact JSON blob per class
+_PACK_MAGIC = b"OIPACK01"
+_PACK_HEADER = struct.Struct("<8sI")
+_PACK_ENTRY = struct.Struct("<QIQI")
+
+
+def get_object_info_pack_path(json_path: str) -> str:
+    """返回object_info JSON缓存文件对应的打包文件路径 | Return the pack file path next to an object_info JSON cache file"""
+    return f"{os.path.splitext(json_path)[0]}.pack"
+
+
+def write_object_info_pack(path: str, object_info: dict) -> None:
+    """
+    将节点描述原子写入打包文件，每个节点类型单独编码，可按名称二分查找
+    Atomically write node descriptions to a pack file; each class is encoded on its own and can be
+    found by binary search on its name
+
+    参数:
+        path: 打包文件路径
+        object_info: 节点描述
+
+    Args:
+        path: Pack file path
+        object_info: Node descriptions
+    """
+    items = sorted(
+        (class_type.encode('utf-8'), json.dumps(node, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        for class_type, node in object_info.items()
+    )
+    name_offset = _PACK_HEADER.size + _PACK_ENTRY.size * len(items)
+    data_offset = name_offset + sum(len(name) for name, _ in items)
+    index = bytearray()
+    for name, data in items:
+        index += _PACK_ENTRY.pack(name_offset, len(name), data_offset, len(data))
+        name_offset += len(name)
+        data_offset += len(data)
+    with atomic_write(path, 'wb') as f:
+        f.write(_PACK_HEADER.pack(_PACK_MAGIC, len(items)))
+        f.write(index)
+        for name, _ in items:
+            f.write(name)
+        for _, data in items:
+            f.write(data)
+
+
+class ObjectInfoPack:
+    """
+    内存映射的节点描述打包文件：打开时不解析内容，按名称二分查找并只解码单个节点类型，
+    打开和查找的开销不随节点类型数量线性增长
+    Memory-mapped node description pack: nothing is parsed on open, a lookup binary-searches the
+    name index and decodes only that one class, so neither opening nor lookups grow linearly with
+    the number of node classes
+    """
+
+    def __init__(self, path: str):
+        """
+        参数:
+            path: 打包文件路径
+
+        Args:
+            path: Pack file path
+
+        Raises:
+            ValueError: 文件不是有效的打包文件 | The file is not a valid pack file
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self._count = _PACK_HEADER.unpack_from(self._mmap, 0)
+            if magic != _PACK_MAGIC:
+                raise ValueError(f"不是节点描述打包文件: {path} | Not an object_info pack file: {path}")
+        except (struct.error, ValueError):
+            self._mmap.close()
+            raise
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, class_type) -> bool:
+        return self._find(class_type) is not None
+
+    def _entry(self, i: int):
+        return _PACK_ENTRY.unpack_from(self._mmap, _PACK_HEADER.size + i * _PACK_ENTRY.size)
+
+    def _find(self, class_type: str):
+        name = class_type.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            current = self._mmap[entry[0]:entry[0] + entry[1]]
+            if current == name:
+                return entry
+            if current < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def raw(self, class_type: str):
+        """返回节点类型的紧凑JSON字节，不存在时为None | Return the compact JSON bytes of a class, None when unknown"""
+        entry = self._find(class_type)
+        if entry is None:
+            return None
+        return self._mmap[entry[2]:entry[2] + entry[3]]
+
+    def text(self, class_type: str):
+        """返回节点类型的紧凑JSON文本，不存在时为None | Return the compact JSON text of a class, None when unknown"""
+        data = self.raw(class_type)
+        return data.decode('utf-8') if data is not None else None
+
+    def get(self, class_type: str):
+        """解码单个节点类型的描述，不存在时为None | Decode the description of one class, None when unknown"""
+        data = self.raw(class_type)
+        return json.loads(data) if data is not None else None
+
+    def class_types(self) -> list:
+        """按名称顺序返回所有节点类型 | Return all class names in name order"""
+        names = []
+        for i in range(self._count):
+            name_offset, name_length, _, _ = self._entry(i)
+            names.append(self._mmap[name_offset:name_offset + name_length].decode('utf-8'))
+        return names
+
+    def close(self) -> None:
+        """关闭内存映射 | Close the memory map"""
+        self._mmap.close()
+
+
+class ObjectInfoStore:
+    """
+    进程级节点描述存储：每个ComfyUI后端的object_info文件只解析一次，文件更新后重新加载
+    Process-wide node description store: each backend's object_info file is parsed once and reloaded
+    when the file is updated
+    """
+
+    def __init__(self, path: str, logger=None):
+        """
+        参数:
+            path: object_info缓存文件路径
+            logger: 日志记录器
+
+        Args:
+            path: object_info cache file path
+            logger: Logger
+        """
+        self.path = path
+        self.pack_path = get_object_info_pack_path(path)
+        self.logger = logger or default_logger
+        self._snapshot = None
+        self._pack = None
+
+    def pack(self):
+        """
+        获取内存映射的打包文件；只有旧版JSON缓存时先由其生成打包文件（一次性迁移）
+        Get the memory-mapped pack file; when only the legacy JSON cache exists the pack is built from
+        it first (a one-off migration)
+
+        返回:
+            ObjectInfoPack: 打包文件，没有任何缓存时为None
+
+        Returns:
+            ObjectInfoPack: Pack file, None when nothing is cached
+        """
+        try:
+            json_mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            json_mtime_ns = None
+        try:
+            pack_mtime_ns = os.stat(self.pack_path).st_mtime_ns
+        except OSError:
+            pack_mtime_ns = None
+
+        if pack_mtime_ns is None or (json_mtime_ns is not None and pack_mtime_ns < json_mtime_ns):
+            if json_mtime_ns is None:
+                return None
+            snapshot = self.get()
+            if not snapshot:
+                return None
+            try:
+                write_object_info_pack(self.pack_path, snapshot.data)
+            except OSError as e:
+                self.logger.warning(f"生成节点描述打包文件失败: {self.pack_path}: {str(e)}")
+                return None
+            self.logger.info(f"已由 {self.path} 生成节点描述打包文件: {self.pack_path}")
+            pack_mtime_ns = os.stat(self.pack_path).st_mtime_ns
+
+        pack = self._pack
+        if pack is not None and pack.mtime_ns == pack_mtime_ns:
+            return pack
+        try:
+            self._pack = ObjectInfoPack(self.pack_path)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"打开节点描述打包文件失败: {str(e)}")
+            return None
+        if pack is not None:
+            pack.close()
+        return self._pack
+
+    def node(self, class_type: str):
+        """
+        获取单个节点类型的描述：已解析完整快照时直接使用，否则只从打包文件解码该节点类型
+        Get the description of one node class: served from the full snapshot when it is already
+        parsed, otherwise only that class is decoded from the pack file
+
+        参数:
+            class_type: 节点类型
+
+        Args:
+            class_type: Node class
+
+        返回:
+            dict: 节点描述，不存在时为None
+
+        Returns:
+            dict: Node description, None when unknown
+        """
+        snapshot = self._parsed()
+        if snapshot is not None:
+            return snapshot.data.get(class_type)
+        pack = self.pack()
+        if pack is not None:
+            return pack.get(class_type)
+        return self.get().data.get(class_type)
+
+    def node_json(self, class_type: str):
+        """
+        获取单个节点类型描述的JSON文本，打包文件中的紧凑JSON直接使用，不重新序列化
+        Get the description of one node class as JSON text; the compact JSON in the pack file is used
+        as-is without re-serializing
+
+        参数:
+            class_type: 节点类型
+
+        Args:
+            class_type: Node class
+
+        返回:
+            str: JSON文本，不存在时为None
+
+        Returns:
+            str: JSON text, None when unknown
+        """
+        snapshot = self._parsed()
+        if snapshot is not None:
+            return snapshot.node_json(class_type)
+        pack = self.pack()
+        if pack is not None:
+            return pack.text(class_type)
+        return self.get().node_json(class_type)
+
+    def _parsed(self):
+        # 已解析且与文件一致的完整快照
+        # The full snapshot when it is parsed and matches the file
+        snapshot = self._snapshot
+        if snapshot:
+            try:
+                if os.stat(self.path).st_mtime_ns == snapshot.mtime_ns:
+                    return snapshot
+            except OSError:
+                pass
+        return None
+
+    def get(self) -> ObjectInfoSnapshot:
+        """
+        获取当前快照；文件不存在或无法解析时返回空快照
+        Get the current snapshot; an empty snapshot when the file is missing or cannot be parsed
+
+        返回:
+            ObjectInfoSnapshot: 节点描述快照
+
+        Returns:
+            ObjectInfoSnapshot: Node description snapshot
+        """
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if self._snapshot is None:
+                self.logger.warning(f"ComfyUI节点描述文件不存在: {self.path}")
+                self._snapshot = _EMPTY
+            return self._snapshot
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.mtime_ns == mtime_ns:
+            return snapshot
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                object_info = json.load(f)
+        except Exception as e:
+            self.logger.error(f"加载ComfyUI节点描述信息时出错: {str(e)}")
+            self._snapshot = snapshot = snapshot or _EMPTY
+            return snapshot
+        self._snapshot = ObjectInfoSnapshot(object_info, mtime_ns)
+        self.logger.debug(f"已加载ComfyUI节点描述信息: {self.path}，共 {len(object_info)} 个节点类型")
+        return self._snapshot
+
+    def replace(self, object_info: dict, mtime_ns: int = None) -> ObjectInfoSnapshot:
+        """
+        用新的节点描述替换当前快照
+        Replace the current snapshot with new node descriptions
+        """
+        self._snapshot = ObjectInfoSnapshot(object_info, mtime_ns)
+        return self._snapshot
+
+
+class ObjectInfoDiff:
+    """
+    两份节点描述之间按节点类型的结构差异
+    Structural difference between two sets of node descriptions, per node class
+    """
+
+    def __init__(self, added=(), removed=(), changed=()):
+        self.added = list(added)
+        self.removed = list(removed)
+        self.changed = list(changed)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def touches(self, class_type: str) -> bool:
+        """该节点类型是否有变化 | Whether the node class changed"""
+        return class_type in self.added or class_type in self.removed or class_type in self.changed
+
+    def summary(self) -> str:
+        """返回差异摘要 | Return a summary of the difference"""
+        return f"新增 {len(self.added)}，移除 {len(self.removed)}，变化 {len(self.changed)} 个节点类型"
+
+
+def diff_object_info(old: dict, new: dict) -> ObjectInfoDiff:
+    """
+    计算两份节点描述的结构差异
+    Compute the structural difference between two sets of node descriptions
+
+    参数:
+        old: 原节点描述
+        new: 新节点描述
+
+    Args:
+        old: Previous node descriptions
+        new: New node descriptions
+
+    返回:
+        ObjectInfoDiff: 差异
+
+    Returns:
+        ObjectInfoDiff: Difference
+    """
+    return ObjectInfoDiff(
+        added=sorted(new.keys() - old.keys()),
+        removed=sorted(old.keys() - new.keys()),
+        changed=sorted(class_type for class_type in old.keys() & new.keys() if old[class_type] != new[class_type])
+    )
+
+
+def diff_object_info_pack(pack: ObjectInfoPack, new: dict) -> ObjectInfoDiff:
+    """
+    计算打包文件与新节点描述的结构差异：先比较紧凑JSON字节，只有字节不同的节点类型才解码比较，
+    不需要解析完整的缓存
+    Compute the structural difference between a pack file and new node descriptions: the compact
+    JSON bytes are compared first and only classes whose bytes differ are decoded, so the full cache
+    is never parsed
+
+    参数:
+        pack: 原节点描述打包文件
+        new: 新节点描述
+
+    Args:
+        pack: Pack file of the previous node descriptions
+        new: New node descriptions
+
+    返回:
+        ObjectInfoDiff: 差异
+
+    Returns:
+        ObjectInfoDiff: Difference
+    """
+    old_types = set(pack.class_types())
+    changed = []
+    for class_type in sorted(old_types & new.keys()):
+        data = pack.raw(class_type)
+        node = new[class_type]
+        if json.dumps(node, ensure_ascii=False, separators=(',', ':')).encode('utf-8') != data and json.loads(data) != node:
+            changed.append(class_type)
+    return ObjectInfoDiff(added=sorted(new.keys() - old_types), removed=sorted(old_types - new.keys()), changed=changed)
+
+
+def _parse_and_diff(content: bytes, path: str, pack_path: str):
+    # 在工作线程中解析 /api/object_info 响应并与缓存文件比较；不访问存储的内存状态
+    # Parse the /api/object_info response and compare it with the cache files on a worker thread;
+    # the store's in-memory state is not touched
+    object_info = json.loads(content)
+    try:
+        json_mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        json_mtime_ns = None
+    try:
+        pack = ObjectInfoPack(pack_path)
+    except (OSError, ValueError):
+        pack = None
+    if pack is not None:
+        try:
+            if json_mtime_ns is None or pack.mtime_ns >= json_mtime_ns:
+                return object_info, diff_object_info_pack(pack, object_info)
+        finally:
+            pack.close()
+    # 只有旧版JSON缓存或没有缓存 | only the legacy JSON cache or no cache at all
+    old = {}
+    if json_mtime_ns is not None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                old = json.load(f)
+        except (OSError, ValueError):
+            pass
+    return object_info, diff_object_info(old, object_info)
+
+
+class NodeClassCache:
+    """
+    按需模式的节点描述缓存：通过 /api/object_info/{节点类型} 只获取用到的节点类型，
+    每个节点类型单独写入缓存文件并有各自的有效期，同一节点类型的并发请求共享一次获取
+    Lazy-mode node description cache: only the node classes in use are fetched through
+    /api/object_info/{class}; each class is written to its own cache file with its own freshness,
+    and concurrent requests for the same class share one fetch
+    """
+
+    def __init__(self, host: str, port: str, cache_dir: str = None, logger=None):
+        """
+        参数:
+            host: ComfyUI服务器主机
+            port: ComfyUI服务器端口
+            cache_dir: 缓存目录，默认为 object_info/{host}_{port}_classes
+            logger: 日志记录器
+
+        Args:
+            host: ComfyUI server host
+            port: ComfyUI server port
+            cache_dir: Cache directory, object_info/{host}_{port}_classes by default
+            logger: Logger
+        """
+        self.host = host
+        self.port = str(port)
+        self.cache_dir = cache_dir or get_object_info_class_dir(host, port)
+        self.logger = logger or default_logger
+        # {节点类型: (节点描述或None, 获取时间)}，None表示ComfyUI没有该节点类型
+        # {class_type: (node description or None, fetch time)}, None means ComfyUI has no such class
+        self._entries = {}
+        self._inflight = {}
+        self._snapshot = None
+
+    def _path(self, class_type: str) -> str:
+        return os.path.join(self.cache_dir, f"{quote(class_type, safe='')}.json")
+
+    def _fresh(self, fetched_at: float) -> bool:
+        ttl = get_settings().object_info.class_ttl
+        return ttl <= 0 or time.time() - fetched_at < ttl
+
+    def _load_file(self, class_type: str):
+        path = self._path(class_type)
+        try:
+            fetched_at = os.stat(path).st_mtime
+            with open(path, 'r', encoding='utf-8') as f:
+                node = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"加载节点类型缓存文件失败: {path}: {str(e)}")
+            return None
+        self._entries[class_type] = (node, fetched_at)
+        self._snapshot = None
+        return self._entries[class_type]
+
+    async def _fetch(self, class_type: str):
+        client = client_manager.get_client()
+        resp = await client.get(f"http://{self.host}:{self.port}/api/object_info/{quote(class_type, safe='')}", timeout=30.0)
+        resp.raise_for_status()
+        node = resp.json().get(class_type)
+        path = self._path(class_type)
+        if node is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            await asyncio.to_thread(write_json_atomic, path, node, None)
+        elif os.path.exists(path):
+            os.unlink(path)
+        return node
+
+    async def _refetch(self, class_type: str, stale):
+        try:
+            node = await self._fetch(class_type)
+        except Exception as e:
+            # 获取失败时继续使用过期的缓存
+            # Keep serving the stale copy when fetching fails
+            self.logger.warning(f"获取节点类型 {class_type} 的描述信息失败（{self.host}:{self.port}）: {str(e)}")
+            return stale[0] if stale is not None else None
+        if stale is None or stale[0] != node:
+            self._snapshot = None
+        self._entries[class_type] = (node, time.time())
+        return node
+
+    async def get(self, class_type: str):
+        """
+        获取单个节点类型的描述：内存或缓存文件中未过期时直接返回，否则从ComfyUI获取
+        Get the description of one node class: served from memory or its cache file while fresh,
+        fetched from ComfyUI otherwise
+
+        参数:
+            class_type: 节点类型
+
+        Args:
+            class_type: Node class
+
+        返回:
+            dict: 节点描述，ComfyUI没有该节点类型时为None
+
+        Returns:
+            dict: Node description, None when ComfyUI has no such class
+        """
+        entry = self._entries.get(class_type) or self._load_file(class_type)
+        if entry is not None and self._fresh(entry[1]):
+            return entry[0]
+        future = self._inflight.get(class_type)
+        if future is None:
+            future = self._inflight[class_type] = asyncio.ensure_future(self._refetch(class_type, entry))
+            future.add_done_callback(lambda _: self._inflight.pop(class_type, None))
+        # 单个调用方被取消不影响共享的获取
+        # One caller being cancelled does not abort the shared fetch
+        return await asyncio.shield(future)
+
+    async def ensure(self, class_types) -> ObjectInfoSnapshot:
+        """
+        确保一组节点类型已缓存且未过期
+        Make sure a set of node classes is cached and fresh
+
+        参数:
+            class_types: 节点类型列表
+
+        Args:
+            class_types: Node classes
+
+        返回:
+            ObjectInfoSnapshot: 当前已缓存节点类型的快照
+
+        Returns:
+            ObjectInfoSnapshot: Snapshot of the node classes cached so far
+        """
+        await asyncio.gather(*(self.get(class_type) for class_type in class_types))
+        return self.snapshot()
+
+    def snapshot(self) -> ObjectInfoSnapshot:
+        """返回当前已缓存节点类型的快照 | Return a snapshot of the node classes cached so far"""
+        if self._snapshot is None:
+            self._snapshot = ObjectInfoSnapshot({
+                class_type: node for class_type, (node, _) in sorted(self._entries.items()) if node is not None
+            })
+        return self._snapshot
+
+    async def refresh(self) -> ObjectInfoDiff:
+        """
+        忽略有效期，重新获取所有已缓存的节点类型
+        Re-fetch every cached node class regardless of freshness
+
+        返回:
+            ObjectInfoDiff: 与刷新前的差异，全部获取失败时为None
+
+        Returns:
+            ObjectInfoDiff: Difference from before the refresh, None when every fetch failed
+        """
+        class_types = sorted(self._entries)
+        old = self.snapshot().data
+        results = await asyncio.gather(*(self._fetch(class_type) for class_type in class_types), return_exceptions=True)
+        now = time.time()
+        failed = 0
+        for class_type, result in zip(class_types, results):
+            if isinstance(result, Exception):
+                failed += 1
+                continue
+            self._entries[class_type] = (result, now)
+        if class_types and failed == len(class_types):
+            self.logger.warning(f"刷新节点类型描述信息失败（{self.host}:{self.port}）: {str(results[0])}")
+            return None
+        self._snapshot = None
+        return diff_object_info(old, self.snapshot().data)
+
+
+_stores = {}
+_class_caches = {}
+
+
+def get_object_info_store(host: str = None, port: str = None) -> ObjectInfoStore:
+    """
+    获取指定ComfyUI后端的节点描述存储（默认第一个后端）
+    Get the node description store of the given ComfyUI backend (the first backend by default)
+
+    参数:
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
+
+    Args:
+        host: ComfyUI server host
+        port: ComfyUI server port
+
+    返回:
+        ObjectInfoStore: 节点描述存储
+
+    Returns:
+        ObjectInfoStore: Node description store
+    """
+    if host is None or port is None:
+        host, port = load_comfyui_backends()[0]
+    store = _stores.get((host, str(port)))
+    if store is None:
+        store = _stores[(host, str(port))] = ObjectInfoStore(get_object_info_path(host, port))
+    return store
+
+
+def get_node_class_cache(host: str = None, port: str = None) -> NodeClassCache:
+    """
+    获取指定ComfyUI后端的按需节点描述缓存（默认第一个后端）
+    Get the lazy node description cache of the given ComfyUI backend (the first backend by default)
+    """
+    if host is None or port is None:
+        host, port = load_comfyui_backends()[0]
+    cache = _class_caches.get((host, str(port)))
+    if cache is None:
+        cache = _class_caches[(host, str(port))] = NodeClassCache(host, port)
+    return cache
+
+
+def get_object_info(host: str = None, port: str = None) -> ObjectInfoSnapshot:
+    """
+    获取指定ComfyUI后端当前的节点描述快照（按需模式下只包含已获取的节点类型）
+    Get the current node description snapshot of the given ComfyUI backend (only the node classes
+    fetched so far in lazy mode)
+    """
+    if get_settings().object_info.lazy:
+        return get_node_class_cache(host, port).snapshot()
+    return get_object_info_store(host, port).get()
+
+
+async def get_node(class_type: str, host: str = None, port: str = None):
+    """
+    获取单个节点类型的描述，不需要解析全部节点描述（完整模式读取打包文件，按需模式读取节点类型缓存）
+    Get the description of one node class without parsing all node descriptions (the pack file in
+    full mode, the per-class cache in lazy mode)
+
+    参数:
+        class_type: 节点类型
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
+
+    Args:
+        class_type: Node class
+        host: ComfyUI server host
+        port: ComfyUI server port
+
+    返回:
+        dict: 节点描述，不存在时为None
+
+    Returns:
+        dict: Node description, None when unknown
+    """
+    if get_settings().object_info.lazy:
+        return await get_node_class_cache(host, port).get(class_type)
+    return get_object_info_store(host, port).node(class_type)
+
+
+async def get_node_json(class_type: str, host: str = None, port: str = None):
+    """
+    获取单个节点类型描述的JSON文本（预先序列化并缓存）
+    Get the description of one node class as JSON text (pre-serialized and cached)
+
+    参数:
+        class_type: 节点类型
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
+
+    Args:
+        class_type: Node class
+        host: ComfyUI server host
+        port: ComfyUI server port
+
+    返回:
+        str: JSON文本，不存在时为None
+
+    Returns:
+        str: JSON text, None when unknown
+    """
+    if get_settings().object_info.lazy:
+        return (await get_node_class_cache(host, port).ensure([class_type])).node_json(class_type)
+    return get_object_info_store(host, port).node_json(class_type)
+
+
+async def get_node_source(class_types, host: str = None, port: str = None):
+    """
+    返回读取少数几个节点类型的来源及其版本标识，供按节点描述预先计算的结构判断是否需要重建；
+    完整模式使用打包文件（不解析全部节点描述），按需模式先获取这些节点类型
+    Return a source for reading a few node classes together with its version marker, so that
+    structures precomputed from the node descriptions can tell when to rebuild; full mode uses the pack
+    file (all node descriptions are never parsed), lazy mode fetches those classes first
+
+    参数:
+        class_types: 需要的节点类型列表
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
+
+    Args:
+        class_types: Node classes needed
+        host: ComfyUI server host
+        port: ComfyUI server port
+
+    返回:
+        tuple: (版本标识, get(class_type) -> 节点描述或None)；节点描述变化后版本标识为新的对象
+
+    Returns:
+        tuple: (version marker, get(class_type) -> node description or None); the marker is a new
+        object once the node descriptions change
+    """
+    if get_settings().object_info.lazy:
+        snapshot = await get_node_class_cache(host, port).ensure(class_types)
+        return snapshot, snapshot.data.get
+    store = get_object_info_store(host, port)
+    pack = store.pack()
+    if pack is not None:
+        return pack, pack.get
+    snapshot = store.get()
+    return snapshot, snapshot.data.get
+
+
+async def fetch_object_info(class_types, host: str = None, port: str = None) -> ObjectInfoSnapshot:
+    """
+    获取包含指定节点类型的节点描述快照；按需模式下先获取缺失或过期的节点类型
+    Get a node description snapshot covering the given node classes; in lazy mode missing or stale
+    classes are fetched first
+
+    参数:
+        class_types: 需要的节点类型列表
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
+
+    Args:
+        class_types: Node classes needed
+        host: ComfyUI server host
+        port: ComfyUI server port
+
+    返回:
+        ObjectInfoSnapshot: 节点描述快照
+
+    Returns:
+        ObjectInfoSnapshot: Node description snapshot
+    """
+    if get_settings().object_info.lazy:
+        return await get_node_class_cache(host, port).ensure(class_types)
+    return get_object_info_store(host, port).get()
+
+
+class ObjectInfoRefresher:
+    """
+    节点描述后台刷新：定期或按需重新获取各后端的 /api/object_info，与缓存比较，
+    只有变化时才原子写入缓存文件、替换内存快照并通知监听者
+    Background node description refresher: re-fetches each backend's /api/object_info periodically or
+    on demand, compares it with the cached copy and, only when something changed, atomically rewrites
+    the cache file, swaps the in-memory snapshot and notifies listeners
+    """
+
+    def __init__(self, backends: list = None, store_factory=None, class_cache_factory=None, logger=None):
+        """
+        参数:
+            backends: [(host, port), ...]，为None时使用配置的全部后端
+            store_factory: (host, port) -> ObjectInfoStore，默认为进程级存储
+            class_cache_factory: (host, port) -> NodeClassCache，按需模式使用，默认为进程级缓存
+            logger: 日志记录器
+
+        Args:
+            backends: [(host, port), ...], all configured backends when None
+            store_factory: (host, port) -> ObjectInfoStore, the process-wide stores by default
+            class_cache_factory: (host, port) -> NodeClassCache used in lazy mode, the process-wide caches by default
+            logger: Logger
+        """
+        self.backends = backends
+        self.store_factory = store_factory or get_object_info_store
+        self.class_cache_factory = class_cache_factory or get_node_class_cache
+        self.logger = logger or default_logger
+        self._listeners = []
+        self._task = None
+        self._lock = None
+
+    def subscribe(self, callback) -> None:
+        """
+        注册变化回调 async callback(host, port, diff)
+        Register a change callback async callback(host, port, diff)
+        """
+        self._listeners.append(callback)
+
+    async def refresh_backend(self, host: str, port: str, skip_fresh: float = 0) -> ObjectInfoDiff:
+        """
+        刷新单个后端的节点描述；响应的解析和比较在工作线程中进行，不阻塞事件循环
+        Refresh the node descriptions of one backend; the response is parsed and compared on a worker
+        thread so the event loop is not blocked
+
+        参数:
+            host: ComfyUI服务器主机
+            port: ComfyUI服务器端口
+            skip_fresh: 缓存文件写入不到该时间（秒）时跳过本次刷新，如启动时刚刚下载过
+
+        Args:
+            host: ComfyUI server host
+            port: ComfyUI server port
+            skip_fresh: Skip this refresh when the cache file was written less than this many seconds
+                ago, e.g. it was just downloaded at startup
+
+        返回:
+            ObjectInfoDiff: 与缓存的差异，获取失败时为None
+
+        Returns:
+            ObjectInfoDiff: Difference from the cached copy, None when fetching failed
+        """
+        # 按需模式只重新获取已缓存的节点类型
+        # Lazy mode only re-fetches the node classes already cached
+        if get_settings().object_info.lazy:
+            diff = await self.class_cache_factory(host, port).refresh()
+            if diff:
+                self.logger.info(f"ComfyUI节点描述信息已更新（{host}:{port}）: {diff.summary()}")
+                await self._notify(host, port, diff)
+            return diff
+
+        store = self.store_factory(host, port)
+        if skip_fresh > 0:
+            try:
+                age = time.time() - os.stat(store.path).st_mtime
+            except OSError:
+                age = None
+            if age is not None and age < skip_fresh:
+                self.logger.debug(f"ComfyUI节点描述缓存刚刚更新，跳过本次刷新（{host}:{port}）")
+                return ObjectInfoDiff()
+
+        client = client_manager.get_client()
+        try:
+            resp = await client.get(f"http://{host}:{port}/api/object_info", timeout=60.0)
+            resp.raise_for_status()
+            object_info, diff = await asyncio.to_thread(_parse_and_diff, resp.content, store.path, store.pack_path)
+        except Exception as e:
+            self.logger.warning(f"刷新ComfyUI节点描述信息失败（{host}:{port}）: {str(e)}")
+            return None
+
+        if not diff:
+            self.logger.debug(f"ComfyUI节点描述信息无变化（{host}:{port}）")
+            return diff
+
+        os.makedirs(os.path.dirname(store.path), exist_ok=True)
+        await asyncio.to_thread(write_json_atomic, store.path, object_info, None)
+        await asyncio.to_thread(write_object_info_pack, store.pack_path, object_info)
+        store.replace(object_info, os.stat(store.path).st_mtime_ns)
+        self.logger.info(f"ComfyUI节点描述信息已更新（{host}:{port}）: {diff.summary()}")
+        await self._notify(host, port, diff)
+        return diff
+
+    async def _notify(self, host, port, diff):
+        for callback in list(self._listeners):
+            try:
+                await callback(host, port, diff)
+            except Exception as e:
+                self.logger.error(f"执行节点描述变化回调时出错: {str(e)}")
+
+    async def refresh(self, skip_fresh: float = 0) -> dict:
+        """
+        刷新所有后端的节点描述（同一时刻只有一次刷新在进行）
+        Refresh the node descriptions of all backends (only one refresh runs at a time)
+
+        参数:
+            skip_fresh: 跳过缓存文件写入不到该时间（秒）的后端
+
+        Args:
+            skip_fresh: Skip backends whose cache file was written less than this many seconds ago
+
+        返回:
+            dict: {(host, port): ObjectInfoDiff 或 None}
+
+        Returns:
+            dict: {(host, port): ObjectInfoDiff or None}
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            backends = self.backends or load_comfyui_backends()
+            diffs = await asyncio.gather(*(self.refresh_backend(host, port, skip_fresh) for host, port in backends))
+            return dict(zip(backends, diffs))
+
+    async def _refresh_loop(self):
+        # 启动时 init_mcp 刚下载过的缓存不必立即重新获取
+        # Caches init_mcp has just downloaded at startup need not be fetched again right away
+        skip_fresh = get_settings().object_info.refresh_interval
+        while True:
+            try:
+                await self.refresh(skip_fresh)
+                skip_fresh = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"刷新ComfyUI节点描述信息时出错: {str(e)}")
+            # 每轮读取间隔，配置热加载后立即生效
+            # Read the interval every round so that a reloaded configuration applies right away
+            interval = get_settings().object_info.refresh_interval
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    async def start(self) -> None:
+        """
+        启动后台刷新任务（启动后立即刷新一次，跳过刚刚下载的缓存）
+        Start the background refresher (refreshes once right away, skipping caches that were just downloaded)
+        """
+        if self._task is None:
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        """停止后台刷新任务 | Stop the background refresher"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+object_info_refresher = ObjectInfoRefresher()
@@ -0,0 +1,161 @@
+import time
+from contextvars import ContextVar
+from .fairness import FairQueue, current_client
+from .settings import get_settings
+from .validation import ValidationError
+
+# 优先级通道，按服务顺序排列 | priority lanes in the order they are served
+HIGH = "high"
+NORMAL = "normal"
+LOW = "low"
+LANES = (HIGH, NORMAL, LOW)
+
+# 当前调用的优先级通道（由工具参数或后台任务管理设置），为None时按客户端策略或默认通道
+# Priority lane of the current call (set from the tool argument or by the background job manager);
+# None falls back to the client policy or the default lane
+priority_lane = ContextVar("priority_lane", default=None)
+
+
+def check_lane(value: str) -> str:
+    """
+    校验优先级通道名
+    Validate a priority lane name
+
+    参数:
+        value: 通道名（high / normal / low，不区分大小写）
+
+    Args:
+        value: Lane name (high / normal / low, case-insensitive)
+
+    返回:
+        str: 规范化的通道名
+
+    Returns:
+        str: Normalized lane name
+
+    Raises:
+        ValidationError: 未知的通道名 | unknown lane name
+    """
+    lane = str(value).strip().lower()
+    if lane not in LANES:
+        raise ValidationError(
+            f"参数 priority 的值 {value!r} 无效，可选值: {', '.join(LANES)} | priority: {value!r} is not one of {', '.join(LANES)}",
+            "priority", list(LANES)
+        )
+    return lane
+
+
+def set_priority(value: str = None) -> None:
+    """
+    为当前调用指定优先级通道；value为None时保持不变
+    Set the priority lane of the current call; unchanged when value is None
+
+    参数:
+        value: 通道名（high / normal / low）
+
+    Args:
+        value: Lane name (high / normal / low)
+
+    Raises:
+        ValidationError: 未知的通道名 | unknown lane name
+    """
+    if value is not None:
+        priority_lane.set(check_lane(value))
+
+
+def higher_lane(first: str, second: str) -> str:
+    """返回两个通道中优先级较高的一个，None视为最低 | Return the higher of two lanes, None counting as lowest"""
+    if first is None or (second is not None and LANES.index(second) < LANES.index(first)):
+        return second
+    return first
+
+
+def current_lane() -> str:
+    """
+    当前调用使用的优先级通道：显式指定的通道，其次是客户端策略，最后是默认通道；未启用优先级时均为 normal
+    Priority lane of the current call: the explicitly set lane, then the client policy, then the
+    default lane; always normal when priorities are disabled
+
+    返回:
+        str: 通道名
+
+    Returns:
+        str: Lane name
+    """
+    config = get_settings().priority
+    if not config.enabled:
+        return NORMAL
+    lane = priority_lane.get()
+    if lane is not None:
+        return lane
+    policy = dict(config.client_lanes)
+    if policy:
+        lane = policy.get(current_client())
+        if lane is not None:
+            return lane
+    return config.default_lane
+
+
+class LaneQueue:
+    """
+    多通道等待队列：高优先级通道先于低优先级通道服务，通道内按客户端公平轮转；
+    等待超过 starvation_after 秒的请求不论通道优先服务，避免低优先级通道饿死。
+    队列项需要有 lane（通道）、key（客户端）、cost（开销）和 enqueued（入队时间，time.monotonic()）属性。
+    Multi-lane wait queue: higher lanes are served before lower ones, with fair round robin across
+    clients within a lane; a request that has waited longer than starvation_after seconds is served
+    first whatever its lane, so the low lane cannot starve.
+    Items need lane, key (client), cost and enqueued (time.monotonic() at enqueue) attributes.
+    """
+
+    def __init__(self, quantum: float = 1.0, starvation_after: float = 10.0):
+        """
+        参数:
+            quantum: 每轮为客户端补充的开销额度
+            starvation_after: 等待超过该时间（秒）的请求优先服务，0表示不做防饿死处理
+
+        Args:
+            quantum: Cost quantum credited to a client on each turn
+            starvation_after: Requests waiting longer than this (seconds) are served first, 0 disables
+                starvation protection
+        """
+        self.starvation_after = starvation_after
+        self._lanes = {lane: FairQueue(quantum) for lane in LANES}
+
+    @property
+    def quantum(self) -> float:
+        return self._lanes[NORMAL].quantum
+
+    @quantum.setter
+    def quantum(self, value: float) -> None:
+        for queue in self._lanes.values():
+            queue.quantum = value
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def push(self, item) -> None:
+        """加入所属通道 | Append to the item's lane"""
+        self._lanes[item.lane].push(item)
+
+    def peek(self):
+        """
+        返回下一个应被处理的项，队列为空时返回None
+        Return the item to be served next, None when the queue is empty
+        """
+        heads = [head for head in (queue.peek() for queue in self._lanes.values()) if head is not None]
+        if not heads:
+            return None
+        if self.starvation_after > 0:
+            deadline = time.monotonic() - self.starvation_after
+            starving = [head for head in heads if head.enqueued <= deadline]
+            if starving:
+                return min(starving, key=lambda head: head.enqueued)
+        return heads[0]
+
+    def take(self, item) -> None:
+        """移除被处理的项并扣除其开销 | Remove a served item and charge its cost"""
+        self._lanes[item.lane].take(item)
+
+    def remove(self, item) -> None:
+        """移除一项（如等待超时或被取消） | Remove an item (e.g. its wait timed out or was cancelled)"""
+        self._lanes[item.lane].remove(item)
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from .logger import default_logger
+from .settings import get_settings
+
+
+def workflow_key(workflow: dict) -> str:
+    """
+    计算工作流的内容哈希：按键排序的紧凑JSON，忽略不影响结果的 _meta 字段
+    Compute the content hash of a workflow: compact JSON with sorted keys, ignoring the _meta fields
+    that do not affect the result
+
+    参数:
+        workflow: API格式工作流（已填充全部参数和seed）
+
+    Args:
+        workflow: API-format workflow (with every parameter and seed filled in)
+
+    返回:
+        str: SHA-256十六进制摘要
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    canonical = {
+        node_id: {key: value for key, value in node.items() if key != "_meta"} if isinstance(node, dict) else node
+        for node_id, node in workflow.items()
+    }
+    text = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    确定性生成结果的内容寻址缓存：以工作流哈希为键，在本地SQLite索引中保存ComfyUI图片引用，
+    按条数上限淘汰最久未使用的结果，并按有效期过期
+    Content-addressed cache of deterministic generations: image references from ComfyUI are kept in a
+    local SQLite index keyed by the workflow hash, the least recently used results are evicted beyond
+    the size limit and results expire after their TTL
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl: float = 604800.0, logger=None):
+        """
+        参数:
+            path: SQLite索引文件路径
+            max_entries: 最多缓存的结果数
+            ttl: 结果的有效期（秒），0表示不过期
+            logger: 日志记录器
+
+        Args:
+            path: SQLite index file path
+            max_entries: Maximum number of cached results
+            ttl: How long (seconds) a result stays valid, 0 never expires
+            logger: Logger
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.logger = logger or default_logger
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, host TEXT NOT NULL, images TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT host, images, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl > 0 and now - row[2] > self.ttl:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        return row[0], json.loads(row[1])
+
+    def _put(self, key: str, host: str, images: list):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, host, images, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, host, json.dumps(images, ensure_ascii=False), now, now)
+            )
+            # 淘汰过期和超出上限的最久未使用结果
+            # Evict expired results and the least recently used ones beyond the limit
+            if self.ttl > 0:
+                conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    async def get(self, key: str):
+        """
+        查找缓存的结果
+        Look up a cached result
+
+        参数:
+            key: 工作流哈希
+
+        Args:
+            key: Workflow hash
+
+        返回:
+            tuple: (ComfyUI主机, 图片列表)，未命中时为None
+
+        Returns:
+            tuple: (ComfyUI host, image list), None on a miss
+        """
+        try:
+            result = await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            self.logger.warning(f"读取结果缓存失败: {str(e)}")
+            result = None
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def put(self, key: str, host: str, images: list) -> None:
+        """
+        保存结果
+        Store a result
+
+        参数:
+            key: 工作流哈希
+            host: 生成图片的ComfyUI主机
+            images: 图片列表
+
+        Args:
+            key: Workflow hash
+            host: ComfyUI host that produced the images
+            images: Image list
+        """
+        try:
+            await asyncio.to_thread(self._put, key, host, images)
+        except sqlite3.Error as e:
+            self.logger.warning(f"写入结果缓存失败: {str(e)}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self) -> None:
+        """关闭索引文件 | Close the index file"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache = None
+
+
+def get_result_cache():
+    """
+    获取进程级结果缓存，未启用时返回None
+    Get the process-wide result cache, None when disabled
+
+    返回:
+        ResultCache: 结果缓存或None
+
+    Returns:
+        ResultCache: Result cache or None
+    """
+    global _cache
+    config = get_settings().result_cache
+    if not config.enabled:
+        return None
+    if _cache is None or _cache.path != config.path:
+        if _cache is not None:
+            _cache.close()
+        _cache = ResultCache(config.path, config.max_entries, config.ttl)
+    else:
+        # 热加载后的上限和有效期立即生效
+        # Reloaded limits apply right away
+        _cache.max_entries, _cache.ttl = config.max_entries, config.ttl
+    return _cache
+
+
+async def run_cached(workflow: dict, run):
+    """
+    按工作流哈希查找结果缓存，未命中时执行并保存结果；只应对固定seed的确定性工作流使用
+    Look up the result cache by workflow hash and on a miss run the workflow and store its result;
+    only meant for deterministic workflows with pinned seeds
+
+    参数:
+        workflow: 已填充全部参数和seed的API格式工作流
+        run: 无参数的协程函数，返回 (ComfyUI主机, 图片列表)
+
+    Args:
+        workflow: API-format workflow with every parameter and seed filled in
+        run: Coroutine function without arguments returning (ComfyUI host, image list)
+
+    返回:
+        tuple: (ComfyUI主机, 图片列表)
+
+    Returns:
+        tuple: (ComfyUI host, image list)
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return await run()
+    key = workflow_key(workflow)
+    cached = await cache.get(key)
+    if cached is not None:
+        default_logger.info(f"结果缓存命中: {key[:12]}")
+        return cached
+    host, images = await run()
+    await cache.put(key, host, images)
+    return host, images
@@ -0,0 +1,587 @@
+import asyncio
+import configparser
+import logging
+import os
+import signal
+from dataclasses import dataclass, field, fields
+
+# 配置文件路径
+# Configuration file path
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.ini')
+
+# 传输模式取值
+# Allowed transport modes
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+
+# 优先级通道取值（与 priority.LANES 一致）
+# Allowed priority lanes (the same as priority.LANES)
+PRIORITY_LANES = ("high", "normal", "low")
+
+# 修改后需要重启服务才能生效的配置段（在启动时用于创建连接池、后端池、日志等）
+# Sections whose changes only take effect after a restart (used at startup to build the pools, logging, ...)
+RESTART_SECTIONS = ("comfyui_server", "scheduler", "http_client", "mcp_server", "logging")
+
+# 默认日志文件路径
+# Default log file path
+DEFAULT_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'mcp_server.log')
+DEFAULT_RESULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'result_cache', 'results.sqlite')
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'journal', 'jobs.sqlite')
+
+_LOG_LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'CRITICAL': logging.CRITICAL
+}
+
+
+@dataclass(frozen=True)
+class ComfyUIServerSettings:
+    host: str = '127.0.0.1'
+    port: str = '8188'
+    # [(host, port), ...]，未配置 backends 时为 [(host, port)]
+    # [(host, port), ...], [(host, port)] when backends is not configured
+    backends: tuple = ()
+
+
+@dataclass(frozen=True)
+class SchedulerSettings:
+    queue_refresh_interval: float = 2.0
+    unhealthy_after_failures: int = 1
+    affinity: bool = True
+    affinity_max_imbalance: int = 2
+
+
+@dataclass(frozen=True)
+class CompletionSettings:
+    websocket: bool = True
+    poll_interval: float = 3.0
+    safety_poll_interval: float = 30.0
+    reconnect_delay: float = 2.0
+    job_timeout: float = 600.0
+    cancel_on_abort: bool = True
+
+
+@dataclass(frozen=True)
+class HttpClientSettings:
+    max_connections: int = 100
+    max_keepalive_connections: int = 100
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 10.0
+    http2: bool = False
+
+
+@dataclass(frozen=True)
+class AdmissionSettings:
+    enabled: bool = True
+    max_concurrent: int = 32
+    max_queue_depth: int = 4
+    max_waiting: int = 128
+    max_wait: float = 30.0
+
+
+@dataclass(frozen=True)
+class FairnessSettings:
+    enabled: bool = True
+    quantum: float = 1.0
+    # 每分钟任务数，0表示不限制
+    # Jobs per minute, 0 for no limit
+    rate_limit: float = 0.0
+    rate_burst: int = 10
+
+
+@dataclass(frozen=True)
+class PrioritySettings:
+    enabled: bool = True
+    default_lane: str = 'normal'
+    background_lane: str = 'low'
+    front: bool = True
+    starvation_after: float = 10.0
+    # ((客户端标识, 通道), ...) | ((client key, lane), ...)
+    client_lanes: tuple = ()
+
+
+@dataclass(frozen=True)
+class BatchingSettings:
+    enabled: bool = False
+    # 时间窗口（秒），配置文件中为 window_ms
+    # Window (seconds), window_ms in the configuration file
+    window: float = 0.05
+    max_batch_images: int = 8
+
+
+@dataclass(frozen=True)
+class ObjectInfoSettings:
+    refresh_interval: float = 300.0
+    lazy: bool = False
+    class_ttl: float = 3600.0
+    page_size: int = 100
+
+
+@dataclass(frozen=True)
+class ValidationSettings:
+    enabled: bool = True
+    max_batch_size: int = 4
+
+
+@dataclass(frozen=True)
+class ResultCacheSettings:
+    enabled: bool = True
+    path: str = DEFAULT_RESULT_CACHE_PATH
+    max_entries: int = 1000
+    ttl: float = 604800.0
+
+
+@dataclass(frozen=True)
+class SingleFlightSettings:
+    enabled: bool = True
+    replay_window: float = 300.0
+    max_replay_keys: int = 10000
+
+
+@dataclass(frozen=True)
+class JobsSettings:
+    max_jobs: int = 1000
+    retention: float = 3600.0
+    journal: bool = True
+    journal_path: str = DEFAULT_JOURNAL_PATH
+
+
+@dataclass(frozen=True)
+class McpServerSettings:
+    host: str = '0.0.0.0'
+    port: int = 9000
+    transport: str = 'sse'
+    config_reload_interval: float = 2.0
+
+
+@dataclass(frozen=True)
+class LoggingSettings:
+    level: int = logging.INFO
+    console_output: bool = True
+    log_path: str = DEFAULT_LOG_PATH
+    max_file_size: int = 10 * 1024 * 1024
+    backup_count: int = 5
+    queue_size: int = 10000
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    不可变的配置快照；热加载时整体替换，请求处理期间不读取磁盘
+    Immutable configuration snapshot; swapped as a whole on reload, no disk I/O while handling requests
+    """
+    comfyui_server: ComfyUIServerSettings = field(default_factory=ComfyUIServerSettings)
+    scheduler: SchedulerSettings = field(default_factory=SchedulerSettings)
+    completion: CompletionSettings = field(default_factory=CompletionSettings)
+    http_client: HttpClientSettings = field(default_factory=HttpClientSettings)
+    admission: AdmissionSettings = field(default_factory=AdmissionSettings)
+    fairness: FairnessSettings = field(default_factory=FairnessSettings)
+    priority: PrioritySettings = field(default_factory=PrioritySettings)
+    batching: BatchingSettings = field(default_factory=BatchingSettings)
+    object_info: ObjectInfoSettings = field(default_factory=ObjectInfoSettings)
+    validation: ValidationSettings = field(default_factory=ValidationSettings)
+    result_cache: ResultCacheSettings = field(default_factory=ResultCacheSettings)
+    singleflight: SingleFlightSettings = field(default_factory=SingleFlightSettings)
+    jobs: JobsSettings = field(default_factory=JobsSettings)
+    mcp_server: McpServerSettings = field(default_factory=McpServerSettings)
+    logging: LoggingSettings = field(default_factory=LoggingSettings)
+
+    def changed_sections(self, other: "Settings") -> list:
+        """返回与另一快照不同的配置段名 | Return the names of sections that differ from another snapshot"""
+        return [f.name for f in fields(self) if getattr(self, f.name) != getattr(other, f.name)]
+
+
+def _parse_backends(value: str, host: str, port: str) -> tuple:
+    backends = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '://' in item:
+            item = item.split('://', 1)[1]
+        backend_host, _, backend_port = item.rstrip('/').rpartition(':')
+        if not backend_host:
+            backend_host, backend_port = backend_port, '8188'
+        if not backend_port.isdigit():
+            raise ValueError(f"无效的ComfyUI后端: {item} | Invalid ComfyUI backend: {item}")
+        if (backend_host, backend_port) not in backends:
+            backends.append((backend_host, backend_port))
+    return tuple(backends) or ((host, port),)
+
+
+def _parse_client_lanes(value: str) -> tuple:
+    # 格式 client=lane，用逗号分隔 | client=lane entries separated by commas
+    lanes = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        client, sep, lane = item.rpartition('=')
+        if not sep or not client.strip():
+            raise ValueError(f"无效的客户端优先级: {item} | Invalid client lane: {item}")
+        lanes.append((client.strip(), lane.strip().lower()))
+    return tuple(lanes)
+
+
+def _section(parser, cls, section, **overrides):
+    # 按数据类字段的默认值类型读取配置段
+    # Read a section using the types of the dataclass field defaults
+    values = {}
+    defaults = cls()
+    for f in fields(cls):
+        if f.name in overrides or not parser.has_option(section, f.name):
+            continue
+        default = getattr(defaults, f.name)
+        if isinstance(default, bool):
+            values[f.name] = parser.getboolean(section, f.name)
+        elif isinstance(default, int):
+            values[f.name] = parser.getint(section, f.name)
+        elif isinstance(default, float):
+            values[f.name] = parser.getfloat(section, f.name)
+        elif isinstance(default, str):
+            values[f.name] = parser.get(section, f.name)
+    values.update(overrides)
+    return cls(**values)
+
+
+def _validate(settings: Settings) -> None:
+    checks = [
+        (settings.scheduler.queue_refresh_interval > 0, "scheduler.queue_refresh_interval > 0"),
+        (settings.scheduler.unhealthy_after_failures >= 1, "scheduler.unhealthy_after_failures >= 1"),
+        (settings.scheduler.affinity_max_imbalance >= 0, "scheduler.affinity_max_imbalance >= 0"),
+        (settings.completion.poll_interval > 0, "completion.poll_interval > 0"),
+        (settings.completion.safety_poll_interval > 0, "completion.safety_poll_interval > 0"),
+        (settings.completion.reconnect_delay >= 0, "completion.reconnect_delay >= 0"),
+        (settings.completion.job_timeout >= 0, "completion.job_timeout >= 0"),
+        (settings.http_client.max_connections >= 1, "http_client.max_connections >= 1"),
+        (settings.http_client.max_keepalive_connections >= 0, "http_client.max_keepalive_connections >= 0"),
+        (settings.admission.max_concurrent >= 0, "admission.max_concurrent >= 0"),
+        (settings.admission.max_queue_depth >= 0, "admission.max_queue_depth >= 0"),
+        (settings.admission.max_waiting >= 0, "admission.max_waiting >= 0"),
+        (settings.admission.max_wait >= 0, "admission.max_wait >= 0"),
+        (settings.fairness.quantum > 0, "fairness.quantum > 0"),
+        (settings.fairness.rate_limit >= 0, "fairness.rate_limit >= 0"),
+        (settings.fairness.rate_burst >= 1, "fairness.rate_burst >= 1"),
+        (settings.priority.default_lane in PRIORITY_LANES, f"priority.default_lane in {PRIORITY_LANES}"),
+        (settings.priority.background_lane in PRIORITY_LANES, f"priority.background_lane in {PRIORITY_LANES}"),
+        (settings.priority.starvation_after >= 0, "priority.starvation_after >= 0"),
+        # 等待到防饿死时刻之前就被拒绝时防饿死不起作用 | starvation protection is useless if waiters are rejected before it kicks in
+        (not (settings.admission.enabled and settings.priority.enabled and settings.priority.starvation_after > 0)
+         or settings.priority.starvation_after < settings.admission.max_wait,
+         "priority.starvation_after < admission.max_wait"),
+        (all(lane in PRIORITY_LANES for _, lane in settings.priority.client_lanes),
+         f"priority.client_lanes values in {PRIORITY_LANES}"),
+        (settings.batching.window >= 0, "batching.window_ms >= 0"),
+        (settings.batching.max_batch_images >= 1, "batching.max_batch_images >= 1"),
+        (settings.object_info.refresh_interval >= 0, "object_info.refresh_interval >= 0"),
+        (settings.object_info.class_ttl >= 0, "object_info.class_ttl >= 0"),
+        (settings.object_info.page_size >= 1, "object_info.page_size >= 1"),
+        (settings.validation.max_batch_size >= 1, "validation.max_batch_size >= 1"),
+        (settings.result_cache.max_entries >= 1, "result_cache.max_entries >= 1"),
+        (settings.result_cache.ttl >= 0, "result_cache.ttl >= 0"),
+        (settings.singleflight.replay_window >= 0, "singleflight.replay_window >= 0"),
+        (settings.singleflight.max_replay_keys >= 1, "singleflight.max_replay_keys >= 1"),
+        (settings.jobs.max_jobs >= 1, "jobs.max_jobs >= 1"),
+        (settings.jobs.retention >= 0, "jobs.retention >= 0"),
+        (0 < settings.mcp_server.port < 65536, "0 < mcp_server.port < 65536"),
+        (settings.mcp_server.transport in TRANSPORTS, f"mcp_server.transport in {TRANSPORTS}"),
+        (settings.mcp_server.config_reload_interval >= 0, "mcp_server.config_reload_interval >= 0"),
+        (settings.logging.max_file_size > 0, "logging.max_file_size > 0"),
+        (settings.logging.backup_count >= 0, "logging.backup_count >= 0"),
+        (settings.logging.queue_size >= 0, "logging.queue_size >= 0"),
+    ]
+    for ok, rule in checks:
+        if not ok:
+            raise ValueError(f"配置校验失败: {rule} | Invalid configuration: {rule}")
+
+
+def parse_settings(parser: configparser.ConfigParser) -> Settings:
+    """
+    从ConfigParser解析并校验配置快照
+    Parse and validate a configuration snapshot from a ConfigParser
+
+    参数:
+        parser: 已读取config.ini的ConfigParser
+
+    Args:
+        parser: ConfigParser that has read config.ini
+
+    返回:
+        Settings: 配置快照
+
+    Returns:
+        Settings: Configuration snapshot
+
+    Raises:
+        ValueError: 配置值无效 | a configuration value is invalid
+    """
+    host = parser.get('comfyui_server', 'host', fallback='127.0.0.1')
+    port = parser.get('comfyui_server', 'port', fallback='8188')
+    comfyui_server = ComfyUIServerSettings(
+        host=host,
+        port=port,
+        backends=_parse_backends(parser.get('comfyui_server', 'backends', fallback=''), host, port)
+    )
+
+    window = parser.getfloat('batching', 'window_ms', fallback=50.0) / 1000.0
+
+    result_cache_path = parser.get('result_cache', 'path', fallback='') or DEFAULT_RESULT_CACHE_PATH
+    if not os.path.isabs(result_cache_path):
+        result_cache_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), result_cache_path)
+
+    journal_path = parser.get('jobs', 'journal_path', fallback='') or DEFAULT_JOURNAL_PATH
+    if not os.path.isabs(journal_path):
+        journal_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), journal_path)
+
+    level = parser.get('logging', 'level', fallback='INFO').upper()
+    log_path = parser.get('logging', 'log_path', fallback='logs/mcp_server.log')
+    # 如果路径是相对路径，则转换为绝对路径
+    # If path is relative, convert to absolute path
+    if not os.path.isabs(log_path):
+        log_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), log_path)
+
+    settings = Settings(
+        comfyui_server=comfyui_server,
+        scheduler=_section(parser, SchedulerSettings, 'scheduler'),
+        completion=_section(parser, CompletionSettings, 'completion'),
+        http_client=_section(parser, HttpClientSettings, 'http_client'),
+        admission=_section(parser, AdmissionSettings, 'admission'),
+        fairness=_section(parser, FairnessSettings, 'fairness'),
+        priority=_section(parser, PrioritySettings, 'priority',
+                          client_lanes=_parse_client_lanes(parser.get('priority', 'client_lanes', fallback=''))),
+        batching=_section(parser, BatchingSettings, 'batching', window=window),
+        object_info=_section(parser, ObjectInfoSettings, 'object_info'),
+        validation=_section(parser, ValidationSettings, 'validation'),
+        result_cache=_section(parser, ResultCacheSettings, 'result_cache', path=result_cache_path),
+        singleflight=_section(parser, SingleFlightSettings, 'singleflight'),
+        jobs=_section(parser, JobsSettings, 'jobs', journal_path=journal_path),
+        mcp_server=_section(parser, McpServerSettings, 'mcp_server'),
+        logging=_section(parser, LoggingSettings, 'logging',
+                         level=_LOG_LEVELS.get(level, logging.INFO), log_path=log_path)
+    )
+    _validate(settings)
+    return settings
+
+
+def read_settings(path: str = CONFIG_PATH) -> Settings:
+    """
+    读取并解析配置文件
+    Read and parse the configuration file
+
+    参数:
+        path: 配置文件路径
+
+    Args:
+        path: Configuration file path
+
+    返回:
+        Settings: 配置快照
+
+    Returns:
+        Settings: Configuration snapshot
+    """
+    parser = configparser.ConfigParser()
+    parser.read(path, encoding='utf-8')
+    return parse_settings(parser)
+
+
+class SettingsManager:
+    """
+    配置管理器：启动时加载一次配置快照，文件修改或收到SIGHUP时重新加载并原子替换；
+    新配置校验失败时保留旧快照。
+    Settings manager: loads the configuration snapshot once at startup and atomically swaps it when the
+    file changes or on SIGHUP; an invalid new configuration keeps the previous snapshot.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH, logger=None):
+        """
+        参数:
+            path: 配置文件路径
+            logger: 日志记录器
+
+        Args:
+            path: Configuration file path
+            logger: Logger
+        """
+        self.path = path
+        self._logger = logger
+        self._settings = None
+        self._mtime_ns = None
+        self._listeners = []
+        self._reload_tasks = set()
+        self._watch_task = None
+        self._sighup_loop = None
+
+    @property
+    def logger(self):
+        # 日志模块本身依赖配置，延迟导入
+        # The logging module itself depends on the settings, import lazily
+        if self._logger is None:
+            from .logger import default_logger
+            self._logger = default_logger
+        return self._logger
+
+    @property
+    def current(self) -> Settings:
+        """当前配置快照（首次访问时加载） | Current configuration snapshot (loaded on first access)"""
+        settings = self._settings
+        if settings is None:
+            self._mtime_ns = self._stat()
+            try:
+                settings = read_settings(self.path)
+            except (ValueError, configparser.Error) as e:
+                print(f"加载配置失败，使用默认配置: {str(e)}")
+                settings = Settings()
+            self._settings = settings
+        return settings
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def subscribe(self, callback) -> None:
+        """
+        注册配置变化回调 callback(old, new)
+        Register a configuration change callback callback(old, new)
+        """
+        self._listeners.append(callback)
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        文件有变化（或 force=True）时重新加载配置
+        Reload the configuration when the file changed (or force=True)
+
+        参数:
+            force: 忽略修改时间强制重新加载
+
+        Args:
+            force: Reload regardless of the modification time
+
+        返回:
+            bool: 配置快照是否被替换
+
+        Returns:
+            bool: Whether the configuration snapshot was replaced
+        """
+        return self._apply(self._read_changed(force))
+
+    async def areload(self, force: bool = False) -> bool:
+        """
+        reload 的异步版本：读取和解析配置文件在线程中执行，不阻塞事件循环；配置替换和回调仍在事件循环中执行
+        Async version of reload: reading and parsing the file runs in a thread so that the event loop
+        is not blocked; the snapshot swap and the callbacks still run on the event loop
+
+        参数:
+            force: 忽略修改时间强制重新加载
+
+        Args:
+            force: Reload regardless of the modification time
+
+        返回:
+            bool: 配置快照是否被替换
+
+        Returns:
+            bool: Whether the configuration snapshot was replaced
+        """
+        return self._apply(await asyncio.to_thread(self._read_changed, force))
+
+    def _read_changed(self, force):
+        # 只做磁盘读取和解析，返回 (old, new, changed)，无变化时返回None
+        # Only reads and parses the file, returns (old, new, changed) or None when nothing changed
+        old = self.current
+        mtime_ns = self._stat()
+        if not force and mtime_ns == self._mtime_ns:
+            return None
+        self._mtime_ns = mtime_ns
+        try:
+            new = read_settings(self.path)
+        except (ValueError, configparser.Error) as e:
+            self.logger.error(f"重新加载配置失败，继续使用当前配置: {str(e)}")
+            return None
+        changed = new.changed_sections(old)
+        if not changed:
+            return None
+        return old, new, changed
+
+    def _apply(self, loaded) -> bool:
+        if loaded is None:
+            return False
+        old, new, changed = loaded
+        self._settings = new
+        self.logger.info(f"配置已重新加载，变化的配置段: {', '.join(changed)}")
+        restart = [section for section in changed if section in RESTART_SECTIONS]
+        if restart:
+            self.logger.warning(f"以下配置段的修改需要重启服务才能生效: {', '.join(restart)}")
+        for callback in list(self._listeners):
+            try:
+                callback(old, new)
+            except Exception as e:
+                self.logger.error(f"执行配置变化回调时出错: {str(e)}")
+        return True
+
+    async def _watch_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.areload()
+
+    def _reload_soon(self):
+        # SIGHUP处理函数运行在事件循环中，在任务中重新加载以免阻塞 | the SIGHUP handler runs on the event loop, reload in a task so that it does not block
+        task = asyncio.ensure_future(self.areload(True))
+        self._reload_tasks.add(task)
+        task.add_done_callback(self._reload_tasks.discard)
+
+    async def start(self) -> None:
+        """
+        启动配置文件监视任务，并在支持的平台上注册SIGHUP重新加载
+        Start watching the configuration file and, where supported, reload on SIGHUP
+        """
+        loop = asyncio.get_running_loop()
+        interval = self.current.mcp_server.config_reload_interval
+        if self._watch_task is None and interval > 0:
+            self._watch_task = asyncio.create_task(self._watch_loop(interval))
+        sighup = getattr(signal, 'SIGHUP', None)
+        if sighup is not None and self._sighup_loop is None:
+            try:
+                loop.add_signal_handler(sighup, self._reload_soon)
+                self._sighup_loop = loop
+            except (NotImplementedError, RuntimeError, ValueError):
+                # 非主线程或不支持信号的平台（如Windows）
+                # Not the main thread, or a platform without signal support (e.g. Windows)
+                pass
+
+    async def close(self) -> None:
+        """停止配置文件监视任务 | Stop watching the configuration file"""
+        task, self._watch_task = self._watch_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._sighup_loop is not None:
+            self._sighup_loop.remove_signal_handler(signal.SIGHUP)
+            self._sighup_loop = None
+
+
+settings_manager = SettingsManager()
+
+
+def get_settings() -> Settings:
+    """
+    获取当前配置快照（不读取磁盘）
+    Get the current configuration snapshot (no disk I/O)
+
+    返回:
+        Settings: 配置快照
+
+    Returns:
+        Settings: Configuration snapshot
+    """
+    return settings_manager.current
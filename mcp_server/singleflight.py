@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from .executor import submission_listener
+from .fairness import current_client
+from .logger import default_logger
+from .settings import get_settings
+from .validation import ValidationError
+
+
+def request_key(api_name: str, values: dict) -> str:
+    """
+    计算一次工具调用的参数键：API名称加按键排序的参数JSON的哈希
+    Compute the argument key of a tool call: the API name plus a hash of the arguments as JSON with
+    sorted keys
+
+    参数:
+        api_name: API名称，如 txt2img
+        values: 校验后的 {槽位名: 值}
+
+    Args:
+        api_name: API name, e.g. txt2img
+        values: Validated {slot name: value}
+
+    返回:
+        str: 参数键
+
+    Returns:
+        str: Argument key
+    """
+    text = json.dumps(values, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return f"{api_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+class _Flight:
+    __slots__ = ("task", "waiters", "replay", "fingerprint", "listeners", "submitted")
+
+    def __init__(self, replay: bool, fingerprint: str = None):
+        self.task = None
+        self.waiters = 0
+        self.replay = replay
+        self.fingerprint = fingerprint
+        self.listeners = []
+        self.submitted = None
+
+    def attach(self, listener) -> None:
+        # 加入的调用方也能得知共享任务的prompt_id
+        # Callers joining the flight learn the prompt_id of the shared job as well
+        if listener is None:
+            return
+        self.listeners.append(listener)
+        if self.submitted is not None:
+            listener(*self.submitted)
+
+    def on_submitted(self, comfyui_host: str, prompt_id: str) -> None:
+        self.submitted = (comfyui_host, prompt_id)
+        for listener in self.listeners:
+            listener(comfyui_host, prompt_id)
+
+    async def run(self, run):
+        submission_listener.set(self.on_submitted)
+        return await run()
+
+
+class SingleFlight:
+    """
+    进行中请求表：相同键的并发调用共享同一次执行及其结果；带幂等键的调用完成后在重放窗口内直接返回结果。
+    所有等待方都取消时才取消执行本身，以便清理ComfyUI上的任务
+    In-flight request table: concurrent calls with the same key share one execution and its result;
+    calls carrying an idempotency key replay the result within the replay window after completion.
+    The execution itself is only cancelled once every waiter has gone, so that the ComfyUI job gets
+    cleaned up
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or default_logger
+        self.coalesced = 0
+        self.replayed = 0
+        self._flights = {}
+        self._replay = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _replayed(self, key: str):
+        now = time.monotonic()
+        while self._replay:
+            oldest, (expires, _, _) = next(iter(self._replay.items()))
+            if expires > now:
+                break
+            del self._replay[oldest]
+        return self._replay.get(key)
+
+    @staticmethod
+    def _check_fingerprint(key: str, expected, fingerprint) -> None:
+        # 幂等键只能用于同一组参数的重试 | an idempotency key may only be reused to retry the same arguments
+        if fingerprint is not None and expected is not None and expected != fingerprint:
+            raise ValidationError(f"幂等键已用于参数不同的请求: {key} | Idempotency key was already used with different arguments: {key}",
+                                  "idempotency_key")
+
+    def _finished(self, key: str, flight: _Flight, task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            # 失败的结果不重放，下一次调用重新执行
+            # Failures are not replayed, the next call runs again
+            return
+        config = get_settings().singleflight
+        if flight.replay and config.replay_window > 0:
+            self._replay[key] = (time.monotonic() + config.replay_window, task.result(), flight.fingerprint)
+            self._replay.move_to_end(key)
+            while len(self._replay) > config.max_replay_keys:
+                self._replay.popitem(last=False)
+
+    async def do(self, key: str, run, replay: bool = False, fingerprint: str = None):
+        """
+        执行或加入相同键的执行
+        Run, or join the execution with the same key
+
+        参数:
+            key: 请求键
+            run: 无参数的协程函数
+            replay: 完成后是否在重放窗口内保留结果（用于幂等键）
+            fingerprint: 请求参数的哈希（可选），相同键但参数哈希不同的调用被拒绝
+
+        Args:
+            key: Request key
+            run: Coroutine function without arguments
+            replay: Whether the result is kept for the replay window after completion (for idempotency keys)
+            fingerprint: Hash of the request arguments (optional), calls with the same key but a different
+                hash are rejected
+
+        返回:
+            run 的结果
+
+        Returns:
+            The result of run
+
+        Raises:
+            ValidationError: 同一个键已用于参数不同的请求 | the key was already used with different arguments
+        """
+        if replay:
+            entry = self._replayed(key)
+            if entry is not None:
+                self._check_fingerprint(key, entry[2], fingerprint)
+                self.replayed += 1
+                self.logger.info(f"重放已完成的请求结果: {key}")
+                return entry[1]
+        flight = self._flights.get(key)
+        if flight is not None:
+            self._check_fingerprint(key, flight.fingerprint, fingerprint)
+        if flight is None:
+            flight = self._flights[key] = _Flight(replay, fingerprint)
+            flight.task = asyncio.ensure_future(flight.run(run))
+            flight.task.add_done_callback(lambda task, flight=flight: self._finished(key, flight, task))
+        else:
+            self.coalesced += 1
+            self.logger.info(f"合并进行中的相同请求: {key}")
+        flight.attach(submission_listener.get())
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+
+_singleflight = SingleFlight()
+
+
+def get_singleflight() -> SingleFlight:
+    """获取进程级进行中请求表 | Get the process-wide in-flight request table"""
+    return _singleflight
+
+
+async def run_once(api_name: str, values: dict, run, idempotency_key: str = None):
+    """
+    合并重复的工具调用：参数相同的并发调用共享一次执行；提供幂等键时按客户端和幂等键合并，完成后在重放窗口内直接返回结果
+    Coalesce duplicate tool calls: concurrent calls with identical arguments share one execution; with
+    an idempotency key calls are coalesced by client and key instead and replay the result within the
+    replay window after completion
+
+    参数:
+        api_name: API名称，如 txt2img
+        values: 校验后的 {槽位名: 值}
+        run: 无参数的协程函数，执行一次实际的生成
+        idempotency_key: 客户端提供的幂等键（可选）
+
+    Args:
+        api_name: API name, e.g. txt2img
+        values: Validated {slot name: value}
+        run: Coroutine function without arguments performing the actual generation
+        idempotency_key: Client-supplied idempotency key (optional)
+
+    返回:
+        run 的结果
+
+    Returns:
+        The result of run
+
+    Raises:
+        ValidationError: 幂等键已用于参数不同的请求 | the idempotency key was already used with different arguments
+    """
+    if not get_settings().singleflight.enabled:
+        return await run()
+    if idempotency_key:
+        # 幂等键只在同一客户端内有效，其他客户端猜中键也拿不到结果
+        # Idempotency keys are scoped to the client, another client guessing a key does not get its result
+        key = f"{api_name}:idempotency:{current_client()}:{idempotency_key}"
+        return await _singleflight.do(key, run, replay=True, fingerprint=request_key(api_name, values))
+    return await _singleflight.do(request_key(api_name, values), run)
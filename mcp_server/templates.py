@@ -0,0 +1,228 @@
+import json
+import os
+import random
+from .logger import default_logger
+
+# 模板所在目录
+# Directory holding the workflow templates
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'tools')
+
+# 采样器节点类型及其seed输入名
+# Sampler node types and their seed input names
+SAMPLER_CLASSES = ("KSampler", "KSamplerAdvanced")
+SEED_INPUTS = ("seed", "noise_seed")
+
+
+def is_link(value) -> bool:
+    """判断输入值是否为指向其他节点输出的连接 [node_id, output_index] | Whether an input value is a link [node_id, output_index] to another node's output"""
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+
+
+def _random_seed() -> int:
+    # 生成15位随机数
+    # Generate a 15-digit random number
+    return random.randint(10**14, 10**15 - 1)
+
+
+def find_slots(workflow: dict) -> dict:
+    """
+    分析API格式工作流，找出可填充参数所在的节点输入
+    Analyse an API-format workflow and locate the node inputs that hold fillable parameters
+
+    槽位 | Slots:
+        prompt / negative_prompt: 采样器正/负向条件所连接的文本编码节点的text | text of the encoders feeding the sampler's positive/negative
+        width / height / batch_size: 采样器latent_image所连接的EmptyLatentImage | the EmptyLatentImage feeding the sampler's latent_image
+        checkpoint: CheckpointLoaderSimple的ckpt_name | ckpt_name of the CheckpointLoaderSimple
+        image: LoadImage的image | image of the LoadImage
+        seeds: 所有seed/noise_seed输入 | every seed/noise_seed input
+
+    参数:
+        workflow: API格式工作流
+
+    Args:
+        workflow: API-format workflow
+
+    返回:
+        dict: {槽位名: (node_id, input_name)}，seeds 为 [(node_id, input_name), ...]
+
+    Returns:
+        dict: {slot name: (node_id, input_name)}, seeds being [(node_id, input_name), ...]
+    """
+    slots = {'seeds': []}
+    for node_id, node in workflow.items():
+        inputs = node.get("inputs", {})
+        for name in SEED_INPUTS:
+            if name in inputs and not is_link(inputs[name]):
+                slots['seeds'].append((node_id, name))
+        class_type = node.get("class_type")
+        if class_type == "CheckpointLoaderSimple" and "ckpt_name" in inputs:
+            slots.setdefault('checkpoint', (node_id, "ckpt_name"))
+        elif class_type == "LoadImage" and "image" in inputs:
+            slots.setdefault('image', (node_id, "image"))
+        elif class_type in SAMPLER_CLASSES:
+            for slot, input_name in (('prompt', "positive"), ('negative_prompt', "negative")):
+                link = inputs.get(input_name)
+                if is_link(link) and "text" in workflow.get(link[0], {}).get("inputs", {}):
+                    slots.setdefault(slot, (link[0], "text"))
+            link = inputs.get("latent_image")
+            if is_link(link) and workflow.get(link[0], {}).get("class_type") == "EmptyLatentImage":
+                for slot in ("width", "height", "batch_size"):
+                    slots.setdefault(slot, (link[0], slot))
+    return slots
+
+
+class WorkflowTemplate:
+    """
+    解析后的工作流模板：只解析一次并预先计算槽位表，每次请求以写时复制方式填充参数
+    Parsed workflow template: parsed once with a precomputed slot map; each request fills in its
+    parameters as a copy-on-write patch
+    """
+
+    def __init__(self, api_name: str, workflow: dict, mtime_ns: int = 0):
+        self.api_name = api_name
+        self.workflow = workflow
+        self.mtime_ns = mtime_ns
+        self.slots = find_slots(workflow)
+
+    def value(self, slot: str, fallback=None):
+        """
+        返回模板中槽位的默认值
+        Return the template's default value of a slot
+        """
+        if slot not in self.slots or slot == 'seeds':
+            return fallback
+        node_id, input_name = self.slots[slot]
+        return self.workflow[node_id]["inputs"].get(input_name, fallback)
+
+    def instantiate(self, randomize_seeds: bool = True, **values) -> dict:
+        """
+        生成一次请求使用的工作流：只复制被修改的节点，其余节点与模板共享（调用方不得原地修改未填充的节点）
+        Build the workflow for one request: only patched nodes are copied, the others are shared with
+        the template (callers must not modify unpatched nodes in place)
+
+        参数:
+            randomize_seeds: 是否随机化所有seed
+            **values: 槽位值，如 prompt="...", width=512；seed=固定值 时所有seed使用该值而不随机化
+
+        Args:
+            randomize_seeds: Whether to randomize every seed
+            **values: Slot values, e.g. prompt="...", width=512; with seed=value every seed is pinned to
+                that value instead of being randomized
+
+        返回:
+            dict: API格式工作流
+
+        Returns:
+            dict: API-format workflow
+        """
+        workflow = dict(self.workflow)
+        patched = {}
+
+        def set_input(node_id, input_name, value):
+            node = patched.get(node_id)
+            if node is None:
+                node = dict(workflow[node_id])
+                node["inputs"] = dict(node.get("inputs", {}))
+                workflow[node_id] = patched[node_id] = node
+            node["inputs"][input_name] = value
+
+        seed = values.pop('seed', None)
+        for slot, value in values.items():
+            if slot not in self.slots or slot == 'seeds':
+                raise KeyError(f"模板 {self.api_name} 没有槽位 {slot} | Template {self.api_name} has no slot {slot}")
+            set_input(*self.slots[slot], value)
+        if seed is not None or randomize_seeds:
+            for node_id, input_name in self.slots['seeds']:
+                set_input(node_id, input_name, seed if seed is not None else _random_seed())
+        return workflow
+
+
+class TemplateRegistry:
+    """
+    工作流模板注册表：缓存解析后的模板，文件修改时间变化时自动重新加载
+    Workflow template registry: caches parsed templates and reloads one automatically when its file's mtime changes
+    """
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR, logger=None):
+        self.template_dir = template_dir
+        self.logger = logger or default_logger
+        self._templates = {}
+
+    def path(self, api_name: str) -> str:
+        """返回模板文件路径 | Return the template file path"""
+        return os.path.join(self.template_dir, f'{api_name}_api.json')
+
+    def api_names(self) -> list:
+        """返回模板目录下所有模板的API名称 | Return the API names of all templates in the template directory"""
+        return sorted(fname[:-len('_api.json')] for fname in os.listdir(self.template_dir) if fname.endswith('_api.json'))
+
+    def get(self, api_name: str) -> WorkflowTemplate:
+        """
+        获取指定API的模板，文件有变化时重新解析
+        Get the template of the given API, re-parsing it when the file changed
+
+        参数:
+            api_name: API名称，如 txt2img
+
+        Args:
+            api_name: API name, e.g. txt2img
+
+        返回:
+            WorkflowTemplate: 工作流模板
+
+        Returns:
+            WorkflowTemplate: Workflow template
+        """
+        path = self.path(api_name)
+        mtime_ns = os.stat(path).st_mtime_ns
+        template = self._templates.get(api_name)
+        if template is not None and template.mtime_ns == mtime_ns:
+            return template
+        with open(path, 'r', encoding='utf-8') as f:
+            template = WorkflowTemplate(api_name, json.load(f), mtime_ns)
+        if api_name in self._templates:
+            self.logger.info(f"工作流模板已重新加载: {path}")
+        self._templates[api_name] = template
+        return template
+
+
+_registry = TemplateRegistry()
+
+
+def get_template(api_name: str) -> WorkflowTemplate:
+    """
+    从进程级注册表获取工作流模板
+    Get a workflow template from the process-wide registry
+
+    参数:
+        api_name: API名称，如 txt2img
+
+    Args:
+        api_name: API name, e.g. txt2img
+
+    返回:
+        WorkflowTemplate: 工作流模板
+
+    Returns:
+        WorkflowTemplate: Workflow template
+    """
+    return _registry.get(api_name)
+
+
+def template_class_types() -> set:
+    """
+    返回所有工作流模板引用的节点类型
+    Return the node classes referenced by all workflow templates
+
+    返回:
+        set: 节点类型集合
+
+    Returns:
+        set: Set of node classes
+    """
+    class_types = set()
+    for api_name in _registry.api_names():
+        for node in _registry.get(api_name).workflow.values():
+            if isinstance(node, dict) and node.get("class_type"):
+                class_types.add(node["class_type"])
+    return class_types
@@ -1,95 +1,87 @@
-import uuid
 import httpx
-import asyncio
-import json
-from mcp_server.utils import load_config, load_prompt_template, randomize_all_seeds
+from mcp_server.templates import get_template
+from mcp_server.executor import run_prompt, images_to_markdown
 from mcp_server.logger_decorator import log_mcp_call
 from mcp_server.logger import default_logger
+from mcp_server.validation import ValidationError, validate_arguments
+from mcp_server.admission import AdmissionRejected
+from mcp_server.priority import set_priority
+from mcp_server.result_cache import run_cached
+from mcp_server.singleflight import run_once
+from mcp_server.jobs import job_manager
 
 def register_img2img_tool(mcp):
-    async def comfyui_img2img_impl(prompt: str) -> str:
+    async def comfyui_img2img_impl(prompt: str, timeout: float = None, seed: int = None, idempotency_key: str = None, priority: str = None) -> str:
         """
         实现ComfyUI图生图API调用，返回Markdown图片格式（异步版）
         Implement ComfyUI image-to-image API call, return Markdown image format (async version).
         """
         default_logger.debug(f"开始处理图生图请求: prompt='{prompt[:50]}...'")
         
-        comfyui_host = load_config()
-        prompt_template = load_prompt_template('img2img')
-        # 随机化所有seed | randomize all seeds
-        randomize_all_seeds(prompt_template)
-        # 设置正向prompt | set positive prompt
-        prompt_template["6"]["inputs"]["text"] = prompt
-        
-        default_logger.debug(f"配置ComfyUI模板参数完成")
-        
-        client_id = str(uuid.uuid4())
-        body = {
-            "client_id": client_id,
-            "prompt": prompt_template
-        }
-        
-        default_logger.debug(f"开始向ComfyUI发送API请求: {comfyui_host}/api/prompt")
-        default_logger.debug(f"请求体内容: {json.dumps(body, ensure_ascii=False, indent=2)}")
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(f"{comfyui_host}/api/prompt", json=body)
-            resp.raise_for_status()
-            prompt_id = resp.json()["prompt_id"]
-            
-            default_logger.debug(f"成功提交ComfyUI任务, prompt_id: {prompt_id}")
-            
-            while True:
-                await asyncio.sleep(3)
-                history_url = f"{comfyui_host}/api/history/{prompt_id}"
-                his_resp = await client.get(history_url)
-                his_resp.raise_for_status()
-                data = his_resp.json()
-                if prompt_id in data:
-                    status = data[prompt_id]["status"]
-                    if status["completed"] and status["status_str"] == "success":
-                        default_logger.debug(f"ComfyUI任务完成: {status['status_str']}")
-                        outputs = data[prompt_id]["outputs"]
-                        images = None
-                        for node_id, node_data in outputs.items():
-                            if "images" in node_data:
-                                images = node_data["images"]
-                                break
-                        if images is None:
-                            error_msg = "未找到包含images的输出节点 | No output node with images found"
-                            default_logger.error(error_msg)
-                            raise Exception(error_msg)
-                        break
-                        
-        default_logger.debug(f"生成图片数量: {len(images)}")
-        
-        image_urls = [
-            f"{comfyui_host}/api/view?filename={img['filename']}&subfolder={img['subfolder']}&type=output"
-            for img in images
-        ]
-        markdown_images = [f"![image]({url})" for url in image_urls]
-        return "\n".join(markdown_images)
+        # 本次调用排队所用的优先级通道 | priority lane this call queues in
+        set_priority(priority)
+
+        # 设置正向prompt并随机化所有seed | set positive prompt and randomize all seeds
+        values = {'prompt': prompt}
+        if seed is not None:
+            values['seed'] = seed
+        values = await validate_arguments('img2img', values)
+
+        async def generate():
+            prompt_template = get_template('img2img').instantiate(**values)
+
+            default_logger.debug(f"配置ComfyUI模板参数完成")
+
+            async def run():
+                return await run_prompt(prompt_template, timeout=timeout)
+
+            # 固定seed时相同的工作流直接返回缓存的图片 | with a pinned seed identical workflows return the cached images
+            if seed is not None:
+                return await run_cached(prompt_template, run)
+            return await run()
+
+        # 重复的调用共享同一个ComfyUI任务 | duplicate calls share one ComfyUI job
+        comfyui_host, images = await run_once('img2img', values, generate, idempotency_key)
+        return images_to_markdown(comfyui_host, images)
 
     @mcp.tool()
     @log_mcp_call
-    async def img2img(prompt: str) -> str:
+    async def img2img(prompt: str, timeout: float = None, seed: int = None, idempotency_key: str = None, priority: str = None) -> str:
         """
         图生图服务：输入prompt，返回图片Markdown格式（异步版）
         Image-to-image service: input prompt, return image in Markdown format (async version).
         Args:
             prompt: str 正向prompt | positive prompt
+            timeout: float 任务截止时间（秒，可选，默认值从配置文件读取，0表示不限制）| job deadline in seconds (optional, default from config, 0 disables it)
+            seed: int 固定的随机种子（可选，默认每次随机；固定后相同参数的请求直接返回缓存的结果）| pinned seed (optional, random by default; once pinned, identical requests return the cached result)
+            idempotency_key: str 幂等键（可选；携带同一幂等键的重试共享同一个任务，完成后在重放窗口内直接返回结果）| idempotency key (optional; retries carrying the same key share one job and replay its result within the replay window)
+            priority: str 优先级通道（可选）：high 用于交互式请求，插到ComfyUI队列最前面；low 用于批量渲染；默认按客户端策略或 normal | priority lane (optional): high for interactive requests, placed at the head of the ComfyUI queue; low for bulk renders; defaults to the client policy or normal
 
         Returns:
             str 图片Markdown格式 | image in Markdown format
         Raises: 
+            ValidationError: 参数未通过预校验，任务未提交 | an argument failed pre-validation, nothing was queued
+            AdmissionRejected: ComfyUI任务队列已饱和，任务未提交，错误信息中给出建议的重试等待时间 | the ComfyUI job queue is saturated, nothing was queued; the message suggests when to retry
             httpx.RequestError: API请求失败 | API request failed
+            TimeoutError: 任务超过截止时间，已从ComfyUI队列移除或中断 | job passed its deadline and was removed from the ComfyUI queue or interrupted
             KeyError: 返回数据格式错误 | response data format error
             Exception: 其他未预期的异常 | other unexpected exception
         """
         try:
             default_logger.info(f"接收到图生图请求: prompt='{prompt[:30]}...'")
-            result = await comfyui_img2img_impl(prompt)
+            result = await comfyui_img2img_impl(prompt, timeout, seed, idempotency_key, priority)
             default_logger.info(f"图生图请求完成")
             return result
+        except ValidationError as e:
+            error_msg = f"参数校验失败: {str(e)} | invalid arguments: {str(e)}"
+            default_logger.warning(error_msg)
+            raise ValidationError(error_msg, e.slot, e.suggestions)
+        except AdmissionRejected:
+            # 保留 retry_after，客户端据此稍后重试 | keep retry_after so that the client can retry later
+            raise
+        except TimeoutError:
+            # 保留异常类型，客户端据此区分超过截止时间与其他错误 | keep the type so that clients can tell a passed deadline from other errors
+            raise
         except httpx.RequestError as e:
             error_msg = f"API请求失败: {str(e)} | API request failed: {str(e)}"
             default_logger.error(error_msg)
@@ -101,4 +93,7 @@ def register_img2img_tool(mcp):
         except Exception as e:
             error_msg = f"图生图服务异常: {str(e)} | image-to-image service error: {str(e)}"
             default_logger.error(error_msg)
-            raise Exception(error_msg) 
\ No newline at end of file
+            raise Exception(error_msg) 
+
+    # 同一工具也可以通过 submit_job 作为后台任务提交 | the same tool can be submitted as a background job through submit_job
+    job_manager.register_runner('img2img', img2img)
@@ -0,0 +1,130 @@
+import json
+from mcp.server.lowlevel.server import request_ctx
+from mcp_server.fairness import LOCAL_CLIENT, current_client
+from mcp_server.logger_decorator import log_mcp_call
+from mcp_server.notifications import resource_notifier
+from mcp_server.jobs import FINISHED_STATES, JOB_URI, JOBS_URI, COMPLETED, job_manager
+
+async def _notify_job_change(job):
+    # 订阅了任务资源或任务列表的客户端收到更新通知
+    # Clients subscribed to the job resource or the job list are told about the update
+    await resource_notifier.notify_updated([job.uri, JOBS_URI])
+
+def _unknown_job(job_id: str) -> str:
+    return f"未找到任务: {job_id} | Unknown job: {job_id}"
+
+def _owner() -> str:
+    # 任务只对提交它的客户端可见；stdio 只有一个客户端，使用固定标识，重启后仍能取回从任务日志恢复的任务
+    # Jobs are only visible to the client that submitted them; stdio has a single client, so it gets a
+    # fixed key and can still reach the jobs recovered from the journal after a restart
+    context = request_ctx.get(None)
+    if context is not None and getattr(context, "request", None) is None:
+        return LOCAL_CLIENT
+    return current_client()
+
+def register_jobs_tool(mcp):
+    job_manager.subscribe(_notify_job_change)
+
+    @mcp.tool()
+    @log_mcp_call
+    async def submit_job(tool: str, arguments: dict = None) -> str:
+        """
+        提交后台生成任务并立即返回任务ID，不等待生成完成；可同时提交多个任务，之后再收集结果
+        Submit a background generation job and return its job id right away without waiting for the
+        generation; many jobs can be submitted at once and collected later
+        Args:
+            tool: str 生成工具名，如 txt2img、img2img | generation tool name, e.g. txt2img, img2img
+            arguments: dict 工具参数，与直接调用该工具时相同 | tool arguments, the same as when calling the tool directly
+
+        Returns:
+            str 任务状态JSON，包含 job_id 和可订阅的资源URI | job state JSON with the job_id and the subscribable resource URI
+        """
+        return job_manager.submit(tool, arguments, owner=_owner()).to_json()
+
+    @mcp.tool()
+    @log_mcp_call
+    async def job_status(job_id: str) -> str:
+        """
+        查询后台任务的状态（pending、submitted、completed、failed、cancelled）及ComfyUI的prompt_id
+        Get the state of a background job (pending, submitted, completed, failed, cancelled) and its ComfyUI prompt_id
+        Args:
+            job_id: str 任务ID | job id
+
+        Returns:
+            str 任务状态JSON | job state JSON
+        """
+        job = job_manager.get(job_id, _owner())
+        return job.to_json() if job is not None else _unknown_job(job_id)
+
+    @mcp.tool()
+    @log_mcp_call
+    async def job_result(job_id: str, wait: float = 0) -> str:
+        """
+        获取后台任务的结果；任务未结束时最多等待 wait 秒
+        Get the result of a background job, waiting up to wait seconds while it has not finished
+        Args:
+            job_id: str 任务ID | job id
+            wait: float 最长等待时间（秒，可选，默认不等待）| maximum wait in seconds (optional, no wait by default)
+
+        Returns:
+            str 图片Markdown格式，任务未完成时为任务状态 | images in Markdown format, the job state while unfinished
+        """
+        job = await job_manager.wait(job_id, wait, _owner())
+        if job is None:
+            return _unknown_job(job_id)
+        if job.status == COMPLETED:
+            return job.result
+        if job.status in FINISHED_STATES:
+            return f"任务未成功完成: {job.status} {job.error or ''} | job did not complete: {job.status} {job.error or ''}".rstrip()
+        return f"任务尚未完成: {job.status} | job not finished yet: {job.status}"
+
+    @mcp.tool()
+    @log_mcp_call
+    async def list_jobs(status: str = None) -> str:
+        """
+        列出当前客户端提交的后台任务，可按状态过滤
+        List the background jobs submitted by the current client, optionally filtered by state
+        Args:
+            status: str 任务状态（可选），如 submitted、completed | job state (optional), e.g. submitted, completed
+
+        Returns:
+            str 任务状态JSON列表 | JSON list of job states
+        """
+        return json.dumps([job.to_dict() for job in job_manager.list_jobs(status, _owner())], ensure_ascii=False)
+
+    @mcp.tool()
+    @log_mcp_call
+    async def cancel_job(job_id: str) -> str:
+        """
+        取消后台任务，已在ComfyUI上排队或执行的任务会被移除或中断
+        Cancel a background job; a job already queued or running on ComfyUI is removed or interrupted
+        Args:
+            job_id: str 任务ID | job id
+
+        Returns:
+            str 取消结果 | cancellation result
+        """
+        owner = _owner()
+        job = job_manager.get(job_id, owner)
+        if job is None:
+            return _unknown_job(job_id)
+        if not job_manager.cancel(job_id, owner):
+            return f"任务已结束: {job.status} | job already finished: {job.status}"
+        return f"任务已取消: {job_id} | job cancelled: {job_id}"
+
+    @mcp.resource(JOBS_URI, mime_type="application/json")
+    async def get_job_list() -> str:
+        """
+        当前客户端所有后台任务的状态，任务状态变化时通知订阅者
+        States of every background job of the current client; subscribers are notified when a job changes state
+        """
+        return json.dumps([job.to_dict() for job in job_manager.list_jobs(owner=_owner())], ensure_ascii=False)
+
+    @mcp.resource(JOB_URI, mime_type="application/json")
+    async def get_job(job_id: str) -> str:
+        """
+        单个后台任务的状态和结果，任务状态变化时通知订阅者
+        State and result of one background job; subscribers are notified when it changes state
+        """
+        job = job_manager.get(job_id, _owner())
+        return job.to_json() if job is not None else _unknown_job(job_id)
@@ -0,0 +1,31 @@
+from urllib.parse import quote
+from mcp_server.logger_decorator import log_mcp_call
+from mcp_server.node_search import get_node_search_index
+
+def register_node_search_tool(mcp):
+    @mcp.tool()
+    @log_mcp_call
+    async def search_nodes(query: str, limit: int = 10) -> str:
+        """
+        按关键词搜索ComfyUI节点类型（匹配节点类型名、显示名称、分类、输入名和提示文本，支持前缀和模糊匹配），结果按相关度排序
+        Search ComfyUI node classes by keywords (matches class names, display names, categories, input
+        names and tooltips, with prefix and fuzzy matching); results are ranked by relevance
+        Args:
+            query: str 关键词，如 "upscale model"、"lora" | keywords, e.g. "upscale model", "lora"
+            limit: int 最多返回的结果数，默认10 | maximum number of results, 10 by default
+
+        Returns:
+            str 匹配的节点类型列表，可通过 info://node/{class_type} 读取详情 | matching node classes, details via info://node/{class_type}
+        """
+        index = get_node_search_index()
+        results = index.search(query, max(1, min(int(limit), 100)))
+        if not results:
+            return f"未找到与 \"{query}\" 匹配的节点类型 | No node class matches \"{query}\""
+        snapshot = index.snapshot
+        lines = [f"## 节点搜索结果 | Node search results: {query}"]
+        for i, (class_type, score) in enumerate(results, 1):
+            node = snapshot.node(class_type) or {}
+            display_name = node.get("display_name") or class_type
+            category = node.get("category", "")
+            lines.append(f"{i}. {class_type} — {display_name} ({category}) info://node/{quote(class_type, safe='')} [{score:.2f}]")
+        return "\n".join(lines)
@@ -1,13 +1,48 @@
-import os
 import json
-import httpx
-import asyncio
+from urllib.parse import quote, unquote
 from mcp_server.logger_decorator import log_mcp_call
 from mcp_server.logger import default_logger
-from mcp_server.utils import load_object_info, load_config
+from mcp_server.notifications import resource_notifier
+from mcp_server.catalog import CATALOG_SOURCES, get_catalog
+from mcp_server.object_info import get_node, get_node_json, get_object_info, object_info_refresher
+from mcp_server.settings import get_settings
+from mcp_server.utils import load_comfyui_backends
+
+# 依赖节点描述信息的资源；模板参数中的特殊字符（如分类名中的 /）需URL编码
+# Resources derived from the node descriptions; special characters in template parameters (such as
+# the / in category names) must be URL-encoded
+CKPT_URI = "info://ckpt"
+ALL_URI = "info://all"
+PAGE_URI = "info://all/page/{cursor}"
+NODE_URI = "info://node/{class_type}"
+CATEGORY_URI = "info://category/{name}"
+CATALOG_URI = "info://catalog"
+CATALOG_ITEM_URI = "info://catalog/{name}"
+
+async def _notify_object_info_change(host, port, diff):
+    # 资源基于第一个后端的节点描述，其他后端的变化不影响资源内容
+    # Resources are built from the first backend's node descriptions, other backends do not affect them
+    if (host, str(port)) != tuple(map(str, load_comfyui_backends()[0])):
+        return
+    uris = [ALL_URI]
+    if diff.touches("CheckpointLoaderSimple"):
+        uris.append(CKPT_URI)
+    catalogs = [name for name, (sources, _, _) in CATALOG_SOURCES.items() if any(diff.touches(class_type) for class_type, _ in sources)]
+    if catalogs:
+        uris.append(CATALOG_URI)
+        uris += [CATALOG_ITEM_URI.format(name=name) for name in catalogs]
+    uris += [NODE_URI.format(class_type=quote(class_type, safe='')) for class_type in diff.added + diff.removed + diff.changed]
+    # 列表页和分类内容可能随任意节点类型变化
+    # Listing pages and categories may change with any node class
+    uris += resource_notifier.subscribed("info://all/page/") + resource_notifier.subscribed("info://category/")
+    await resource_notifier.notify_updated(uris)
+    if diff.added or diff.removed:
+        await resource_notifier.notify_list_changed()
 
 def register_resource_info_tool(mcp):
-    @mcp.resource("info://ckpt")
+    object_info_refresher.subscribe(_notify_object_info_change)
+
+    @mcp.resource(CKPT_URI)
     @log_mcp_call
     async def get_checkpoint_list() -> str:
         """
@@ -18,74 +53,121 @@ def register_resource_info_tool(mcp):
             str 格式化的模型清单 | Formatted checkpoint list
         """
         try:
-            # 加载节点描述信息
-            # Load node description information
-            object_info = load_object_info(default_logger)
-            
-            if not object_info:
-                return "无法加载ComfyUI节点描述信息，请确保MCP服务已成功从ComfyUI获取节点描述信息。"
-            
-            # 获取CheckpointLoaderSimple节点的ckpt_name选项
-            # Get ckpt_name options from CheckpointLoaderSimple node
-            if "CheckpointLoaderSimple" not in object_info:
-                return "未找到CheckpointLoaderSimple节点，无法获取模型清单。"
-            
-            node_info = object_info["CheckpointLoaderSimple"]
-            
-            # 检查input和required字段
-            if "input" not in node_info:
-                return "CheckpointLoaderSimple节点中未找到input字段。"
-                
-            input_info = node_info["input"]
-            
-            if "required" not in input_info:
-                return "CheckpointLoaderSimple节点中未找到required字段。"
-                
-            required_info = input_info["required"]
-            
-            if "ckpt_name" not in required_info:
-                return "CheckpointLoaderSimple节点中未找到ckpt_name字段。"
-                
-            # 获取模型列表和描述
-            ckpt_info = required_info["ckpt_name"]
-            
-            # 获取tooltip描述
-            tooltip = "无描述"
-            if isinstance(ckpt_info, list) and len(ckpt_info) > 1:
-                # 数组的第二个元素通常包含tooltip
-                tooltip_obj = ckpt_info[1]
-                if isinstance(tooltip_obj, dict) and "tooltip" in tooltip_obj:
-                    tooltip = tooltip_obj["tooltip"]
-            
-            # 获取模型列表
-            model_list = []
-            if isinstance(ckpt_info, list) and len(ckpt_info) > 0 and isinstance(ckpt_info[0], list):
-                # 数组的第一个元素通常包含模型列表
-                model_list = ckpt_info[0]
-            
-            # 格式化输出
-            # Format output
-            result = [
-                "## ComfyUI Checkpoint模型列表",
-                f"描述: {tooltip}",
-                f"共找到 {len(model_list)} 个模型\n"
-            ]
-            
-            for i, model_name in enumerate(model_list, 1):
-                # 确保直接使用原始模型名称
-                result.append(f"{i}. {model_name}")
-            
-            return "\n".join(result)
-            
+            # 模型目录只在节点描述变化时重建，Markdown文本预先渲染
+            # The catalogs are only rebuilt when the node descriptions change, the Markdown is pre-rendered
+            return (await get_catalog()).get("checkpoints").markdown
         except Exception as e:
             error_msg = f"获取模型清单时出错: {str(e)}"
             default_logger.error(error_msg)
             return error_msg 
 
-    @mcp.resource("info://all")
-    async def get_all_object_info() -> dict:
+    @mcp.resource(CATALOG_URI, mime_type="application/json")
+    async def get_catalog_index() -> str:
+        """
+        模型与枚举目录一览（checkpoint、LoRA、VAE、放大模型、ControlNet、采样器、调度器）及各自的条目数
+        Overview of the model and enum catalogs (checkpoints, LoRAs, VAEs, upscale models, ControlNets,
+        samplers, schedulers) with their sizes
+        """
+        return (await get_catalog()).index_json
+
+    @mcp.resource(CATALOG_ITEM_URI)
+    async def get_catalog_item(name: str) -> str:
+        """
+        单个模型或枚举目录，如 info://catalog/loras、info://catalog/samplers
+        One model or enum catalog, e.g. info://catalog/loras, info://catalog/samplers
+        """
+        entry = (await get_catalog()).get(name)
+        if entry is None:
+            return f"未知的目录: {name}，可用目录: {', '.join(CATALOG_SOURCES)} | Unknown catalog: {name}"
+        return entry.markdown
+
+    @mcp.resource(ALL_URI, mime_type="application/json")
+    async def get_all_object_info() -> str:
+        """
+        ComfyUI节点类型列表的第一页（名称、显示名称、分类和资源URI），后续页见 next 字段
+        First page of the ComfyUI node class listing (name, display name, category and resource URI);
+        see the next field for the following pages
+        """
+        return get_object_info().page_json(0, get_settings().object_info.page_size)
+
+    @mcp.resource(PAGE_URI, mime_type="application/json")
+    async def get_object_info_page(cursor: str) -> str:
+        """
+        ComfyUI节点类型列表中从 cursor 开始的一页
+        One page of the ComfyUI node class listing starting at cursor
+        """
+        try:
+            offset = int(cursor)
+        except ValueError:
+            offset = -1
+        # 各页只序列化一次，在请求间共享；只接受 next 字段给出的页边界
+        # Each page is serialized once and shared between requests; only the page boundaries given
+        # by the next field are accepted
+        text = get_object_info().page_json(offset, get_settings().object_info.page_size) if offset >= 0 else None
+        if text is None:
+            return f"无效的分页位置: {cursor} | Invalid cursor: {cursor}"
+        return text
+
+    @mcp.resource(NODE_URI, mime_type="application/json")
+    async def get_node_object_info(class_type: str) -> str:
         """
-        返回完整的ComfyUI节点描述信息（object_info.json）
-        Return the full ComfyUI node description info (object_info.json)
+        单个ComfyUI节点类型的描述信息
+        Description of a single ComfyUI node class
+        """
+        class_type = unquote(class_type)
+        text = await get_node_json(class_type)
+        if text is None:
+            return f"未找到节点类型: {class_type} | Unknown node class: {class_type}"
+        return text
+
+    @mcp.resource(CATEGORY_URI, mime_type="application/json")
+    async def get_category_object_info(name: str) -> str:
+        """
+        某个分类下所有ComfyUI节点类型的描述信息
+        Descriptions of every ComfyUI node class in a category
+        """
+        name = unquote(name)
+        text = get_object_info().category_json(name)
+        if text is None:
+            return f"未找到节点分类: {name} | Unknown node category: {name}"
+        return text
+
+    @mcp.tool()
+    @log_mcp_call
+    async def get_node_info(class_type: str) -> str:
+        """
+        获取单个ComfyUI节点类型的描述信息（输入、输出、分类等）
+        Get the description of a single ComfyUI node class (inputs, outputs, category, ...)
+
+        Args:
+            class_type: 节点类型，如 KSampler | node class, e.g. KSampler
+
+        Returns:
+            str 节点描述JSON | node description JSON
+        """
+        node = await get_node(class_type)
+        if node is None:
+            return f"未找到节点类型: {class_type} | Unknown node class: {class_type}"
+        return json.dumps({class_type: node}, ensure_ascii=False, indent=2)
+
+    @mcp.tool()
+    @log_mcp_call
+    async def refresh_object_info() -> str:
+        """
+        立即从ComfyUI重新获取节点描述信息（如安装了新的模型或自定义节点后），有变化时更新缓存并通知客户端
+        Re-fetch node descriptions from ComfyUI right away (e.g. after installing new models or custom
+        nodes); on change the cache is updated and clients are notified
+
+        Returns:
+            str 各后端的刷新结果 | refresh result per backend
         """
-        return load_object_info(default_logger) 
\ No newline at end of file
+        results = await object_info_refresher.refresh()
+        lines = []
+        for (host, port), diff in results.items():
+            if diff is None:
+                lines.append(f"{host}:{port} 获取失败 | fetch failed")
+            elif diff:
+                lines.append(f"{host}:{port} {diff.summary()}")
+            else:
+                lines.append(f"{host}:{port} 无变化 | unchanged")
+        return "\n".join(lines)
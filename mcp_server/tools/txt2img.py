@@ -1,9 +1,13 @@
-import uuid
 import httpx
-import asyncio
-import json
-import os
-from mcp_server.utils import load_config, load_prompt_template, randomize_all_seeds
+from mcp_server.templates import get_template
+from mcp_server.executor import run_prompt, images_to_markdown
+from mcp_server.batching import get_txt2img_batcher
+from mcp_server.validation import ValidationError, validate_arguments
+from mcp_server.admission import AdmissionRejected
+from mcp_server.priority import set_priority
+from mcp_server.result_cache import run_cached
+from mcp_server.singleflight import run_once
+from mcp_server.jobs import job_manager
 from mcp_server.logger_decorator import log_mcp_call
 from mcp_server.logger import default_logger
 
@@ -19,19 +23,15 @@ def _load_default_values():
         dict: Dictionary containing default values
     """
     try:
-        # 获取txt2img_api.json文件路径
-        api_json_path = os.path.join(os.path.dirname(__file__), 'txt2img_api.json')
-        
-        with open(api_json_path, 'r', encoding='utf-8') as f:
-            api_json = json.load(f)
-        
-        # 提取各个字段的默认值
-        default_prompt = api_json.get("6", {}).get("inputs", {}).get("text", "beautiful scenery nature glass bottle landscape, , purple galaxy bottle,")
-        default_negative_prompt = api_json.get("7", {}).get("inputs", {}).get("text", "text, watermark")
-        default_width = str(api_json.get("5", {}).get("inputs", {}).get("width", 512))
-        default_height = str(api_json.get("5", {}).get("inputs", {}).get("height", 512))
-        default_batch_size = str(api_json.get("5", {}).get("inputs", {}).get("batch_size", 1))
-        default_model = api_json.get("4", {}).get("inputs", {}).get("ckpt_name", "sd_xl_base_1.0.safetensors")
+        template = get_template('txt2img')
+
+        # 按槽位提取各个字段的默认值
+        default_prompt = template.value("prompt", "beautiful scenery nature glass bottle landscape, , purple galaxy bottle,")
+        default_negative_prompt = template.value("negative_prompt", "text, watermark")
+        default_width = str(template.value("width", 512))
+        default_height = str(template.value("height", 512))
+        default_batch_size = str(template.value("batch_size", 1))
+        default_model = template.value("checkpoint", "sd_xl_base_1.0.safetensors")
         
         return {
             "prompt": default_prompt,
@@ -56,8 +56,11 @@ def _load_default_values():
 # 加载默认值
 DEFAULT_VALUES = _load_default_values()
 
+# 模板槽位对应的工具参数名 | tool argument name of each template slot
+TXT2IMG_ARGUMENTS = {'width': 'pic_width', 'height': 'pic_height', 'checkpoint': 'model'}
+
 def register_txt2img_tool(mcp):
-    async def comfyui_txt2img_impl(prompt: str, pic_width: str, pic_height: str, negative_prompt: str, batch_size: str, model: str) -> str:
+    async def comfyui_txt2img_impl(prompt: str, pic_width: str, pic_height: str, negative_prompt: str, batch_size: str, model: str, timeout: float = None, seed: int = None, idempotency_key: str = None, priority: str = None) -> str:
         """
         实现ComfyUI文生图API调用，返回Markdown图片格式（异步版）
         支持自定义输出图片宽高、负向提示词、批次、模型。
@@ -66,69 +69,47 @@ def register_txt2img_tool(mcp):
         """
         default_logger.debug(f"开始处理文生图请求: prompt='{prompt[:50]}...'")
         
-        comfyui_host = load_config()
-        prompt_template = load_prompt_template('txt2img')
-        # seed 处理 | seed processing
-        randomize_all_seeds(prompt_template)
-        # 正向prompt | positive prompt
-        prompt_template["6"]["inputs"]["text"] = prompt
-        # 负向prompt | negative prompt
-        prompt_template["7"]["inputs"]["text"] = negative_prompt
-        # 宽高 | width & height
-        prompt_template["5"]["inputs"]["width"] = pic_width
-        prompt_template["5"]["inputs"]["height"] = pic_height
-        # 批次 | batch size
-        prompt_template["5"]["inputs"]["batch_size"] = batch_size
-        # 模型 | model
-        prompt_template["4"]["inputs"]["ckpt_name"] = model
+        # 本次调用排队所用的优先级通道 | priority lane this call queues in
+        set_priority(priority)
 
-        default_logger.debug(f"配置ComfyUI模板参数完成")
-        
-        client_id = str(uuid.uuid4())
-        body = {
-            "client_id": client_id,
-            "prompt": prompt_template
+        # 提交前按节点描述校验参数，无效参数不占用ComfyUI队列 | validate against the node descriptions before anything is queued
+        values = {
+            'prompt': prompt,                    # 正向prompt | positive prompt
+            'negative_prompt': negative_prompt,  # 负向prompt | negative prompt
+            'width': pic_width,                  # 宽高 | width & height
+            'height': pic_height,
+            'batch_size': batch_size,            # 批次 | batch size
+            'checkpoint': model                  # 模型 | model
         }
-        
-        default_logger.debug(f"开始向ComfyUI发送API请求: {comfyui_host}/api/prompt")
-        default_logger.debug(f"请求体内容: {json.dumps(body, ensure_ascii=False, indent=2)}")
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(f"{comfyui_host}/api/prompt", json=body)
-            resp.raise_for_status()
-            prompt_id = resp.json()["prompt_id"]
-            
-            default_logger.debug(f"成功提交ComfyUI任务, prompt_id: {prompt_id}")
-            
-            while True:
-                await asyncio.sleep(3)
-                history_url = f"{comfyui_host}/api/history/{prompt_id}"
-                his_resp = await client.get(history_url)
-                his_resp.raise_for_status()
-                data = his_resp.json()
-                if prompt_id in data:
-                    status = data[prompt_id]["status"]
-                    if status["completed"] and status["status_str"] == "success":
-                        default_logger.debug(f"ComfyUI任务完成: {status['status_str']}")
-                        outputs = data[prompt_id]["outputs"]
-                        images = None
-                        for node_id, node_data in outputs.items():
-                            if "images" in node_data:
-                                images = node_data["images"]
-                                break
-                        if images is None:
-                            error_msg = "未找到包含images的输出节点 | No output node with images found"
-                            default_logger.error(error_msg)
-                            raise Exception(error_msg)
-                        break
-        
-        default_logger.debug(f"生成图片数量: {len(images)}")
-        
-        image_urls = [
-            f"{comfyui_host}/api/view?filename={img['filename']}&subfolder={img['subfolder']}&type=output"
-            for img in images
-        ]
-        markdown_images = [f"![image]({url})" for url in image_urls]
-        return "\n".join(markdown_images)
+        if seed is not None:
+            values['seed'] = seed                # 固定seed | pinned seed
+        values = await validate_arguments('txt2img', values, aliases=TXT2IMG_ARGUMENTS)
+
+        async def generate():
+            # 按槽位填充参数，未固定seed时随机化 | fill parameters by slot, seeds randomized unless pinned
+            prompt_template = get_template('txt2img').instantiate(**values)
+
+            default_logger.debug(f"配置ComfyUI模板参数完成")
+
+            # 启用微批处理时与其他兼容的并发请求合并为一个ComfyUI任务（固定seed的请求单独执行）
+            # With micro-batching enabled, coalesce with compatible concurrent requests into one ComfyUI prompt
+            # (pinned-seed requests run on their own)
+            async def run():
+                batcher = get_txt2img_batcher()
+                if batcher is not None:
+                    return await batcher.submit(prompt_template, checkpoint=model, timeout=timeout,
+                                                pinned_seed=seed is not None)
+                return await run_prompt(prompt_template, checkpoint=model, timeout=timeout)
+
+            # 固定seed的生成是确定性的，相同的工作流直接返回缓存的图片 | pinned-seed generations are deterministic, identical workflows return the cached images
+            if seed is not None:
+                return await run_cached(prompt_template, run)
+            return await run()
+
+        # 重复的调用（客户端重试、多个代理同时发出的相同请求）共享同一个ComfyUI任务
+        # Duplicate calls (client retries, identical requests from several agents) share one ComfyUI job
+        comfyui_host, images = await run_once('txt2img', values, generate, idempotency_key)
+        return images_to_markdown(comfyui_host, images)
 
     @mcp.tool()
     @log_mcp_call
@@ -138,7 +119,11 @@ def register_txt2img_tool(mcp):
         pic_height: str = DEFAULT_VALUES["height"],
         negative_prompt: str = DEFAULT_VALUES["negative_prompt"],
         batch_size: str = DEFAULT_VALUES["batch_size"],
-        model: str = DEFAULT_VALUES["model"]
+        model: str = DEFAULT_VALUES["model"],
+        timeout: float = None,
+        seed: int = None,
+        idempotency_key: str = None,
+        priority: str = None
     ) -> str:
         """
         文生图服务：输入prompt，返回图片Markdown格式（异步版）
@@ -154,19 +139,36 @@ def register_txt2img_tool(mcp):
             negative_prompt: str 负向提示词（可选，默认值从配置文件读取）| negative prompt (optional, default from config)
             batch_size: str 生成批次数（可选，最大4，默认值从配置文件读取）| batch size (optional, max 4, default from config)
             model: str 模型名称（可选，默认值从配置文件读取）| model name (optional, default from config)
+            timeout: float 任务截止时间（秒，可选，默认值从配置文件读取，0表示不限制）| job deadline in seconds (optional, default from config, 0 disables it)
+            seed: int 固定的随机种子（可选，默认每次随机；固定后相同参数的请求直接返回缓存的结果）| pinned seed (optional, random by default; once pinned, identical requests return the cached result)
+            idempotency_key: str 幂等键（可选；携带同一幂等键的重试共享同一个任务，完成后在重放窗口内直接返回结果）| idempotency key (optional; retries carrying the same key share one job and replay its result within the replay window)
+            priority: str 优先级通道（可选）：high 用于交互式请求，插到ComfyUI队列最前面；low 用于批量渲染；默认按客户端策略或 normal | priority lane (optional): high for interactive requests, placed at the head of the ComfyUI queue; low for bulk renders; defaults to the client policy or normal
 
         Returns:
             str 图片Markdown格式 | image in Markdown format
         Raises: 
+            ValidationError: 参数未通过预校验（如模型名不存在、宽高超出范围），任务未提交 | an argument failed pre-validation (e.g. unknown model, size out of range), nothing was queued
+            AdmissionRejected: ComfyUI任务队列已饱和，任务未提交，错误信息中给出建议的重试等待时间 | the ComfyUI job queue is saturated, nothing was queued; the message suggests when to retry
             httpx.RequestError: API请求失败 | API request failed
+            TimeoutError: 任务超过截止时间，已从ComfyUI队列移除或中断 | job passed its deadline and was removed from the ComfyUI queue or interrupted
             KeyError: 返回数据格式错误 | response data format error
             Exception: 其他未预期的异常 | other unexpected exception
         """
         try:
             default_logger.info(f"接收到文生图请求: prompt='{prompt[:30]}...'")
-            result = await comfyui_txt2img_impl(prompt, pic_width, pic_height, negative_prompt, batch_size, model)
+            result = await comfyui_txt2img_impl(prompt, pic_width, pic_height, negative_prompt, batch_size, model, timeout, seed, idempotency_key, priority)
             default_logger.info(f"文生图请求完成: 生成 {batch_size} 张图片")
             return result
+        except ValidationError as e:
+            error_msg = f"参数校验失败: {str(e)} | invalid arguments: {str(e)}"
+            default_logger.warning(error_msg)
+            raise ValidationError(error_msg, e.slot, e.suggestions)
+        except AdmissionRejected:
+            # 保留 retry_after，客户端据此稍后重试 | keep retry_after so that the client can retry later
+            raise
+        except TimeoutError:
+            # 保留异常类型，客户端据此区分超过截止时间与其他错误 | keep the type so that clients can tell a passed deadline from other errors
+            raise
         except httpx.RequestError as e:
             error_msg = f"API请求失败: {str(e)} | API request failed: {str(e)}"
             default_logger.error(error_msg)
@@ -178,4 +180,7 @@ def register_txt2img_tool(mcp):
         except Exception as e:
             error_msg = f"文生图服务异常: {str(e)} | text-to-image service error: {str(e)}"
             default_logger.error(error_msg)
-            raise Exception(error_msg) 
\ No newline at end of file
+            raise Exception(error_msg) 
+
+    # 同一工具也可以通过 submit_job 作为后台任务提交 | the same tool can be submitted as a background job through submit_job
+    job_manager.register_runner('txt2img', txt2img)
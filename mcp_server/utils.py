@@ -1,46 +1,44 @@
 import json
-import configparser
 import os
-import random
-import logging
-import httpx
-import asyncio
+import tempfile
+from contextlib import contextmanager
+from dataclasses import asdict
+from .settings import get_settings
 
-def _get_config_parser():
+def load_comfyui_server_info():
     """
-    获取配置解析器
-    Get config parser
+    加载ComfyUI服务器信息（主机和端口）
+    Load ComfyUI server information (host and port)
     
     返回:
-        configparser.ConfigParser: 配置解析器
+        tuple: (host, port)
     
     Returns:
-        configparser.ConfigParser: Config parser
+        tuple: (host, port)
     """
-    config = configparser.ConfigParser()
-    config.read(os.path.join(os.path.dirname(__file__), 'config.ini'), encoding='utf-8')
-    return config
+    server = get_settings().comfyui_server
+    return server.host, server.port
 
-def load_comfyui_server_info():
+def load_comfyui_backends():
     """
-    加载ComfyUI服务器信息（主机和端口）
-    Load ComfyUI server information (host and port)
+    加载所有ComfyUI后端（主机和端口）
+    未配置 backends 时只返回 [comfyui_server] 的 host/port。
+    Load all ComfyUI backends (host and port).
+    Returns only the host/port of [comfyui_server] when backends is not configured.
     
     返回:
-        tuple: (host, port)
+        list: [(host, port), ...]
     
     Returns:
-        tuple: (host, port)
+        list: [(host, port), ...]
     """
-    config = _get_config_parser()
-    host = config.get('comfyui_server', 'host', fallback='127.0.0.1')
-    port = config.get('comfyui_server', 'port', fallback='8188')
-    return host, port
+    server = get_settings().comfyui_server
+    return list(server.backends) or [(server.host, server.port)]
 
 def load_config():
     """
-    加载ComfyUI服务器URL
-    Load ComfyUI server URL
+    加载ComfyUI服务器URL（多后端时为第一个后端）
+    Load ComfyUI server URL (the first backend when several are configured)
     
     返回:
         str: ComfyUI服务器完整URL
@@ -48,9 +46,61 @@ def load_config():
     Returns:
         str: Complete ComfyUI server URL
     """
-    host, port = load_comfyui_server_info()
+    host, port = load_comfyui_backends()[0]
     return f"http://{host}:{port}"
 
+def load_scheduler_config():
+    """
+    加载多后端调度配置
+    Load multi-backend scheduling configuration
+
+    返回:
+        dict: 调度配置
+
+    Returns:
+        dict: Scheduling configuration
+    """
+    return asdict(get_settings().scheduler)
+
+def load_completion_config():
+    """
+    加载任务完成跟踪配置
+    Load job completion tracking configuration
+
+    返回:
+        dict: 完成跟踪配置
+
+    Returns:
+        dict: Completion tracking configuration
+    """
+    return asdict(get_settings().completion)
+
+def load_http_client_config():
+    """
+    加载共享HTTP客户端（连接池）配置
+    Load shared HTTP client (connection pool) configuration
+
+    返回:
+        dict: HTTP客户端配置
+
+    Returns:
+        dict: HTTP client configuration
+    """
+    return asdict(get_settings().http_client)
+
+def load_batching_config():
+    """
+    加载文生图微批处理配置
+    Load txt2img micro-batching configuration
+
+    返回:
+        dict: 微批处理配置
+
+    Returns:
+        dict: Micro-batching configuration
+    """
+    return asdict(get_settings().batching)
+
 def load_uvicorn_config():
     """
     加载MCP服务器配置
@@ -62,11 +112,8 @@ def load_uvicorn_config():
     Returns:
         tuple: (host, port, transport)
     """
-    config = _get_config_parser()
-    uvicorn_host = config.get('mcp_server', 'host', fallback='0.0.0.0')
-    uvicorn_port = config.getint('mcp_server', 'port', fallback=9000)
-    transport = config.get('mcp_server', 'transport', fallback='sse')
-    return uvicorn_host, uvicorn_port, transport
+    server = get_settings().mcp_server
+    return server.host, server.port, server.transport
 
 def load_logging_config():
     """
@@ -79,59 +126,117 @@ def load_logging_config():
     Returns:
         dict logging configuration
     """
-    config = _get_config_parser()
-    
-    # 获取日志级别
-    # Get log level
-    level_str = config.get('logging', 'level', fallback='INFO').upper()
-    level_map = {
-        'DEBUG': logging.DEBUG,
-        'INFO': logging.INFO,
-        'WARNING': logging.WARNING,
-        'ERROR': logging.ERROR,
-        'CRITICAL': logging.CRITICAL
-    }
-    level = level_map.get(level_str, logging.INFO)
-    
-    # 获取控制台输出设置
-    # Get console output setting
-    console_output = config.getboolean('logging', 'console_output', fallback=True)
-    
-    # 获取日志文件路径
-    # Get log file path
-    log_path = config.get('logging', 'log_path', fallback='logs/mcp_server.log')
+    return asdict(get_settings().logging)
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """
+    原子写入文件：先写入同目录的临时文件，成功后再替换目标文件，读取方不会看到写了一半的文件
+    Write a file atomically: write a temporary file in the same directory and replace the target only
+    on success, so readers never see a half-written file
+
+    参数:
+        path: 目标文件路径
+        mode: 'w'（文本，UTF-8）或 'wb'（二进制）
+
+    Args:
+        path: Target file path
+        mode: 'w' (text, UTF-8) or 'wb' (binary)
+    """
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_json_atomic(path, data, indent=2):
+    """
+    原子写入JSON文件
+    Write a JSON file atomically
+
+    参数:
+        path: 目标文件路径
+        data: 可JSON序列化的数据
+        indent: 缩进，None表示紧凑格式
+
+    Args:
+        path: Target file path
+        data: JSON-serializable data
+        indent: Indentation, None for the compact form
+    """
+    with atomic_write(path) as f:
+        if indent is None:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+
+def get_object_info_path(host, port):
+    """
+    获取指定ComfyUI后端的节点描述缓存文件路径
+    Get the node description cache file path of the given ComfyUI backend
     
-    # 如果路径是相对路径，则转换为绝对路径
-    # If path is relative, convert to absolute path
-    if not os.path.isabs(log_path):
-        log_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), log_path)
+    参数:
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
     
-    # 获取日志文件大小限制
-    # Get log file size limit
-    max_file_size = config.getint('logging', 'max_file_size', fallback=10*1024*1024)  # 默认10MB
+    Args:
+        host: ComfyUI server host
+        port: ComfyUI server port
     
-    # 获取备份文件数量
-    # Get backup count
-    backup_count = config.getint('logging', 'backup_count', fallback=5)
+    返回:
+        str: 缓存文件路径
     
-    return {
-        'level': level,
-        'console_output': console_output,
-        'log_path': log_path,
-        'max_file_size': max_file_size,
-        'backup_count': backup_count
-    }
+    Returns:
+        str: Cache file path
+    """
+    object_info_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'object_info')
+    return os.path.join(object_info_dir, f"{host}_{port}_object_info.json")
+
+def get_object_info_class_dir(host, port):
+    """
+    获取按需模式下指定ComfyUI后端按节点类型缓存的目录
+    Get the directory of the per-class node description cache (lazy mode) of the given ComfyUI backend
+
+    参数:
+        host: ComfyUI服务器主机
+        port: ComfyUI服务器端口
+
+    Args:
+        host: ComfyUI server host
+        port: ComfyUI server port
 
-async def fetch_and_save_object_info(logger=None):
+    返回:
+        str: 缓存目录路径
+
+    Returns:
+        str: Cache directory path
+    """
+    object_info_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'object_info')
+    return os.path.join(object_info_dir, f"{host}_{port}_classes")
+
+async def fetch_and_save_object_info(logger=None, host=None, port=None):
     """
     从ComfyUI服务器获取节点描述信息并保存到本地
     Fetch node description information from ComfyUI server and save it locally
     
     参数:
         logger: 日志记录器，如果为None则不记录日志
+        host: ComfyUI服务器主机，为None时使用第一个后端
+        port: ComfyUI服务器端口，为None时使用第一个后端
         
     Args:
         logger: Logger, if None, no logs will be recorded
+        host: ComfyUI server host, the first backend when None
+        port: ComfyUI server port, the first backend when None
     
     返回:
         bool: 是否成功获取并保存
@@ -142,16 +247,14 @@ async def fetch_and_save_object_info(logger=None):
     try:
         # 获取ComfyUI服务器信息
         # Get ComfyUI server information
-        host, port = load_comfyui_server_info()
+        if host is None or port is None:
+            host, port = load_comfyui_backends()[0]
         comfyui_url = f"http://{host}:{port}"
         
-        # 构建目标文件名
-        # Build target filename
-        object_info_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'object_info')
-        os.makedirs(object_info_dir, exist_ok=True)
-        
-        object_info_filename = f"{host}_{port}_object_info.json"
-        object_info_path = os.path.join(object_info_dir, object_info_filename)
+        # 构建目标文件名（每个后端独立缓存）
+        # Build target filename (each backend has its own cache)
+        object_info_path = get_object_info_path(host, port)
+        os.makedirs(os.path.dirname(object_info_path), exist_ok=True)
         
         # 检查文件是否已存在
         # Check if the file already exists
@@ -166,41 +269,50 @@ async def fetch_and_save_object_info(logger=None):
         if logger:
             logger.info(f"正在从ComfyUI服务器获取节点描述信息: {object_info_url}")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(object_info_url, timeout=30.0)
-            
-            if response.status_code != 200:
-                if logger:
-                    logger.error(f"获取ComfyUI节点描述信息失败，状态码: {response.status_code}")
-                return False
-            
-            object_info = response.json()
-            
-            # 保存到文件
-            # Save to file
-            with open(object_info_path, 'w', encoding='utf-8') as f:
-                json.dump(object_info, f, ensure_ascii=False, indent=2)
-            
+        # 复用进程级共享HTTP客户端
+        # Reuse the process-wide shared HTTP client
+        from .http_client import client_manager
+        client = client_manager.get_client()
+        response = await client.get(object_info_url, timeout=30.0)
+        
+        if response.status_code != 200:
             if logger:
-                logger.info(f"已成功获取并保存ComfyUI节点描述信息: {object_info_path}")
-            
-            return True
+                logger.error(f"获取ComfyUI节点描述信息失败，状态码: {response.status_code}")
+            return False
+        
+        object_info = response.json()
+        
+        # 原子写入紧凑JSON和可内存映射的打包文件，避免读取方看到写了一半的文件
+        # Atomically write the compact JSON and the memory-mappable pack so readers never see a half-written file
+        from .object_info import get_object_info_pack_path, write_object_info_pack
+        write_json_atomic(object_info_path, object_info, indent=None)
+        write_object_info_pack(get_object_info_pack_path(object_info_path), object_info)
+        
+        if logger:
+            logger.info(f"已成功获取并保存ComfyUI节点描述信息: {object_info_path}")
+        
+        return True
     
     except Exception as e:
         if logger:
             logger.error(f"获取ComfyUI节点描述信息时出错: {str(e)}")
         return False
 
-def load_object_info(logger=None):
+def load_object_info(logger=None, host=None, port=None):
     """
-    加载ComfyUI节点描述信息
-    Load ComfyUI node description information
+    加载ComfyUI节点描述信息（来自进程级存储，只在文件变化时重新解析；返回的字典为共享数据，不得修改）
+    Load ComfyUI node description information (from the process-wide store, only re-parsed when the
+    file changes; the returned dict is shared and must not be modified)
     
     参数:
         logger: 日志记录器，如果为None则不记录日志
+        host: ComfyUI服务器主机，为None时使用第一个后端
+        port: ComfyUI服务器端口，为None时使用第一个后端
     
     Args:
         logger: Logger, if None, no logs will be recorded
+        host: ComfyUI server host, the first backend when None
+        port: ComfyUI server port, the first backend when None
     
     返回:
         dict: 节点描述信息，如果加载失败则返回空字典
@@ -208,55 +320,14 @@ def load_object_info(logger=None):
     Returns:
         dict: Node description information, empty dict if loading fails
     """
+    from .object_info import get_object_info
     try:
-        # 获取ComfyUI服务器信息
-        # Get ComfyUI server information
-        host, port = load_comfyui_server_info()
-        
-        # 构建目标文件名
-        # Build target filename
-        object_info_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'object_info')
-        object_info_filename = f"{host}_{port}_object_info.json"
-        object_info_path = os.path.join(object_info_dir, object_info_filename)
-        
-        # 检查文件是否存在
-        # Check if the file exists
-        if not os.path.exists(object_info_path):
-            if logger:
-                logger.warning(f"ComfyUI节点描述文件不存在: {object_info_path}")
-            return {}
-        
-        # 加载节点描述信息
-        # Load node description information
-        with open(object_info_path, 'r', encoding='utf-8') as f:
-            object_info = json.load(f)
-        
-        if logger:
-            logger.debug(f"已加载ComfyUI节点描述信息: {object_info_path}")
-        
-        return object_info
-    
+        return get_object_info(host, port).data
     except Exception as e:
         if logger:
             logger.error(f"加载ComfyUI节点描述信息时出错: {str(e)}")
         return {}
 
-def load_prompt_template(api_name):
-    # 加载指定API的prompt模板（JSON格式）
-    # Load the prompt template (JSON) for the specified API
-    with open(os.path.join(os.path.dirname(__file__), 'tools', f'{api_name}_api.json'), 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def randomize_all_seeds(prompt_template):
-    # 遍历所有节点，递归随机化所有seed字段
-    # Traverse all nodes and recursively randomize all seed fields
-    for node in prompt_template.values():
-        inputs = node.get("inputs", {})
-        if "seed" in inputs:
-            # 生成15位随机数
-            # Generate a 15-digit random number
-            inputs["seed"] = random.randint(10**14, 10**15 - 1)
-
 async def init_mcp(logger=None):
     """
     初始化 MCP 服务环境，包括创建必要的目录结构和获取 ComfyUI 节点描述信息
@@ -299,14 +370,29 @@ async def init_mcp(logger=None):
         if logger:
             logger.info("正在检查ComfyUI节点描述信息...")
         
-        success = await fetch_and_save_object_info(logger)
-        
-        if success:
-            if logger:
-                logger.info("ComfyUI节点描述信息获取成功")
-        else:
-            if logger:
-                logger.warning("无法获取ComfyUI节点描述信息，服务将继续启动")
+        # 按需模式只获取工作流模板引用的节点类型，不等待完整的节点描述下载
+        # Lazy mode only fetches the node classes referenced by the workflow templates instead of waiting for the full dump
+        if get_settings().object_info.lazy:
+            from .object_info import get_node_class_cache
+            from .templates import template_class_types
+            class_types = template_class_types()
+            for host, port in load_comfyui_backends():
+                snapshot = await get_node_class_cache(host, port).ensure(class_types)
+                if logger:
+                    logger.info(f"按需模式：已准备 {len(snapshot.data)}/{len(class_types)} 个模板节点类型的描述信息（{host}:{port}）")
+            return True
+
+        # 每个后端分别缓存节点描述信息
+        # Cache node description information for each backend separately
+        for host, port in load_comfyui_backends():
+            success = await fetch_and_save_object_info(logger, host, port)
+            
+            if success:
+                if logger:
+                    logger.info(f"ComfyUI节点描述信息获取成功: {host}:{port}")
+            else:
+                if logger:
+                    logger.warning(f"无法获取ComfyUI节点描述信息（{host}:{port}），服务将继续启动")
         
         return True
     
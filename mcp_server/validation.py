@@ -0,0 +1,218 @@
+import math
+from difflib import get_close_matches
+from .logger import default_logger
+from .object_info import COMBO_TYPE, get_node_source, input_choices, input_type, node_input_spec
+from .settings import get_settings
+from .templates import get_template
+
+
+class ValidationError(ValueError):
+    """
+    工具参数未通过预校验，任务未提交到ComfyUI
+    A tool argument failed pre-validation, nothing was submitted to ComfyUI
+    """
+
+    def __init__(self, message: str, slot: str = None, suggestions=()):
+        super().__init__(message)
+        self.slot = slot
+        self.suggestions = list(suggestions)
+
+
+class InputRule:
+    """
+    由节点输入定义编译出的单个槽位校验规则
+    Validation rule of one slot compiled from a node input spec
+    """
+
+    __slots__ = ("slot", "class_type", "input_name", "kind", "minimum", "maximum", "choices", "choice_set")
+
+    def __init__(self, slot: str, class_type: str, input_name: str, spec):
+        self.slot = slot
+        self.class_type = class_type
+        self.input_name = input_name
+        self.kind = input_type(spec)
+        options = spec[1] if isinstance(spec, list) and len(spec) > 1 and isinstance(spec[1], dict) else {}
+        self.minimum = options.get("min")
+        self.maximum = options.get("max")
+        self.choices = tuple(input_choices(spec)) if self.kind == COMBO_TYPE else ()
+        self.choice_set = frozenset(self.choices)
+
+    def check(self, value, name: str):
+        """
+        校验并转换参数值
+        Validate and convert an argument value
+
+        参数:
+            value: 参数值
+            name: 报错时使用的参数名
+
+        Args:
+            value: Argument value
+            name: Argument name used in error messages
+
+        返回:
+            转换后的值（INT/FLOAT 转为数值）
+
+        Returns:
+            The converted value (INT/FLOAT become numbers)
+
+        Raises:
+            ValidationError: 参数值无效 | the value is invalid
+        """
+        if self.kind == COMBO_TYPE:
+            if value in self.choice_set or not self.choices:
+                return value
+            suggestions = get_close_matches(str(value), self.choices, n=3, cutoff=0.5)
+            lowered = str(value).lower()
+            suggestions = [choice for choice in self.choices if str(choice).lower() == lowered] + \
+                [choice for choice in suggestions if str(choice).lower() != lowered]
+            hint = f"，是否为: {', '.join(map(str, suggestions))} | did you mean: {', '.join(map(str, suggestions))}" if suggestions else ""
+            raise ValidationError(
+                f"参数 {name} 的值 {value!r} 不在可选项中 | {name}: {value!r} is not one of the available options{hint}",
+                self.slot, suggestions)
+        if self.kind in ("INT", "FLOAT"):
+            converted = self._number(value, name)
+            if self.minimum is not None and converted < self.minimum:
+                raise ValidationError(f"参数 {name} 的值 {value!r} 小于最小值 {self.minimum} | {name}: {value!r} is below the minimum {self.minimum}", self.slot)
+            if self.maximum is not None and converted > self.maximum:
+                raise ValidationError(f"参数 {name} 的值 {value!r} 大于最大值 {self.maximum} | {name}: {value!r} is above the maximum {self.maximum}", self.slot)
+            return converted
+        if self.kind == "STRING" and not isinstance(value, str):
+            raise ValidationError(f"参数 {name} 必须是字符串 | {name} must be a string", self.slot)
+        return value
+
+    def _number(self, value, name: str):
+        try:
+            if isinstance(value, bool):
+                raise ValueError(value)
+            number = float(value.strip()) if isinstance(value, str) else float(value)
+            if not math.isfinite(number):
+                raise ValueError(value)
+        except (TypeError, ValueError):
+            raise ValidationError(f"参数 {name} 的值 {value!r} 不是有效的数字 | {name}: {value!r} is not a valid number", self.slot) from None
+        if self.kind == "INT":
+            if not number.is_integer():
+                raise ValidationError(f"参数 {name} 的值 {value!r} 必须是整数 | {name}: {value!r} must be an integer", self.slot)
+            return int(number)
+        return number
+
+
+class WorkflowValidator:
+    """
+    由工作流模板和节点描述一次编译得到的参数校验器：每个槽位对应其所在节点输入的类型、范围和可选项
+    Argument validator compiled once from a workflow template and the node descriptions: each slot maps
+    to the type, range and options of the node input it fills
+    """
+
+    def __init__(self, template, get_node, version=None):
+        """
+        参数:
+            template: WorkflowTemplate
+            get_node: get(class_type) -> 节点描述或None
+            version: 节点描述的版本标识
+
+        Args:
+            template: WorkflowTemplate
+            get_node: get(class_type) -> node description or None
+            version: Version marker of the node descriptions
+        """
+        self.api_name = template.api_name
+        self.version = version
+        self.template_mtime_ns = template.mtime_ns
+        self.rules = {}
+        nodes = {}
+        for slot, target in template.slots.items():
+            if slot == 'seeds':
+                # 固定的seed按第一个seed输入校验
+                # A pinned seed is checked against the first seed input
+                if not target:
+                    continue
+                slot, target = 'seed', target[0]
+            node_id, input_name = target
+            class_type = template.workflow[node_id].get("class_type")
+            if class_type not in nodes:
+                nodes[class_type] = get_node(class_type)
+            spec = node_input_spec(nodes[class_type], input_name)
+            if spec is not None:
+                self.rules[slot] = InputRule(slot, class_type, input_name, spec)
+
+    def validate(self, values: dict, aliases: dict = None) -> dict:
+        """
+        校验一次请求的参数
+        Validate the arguments of one request
+
+        参数:
+            values: {槽位名: 值}
+            aliases: {槽位名: 工具参数名}，用于报错信息
+
+        Args:
+            values: {slot name: value}
+            aliases: {slot name: tool argument name}, used in error messages
+
+        返回:
+            dict: 转换后的 {槽位名: 值}
+
+        Returns:
+            dict: Converted {slot name: value}
+
+        Raises:
+            ValidationError: 参数无效 | an argument is invalid
+        """
+        aliases = aliases or {}
+        settings = get_settings().validation
+        checked = {}
+        for slot, value in values.items():
+            name = aliases.get(slot, slot)
+            rule = self.rules.get(slot)
+            checked[slot] = rule.check(value, name) if rule is not None else value
+        try:
+            batch_size = int(checked['batch_size'])
+        except (KeyError, TypeError, ValueError):
+            batch_size = None
+        if batch_size is not None and batch_size > settings.max_batch_size:
+            raise ValidationError(
+                f"参数 {aliases.get('batch_size', 'batch_size')} 的值 {batch_size} 超过允许的最大批次数 {settings.max_batch_size} | "
+                f"{aliases.get('batch_size', 'batch_size')}: {batch_size} exceeds the maximum batch size {settings.max_batch_size}",
+                'batch_size')
+        return checked
+
+
+_validators = {}
+
+
+async def validate_arguments(api_name: str, values: dict, aliases: dict = None) -> dict:
+    """
+    按工作流模板和节点描述校验工具参数；校验器只在模板或节点描述变化时重新编译，关闭预校验时原样返回
+    Validate tool arguments against a workflow template and the node descriptions; the validator is
+    only recompiled when the template or the node descriptions change, and the values are returned
+    unchanged when pre-validation is disabled
+
+    参数:
+        api_name: API名称，如 txt2img
+        values: {槽位名: 值}
+        aliases: {槽位名: 工具参数名}，用于报错信息
+
+    Args:
+        api_name: API name, e.g. txt2img
+        values: {slot name: value}
+        aliases: {slot name: tool argument name}, used in error messages
+
+    返回:
+        dict: 转换后的 {槽位名: 值}
+
+    Returns:
+        dict: Converted {slot name: value}
+
+    Raises:
+        ValidationError: 参数无效 | an argument is invalid
+    """
+    if not get_settings().validation.enabled:
+        return values
+    template = get_template(api_name)
+    class_types = sorted({node.get("class_type") for node in template.workflow.values() if isinstance(node, dict)} - {None})
+    version, get_node = await get_node_source(class_types)
+    validator = _validators.get(api_name)
+    if validator is None or validator.version is not version or validator.template_mtime_ns != template.mtime_ns:
+        validator = _validators[api_name] = WorkflowValidator(template, get_node, version)
+        default_logger.debug(f"参数校验器已编译: {api_name}，校验槽位 {', '.join(validator.rules) or '无'}")
+    return validator.validate(values, aliases)
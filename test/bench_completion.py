@@ -0,0 +1,60 @@
+"""
+完成跟踪基准测试：对比WebSocket事件驱动与3秒轮询的完成延迟
+Completion tracking benchmark: completion latency of WebSocket events versus 3-second polling
+
+用法 | Usage:
+    python test/bench_completion.py [任务数 | jobs] [单任务执行时间 | exec_time]
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+import httpx
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.completion import CompletionTracker
+from test.fake_comfyui import FakeComfyUI
+
+
+async def _run(jobs, exec_time, use_websocket):
+    comfyui = await FakeComfyUI(exec_time=exec_time).start()
+    tracker = CompletionTracker(comfyui.url, use_websocket=use_websocket, poll_interval=3.0)
+    latencies = []
+    try:
+        await tracker.ensure_started()
+        async with httpx.AsyncClient() as client:
+            async def one():
+                resp = await client.post(f"{comfyui.url}/api/prompt", json={
+                    "client_id": tracker.client_id,
+                    "prompt": {"9": {"class_type": "SaveImage", "inputs": {}}}
+                })
+                prompt_id = resp.json()["prompt_id"]
+                submitted_at = time.monotonic()
+                await tracker.wait_for(prompt_id, client, submitted_at)
+                latencies.append(time.monotonic() - submitted_at)
+
+            await asyncio.gather(*(one() for _ in range(jobs)))
+        counts = comfyui.request_counts
+        return latencies, tracker.stats(), counts.get("history", 0) + counts.get("history_item", 0) + counts.get("queue", 0)
+    finally:
+        await tracker.close()
+        await comfyui.stop()
+
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    exec_time = float(sys.argv[2]) if len(sys.argv) > 2 else 0.4
+
+    for label, use_websocket in (("轮询 | polling", False), ("WebSocket", True)):
+        latencies, stats, history_requests = asyncio.run(_run(jobs, exec_time, use_websocket))
+        print(f"[{label}] 任务数 {jobs}, 平均完成延迟 {statistics.mean(latencies):.3f}s, "
+              f"最大 {max(latencies):.3f}s, history/queue请求数 {history_requests}, "
+              f"统计的节省延迟 {stats['saved_seconds']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+共享HTTP客户端基准测试：对比每次调用新建 httpx.AsyncClient 与进程级连接池的连接建立开销
+Shared HTTP client benchmark: connection setup cost of a new httpx.AsyncClient per call
+versus the process-wide connection pool
+
+用法 | Usage:
+    python test/bench_http_client.py [并发调用数 | concurrent calls] [轮次 | rounds]
+"""
+import os
+import sys
+import time
+import asyncio
+
+import httpx
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.http_client import ComfyUIClientManager
+from test.fake_comfyui import FakeComfyUIProcess
+
+# 每次工具调用：一次提交加若干次history查询
+# Each tool call: one submission plus a few history requests
+HISTORY_REQUESTS_PER_CALL = 3
+
+
+class ConnectStats:
+    """通过httpx trace扩展统计TCP连接建立次数与耗时 | Count TCP connects and their duration via the httpx trace extension"""
+
+    def __init__(self):
+        self.connects = 0
+        self.connect_seconds = 0.0
+
+    def tracer(self):
+        started = []
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                started.append(time.perf_counter())
+            elif event_name == "connection.connect_tcp.complete" and started:
+                self.connects += 1
+                self.connect_seconds += time.perf_counter() - started.pop()
+
+        return trace
+
+
+async def _tool_call(client, url, stats):
+    resp = await client.post(f"{url}/api/prompt", json={"client_id": "bench", "prompt": {}},
+                             extensions={"trace": stats.tracer()})
+    prompt_id = resp.json()["prompt_id"]
+    for _ in range(HISTORY_REQUESTS_PER_CALL):
+        await client.get(f"{url}/api/history/{prompt_id}", extensions={"trace": stats.tracer()})
+
+
+async def _per_call_clients(url, calls, stats):
+    async def one():
+        async with httpx.AsyncClient() as client:
+            await _tool_call(client, url, stats)
+    await asyncio.gather(*(one() for _ in range(calls)))
+
+
+async def _shared_client(url, calls, stats, manager):
+    client = manager.get_client()
+    await asyncio.gather(*(_tool_call(client, url, stats) for _ in range(calls)))
+
+
+async def _run(url, calls, rounds):
+    manager = ComfyUIClientManager()
+    results = {}
+    try:
+        for label, runner in (("每次新建客户端 | client per call", lambda s: _per_call_clients(url, calls, s)),
+                              ("共享连接池 | shared pool", lambda s: _shared_client(url, calls, s, manager))):
+            stats = ConnectStats()
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await runner(stats)
+            results[label] = (time.perf_counter() - start, stats)
+    finally:
+        await manager.aclose()
+    return results
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with FakeComfyUIProcess() as comfyui:
+        results = asyncio.run(_run(comfyui.url, calls, rounds))
+    for label, (elapsed, stats) in results.items():
+        print(f"[{label}] {calls} 并发调用 x {rounds} 轮, 总耗时 {elapsed:.3f}s, "
+              f"TCP连接数 {stats.connects}, 连接建立总耗时 {stats.connect_seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
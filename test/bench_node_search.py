@@ -0,0 +1,61 @@
+"""
+节点搜索基准测试：对比线性扫描全部节点描述与倒排索引的查询延迟，以及索引的全量建立和增量更新耗时
+Node search benchmark: query latency of a linear scan over all node descriptions versus the inverted
+index, plus the time to build the index and to update it incrementally
+
+用法 | Usage:
+    python test/bench_node_search.py [自定义节点数 | custom nodes] [查询次数 | queries]
+"""
+import os
+import sys
+import json
+import time
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.node_search import NodeSearchIndex
+from mcp_server.object_info import ObjectInfoSnapshot
+from test.fake_comfyui import make_object_info
+
+QUERIES = ["upscale model", "lora", "custom node 1234", "mode", "ksamplr", "strength mask"]
+
+
+def _scan(object_info, query):
+    # 原方式：客户端拉取 info://all 后逐个节点做子串匹配
+    # Previous approach: the client pulls info://all and substring-matches every node
+    words = query.lower().split()
+    return [class_type for class_type, node in object_info.items()
+            if all(word in json.dumps(node).lower() or word in class_type.lower() for word in words)]
+
+
+def main():
+    node_count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    object_info = make_object_info(node_count=node_count)
+
+    start = time.perf_counter()
+    for i in range(queries):
+        _scan(object_info, QUERIES[i % len(QUERIES)])
+    print(f"[线性扫描 | linear scan] 每次查询 {(time.perf_counter() - start) / queries * 1000:.2f}ms")
+
+    index = NodeSearchIndex()
+    start = time.perf_counter()
+    index.sync(ObjectInfoSnapshot(object_info))
+    print(f"[索引建立 | index build] {(time.perf_counter() - start) * 1000:.1f}ms, {node_count} 个自定义节点")
+
+    start = time.perf_counter()
+    for i in range(queries):
+        index.search(QUERIES[i % len(QUERIES)])
+    print(f"[倒排索引 | inverted index] 每次查询 {(time.perf_counter() - start) / queries * 1000:.3f}ms")
+
+    updated = dict(object_info)
+    updated["UpscaleModelLoader"] = {"input": {}, "output": [], "display_name": "Load Upscale Model", "category": "loaders"}
+    del updated["CustomNode00000"]
+    start = time.perf_counter()
+    index.sync(ObjectInfoSnapshot(updated))
+    print(f"[增量更新 | incremental update] {(time.perf_counter() - start) * 1000:.1f}ms（含差异计算 | including the diff）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+节点描述存储基准测试：对比每次资源读取都重新解析object_info文件与进程级已索引存储的延迟和内存，
+以及内存映射打包文件的冷启动和单节点查找开销随节点数量的变化
+Node description store benchmark: latency and memory of re-parsing the object_info file on every
+resource read versus the process-wide indexed store, and how the cold-start and single-node lookup
+costs of the memory-mapped pack file scale with the number of nodes
+
+用法 | Usage:
+    python test/bench_object_info.py [自定义节点数 | custom nodes] [读取次数 | reads]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.object_info import ObjectInfoPack, ObjectInfoStore, write_object_info_pack
+from test.fake_comfyui import make_object_info
+
+
+def _reparse_ckpt(path):
+    # 原实现：每次读取 info://ckpt 都完整解析文件
+    # Previous behaviour: every info://ckpt read parses the whole file
+    with open(path, 'r', encoding='utf-8') as f:
+        object_info = json.load(f)
+    return object_info["CheckpointLoaderSimple"]["input"]["required"]["ckpt_name"][0]
+
+
+def _reparse_all(path):
+    # 原实现：info://all 解析文件后再序列化为JSON
+    # Previous behaviour: info://all parses the file and serializes it back to JSON
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.dumps(json.load(f), ensure_ascii=False, indent=2)
+
+
+def _measure(label, func, reads):
+    start = time.perf_counter()
+    for _ in range(reads):
+        func()
+    elapsed = time.perf_counter() - start
+    # tracemalloc会显著拖慢执行，单独测一次内存峰值
+    # tracemalloc slows execution down considerably, measure the memory peak in a separate call
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"[{label}] 每次读取 {elapsed / reads * 1000:.3f}ms, 峰值内存 {peak / 1024 / 1024:.1f}MB")
+
+
+def _bench_pack(object_info_dir, reads):
+    for node_count in (300, 3000, 30000):
+        object_info = make_object_info(node_count=node_count)
+        json_path = os.path.join(object_info_dir, f'{node_count}.json')
+        pack_path = os.path.join(object_info_dir, f'{node_count}.pack')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(object_info, f, ensure_ascii=False, separators=(',', ':'))
+        write_object_info_pack(pack_path, object_info)
+        del object_info
+
+        start = time.perf_counter()
+        with open(json_path, 'r', encoding='utf-8') as f:
+            json.load(f)["KSampler"]
+        json_cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pack = ObjectInfoPack(pack_path)
+        pack.get("KSampler")
+        pack_cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(reads):
+            pack.get("CheckpointLoaderSimple")
+        lookup = (time.perf_counter() - start) / reads
+        pack.close()
+        print(f"[打包文件 | pack] {node_count} 个节点: JSON冷启动 {json_cold * 1000:.1f}ms, 打包文件冷启动 {pack_cold * 1000:.3f}ms, "
+              f"单节点查找 {lookup * 1000000:.1f}us, 文件 {os.path.getsize(pack_path) / 1024 / 1024:.1f}MB")
+
+
+def main():
+    node_count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        path = os.path.join(object_info_dir, '127.0.0.1_8188_object_info.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_object_info(node_count=node_count), f, ensure_ascii=False, indent=2)
+        print(f"object_info 文件大小 {os.path.getsize(path) / 1024 / 1024:.1f}MB, {node_count} 个自定义节点, {reads} 次读取")
+
+        _measure("重新解析 info://ckpt | re-parse info://ckpt", lambda: _reparse_ckpt(path), reads)
+        _measure("重新解析 info://all | re-parse info://all", lambda: _reparse_all(path), reads)
+
+        start = time.perf_counter()
+        ObjectInfoStore(path).get().to_json()
+        load_seconds = time.perf_counter() - start
+        store = ObjectInfoStore(path)
+        tracemalloc.start()
+        store.get().to_json()
+        resident, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"[存储首次加载 | store first load] {load_seconds * 1000:.1f}ms, 常驻内存（含索引和JSON文本）{resident / 1024 / 1024:.1f}MB")
+
+        _measure("存储 info://ckpt | store info://ckpt",
+                 lambda: store.get().choices("CheckpointLoaderSimple", "ckpt_name"), reads)
+        _measure("存储 info://all | store info://all", lambda: store.get().to_json(), reads)
+
+        _bench_pack(object_info_dir, reads)
+
+
+if __name__ == "__main__":
+    main()
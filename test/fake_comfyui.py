@@ -0,0 +1,360 @@
+"""
+本地模拟ComfyUI服务器，用于测试和基准测试
+Local fake ComfyUI server for tests and benchmarks
+"""
+import asyncio
+import socket
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+
+def make_object_info(node_count: int = 20, checkpoints=("sd_xl_base_1.0.safetensors", "v1-5-pruned.safetensors")) -> dict:
+    """
+    生成 /api/object_info 格式的节点描述：内置的几个常用节点加上 node_count 个合成的自定义节点
+    Build node descriptions in /api/object_info format: a few common built-in nodes plus node_count
+    synthetic custom nodes
+    """
+    object_info = {
+        "CheckpointLoaderSimple": {
+            "input": {"required": {"ckpt_name": [list(checkpoints), {"tooltip": "The name of the checkpoint (model) to load."}]}},
+            "output": ["MODEL", "CLIP", "VAE"], "output_name": ["MODEL", "CLIP", "VAE"],
+            "name": "CheckpointLoaderSimple", "display_name": "Load Checkpoint", "category": "loaders",
+            "description": "Loads a diffusion model checkpoint.", "output_node": False
+        },
+        "KSampler": {
+            "input": {"required": {
+                "model": ["MODEL", {}], "seed": ["INT", {"default": 0, "min": 0, "max": 2**64 - 1}],
+                "steps": ["INT", {"default": 20, "min": 1, "max": 10000}],
+                "cfg": ["FLOAT", {"default": 8.0, "min": 0.0, "max": 100.0}],
+                "sampler_name": [["euler", "euler_ancestral", "dpmpp_2m"], {}],
+                "scheduler": [["normal", "karras"], {}],
+                "positive": ["CONDITIONING", {}], "negative": ["CONDITIONING", {}],
+                "latent_image": ["LATENT", {}], "denoise": ["FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0}]
+            }},
+            "output": ["LATENT"], "output_name": ["LATENT"], "name": "KSampler", "display_name": "KSampler",
+            "category": "sampling", "description": "Denoises a latent image.", "output_node": False
+        },
+        "EmptyLatentImage": {
+            "input": {"required": {"width": ["INT", {"default": 512, "min": 16, "max": 16384, "step": 8}],
+                                   "height": ["INT", {"default": 512, "min": 16, "max": 16384, "step": 8}],
+                                   "batch_size": ["INT", {"default": 1, "min": 1, "max": 4096}]}},
+            "output": ["LATENT"], "output_name": ["LATENT"], "name": "EmptyLatentImage",
+            "display_name": "Empty Latent Image", "category": "latent", "description": "", "output_node": False
+        },
+        "CLIPTextEncode": {
+            "input": {"required": {"text": ["STRING", {"multiline": True}], "clip": ["CLIP", {}]}},
+            "output": ["CONDITIONING"], "output_name": ["CONDITIONING"], "name": "CLIPTextEncode",
+            "display_name": "CLIP Text Encode (Prompt)", "category": "conditioning", "description": "", "output_node": False
+        },
+        "VAEDecode": {
+            "input": {"required": {"samples": ["LATENT", {}], "vae": ["VAE", {}]}},
+            "output": ["IMAGE"], "output_name": ["IMAGE"], "name": "VAEDecode", "display_name": "VAE Decode",
+            "category": "latent", "description": "", "output_node": False
+        },
+        "SaveImage": {
+            "input": {"required": {"images": ["IMAGE", {}], "filename_prefix": ["STRING", {"default": "ComfyUI"}]}},
+            "output": [], "output_name": [], "name": "SaveImage", "display_name": "Save Image",
+            "category": "image", "description": "Saves the input images.", "output_node": True
+        },
+    }
+    for i in range(node_count):
+        object_info[f"CustomNode{i:05}"] = {
+            "input": {
+                "required": {
+                    "image": ["IMAGE", {}],
+                    "mode": [[f"mode_{j}" for j in range(20)], {"default": "mode_0", "tooltip": "Processing mode " * 4}],
+                    "strength": ["FLOAT", {"default": 1.0, "min": 0.0, "max": 10.0, "step": 0.01}],
+                },
+                "optional": {"mask": ["MASK", {}], "label": ["STRING", {"default": f"custom {i}", "multiline": False}]}
+            },
+            "input_order": {"required": ["image", "mode", "strength"], "optional": ["mask", "label"]},
+            "output": ["IMAGE", "MASK"], "output_is_list": [False, False], "output_name": ["IMAGE", "MASK"],
+            "name": f"CustomNode{i:05}", "display_name": f"Custom Node {i}", "category": f"custom/pack_{i % 40}",
+            "description": f"Synthetic custom node number {i} used for tests and benchmarks. " * 3,
+            "python_module": f"custom_nodes.pack_{i % 40}", "output_node": False
+        }
+    return object_info
+
+
+class FakeComfyUI:
+    """
+    模拟ComfyUI的 /api/prompt、/api/history、/api/queue、/api/interrupt、/api/object_info 和 /ws 接口，按顺序执行任务
+    Fakes ComfyUI's /api/prompt, /api/history, /api/queue, /api/interrupt, /api/object_info and /ws endpoints
+    and executes jobs in order
+    """
+
+    def __init__(self, exec_time: float = 0.2, websocket: bool = True):
+        self.exec_time = exec_time
+        self.websocket = websocket
+        self.history = {}
+        self.pending = []
+        self.running = None
+        self.sockets = {}
+        self.request_counts = {}
+        self.image_counter = 0
+        self.object_info = make_object_info()
+        self.port = None
+        self._server = None
+        self._serve_task = None
+        self._worker_task = None
+        self._wakeup = None
+        self._interrupt = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _count(self, name):
+        self.request_counts[name] = self.request_counts.get(name, 0) + 1
+
+    async def _post_prompt(self, request):
+        self._count("prompt")
+        body = await request.json()
+        prompt_id = str(uuid.uuid4())
+        item = (prompt_id, body.get("prompt", {}), body.get("client_id"))
+        # 与ComfyUI一致：front=true 的任务插到等待队列最前面 | like ComfyUI: front=true puts the job at the head of the pending queue
+        if body.get("front"):
+            self.pending.insert(0, item)
+        else:
+            self.pending.append(item)
+        self._wakeup.set()
+        return JSONResponse({"prompt_id": prompt_id, "number": len(self.history) + len(self.pending), "node_errors": {}})
+
+    async def _get_history_item(self, request):
+        self._count("history_item")
+        prompt_id = request.path_params["prompt_id"]
+        if prompt_id in self.history:
+            return JSONResponse({prompt_id: self.history[prompt_id]})
+        return JSONResponse({})
+
+    async def _get_history(self, request):
+        self._count("history")
+        items = list(self.history.items())
+        max_items = request.query_params.get("max_items")
+        if max_items:
+            items = items[-int(max_items):]
+        return JSONResponse(dict(items))
+
+    async def _get_queue(self, request):
+        self._count("queue")
+        running = [[0, self.running[0], self.running[1], {}, []]] if self.running else []
+        pending = [[i + 1, pid, prompt, {}, []] for i, (pid, prompt, _) in enumerate(self.pending)]
+        return JSONResponse({"queue_running": running, "queue_pending": pending})
+
+    async def _post_queue(self, request):
+        self._count("queue_delete")
+        body = await request.json()
+        if body.get("clear"):
+            self.pending.clear()
+        delete = set(body.get("delete", []))
+        self.pending = [item for item in self.pending if item[0] not in delete]
+        return JSONResponse({})
+
+    async def _post_interrupt(self, request):
+        self._count("interrupt")
+        body = await request.json() if await request.body() else {}
+        prompt_id = body.get("prompt_id")
+        if self.running and (prompt_id is None or prompt_id == self.running[0]):
+            self._interrupt.set()
+        return JSONResponse({})
+
+    async def _get_object_info(self, request):
+        self._count("object_info")
+        return JSONResponse(self.object_info)
+
+    async def _get_node_info(self, request):
+        self._count("object_info_class")
+        node_class = request.path_params["node_class"]
+        if node_class in self.object_info:
+            return JSONResponse({node_class: self.object_info[node_class]})
+        return JSONResponse({})
+
+    async def _websocket(self, websocket):
+        if not self.websocket:
+            await websocket.close(code=1008)
+            return
+        client_id = websocket.query_params.get("clientId") or str(uuid.uuid4())
+        await websocket.accept()
+        self.sockets[client_id] = websocket
+        await websocket.send_json({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": len(self.pending)}}, "sid": client_id}})
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if self.sockets.get(client_id) is websocket:
+                del self.sockets[client_id]
+
+    async def _send(self, client_id, msg_type, data):
+        websocket = self.sockets.get(client_id)
+        if websocket is None:
+            return
+        try:
+            await websocket.send_json({"type": msg_type, "data": data})
+        except Exception:
+            pass
+
+    def _batch_size_for(self, prompt, node_id):
+        # 沿输入链向上查找EmptyLatentImage的batch_size
+        # Walk up the input links to find the batch_size of the EmptyLatentImage
+        seen, stack = set(), [node_id]
+        while stack:
+            current = stack.pop()
+            if current in seen or current not in prompt:
+                continue
+            seen.add(current)
+            node = prompt[current]
+            if node.get("class_type") == "EmptyLatentImage":
+                return int(node.get("inputs", {}).get("batch_size", 1))
+            for value in node.get("inputs", {}).values():
+                if isinstance(value, list) and len(value) == 2 and isinstance(value[0], str):
+                    stack.append(value[0])
+        return 1
+
+    def _outputs_for(self, prompt):
+        outputs = {}
+        for node_id, node in prompt.items():
+            if node.get("class_type") != "SaveImage":
+                continue
+            images = []
+            for _ in range(self._batch_size_for(prompt, node_id)):
+                self.image_counter += 1
+                images.append({"filename": f"ComfyUI_{self.image_counter:05}_.png", "subfolder": "", "type": "output"})
+            outputs[node_id] = {"images": images}
+        return outputs
+
+    async def _worker(self):
+        while True:
+            while not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            prompt_id, prompt, client_id = self.pending.pop(0)
+            self.running = (prompt_id, prompt)
+            await self._send(client_id, "execution_start", {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)})
+            for node_id in prompt:
+                await self._send(client_id, "executing", {"node": node_id, "display_node": node_id, "prompt_id": prompt_id})
+            self._interrupt.clear()
+            try:
+                await asyncio.wait_for(self._interrupt.wait(), self.exec_time)
+                interrupted = True
+            except asyncio.TimeoutError:
+                interrupted = False
+            failing = next((node_id for node_id, node in prompt.items() if node.get("class_type") == "FakeError"), None)
+            if interrupted or failing:
+                # 与ComfyUI一致：失败或中断的任务以status_str=error写入history
+                # Like ComfyUI: failed or interrupted jobs are stored in the history with status_str=error
+                if interrupted:
+                    event, data = "execution_interrupted", {"prompt_id": prompt_id, "node_id": None}
+                else:
+                    event, data = "execution_error", {"prompt_id": prompt_id, "node_id": failing, "node_type": "FakeError",
+                                                      "exception_message": "fake failure"}
+                await self._send(client_id, event, data)
+                self.history[prompt_id] = {
+                    "prompt": [0, prompt_id, prompt, {}, []],
+                    "outputs": {},
+                    "status": {"status_str": "error", "completed": False, "messages": [[event, data]]},
+                }
+            else:
+                await self._send(client_id, "execution_success", {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)})
+                self.history[prompt_id] = {
+                    "prompt": [0, prompt_id, prompt, {}, []],
+                    "outputs": self._outputs_for(prompt),
+                    "status": {"status_str": "success", "completed": True, "messages": []},
+                }
+            self.running = None
+            await self._send(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+
+    async def drop_websockets(self) -> None:
+        """断开所有WebSocket连接 | Disconnect all WebSocket clients"""
+        for websocket in list(self.sockets.values()):
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+        self.sockets.clear()
+
+    async def start(self) -> "FakeComfyUI":
+        app = Starlette(routes=[
+            Route("/api/prompt", self._post_prompt, methods=["POST"]),
+            Route("/api/history", self._get_history, methods=["GET"]),
+            Route("/api/history/{prompt_id}", self._get_history_item, methods=["GET"]),
+            Route("/api/queue", self._get_queue, methods=["GET"]),
+            Route("/api/queue", self._post_queue, methods=["POST"]),
+            Route("/api/interrupt", self._post_interrupt, methods=["POST"]),
+            Route("/api/object_info", self._get_object_info, methods=["GET"]),
+            Route("/api/object_info/{node_class}", self._get_node_info, methods=["GET"]),
+            WebSocketRoute("/ws", self._websocket),
+        ])
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        config = uvicorn.Config(app, log_level="error", lifespan="off", timeout_graceful_shutdown=1)
+        self._server = uvicorn.Server(config)
+        self._serve_task = asyncio.create_task(self._server.serve(sockets=[sock]))
+        self._wakeup = asyncio.Event()
+        self._interrupt = asyncio.Event()
+        self._worker_task = asyncio.create_task(self._worker())
+        # 服务器启动失败时抛出异常而不是一直等待 | a server that fails to start raises instead of being waited for forever
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if self._serve_task.done() or time.monotonic() > deadline:
+                await self.stop()
+                raise RuntimeError("模拟ComfyUI启动失败 | Fake ComfyUI failed to start")
+            await asyncio.sleep(0.01)
+        return self
+
+    async def stop(self) -> None:
+        self._worker_task.cancel()
+        await asyncio.gather(self._worker_task, return_exceptions=True)
+        # 先断开WebSocket，优雅关闭不必等待客户端 | drop the WebSockets first so the graceful shutdown does not wait for clients
+        await self.drop_websockets()
+        self._server.should_exit = True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._serve_task), 5)
+        except asyncio.TimeoutError:
+            self._server.force_exit = True
+            await asyncio.gather(self._serve_task, return_exceptions=True)
+
+
+def _serve_forever(exec_time, port_queue):
+    async def run():
+        comfyui = await FakeComfyUI(exec_time=exec_time).start()
+        port_queue.put(comfyui.port)
+        await comfyui._serve_task
+
+    asyncio.run(run())
+
+
+class FakeComfyUIProcess:
+    """
+    在独立进程中运行模拟ComfyUI，避免基准测试中客户端与服务器争用同一事件循环
+    Runs the fake ComfyUI in a separate process so that benchmarks do not share the client's event loop
+    """
+
+    def __init__(self, exec_time: float = 0.0):
+        self.exec_time = exec_time
+        self.port = None
+        self._process = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "FakeComfyUIProcess":
+        import multiprocessing
+        port_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve_forever, args=(self.exec_time, port_queue), daemon=True)
+        self._process.start()
+        self.port = port_queue.get(timeout=30)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import asyncio
+import dataclasses
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import admission, backends
+from mcp_server.admission import AdmissionRejected, get_admission_controller
+from mcp_server.backends import BackendPool
+from mcp_server.completion import close_completion_trackers
+from mcp_server.executor import run_prompt
+from mcp_server.http_client import client_manager
+from mcp_server.jobs import COMPLETED, JobManager
+from mcp_server.settings import settings_manager
+from test.fake_comfyui import FakeComfyUI
+
+SAVE_IMAGE_PROMPT = {"9": {"class_type": "SaveImage", "inputs": {}}}
+
+
+async def _with_fake(exec_time, scenario, **limits):
+    comfyui = await FakeComfyUI(exec_time=exec_time).start()
+    previous_pool, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)], queue_refresh_interval=0.2)
+    previous_settings = settings_manager.current
+    settings_manager._settings = dataclasses.replace(
+        previous_settings, admission=dataclasses.replace(previous_settings.admission, **limits))
+    admission._controller = None
+    try:
+        await scenario(comfyui)
+    finally:
+        settings_manager._settings = previous_settings
+        admission._controller = None
+        backends._pool = previous_pool
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+async def _concurrency_limit(comfyui):
+    results = await asyncio.gather(*(run_prompt(SAVE_IMAGE_PROMPT, timeout=10) for _ in range(3)),
+                                   return_exceptions=True)
+    rejected = [result for result in results if isinstance(result, AdmissionRejected)]
+    # 一个执行、一个等待、等待队列已满时第三个立即被拒绝 | one runs, one waits, the third is rejected since the wait queue is full
+    assert len(rejected) == 1 and rejected[0].retry_after >= 1, results
+    assert "retry after" in str(rejected[0])
+    assert comfyui.request_counts["prompt"] == 2
+    stats = get_admission_controller().stats()
+    assert stats['admitted'] == 2 and stats['rejected'] == 1 and stats['active'] == 0
+
+
+def test_concurrency_limit():
+    asyncio.run(_with_fake(0.3, _concurrency_limit, max_concurrent=1, max_queue_depth=0, max_waiting=1, max_wait=5))
+
+
+async def _queue_depth_limit(comfyui):
+    client = client_manager.get_client()
+    for _ in range(3):
+        await client.post(f"{comfyui.url}/api/prompt", json={"client_id": "other", "prompt": SAVE_IMAGE_PROMPT})
+
+    # 其他客户端的任务已使队列超过上限，等待超时后被拒绝 | other clients' jobs push the queue past the ceiling, the wait times out
+    start = time.monotonic()
+    try:
+        await run_prompt(SAVE_IMAGE_PROMPT, timeout=10)
+        raise AssertionError("expected AdmissionRejected")
+    except AdmissionRejected:
+        pass
+    assert 0.2 <= time.monotonic() - start < 1.0
+    assert comfyui.request_counts["prompt"] == 3
+
+    # 队列排空后按上限陆续准入 | calls are admitted one after another within the ceiling once the queue drains
+    settings = settings_manager.current
+    settings_manager._settings = dataclasses.replace(settings, admission=dataclasses.replace(settings.admission, max_wait=10))
+    depths = []
+
+    async def sample():
+        while True:
+            depths.append(len(comfyui.pending) + (1 if comfyui.running else 0))
+            await asyncio.sleep(0.02)
+
+    sampler = asyncio.create_task(sample())
+    queue_requests = comfyui.request_counts["queue"]
+    start = time.monotonic()
+    try:
+        await asyncio.gather(*(run_prompt(SAVE_IMAGE_PROMPT, timeout=10) for _ in range(6)))
+    finally:
+        sampler.cancel()
+    elapsed = time.monotonic() - start
+    drained = depths[next(i for i, depth in enumerate(depths) if depth <= 2):]
+    assert max(drained) <= 2, depths
+    # 所有等待者共用刷新间隔内的同一个队列快照 | every waiter shares one queue snapshot per refresh interval
+    assert comfyui.request_counts["queue"] - queue_requests <= elapsed / 0.2 + 2, comfyui.request_counts
+
+
+def test_queue_depth_limit():
+    asyncio.run(_with_fake(0.15, _queue_depth_limit, max_concurrent=0, max_queue_depth=2, max_waiting=10, max_wait=0.3))
+
+
+async def _background_jobs_wait(comfyui):
+    manager = JobManager(journal_factory=lambda: None)
+
+    async def _render():
+        await run_prompt(SAVE_IMAGE_PROMPT, timeout=10)
+        return "done"
+
+    manager.register_runner("render", _render)
+    jobs = [manager.submit("render") for _ in range(4)]
+    # 后台任务超过等待上限和等待队列长度时仍然等待，而不是被拒绝 | background jobs keep waiting past the wait limits instead of being rejected
+    for job in jobs:
+        assert (await manager.wait(job.id, 10)).status == COMPLETED, job.error
+    assert comfyui.request_counts["prompt"] == 4
+    assert get_admission_controller().stats()['rejected'] == 0
+
+
+def test_background_jobs_wait():
+    asyncio.run(_with_fake(0.15, _background_jobs_wait, max_concurrent=1, max_queue_depth=0, max_waiting=1, max_wait=0.2))
+
+
+async def _deadline_after_admission(comfyui):
+    # 第二个调用等待约0.3秒后准入，执行时间仍有完整的0.5秒 | the second call is admitted after about 0.3s and still gets the full 0.5s to run
+    results = await asyncio.gather(*(run_prompt(SAVE_IMAGE_PROMPT, timeout=0.5) for _ in range(2)))
+    assert all(images for _, images in results)
+
+
+def test_deadline_after_admission():
+    asyncio.run(_with_fake(0.3, _deadline_after_admission, max_concurrent=1, max_queue_depth=0, max_waiting=10, max_wait=5))
+
+
+def main():
+    test_concurrency_limit()
+    test_queue_depth_limit()
+    test_background_jobs_wait()
+    test_deadline_after_admission()
+    print("所有准入控制测试通过")
+
+
+if __name__ == "__main__":
+    main()
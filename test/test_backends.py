@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import backends
+from mcp_server.affinity import CheckpointAffinityRouter
+from mcp_server.backends import BackendPool
+from mcp_server.completion import close_completion_trackers
+from mcp_server.executor import run_prompt
+from mcp_server.http_client import client_manager
+from test.fake_comfyui import FakeComfyUI
+
+SAVE_IMAGE_PROMPT = {"9": {"class_type": "SaveImage", "inputs": {}}}
+
+
+def _unused_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _fill_queue(comfyui, jobs):
+    client = client_manager.get_client()
+    for _ in range(jobs):
+        await client.post(f"{comfyui.url}/api/prompt", json={"client_id": "other", "prompt": SAVE_IMAGE_PROMPT})
+
+
+async def _queue_depth_selection():
+    busy = await FakeComfyUI(exec_time=1.0).start()
+    idle = await FakeComfyUI(exec_time=0.05).start()
+    pool = BackendPool([("127.0.0.1", busy.port), ("127.0.0.1", idle.port)], queue_refresh_interval=0.1)
+    previous, backends._pool = backends._pool, pool
+    try:
+        await _fill_queue(busy, 3)
+        await pool.refresh()
+        assert pool.get(busy.url).queue_depth == 3
+        assert pool.select().url == idle.url
+
+        # 任务和图片URL固定在执行任务的后端上
+        # The job and its image URLs stay pinned to the backend that ran it
+        comfyui_host, images = await run_prompt(SAVE_IMAGE_PROMPT)
+        assert comfyui_host == idle.url
+        assert len(images) == 1
+        assert len(idle.history) == 1
+        assert pool.get(idle.url).inflight == 0
+    finally:
+        backends._pool = previous
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await busy.stop()
+        await idle.stop()
+
+
+async def _unreachable_backend():
+    alive = await FakeComfyUI(exec_time=0.05).start()
+    dead_port = _unused_port()
+    pool = BackendPool([("127.0.0.1", dead_port), ("127.0.0.1", alive.port)], queue_refresh_interval=0.1)
+    previous, backends._pool = backends._pool, pool
+    try:
+        await pool.refresh()
+        dead = pool.get(f"http://127.0.0.1:{dead_port}")
+        assert not dead.healthy
+        assert pool.select().url == alive.url
+
+        # 刷新失败也记录尝试时间，退避期间不再探测，退避时间随连续失败次数增长
+        # A failed refresh records the attempt too, the backend is not probed during the back-off, and
+        # the back-off grows with consecutive failures
+        assert dead.refresh_due > time.monotonic()
+        await pool.refresh()
+        assert dead.failures == 1
+        dead.refresh_due = 0.0
+        await pool.refresh()
+        assert dead.failures == 2 and dead.refresh_due - time.monotonic() > 0.15
+
+        # 即使不健康的后端被选中，提交失败后也会切换到其他后端
+        # Even if the unhealthy backend is picked, a failed submission moves to another backend
+        dead.healthy = True
+        dead.queue_pending = -1
+        comfyui_host, _ = await run_prompt(SAVE_IMAGE_PROMPT)
+        assert comfyui_host == alive.url
+        assert not dead.healthy
+    finally:
+        backends._pool = previous
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await alive.stop()
+
+
+async def _affinity_bootstrap():
+    comfyui = await FakeComfyUI(exec_time=0.01).start()
+    pool = BackendPool([("127.0.0.1", comfyui.port), ("127.0.0.1", _unused_port())])
+    router = CheckpointAffinityRouter(pool)
+    try:
+        client = client_manager.get_client()
+        await client.post(f"{comfyui.url}/api/prompt", json={"client_id": "other", "prompt": {
+            "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "v1-5-pruned.safetensors"}}
+        }})
+        while not comfyui.history:
+            await asyncio.sleep(0.01)
+        await router.bootstrap()
+        assert pool.get(comfyui.url).last_checkpoint == "v1-5-pruned.safetensors"
+    finally:
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+def test_checkpoint_affinity():
+    pool = BackendPool([("10.0.0.1", 8188), ("10.0.0.2", 8188), ("10.0.0.3", 8188)])
+    router = CheckpointAffinityRouter(pool, max_imbalance=2)
+    first, second, third = pool.backends
+    second.last_checkpoint = "sd_xl_base_1.0.safetensors"
+    second.queue_pending = 2
+
+    # 亲和后端负载在允许范围内：命中
+    # Warm backend within the allowed imbalance: hit
+    assert router.select("sd_xl_base_1.0.safetensors") is second
+    # 没有亲和后端：选择最空闲后端
+    # No warm backend: least-loaded backend
+    assert router.select("flux1-dev.safetensors") is first
+    # 亲和后端过载：放弃亲和
+    # Warm backend overloaded: affinity overridden
+    second.queue_pending = 5
+    assert router.select("sd_xl_base_1.0.safetensors") is first
+
+    # 在途任务决定下一个任务开始时已加载的checkpoint
+    # In-flight jobs decide which checkpoint is loaded when the next job starts
+    third.queued_checkpoint, third.inflight = "flux1-dev.safetensors", 1
+    assert router.select("flux1-dev.safetensors") is third
+
+    metrics = router.metrics()
+    assert metrics['requests'] == 4
+    assert metrics['hits'] == 2
+    assert metrics['cold_misses'] == 1
+    assert metrics['imbalance_overrides'] == 1
+    assert metrics['hit_rate'] == 0.5
+
+
+def test_affinity_bootstrap():
+    asyncio.run(_affinity_bootstrap())
+
+
+def test_queue_depth_selection():
+    asyncio.run(_queue_depth_selection())
+
+
+def test_unreachable_backend():
+    asyncio.run(_unreachable_backend())
+
+
+def main():
+    asyncio.run(_queue_depth_selection())
+    asyncio.run(_unreachable_backend())
+    test_checkpoint_affinity()
+    asyncio.run(_affinity_bootstrap())
+    print("所有多后端调度测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import asyncio
+import dataclasses
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import backends, batching
+from mcp_server.backends import BackendPool
+from mcp_server.batching import Txt2ImgBatcher, batch_key, build_batched_workflow, get_txt2img_batcher
+from mcp_server.completion import close_completion_trackers
+from mcp_server.http_client import client_manager
+from mcp_server.settings import settings_manager
+from mcp_server.templates import get_template
+from test.fake_comfyui import FakeComfyUI
+
+
+def _workflow(prompt, batch_size=1, seed=1, width=512):
+    return get_template('txt2img').instantiate(prompt=prompt, batch_size=str(batch_size), width=width, seed=seed)
+
+
+def test_batch_key():
+    # 只有正向提示词、seed和batch_size不同的工作流可以合并
+    # Only workflows differing in positive prompt, seed and batch_size can be coalesced
+    assert batch_key(_workflow("a cat", 1, 1)) == batch_key(_workflow("a dog", 2, 7))
+    assert batch_key(_workflow("a cat", width=512)) != batch_key(_workflow("a cat", width=768))
+    assert batch_key({"9": {"class_type": "SaveImage", "inputs": {}}}) is None
+
+
+def test_build_batched_workflow():
+    merged, branches = build_batched_workflow([
+        _workflow("a cat", 1), _workflow("a dog", 2), _workflow("a cat", 1)
+    ])
+    # 相同提示词共用一个分支并增大batch，不同提示词复制采样分支，共享checkpoint和负向提示词
+    # Same prompts share one branch with a larger batch; different prompts get a cloned sampler branch
+    # sharing the checkpoint loader and the negative prompt
+    assert merged["5"]["inputs"]["batch_size"] == 2
+    assert merged["5_b1"]["inputs"]["batch_size"] == 2
+    assert merged["6_b1"]["inputs"]["text"] == "a dog"
+    assert merged["3_b1"]["inputs"]["positive"] == ["6_b1", 0]
+    assert merged["3_b1"]["inputs"]["negative"] == ["7", 0]
+    assert merged["9_b1"]["inputs"]["images"] == ["8_b1", 0]
+    assert "4_b1" not in merged and "7_b1" not in merged
+    assert branches == [(["9"], [(0, 1), (2, 1)]), (["9_b1"], [(1, 2)])]
+
+
+async def _coalesce_concurrent_requests():
+    comfyui = await FakeComfyUI(exec_time=0.05).start()
+    pool = BackendPool([("127.0.0.1", comfyui.port)])
+    previous, backends._pool = backends._pool, pool
+    batcher = Txt2ImgBatcher(window=0.05, max_images=8)
+    try:
+        results = await asyncio.gather(
+            batcher.submit(_workflow("a cat", 1)),
+            batcher.submit(_workflow("a dog", 2)),
+            batcher.submit(_workflow("a cat", 1)),
+        )
+        assert comfyui.request_counts["prompt"] == 1
+        assert [len(images) for _, images in results] == [1, 2, 1]
+        filenames = [image["filename"] for _, images in results for image in images]
+        assert len(set(filenames)) == 4
+        assert batcher.stats() == {'requests': 3, 'prompts': 1, 'batched_requests': 3}
+    finally:
+        backends._pool = previous
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+def test_coalesce_concurrent_requests():
+    asyncio.run(_coalesce_concurrent_requests())
+
+
+async def _pinned_seeds_run_alone():
+    comfyui = await FakeComfyUI(exec_time=0.05).start()
+    previous_pool, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)])
+    previous_settings = settings_manager.current
+    settings_manager._settings = dataclasses.replace(
+        previous_settings, batching=dataclasses.replace(previous_settings.batching, enabled=True, window=0.05))
+    batching._batcher = None
+    try:
+        batcher = get_txt2img_batcher()
+        results = await asyncio.gather(
+            batcher.submit(_workflow("a cat", seed=1), pinned_seed=True),
+            batcher.submit(_workflow("a cat", seed=2), pinned_seed=True),
+            batcher.submit(_workflow("a dog", seed=3)),
+            batcher.submit(_workflow("a cow", seed=4)),
+        )
+        # 固定seed的请求各自单独执行，未固定seed的请求照常合并 | pinned-seed requests run alone, the others are still coalesced
+        assert comfyui.request_counts["prompt"] == 3
+        assert all(len(images) == 1 for _, images in results)
+        seeds = [sorted(node["inputs"]["seed"] for node in entry["prompt"][2].values() if "seed" in node["inputs"])
+                 for entry in comfyui.history.values()]
+        assert [1] in seeds and [2] in seeds and [3, 4] in seeds, seeds
+    finally:
+        settings_manager._settings = previous_settings
+        batching._batcher = None
+        backends._pool = previous_pool
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+def test_pinned_seeds_run_alone():
+    asyncio.run(_pinned_seeds_run_alone())
+
+
+async def _cancelled_batch_fails_callers():
+    comfyui = await FakeComfyUI(exec_time=5).start()
+    previous, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)])
+    try:
+        batcher = Txt2ImgBatcher(window=0.01, max_images=8)
+        callers = [asyncio.ensure_future(batcher.submit(_workflow(f"a cat {i}"))) for i in range(2)]
+        while not comfyui.request_counts.get("prompt"):
+            await asyncio.sleep(0.01)
+        # 模拟服务关闭时取消合并任务 | cancel the coalesced job as a shutdown would
+        for task in list(batcher._tasks):
+            task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 5)
+        assert all(isinstance(result, Exception) and "cancelled" in str(result) for result in results), results
+    finally:
+        backends._pool = previous
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+def test_cancelled_batch_fails_callers():
+    asyncio.run(_cancelled_batch_fails_callers())
+
+
+def main():
+    test_batch_key()
+    test_build_batched_workflow()
+    asyncio.run(_coalesce_concurrent_requests())
+    test_pinned_seeds_run_alone()
+    test_cancelled_batch_fails_callers()
+    print("所有微批处理测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import asyncio
+
+from mcp.server.fastmcp import FastMCP
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import backends
+from mcp_server.backends import BackendPool
+from mcp_server.completion import CompletionTracker, ComfyUIJobError, close_completion_trackers
+from mcp_server.executor import run_prompt
+from mcp_server.http_client import client_manager
+from mcp_server.tools.img2img import register_img2img_tool
+from mcp_server.tools.txt2img import DEFAULT_VALUES, register_txt2img_tool
+from test.fake_comfyui import FakeComfyUI
+
+SAVE_IMAGE_PROMPT = {"9": {"class_type": "SaveImage", "inputs": {}}}
+FAILING_PROMPT = {"1": {"class_type": "FakeError", "inputs": {}}, **SAVE_IMAGE_PROMPT}
+
+
+async def _with_fake(exec_time, scenario):
+    comfyui = await FakeComfyUI(exec_time=exec_time).start()
+    previous, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)])
+    try:
+        await scenario(comfyui)
+    finally:
+        backends._pool = previous
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+async def _execution_error(comfyui):
+    start = time.monotonic()
+    try:
+        await run_prompt(FAILING_PROMPT, timeout=10)
+        raise AssertionError("expected ComfyUIJobError")
+    except ComfyUIJobError as e:
+        assert "fake failure" in str(e)
+    assert time.monotonic() - start < 1.0
+
+
+async def _deadline_interrupts_running_job(comfyui):
+    try:
+        await run_prompt(SAVE_IMAGE_PROMPT, timeout=0.2)
+        raise AssertionError("expected TimeoutError")
+    except TimeoutError:
+        pass
+    assert comfyui.request_counts.get("interrupt") == 1
+    while not comfyui.history:
+        await asyncio.sleep(0.01)
+    assert list(comfyui.history.values())[0]["status"]["status_str"] == "error"
+
+
+async def _deadline_removes_pending_job(comfyui):
+    client = client_manager.get_client()
+    await client.post(f"{comfyui.url}/api/prompt", json={"client_id": "other", "prompt": SAVE_IMAGE_PROMPT})
+    try:
+        await run_prompt(SAVE_IMAGE_PROMPT, timeout=0.2)
+        raise AssertionError("expected TimeoutError")
+    except TimeoutError:
+        pass
+    # 排队中的任务被删除，正在执行的其他任务不受影响
+    # The queued job is deleted, the other running job is left alone
+    assert comfyui.pending == []
+    assert comfyui.running is not None
+    assert "interrupt" not in comfyui.request_counts
+
+
+async def _cancelled_call_interrupts_job(comfyui):
+    task = asyncio.ensure_future(run_prompt(SAVE_IMAGE_PROMPT, timeout=0))
+    while comfyui.running is None:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    while "interrupt" not in comfyui.request_counts:
+        await asyncio.sleep(0.01)
+
+
+async def _tool_deadline_keeps_timeout_error(comfyui):
+    mcp = FastMCP("test")
+    register_txt2img_tool(mcp)
+    register_img2img_tool(mcp)
+    txt2img = mcp._tool_manager.get_tool("txt2img").fn
+    img2img = mcp._tool_manager.get_tool("img2img").fn
+    calls = [
+        lambda: txt2img(prompt="a cat", pic_width=DEFAULT_VALUES["width"], pic_height=DEFAULT_VALUES["height"],
+                negative_prompt=DEFAULT_VALUES["negative_prompt"], batch_size="1", model=DEFAULT_VALUES["model"],
+                timeout=0.2),
+        lambda: img2img(prompt="a cat", timeout=0.2),
+    ]
+    # 工具层不把截止时间包装成普通异常，调用方仍可按TimeoutError处理
+    # The tools do not wrap a passed deadline into a plain Exception, callers can still handle TimeoutError
+    for call in calls:
+        try:
+            await call()
+            raise AssertionError("expected TimeoutError")
+        except TimeoutError:
+            pass
+
+
+async def _lost_job():
+    comfyui = await FakeComfyUI(exec_time=1.0, websocket=False).start()
+    tracker = CompletionTracker(comfyui.url, use_websocket=False, poll_interval=0.1)
+    try:
+        client = client_manager.get_client()
+        await client.post(f"{comfyui.url}/api/prompt", json={"client_id": "other", "prompt": SAVE_IMAGE_PROMPT})
+        resp = await client.post(f"{comfyui.url}/api/prompt", json={"client_id": tracker.client_id, "prompt": SAVE_IMAGE_PROMPT})
+        prompt_id = resp.json()["prompt_id"]
+        # 其他客户端清空了队列
+        # Another client cleared the queue
+        await client.post(f"{comfyui.url}/api/queue", json={"clear": True})
+        try:
+            await asyncio.wait_for(tracker.wait_for(prompt_id, client), 2.0)
+            raise AssertionError("expected ComfyUIJobError")
+        except ComfyUIJobError as e:
+            assert e.prompt_id == prompt_id
+    finally:
+        await tracker.close()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+def test_execution_error():
+    asyncio.run(_with_fake(0.05, _execution_error))
+
+
+def test_deadline_interrupts_running_job():
+    asyncio.run(_with_fake(2.0, _deadline_interrupts_running_job))
+
+
+def test_deadline_removes_pending_job():
+    asyncio.run(_with_fake(2.0, _deadline_removes_pending_job))
+
+
+def test_cancelled_call_interrupts_job():
+    asyncio.run(_with_fake(2.0, _cancelled_call_interrupts_job))
+
+
+def test_tool_deadline_keeps_timeout_error():
+    asyncio.run(_with_fake(2.0, _tool_deadline_keeps_timeout_error))
+
+
+def test_lost_job():
+    asyncio.run(_lost_job())
+
+
+def main():
+    test_execution_error()
+    test_deadline_interrupts_running_job()
+    test_deadline_removes_pending_job()
+    test_cancelled_call_interrupts_job()
+    test_tool_deadline_keeps_timeout_error()
+    test_lost_job()
+    print("所有任务截止时间与取消测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp.server.fastmcp import FastMCP
+from mcp_server import object_info as object_info_module
+from mcp_server.catalog import CatalogManager, ModelCatalog
+from mcp_server.object_info import ObjectInfoStore, write_object_info_pack
+from mcp_server.tools.resource_info import register_resource_info_tool
+from mcp_server.utils import load_comfyui_backends
+from test.fake_comfyui import make_object_info
+
+
+def _object_info(checkpoints=("sd_xl_base_1.0.safetensors", "v1-5-pruned.safetensors")):
+    object_info = make_object_info(node_count=5, checkpoints=checkpoints)
+    object_info["LoraLoader"] = {"input": {"required": {"lora_name": [["detail.safetensors", "style.safetensors"], {"tooltip": "The name of the LoRA."}]}}}
+    object_info["LoraLoaderModelOnly"] = {"input": {"required": {"lora_name": [["style.safetensors", "extra.safetensors"], {}]}}}
+    return object_info
+
+
+def test_build_catalog():
+    catalog = ModelCatalog(_object_info())
+    assert catalog.get("loras").choices == ("detail.safetensors", "style.safetensors", "extra.safetensors")
+    assert catalog.get("samplers").choices == ("euler", "euler_ancestral", "dpmpp_2m")
+    assert catalog.get("schedulers").choices == ("normal", "karras")
+    assert "1. sd_xl_base_1.0.safetensors" in catalog.get("checkpoints").markdown
+    assert "The name of the LoRA." in catalog.get("loras").markdown
+    # 没有来源节点的目录
+    # Catalogs without a source node
+    assert not catalog.get("vaes").found and catalog.get("vaes").choices == ()
+    index = {item["name"]: item["count"] for item in json.loads(catalog.index_json)}
+    assert index["loras"] == 3 and index["vaes"] == 0
+
+
+async def _manager_scenario(object_info_dir):
+    host, port = load_comfyui_backends()[0]
+    store = ObjectInfoStore(os.path.join(object_info_dir, f"{host}_{port}_object_info.json"))
+    write_object_info_pack(store.pack_path, _object_info())
+    previous = dict(object_info_module._stores)
+    object_info_module._stores[(host, str(port))] = store
+    try:
+        manager = CatalogManager()
+        catalog = await manager.get()
+        # 只从打包文件解码来源节点类型，不解析全部节点描述
+        # Only the source classes are decoded from the pack, all node descriptions are never parsed
+        assert store._snapshot is None
+        assert await manager.get() is catalog
+
+        write_object_info_pack(store.pack_path, _object_info(checkpoints=("new_model.safetensors",)))
+        os.utime(store.pack_path, ns=(os.stat(store.pack_path).st_atime_ns, catalog.version.mtime_ns + 1_000_000))
+        rebuilt = await manager.get()
+        assert rebuilt is not catalog
+        assert rebuilt.get("checkpoints").choices == ("new_model.safetensors",)
+
+        mcp = FastMCP("test")
+        register_resource_info_tool(mcp)
+        ckpt = (await mcp.read_resource("info://ckpt"))[0].content
+        assert "共找到 1 个模型" in ckpt and "new_model.safetensors" in ckpt
+        loras = (await mcp.read_resource("info://catalog/loras"))[0].content
+        assert "3. extra.safetensors" in loras
+        assert "Unknown catalog" in (await mcp.read_resource("info://catalog/missing"))[0].content
+    finally:
+        object_info_module._stores.clear()
+        object_info_module._stores.update(previous)
+        if store._pack is not None:
+            store._pack.close()
+
+
+def test_catalog_manager():
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        asyncio.run(_manager_scenario(object_info_dir))
+
+
+def main():
+    test_build_catalog()
+    test_catalog_manager()
+    print("所有模型目录测试通过")
+
+
+if __name__ == "__main__":
+    main()
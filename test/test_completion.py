@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import asyncio
+
+import httpx
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.completion import ComfyUIJobError, CompletionTracker
+from test.fake_comfyui import FakeComfyUI
+
+
+async def _submit(client, comfyui, tracker):
+    resp = await client.post(f"{comfyui.url}/api/prompt", json={
+        "client_id": tracker.client_id,
+        "prompt": {"9": {"class_type": "SaveImage", "inputs": {}}}
+    })
+    resp.raise_for_status()
+    return resp.json()["prompt_id"], time.monotonic()
+
+
+async def _websocket_completion():
+    comfyui = await FakeComfyUI(exec_time=0.3).start()
+    tracker = CompletionTracker(comfyui.url, poll_interval=3.0)
+    try:
+        await tracker.ensure_started()
+        assert tracker.connected
+        async with httpx.AsyncClient() as client:
+            prompt_id, submitted_at = await _submit(client, comfyui, tracker)
+            entry = await tracker.wait_for(prompt_id, client, submitted_at)
+            elapsed = time.monotonic() - submitted_at
+        assert entry["status"]["status_str"] == "success"
+        # 远早于3秒的轮询时刻完成
+        # Finishes well before the 3-second poll tick
+        assert elapsed < 1.5, elapsed
+        stats = tracker.stats()
+        assert stats['completed_via_websocket'] == 1
+        assert stats['completed_via_poll'] == 0
+        assert stats['saved_seconds'] > 1.5
+        return stats
+    finally:
+        await tracker.close()
+        await comfyui.stop()
+
+
+async def _polling_fallback():
+    comfyui = await FakeComfyUI(exec_time=0.2, websocket=False).start()
+    tracker = CompletionTracker(comfyui.url, poll_interval=0.1, reconnect_delay=0.1)
+    try:
+        await tracker.ensure_started(connect_timeout=0.5)
+        assert not tracker.connected
+        # 之后的提交不再等待连接，直接轮询 | later submissions do not wait for the connection, they poll at once
+        start = time.monotonic()
+        await tracker.ensure_started(connect_timeout=0.5)
+        assert time.monotonic() - start < 0.1
+        async with httpx.AsyncClient() as client:
+            prompt_id, submitted_at = await _submit(client, comfyui, tracker)
+            entry = await tracker.wait_for(prompt_id, client, submitted_at)
+        assert entry["status"]["completed"]
+        assert tracker.stats()['completed_via_poll'] == 1
+    finally:
+        await tracker.close()
+        await comfyui.stop()
+
+
+async def _socket_drop_during_job():
+    comfyui = await FakeComfyUI(exec_time=0.6).start()
+    tracker = CompletionTracker(comfyui.url, poll_interval=0.1, safety_poll_interval=30.0, reconnect_delay=30.0)
+    try:
+        await tracker.ensure_started()
+        async with httpx.AsyncClient() as client:
+            prompt_id, submitted_at = await _submit(client, comfyui, tracker)
+            waiter = asyncio.create_task(tracker.wait_for(prompt_id, client, submitted_at))
+            await asyncio.sleep(0.1)
+            await comfyui.drop_websockets()
+            entry = await asyncio.wait_for(waiter, 5)
+        assert entry["status"]["completed"]
+        assert not tracker.connected
+        assert tracker.stats()['completed_via_poll'] == 1
+    finally:
+        await tracker.close()
+        await comfyui.stop()
+
+
+async def _shared_poller():
+    comfyui = await FakeComfyUI(exec_time=0.05, websocket=False).start()
+    tracker = CompletionTracker(comfyui.url, poll_interval=0.2, reconnect_delay=30.0)
+    try:
+        await tracker.ensure_started(connect_timeout=0.5)
+        async with httpx.AsyncClient() as client:
+            submitted = [await _submit(client, comfyui, tracker) for _ in range(20)]
+            lost = "missing-prompt"
+            waiters = [tracker.wait_for(prompt_id, client, submitted_at) for prompt_id, submitted_at in submitted]
+            results = await asyncio.gather(*waiters, tracker.wait_for(lost, client), return_exceptions=True)
+        errors = [entry for entry in results[:-1] if isinstance(entry, BaseException)]
+        assert not errors, errors
+        assert all(entry["status"]["completed"] for entry in results[:-1])
+        # 不在队列也不在history中的任务失败 | a job neither queued nor in the history fails
+        assert isinstance(results[-1], ComfyUIJobError) and results[-1].prompt_id == lost
+        stats = tracker.stats()
+        assert stats['completed_via_poll'] == 20
+        # 所有任务共用一次批量查询，请求数与任务数无关 | all jobs share one bulk query per round,
+        # the request count does not depend on the number of jobs
+        polls = comfyui.request_counts["history"]
+        assert polls == stats['polls'] and polls < 20, comfyui.request_counts
+        assert comfyui.request_counts["queue"] <= polls
+        assert comfyui.request_counts.get("history_item", 0) <= polls
+        assert tracker._poll_task.done()
+    finally:
+        await tracker.close()
+        await comfyui.stop()
+
+
+def _run(scenario, timeout=30):
+    # 场景卡住时以超时失败，而不是挂住整个测试 | a stuck scenario fails with a timeout instead of hanging the suite
+    return asyncio.run(asyncio.wait_for(scenario(), timeout))
+
+
+def test_websocket_completion():
+    _run(_websocket_completion)
+
+
+def test_polling_fallback():
+    _run(_polling_fallback)
+
+
+def test_socket_drop_during_job():
+    _run(_socket_drop_during_job)
+
+
+def test_shared_poller():
+    _run(_shared_poller)
+
+
+def main():
+    print(f"WebSocket完成统计: {_run(_websocket_completion)}")
+    _run(_polling_fallback)
+    _run(_socket_drop_during_job)
+    _run(_shared_poller)
+    print("所有完成跟踪测试通过")
+
+
+if __name__ == "__main__":
+    main()
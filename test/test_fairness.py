@@ -0,0 +1,142 @@
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp.server.lowlevel.server import request_ctx
+from mcp_server.admission import AdmissionController, AdmissionRejected
+from mcp_server.fairness import LOCAL_CLIENT, FairQueue, RateLimiter, current_client, estimate_cost
+
+
+def _item(key, cost, name):
+    return SimpleNamespace(key=key, cost=cost, name=name)
+
+
+def _drain(queue):
+    served = []
+    while len(queue):
+        item = queue.peek()
+        queue.take(item)
+        served.append(item.name)
+    return served
+
+
+def test_fair_queue_shares_by_cost():
+    queue = FairQueue(quantum=1.0)
+    for i in range(3):
+        queue.push(_item("heavy", 4.0, f"h{i}"))
+    for i in range(4):
+        queue.push(_item("light", 1.0, f"l{i}"))
+    served = _drain(queue)
+    # 开销为4的请求每轮只能在积累4个额度后执行一次 | a cost-4 request runs once per four quanta
+    assert served.index("h1") > served.index("l3"), served
+    assert served.index("h0") < served.index("l3"), served
+
+    queue = FairQueue(quantum=1.0)
+    for name in ("a0", "a1", "a2"):
+        queue.push(_item("a", 1.0, name))
+    queue.push(_item("b", 1.0, "b0"))
+    # 开销相同时客户端轮流执行，同一客户端内保持顺序 | equal costs alternate, each client keeps its order
+    assert _drain(queue) == ["a0", "b0", "a1", "a2"]
+
+
+def test_fair_queue_remove():
+    queue = FairQueue()
+    first, second = _item("a", 1.0, "a0"), _item("b", 1.0, "b0")
+    queue.push(first)
+    queue.push(second)
+    queue.remove(first)
+    assert len(queue) == 1 and queue.peek() is second
+    queue.remove(first)
+    assert len(queue) == 1
+
+
+def test_estimate_cost():
+    txt2img = {"5": {"class_type": "EmptyLatentImage", "inputs": {"width": 1024, "height": 1024, "batch_size": 4}}}
+    assert estimate_cost(txt2img) == 16
+    img2img = {"10": {"class_type": "LoadImage", "inputs": {"image": "a.png"}}}
+    assert estimate_cost(img2img) == 1
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(rate=60, burst=2)
+    assert limiter.acquire("a") == 0 and limiter.acquire("a") == 0
+    assert 0.5 < limiter.acquire("a") <= 1.0
+    # 各客户端独立计数 | every client has its own bucket
+    assert limiter.acquire("b") == 0
+    assert RateLimiter(rate=0).acquire("a") == 0
+
+
+def test_current_client():
+    assert current_client() == LOCAL_CLIENT
+    session = object()
+    for headers, expected in (({"x-api-key": "secret"}, "key:"),
+                              ({"mcp-session-id": "abc"}, "session:abc"),
+                              ({}, f"session:{id(session):x}")):
+        token = request_ctx.set(SimpleNamespace(request=SimpleNamespace(headers=headers), session=session))
+        try:
+            assert current_client().startswith(expected)
+            assert "secret" not in current_client()
+        finally:
+            request_ctx.reset(token)
+
+
+async def _interleaving():
+    controller = AdmissionController(max_concurrent=1, max_queue_depth=0, max_wait=10)
+    finished = []
+
+    async def job(key, cost, name):
+        async with controller.admit(key, cost):
+            await asyncio.sleep(0.02)
+            finished.append(name)
+
+    tasks = [asyncio.create_task(job("batch-agent", 4.0, f"batch{i}")) for i in range(4)]
+    await asyncio.sleep(0.005)
+    tasks += [asyncio.create_task(job("interactive", 1.0, f"chat{i}")) for i in range(2)]
+    await asyncio.gather(*tasks)
+    # 交互式请求不必等待批量代理排在前面的全部任务 | interactive calls do not wait behind the whole batch backlog
+    assert finished.index("chat1") < finished.index("batch3"), finished
+
+    limited = AdmissionController(max_concurrent=0, max_queue_depth=0, rate_limit=60, rate_burst=1)
+    async with limited.admit("agent"):
+        pass
+    try:
+        async with limited.admit("agent"):
+            raise AssertionError("expected AdmissionRejected")
+    except AdmissionRejected as e:
+        assert e.retry_after == 1
+    async with limited.admit("other"):
+        pass
+
+    # 等待队列已满时拒绝调用，但不扣除令牌 | a full wait queue rejects the call without spending a token
+    full = AdmissionController(max_concurrent=1, max_queue_depth=0, max_waiting=0, rate_limit=60, rate_burst=1)
+    async with full.admit("holder"):
+        for _ in range(3):
+            try:
+                async with full.admit("agent"):
+                    raise AssertionError("expected AdmissionRejected")
+            except AdmissionRejected as e:
+                assert "wait queue full" in str(e)
+    async with full.admit("agent"):
+        pass
+
+
+def test_fair_admission():
+    asyncio.run(_interleaving())
+
+
+def main():
+    test_fair_queue_shares_by_cost()
+    test_fair_queue_remove()
+    test_estimate_cost()
+    test_rate_limiter()
+    test_current_client()
+    test_fair_admission()
+    print("所有公平调度测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import asyncio
+import threading
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.http_client import ComfyUIClientManager
+
+
+async def _get(manager):
+    return manager.get_client()
+
+
+def test_client_of_closed_loop_is_closed():
+    manager = ComfyUIClientManager()
+    first = asyncio.run(_get(manager))
+
+    async def scenario():
+        second = manager.get_client()
+        await asyncio.sleep(0)
+        assert first.is_closed and not second.is_closed
+        await manager.aclose()
+        return second
+
+    second = asyncio.run(scenario())
+    assert second.is_closed and not manager._stale_tasks
+
+
+def test_client_of_running_loop_is_closed_there():
+    manager = ComfyUIClientManager()
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    try:
+        first = asyncio.run_coroutine_threadsafe(_get(manager), other).result(5)
+
+        async def scenario():
+            manager.get_client()
+            await manager.aclose()
+
+        asyncio.run(scenario())
+        # 旧客户端在其自己的事件循环中关闭 | the old client is closed on its own loop
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.1), other).result(5)
+        assert first.is_closed
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join(5)
+        other.close()
+
+
+def main():
+    test_client_of_closed_loop_is_closed()
+    test_client_of_running_loop_is_closed_there()
+    print("所有HTTP客户端测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import asyncio
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp.server.fastmcp import FastMCP
+from mcp_server import backends
+from mcp_server.backends import BackendPool
+from mcp_server.completion import close_completion_trackers
+from mcp_server.fairness import LOCAL_CLIENT
+from mcp_server.executor import images_to_markdown, run_prompt
+from mcp_server.http_client import client_manager
+from mcp_server.jobs import CANCELLED, COMPLETED, FAILED, SUBMITTED, JobManager, job_manager
+from mcp_server.tools.jobs import register_jobs_tool
+from test.fake_comfyui import FakeComfyUI
+
+SAVE_IMAGE_PROMPT = {"9": {"class_type": "SaveImage", "inputs": {}}}
+
+
+def _no_journal():
+    return None
+
+
+async def _render(label: str = "") -> str:
+    comfyui_host, images = await run_prompt(SAVE_IMAGE_PROMPT, timeout=0)
+    return images_to_markdown(comfyui_host, images)
+
+
+async def _failing(label: str = "") -> str:
+    raise RuntimeError("render failed")
+
+
+async def _with_fake(scenario):
+    comfyui = await FakeComfyUI(exec_time=0.1).start()
+    previous, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)])
+    try:
+        await scenario(comfyui)
+    finally:
+        backends._pool = previous
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+async def _fan_out(comfyui):
+    manager = JobManager(journal_factory=_no_journal)
+    manager.register_runner("render", _render)
+    manager.register_runner("failing", _failing)
+    changes = []
+
+    async def _record(job):
+        changes.append((job.id, job.status))
+
+    manager.subscribe(_record)
+
+    jobs = [manager.submit("render", {"label": str(i)}) for i in range(3)]
+    # 提交立即返回，不等待生成 | submitting returns right away without waiting for the generation
+    assert all(job.status not in (COMPLETED, FAILED) for job in jobs)
+
+    for job in jobs:
+        finished = await manager.wait(job.id, 10)
+        assert finished.status == COMPLETED
+        assert "![image]" in finished.result
+        assert finished.prompt_id in comfyui.history
+        assert finished.backend == comfyui.url
+    await asyncio.sleep(0)
+    assert (jobs[0].id, SUBMITTED) in changes and (jobs[0].id, COMPLETED) in changes
+    assert len(manager.list_jobs(COMPLETED)) == 3
+
+    failed = await manager.wait(manager.submit("failing").id, 10)
+    assert failed.status == FAILED and "render failed" in failed.error
+
+    # 参数不匹配或工具未知时提交即失败 | mismatching arguments or unknown tools fail on submit
+    for api_name, arguments in (("render", {"unknown": 1}), ("missing", {})):
+        try:
+            manager.submit(api_name, arguments)
+            raise AssertionError("expected ValueError")
+        except ValueError:
+            pass
+
+
+def test_fan_out_and_collect():
+    asyncio.run(_with_fake(_fan_out))
+
+
+async def _cancel(comfyui):
+    manager = JobManager(journal_factory=_no_journal)
+    manager.register_runner("render", _render)
+    job = manager.submit("render")
+    while job.prompt_id is None:
+        await asyncio.sleep(0.01)
+    assert manager.cancel(job.id)
+    await manager.wait(job.id, 5)
+    assert job.status == CANCELLED
+    # ComfyUI上的任务随之被中断 | the ComfyUI job is interrupted along with it
+    while "interrupt" not in comfyui.request_counts:
+        await asyncio.sleep(0.01)
+    assert not manager.cancel(job.id)
+
+
+def test_cancel_job():
+    asyncio.run(_with_fake(_cancel))
+
+
+async def _resources_scenario():
+    mcp = FastMCP("test")
+    register_jobs_tool(mcp)
+    gate = asyncio.Event()
+
+    async def _slow(label: str = "") -> str:
+        await gate.wait()
+        return f"done {label}"
+
+    job_manager.register_runner("slow", _slow)
+    previous, job_manager.journal_factory = job_manager.journal_factory, _no_journal
+    job = job_manager.submit("slow", {"label": "a"}, owner=LOCAL_CLIENT)
+    other = job_manager.submit("slow", {"label": "b"}, owner="key:other")
+    try:
+        state = json.loads((await mcp.read_resource(f"job://{job.id}"))[0].content)
+        assert state["status"] == "pending" and state["tool"] == "slow"
+        listing = json.loads((await mcp.read_resource("job://list"))[0].content)
+        assert job.id in [item["job_id"] for item in listing]
+
+        # 其他客户端的任务既不列出也不能读取或取消 | other clients' jobs are neither listed nor readable or cancellable
+        assert other.id not in [item["job_id"] for item in listing]
+        assert "Unknown job" in (await mcp.read_resource(f"job://{other.id}"))[0].content
+        for tool, arguments in (("job_status", {}), ("job_result", {}), ("cancel_job", {})):
+            result = await mcp._tool_manager.get_tool(tool).fn(job_id=other.id, **arguments)
+            assert "Unknown job" in result, (tool, result)
+        assert not other.task.done()
+
+        gate.set()
+        await job_manager.wait(job.id, 5)
+        state = json.loads((await mcp.read_resource(f"job://{job.id}"))[0].content)
+        assert state["status"] == "completed" and state["result"] == "done a"
+        assert "Unknown job" in (await mcp.read_resource("job://missing"))[0].content
+    finally:
+        job_manager.journal_factory = previous
+        job_manager._runners.pop("slow", None)
+        job_manager._jobs.pop(job.id, None)
+        other.task.cancel()
+        job_manager._jobs.pop(other.id, None)
+
+
+def test_job_resources():
+    asyncio.run(_resources_scenario())
+
+
+def main():
+    test_fan_out_and_collect()
+    test_cancel_job()
+    test_job_resources()
+    print("所有后台任务测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import asyncio
+import sqlite3
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import backends, executor
+from mcp_server.backends import BackendPool
+from mcp_server.completion import close_completion_trackers
+from mcp_server.executor import images_to_markdown, run_prompt
+from mcp_server.http_client import client_manager
+from mcp_server.jobs import COMPLETED, FAILED, JobManager
+from mcp_server.journal import FINISHED_EVENT, PROMPT_EVENT, SUBMITTED_EVENT, JobJournal
+from test.fake_comfyui import FakeComfyUI
+
+SAVE_IMAGE_PROMPT = {"9": {"class_type": "SaveImage", "inputs": {}}}
+
+
+def test_journal_replay():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        journal = JobJournal(os.path.join(journal_dir, "jobs.sqlite"))
+        try:
+            journal.append("a", SUBMITTED_EVENT, tool="txt2img", arguments={"prompt": "a cat"}, created=1.0)
+            journal.append("b", SUBMITTED_EVENT, tool="img2img", arguments={}, created=2.0)
+            journal.append("a", PROMPT_EVENT, backend="http://127.0.0.1:8188", prompt_id="p1", client_id="c1")
+            journal.append("b", FINISHED_EVENT, status="failed", result=None, error="boom", finished=3.0)
+            # 未知任务的事件被忽略 | events of unknown jobs are ignored
+            journal.append("z", PROMPT_EVENT, backend="http://127.0.0.1:8188", prompt_id="p9", client_id="c1")
+
+            jobs = asyncio.run(journal.load())
+            assert list(jobs) == ["a", "b"]
+            assert jobs["a"]["status"] == "submitted" and jobs["a"]["prompt_id"] == "p1"
+            assert jobs["a"]["arguments"] == {"prompt": "a cat"}
+            assert jobs["b"]["status"] == "failed" and jobs["b"]["error"] == "boom"
+
+            # 遗忘只追加墓碑，加载时才压缩 | forgetting only appends a tombstone, loading compacts it away
+            journal.forget(["b"])
+            journal.close()
+            conn = sqlite3.connect(journal.path)
+            try:
+                assert conn.execute("SELECT COUNT(*) FROM events WHERE job_id = 'b'").fetchone()[0] == 3
+                assert list(asyncio.run(journal.load())) == ["a"]
+                assert conn.execute("SELECT COUNT(*) FROM events WHERE job_id = 'b'").fetchone()[0] == 0
+            finally:
+                conn.close()
+        finally:
+            journal.close()
+
+
+async def _render(label: str = "") -> str:
+    comfyui_host, images = await run_prompt(SAVE_IMAGE_PROMPT, timeout=0)
+    return images_to_markdown(comfyui_host, images)
+
+
+async def _echo(label: str = "") -> str:
+    return f"echo {label}"
+
+
+async def _restart_scenario(journal_path):
+    comfyui = await FakeComfyUI(exec_time=0.5).start()
+    previous, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)])
+    journal = JobJournal(journal_path)
+    gate = asyncio.Event()
+
+    async def _gated(label: str = "") -> str:
+        await gate.wait()
+        return f"gated {label}"
+
+    try:
+        before = JobManager(journal_factory=lambda: journal)
+        for name, runner in (("render", _render), ("echo", _echo), ("gated", _gated)):
+            before.register_runner(name, runner)
+        running = before.submit("render")
+        finished = before.submit("echo", {"label": "x"}, owner="key:agent")
+        unsubmitted = before.submit("gated", {"label": "y"})
+        while running.prompt_id is None:
+            await asyncio.sleep(0.01)
+        await before.wait(finished.id, 5)
+
+        # 关闭时保留ComfyUI上的任务 | the ComfyUI job is kept on shutdown
+        await before.close()
+        await close_completion_trackers()
+        assert "interrupt" not in comfyui.request_counts and "queue_delete" not in comfyui.request_counts
+        prompts = comfyui.request_counts["prompt"]
+
+        gate.set()
+        after = JobManager(journal_factory=lambda: journal)
+        for name, runner in (("render", _render), ("echo", _echo), ("gated", _gated)):
+            after.register_runner(name, runner)
+        start = time.monotonic()
+        assert await after.recover() == 2
+
+        restored = after.get(finished.id, "key:agent")
+        assert restored.status == COMPLETED and restored.result == "echo x"
+        # 提交任务的客户端随任务恢复 | the submitting client is recovered with the job
+        assert after.get(finished.id, "key:other") is None
+
+        resumed = await after.wait(running.id, 10)
+        assert resumed.status == COMPLETED and resumed.prompt_id == running.prompt_id
+        assert "![image]" in resumed.result
+        # 使用原来的client_id，执行事件直接送达，不依赖兜底轮询 | the original client_id gets the events, no safety poll needed
+        assert time.monotonic() - start < 5
+        # 重新关联而不是重新提交 | re-attached rather than resubmitted
+        assert comfyui.request_counts["prompt"] == prompts
+
+        rerun = await after.wait(unsubmitted.id, 5)
+        assert rerun.status == COMPLETED and rerun.result == "gated y"
+
+        # 结束状态写入日志，再次重启时不会重复恢复 | final states are journaled and not recovered again
+        again = JobManager(journal_factory=lambda: journal)
+        assert await again.recover() == 0
+        assert again.get(running.id).status == COMPLETED
+
+        lost = JobManager(journal_factory=lambda: journal)
+        journal.append("lost", SUBMITTED_EVENT, tool="render", arguments={}, created=time.time())
+        journal.append("lost", PROMPT_EVENT, backend=comfyui.url, prompt_id="missing", client_id=None)
+        assert await lost.recover() == 1
+        assert (await lost.wait("lost", 10)).status == FAILED
+    finally:
+        executor._detached = False
+        backends._pool = previous
+        journal.close()
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+def test_recover_after_restart():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        asyncio.run(_restart_scenario(os.path.join(journal_dir, "jobs.sqlite")))
+
+
+async def _unavailable_scenario(journal_path):
+    journal = JobJournal(journal_path)
+    try:
+        for job_id, tool in (("a", "removed_a"), ("b", "removed_b")):
+            journal.append(job_id, SUBMITTED_EVENT, tool=tool, arguments={}, created=time.time())
+        manager = JobManager(journal_factory=lambda: journal)
+        assert await manager.recover() == 2
+        # 每个任务报告自己的工具名 | each job reports its own tool
+        for job_id, tool in (("a", "removed_a"), ("b", "removed_b")):
+            job = await manager.wait(job_id, 5)
+            assert job.status == FAILED and tool in job.error, job.error
+    finally:
+        journal.close()
+
+
+def test_recover_unavailable_tools():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        asyncio.run(_unavailable_scenario(os.path.join(journal_dir, "jobs.sqlite")))
+
+
+def main():
+    test_journal_replay()
+    test_recover_after_restart()
+    test_recover_unavailable_tools()
+    print("所有任务日志测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.logger import MCPLogger
+
+
+def _read(log_path):
+    with open(log_path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def test_records_written_on_close():
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "logs", "mcp.log")
+        logger = MCPLogger(log_path=log_path, console_output=False, name="test_logger_flush")
+        for i in range(200):
+            logger.info(f"消息 {i}")
+        logger.log_mcp_call("txt2img", {"prompt": "cat"})
+        logger.close()
+        lines = _read(log_path)
+        assert len(lines) == 201 and " 消息 0 " in lines[0] and 'MCP_CALL={"tool": "txt2img"' in lines[-1]
+        assert logger.dropped == 0
+        # 关闭后在调用线程中同步写入 | records are written synchronously after close
+        logger.info("关闭之后")
+        assert " 关闭之后 " in _read(log_path)[-1]
+
+
+def test_overflow_never_blocks():
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "mcp.log")
+        logger = MCPLogger(log_path=log_path, console_output=False, queue_size=5, name="test_logger_overflow")
+        file_handler = logger._handlers[0]
+        emit, released = file_handler.emit, threading.Event()
+
+        def stalled_emit(record):
+            # 模拟磁盘阻塞 | simulate a disk stall
+            released.wait(5)
+            emit(record)
+
+        file_handler.emit = stalled_emit
+        start = time.monotonic()
+        for i in range(100):
+            logger.info(f"消息 {i}")
+        assert time.monotonic() - start < 0.5
+        assert logger.dropped >= 90
+
+        released.set()
+        logger.close()
+        lines = _read(log_path)
+        assert " 消息 0 " in lines[0]
+        assert any(f" 日志队列已满，丢弃了 {logger.dropped} 条日志 " in line for line in lines), lines
+        assert len(lines) == 100 - logger.dropped + 1
+
+
+def main():
+    test_records_written_on_close()
+    test_overflow_never_blocks()
+    print("所有日志测试通过")
+
+
+if __name__ == "__main__":
+    main()
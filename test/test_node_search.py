@@ -0,0 +1,79 @@
+import os
+import sys
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.node_search import NodeSearchIndex, tokenize
+from mcp_server.object_info import ObjectInfoSnapshot
+from test.fake_comfyui import make_object_info
+
+
+def _object_info():
+    object_info = make_object_info(node_count=200)
+    object_info["UpscaleModelLoader"] = {
+        "input": {"required": {"model_name": [["4x-UltraSharp.pth"], {}]}},
+        "output": ["UPSCALE_MODEL"], "name": "UpscaleModelLoader", "display_name": "Load Upscale Model",
+        "category": "loaders", "description": ""
+    }
+    object_info["LoraLoader"] = {
+        "input": {"required": {"model": ["MODEL", {}], "lora_name": [["detail.safetensors"], {}],
+                               "strength_model": ["FLOAT", {"tooltip": "How strongly to modify the diffusion model."}]}},
+        "output": ["MODEL", "CLIP"], "name": "LoraLoader", "display_name": "Load LoRA", "category": "loaders",
+        "description": "LoRAs are used to modify diffusion and CLIP models."
+    }
+    return object_info
+
+
+def test_tokenize():
+    assert tokenize("CLIPTextEncode") == ["clip", "text", "encode", "cliptextencode"]
+    assert tokenize("ckpt_name") == ["ckpt", "name", "ckptname"]
+    assert tokenize("custom/pack_1") == ["custom", "pack", "1", "pack1"]
+
+
+def test_search_ranking():
+    index = NodeSearchIndex()
+    index.sync(ObjectInfoSnapshot(_object_info()))
+    assert index.search("upscale model")[0][0] == "UpscaleModelLoader"
+    assert index.search("lora")[0][0] == "LoraLoader"
+    # 前缀与模糊匹配
+    # Prefix and fuzzy matches
+    assert index.search("upsc")[0][0] == "UpscaleModelLoader"
+    assert index.search("upscael")[0][0] == "UpscaleModelLoader"
+    assert index.search("ksampler")[0][0] == "KSampler"
+    # 输入名与提示文本
+    # Input names and tooltips
+    assert index.search("ckpt_name")[0][0] == "CheckpointLoaderSimple"
+    assert "LoraLoader" in [class_type for class_type, _ in index.search("diffusion")]
+    assert index.search("zzzzqqq") == []
+
+
+def test_incremental_sync():
+    object_info = _object_info()
+    index = NodeSearchIndex()
+    index.sync(ObjectInfoSnapshot(object_info))
+    total = len(index)
+
+    updated = dict(object_info)
+    del updated["LoraLoader"]
+    updated["UpscaleModelLoader"] = dict(updated["UpscaleModelLoader"], display_name="Load Super Resolution Model")
+    updated["FaceDetailer"] = {"input": {}, "output": [], "display_name": "Face Detailer", "category": "impact"}
+    index.sync(ObjectInfoSnapshot(updated))
+    assert len(index) == total
+    assert "LoraLoader" not in [class_type for class_type, _ in index.search("lora")]
+    assert index.search("resolution")[0][0] == "UpscaleModelLoader"
+    assert index.search("face detailer")[0][0] == "FaceDetailer"
+    # 被移除节点类型独有的词项从词表中删除
+    # Terms unique to the removed class leave the vocabulary
+    assert "loraloader" not in index._postings
+
+
+def main():
+    test_tokenize()
+    test_search_ranking()
+    test_incremental_sync()
+    print("所有节点搜索测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import asyncio
+import tempfile
+import dataclasses
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.http_client import client_manager
+from mcp_server.object_info import NodeClassCache
+from mcp_server.settings import settings_manager
+from mcp_server.templates import template_class_types
+from test.fake_comfyui import FakeComfyUI, make_object_info
+
+
+def _set_class_ttl(class_ttl):
+    current = settings_manager.current
+    settings_manager._settings = dataclasses.replace(
+        current, object_info=dataclasses.replace(current.object_info, lazy=True, class_ttl=class_ttl))
+    return current
+
+
+def test_template_class_types():
+    class_types = template_class_types()
+    assert {"CheckpointLoaderSimple", "KSampler", "SaveImage"} <= class_types
+
+
+async def _lazy_scenario(cache_dir):
+    comfyui = await FakeComfyUI().start()
+    previous = _set_class_ttl(3600)
+    try:
+        cache = NodeClassCache("127.0.0.1", comfyui.port, cache_dir=cache_dir)
+        snapshot = await cache.ensure(["CheckpointLoaderSimple", "KSampler", "MissingNode"])
+        assert comfyui.request_counts.get("object_info_class") == 3
+        assert "object_info" not in comfyui.request_counts
+        assert sorted(snapshot.data) == ["CheckpointLoaderSimple", "KSampler"]
+        assert snapshot.choices("KSampler", "scheduler") == ["normal", "karras"]
+        assert len(os.listdir(cache_dir)) == 2
+
+        # 未过期时不重复获取，并发请求共享一次获取
+        # Fresh classes are not re-fetched and concurrent requests share one fetch
+        await cache.ensure(["KSampler", "MissingNode"])
+        await asyncio.gather(*(cache.get("VAEDecode") for _ in range(5)))
+        assert comfyui.request_counts["object_info_class"] == 4
+
+        # 新的缓存实例从文件加载
+        # A new cache instance loads from the files
+        restarted = NodeClassCache("127.0.0.1", comfyui.port, cache_dir=cache_dir)
+        assert (await restarted.get("KSampler"))["category"] == "sampling"
+        assert comfyui.request_counts["object_info_class"] == 4
+
+        # 刷新只获取已缓存的节点类型并报告变化
+        # A refresh re-fetches only the cached classes and reports changes
+        comfyui.object_info = make_object_info(checkpoints=("new_model.safetensors",))
+        diff = await cache.refresh()
+        assert diff.changed == ["CheckpointLoaderSimple"]
+        assert comfyui.request_counts["object_info_class"] == 8
+        assert cache.snapshot().choices("CheckpointLoaderSimple", "ckpt_name") == ["new_model.safetensors"]
+
+        # 过期后重新获取，获取失败时继续使用过期的缓存
+        # Stale classes are re-fetched, and the stale copy is served when fetching fails
+        _set_class_ttl(0.01)
+        await asyncio.sleep(0.02)
+        await restarted.get("KSampler")
+        assert comfyui.request_counts["object_info_class"] == 9
+        await comfyui.stop()
+        await asyncio.sleep(0.02)
+        assert (await restarted.get("KSampler"))["category"] == "sampling"
+    finally:
+        settings_manager._settings = previous
+        await client_manager.aclose()
+        if comfyui._server.started and not comfyui._server.should_exit:
+            await comfyui.stop()
+
+
+def test_lazy_class_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        asyncio.run(_lazy_scenario(cache_dir))
+
+
+def main():
+    test_template_class_types()
+    test_lazy_class_cache()
+    print("所有按需节点描述测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.object_info import ObjectInfoPack, ObjectInfoStore, write_object_info_pack
+from test.fake_comfyui import make_object_info
+
+
+def test_pack_round_trip():
+    object_info = make_object_info(node_count=50)
+    object_info["Ünïcode Node"] = {"input": {}, "output": [], "category": "测试"}
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        path = os.path.join(object_info_dir, 'test.pack')
+        write_object_info_pack(path, object_info)
+        pack = ObjectInfoPack(path)
+        try:
+            assert len(pack) == len(object_info)
+            assert sorted(pack.class_types()) == sorted(object_info)
+            for class_type, node in object_info.items():
+                assert pack.get(class_type) == node
+            assert pack.get("Missing") is None and "Missing" not in pack
+            assert json.loads(pack.raw("KSampler")) == object_info["KSampler"]
+        finally:
+            pack.close()
+
+        # 空文件与其他格式的文件被拒绝
+        # Empty files and files in another format are rejected
+        write_object_info_pack(path, {})
+        empty = ObjectInfoPack(path)
+        assert len(empty) == 0 and empty.get("KSampler") is None
+        empty.close()
+        with open(path, 'wb') as f:
+            f.write(b'{"KSampler": {}}')
+        try:
+            ObjectInfoPack(path)
+            raise AssertionError("expected ValueError")
+        except ValueError:
+            pass
+
+
+def test_store_migrates_legacy_json():
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        path = os.path.join(object_info_dir, '127.0.0.1_8188_object_info.json')
+        store = ObjectInfoStore(path)
+        assert store.pack() is None and store.node("KSampler") is None
+
+        # 旧版缓存只有格式化的JSON文件
+        # A legacy cache only has the pretty-printed JSON file
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_object_info(node_count=3), f, indent=2)
+        pack = store.pack()
+        assert os.path.exists(store.pack_path)
+        assert pack.get("CustomNode00002")["category"] == "custom/pack_2"
+
+        # 重启后直接使用打包文件，不解析JSON
+        # After a restart the pack is used directly without parsing the JSON
+        restarted = ObjectInfoStore(path)
+        assert restarted.node("CustomNode00001")["name"] == "CustomNode00001"
+        assert restarted._snapshot is None
+
+        # JSON文件更新后重新生成打包文件
+        # The pack is rebuilt when the JSON file is updated
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_object_info(node_count=5), f)
+        os.utime(path, ns=(os.stat(path).st_atime_ns, pack.mtime_ns + 1_000_000))
+        assert restarted.node("CustomNode00004") is not None
+        assert restarted.pack().mtime_ns >= os.stat(path).st_mtime_ns
+
+
+def main():
+    test_pack_round_trip()
+    test_store_migrates_legacy_json()
+    print("所有节点描述打包文件测试通过")
+
+
+if __name__ == "__main__":
+    main()
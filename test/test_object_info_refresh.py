@@ -0,0 +1,155 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.http_client import client_manager
+from mcp_server.notifications import ResourceNotifier
+from mcp_server.object_info import (ObjectInfoPack, ObjectInfoRefresher, ObjectInfoStore, diff_object_info,
+                                    diff_object_info_pack, write_object_info_pack)
+from test.fake_comfyui import FakeComfyUI, make_object_info
+
+
+def test_diff_object_info():
+    old = make_object_info(node_count=3)
+    new = make_object_info(node_count=2, checkpoints=("v1-5-pruned.safetensors",))
+    diff = diff_object_info(old, new)
+    assert diff.removed == ["CustomNode00002"]
+    assert diff.changed == ["CheckpointLoaderSimple"]
+    assert diff.touches("CheckpointLoaderSimple") and not diff.touches("KSampler")
+    assert not diff_object_info(old, make_object_info(node_count=3))
+
+
+def test_diff_object_info_pack():
+    old = make_object_info(node_count=3)
+    new = make_object_info(node_count=2, checkpoints=("v1-5-pruned.safetensors",))
+    # 键顺序不同但内容相同的节点不算变化 | a node with the same content in a different key order is unchanged
+    new["KSampler"] = dict(reversed(list(new["KSampler"].items())))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "object_info.pack")
+        write_object_info_pack(path, old)
+        pack = ObjectInfoPack(path)
+        try:
+            diff = diff_object_info_pack(pack, new)
+            expected = diff_object_info(old, new)
+            assert (diff.added, diff.removed, diff.changed) == (expected.added, expected.removed, expected.changed)
+            assert diff.changed == ["CheckpointLoaderSimple"]
+        finally:
+            pack.close()
+
+
+async def _refresh_scenario(object_info_dir):
+    comfyui = await FakeComfyUI().start()
+    stores = {}
+
+    def store_factory(host, port):
+        key = (host, str(port))
+        if key not in stores:
+            stores[key] = ObjectInfoStore(os.path.join(object_info_dir, f"{host}_{port}_object_info.json"))
+        return stores[key]
+
+    refresher = ObjectInfoRefresher(backends=[("127.0.0.1", comfyui.port)], store_factory=store_factory)
+    changes = []
+
+    async def listener(host, port, diff):
+        changes.append(diff)
+
+    refresher.subscribe(listener)
+    try:
+        # 首次刷新写入缓存
+        # The first refresh writes the cache
+        diff = (await refresher.refresh())[("127.0.0.1", comfyui.port)]
+        assert len(diff.added) == len(comfyui.object_info)
+        store = store_factory("127.0.0.1", comfyui.port)
+        snapshot = store.get()
+        assert "CustomNode00000" in snapshot
+        mtime_ns = os.stat(store.path).st_mtime_ns
+
+        # 无变化时既不写文件也不替换快照
+        # Nothing is written or swapped when nothing changed
+        assert not (await refresher.refresh())[("127.0.0.1", comfyui.port)]
+        assert os.stat(store.path).st_mtime_ns == mtime_ns
+        assert store.get() is snapshot
+        assert len(changes) == 1
+
+        # 缓存刚刚写入时跳过刷新，不请求后端 | a just-written cache is skipped without asking the backend
+        requests = comfyui.request_counts["object_info"]
+        assert not (await refresher.refresh(skip_fresh=60))[("127.0.0.1", comfyui.port)]
+        assert comfyui.request_counts["object_info"] == requests
+
+        # 新增模型后快照随之更新
+        # The snapshot follows a newly installed model
+        comfyui.object_info = make_object_info(checkpoints=("new_model.safetensors",))
+        diff = (await refresher.refresh())[("127.0.0.1", comfyui.port)]
+        assert diff.changed == ["CheckpointLoaderSimple"]
+        assert store.get().choices("CheckpointLoaderSimple", "ckpt_name") == ["new_model.safetensors"]
+        assert changes[-1] is diff
+    finally:
+        await client_manager.aclose()
+        await comfyui.stop()
+
+    # 后端不可达时返回None并保留缓存
+    # An unreachable backend yields None and keeps the cache
+    assert (await refresher.refresh())[("127.0.0.1", comfyui.port)] is None
+    assert store.get().choices("CheckpointLoaderSimple", "ckpt_name") == ["new_model.safetensors"]
+    await client_manager.aclose()
+
+
+def test_refresh_writes_only_changes():
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        asyncio.run(_refresh_scenario(object_info_dir))
+
+
+class _FakeSession:
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.sent = []
+
+    async def send_resource_list_changed(self):
+        if self.broken:
+            raise ConnectionError("closed")
+        self.sent.append("list_changed")
+
+    async def send_resource_updated(self, uri):
+        if self.broken:
+            raise ConnectionError("closed")
+        self.sent.append(("updated", uri))
+
+
+async def _notify_scenario():
+    notifier = ResourceNotifier()
+    subscribed, idle, broken = _FakeSession(), _FakeSession(), _FakeSession(broken=True)
+    notifier.subscribe(subscribed, "info://ckpt")
+    notifier.subscribe(broken, "info://ckpt")
+    notifier.track(idle)
+
+    assert await notifier.notify_updated(["info://all", "info://ckpt"]) == 1
+    assert subscribed.sent == [("updated", "info://ckpt")]
+    # 发送失败的会话被移除
+    # Sessions that failed are dropped
+    assert broken not in notifier._sessions
+
+    assert await notifier.notify_list_changed() == 2
+    assert idle.sent == ["list_changed"]
+
+    notifier.unsubscribe(subscribed, "info://ckpt")
+    assert await notifier.notify_updated(["info://ckpt"]) == 0
+
+
+def test_resource_notifier():
+    asyncio.run(_notify_scenario())
+
+
+def main():
+    test_diff_object_info()
+    test_diff_object_info_pack()
+    test_refresh_writes_only_changes()
+    test_resource_notifier()
+    print("所有节点描述刷新测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp.server.fastmcp import FastMCP
+from mcp_server import object_info as object_info_module
+from mcp_server.object_info import ObjectInfoStore, write_object_info_pack
+from mcp_server.tools.resource_info import register_resource_info_tool
+from mcp_server.utils import load_comfyui_backends, write_json_atomic
+from test.fake_comfyui import make_object_info
+
+
+async def _read(mcp, uri):
+    contents = await mcp.read_resource(uri)
+    return contents[0].content
+
+
+async def _resources_scenario(object_info_dir):
+    host, port = load_comfyui_backends()[0]
+    store = ObjectInfoStore(os.path.join(object_info_dir, f"{host}_{port}_object_info.json"))
+    object_info = make_object_info(node_count=250)
+    write_json_atomic(store.path, object_info, None)
+    write_object_info_pack(store.pack_path, object_info)
+    previous = dict(object_info_module._stores)
+    object_info_module._stores[(host, str(port))] = store
+    mcp = FastMCP("test")
+    register_resource_info_tool(mcp)
+    try:
+        # 单个节点类型直接取自打包文件，不解析完整节点描述
+        # A single class comes straight from the pack without parsing all node descriptions
+        node = json.loads(await _read(mcp, "info://node/KSampler"))
+        assert node == object_info["KSampler"]
+        assert store._snapshot is None
+        assert "Unknown node class" in await _read(mcp, "info://node/Missing")
+
+        # 分页列表
+        # Paginated listing
+        first = json.loads(await _read(mcp, "info://all"))
+        assert first["total"] == len(object_info) and len(first["nodes"]) == 100
+        assert first["next"] == "info://all/page/100"
+        seen = [item["class_type"] for item in first["nodes"]]
+        cursor = first["next_cursor"]
+        while cursor is not None:
+            page = json.loads(await _read(mcp, f"info://all/page/{cursor}"))
+            seen += [item["class_type"] for item in page["nodes"]]
+            cursor = page["next_cursor"]
+        assert seen == sorted(object_info)
+        assert "Invalid cursor" in await _read(mcp, "info://all/page/-1")
+        # 不在页边界或超出列表的位置被拒绝，也不进入缓存 | cursors off a page boundary or past the end are rejected and not cached
+        views = len(store.get()._views)
+        for cursor in (1, 150, 100 * (len(object_info) // 100 + 1), 10 ** 9):
+            assert "Invalid cursor" in await _read(mcp, f"info://all/page/{cursor}")
+        assert len(store.get()._views) == views
+
+        # 分类名中的 / 需要编码
+        # The / in category names has to be encoded
+        category = json.loads(await _read(mcp, "info://category/custom%2Fpack_1"))
+        assert sorted(category["nodes"]) == [f"CustomNode{i:05}" for i in range(1, 250, 40)]
+        assert json.loads(await _read(mcp, "info://category/sampling"))["nodes"] == {"KSampler": object_info["KSampler"]}
+
+        # 预先序列化的内容在请求间共享
+        # Pre-serialized payloads are shared between requests
+        assert await _read(mcp, "info://all/page/100") is await _read(mcp, "info://all/page/100")
+    finally:
+        object_info_module._stores.clear()
+        object_info_module._stores.update(previous)
+        if store._pack is not None:
+            store._pack.close()
+
+
+def test_object_info_resources():
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        asyncio.run(_resources_scenario(object_info_dir))
+
+
+def main():
+    test_object_info_resources()
+    print("所有节点描述资源测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.object_info import COMBO_TYPE, ObjectInfoSnapshot, ObjectInfoStore
+from test.fake_comfyui import make_object_info
+
+
+def test_indexes():
+    object_info = make_object_info(node_count=3)
+    # 新格式的组合框输入
+    # Combo input in the new format
+    object_info["KSampler"]["input"]["required"]["scheduler"] = ["COMBO", {"options": ["normal", "karras"]}]
+    snapshot = ObjectInfoSnapshot(object_info)
+
+    assert snapshot.choices("CheckpointLoaderSimple", "ckpt_name") == ["sd_xl_base_1.0.safetensors", "v1-5-pruned.safetensors"]
+    assert snapshot.choices("KSampler", "scheduler") == ["normal", "karras"]
+    assert snapshot.choices("KSampler", "steps") == []
+    assert snapshot.input_spec("KSampler", "missing") is None
+    assert ("KSampler", "sampler_name") in snapshot.by_input_type[COMBO_TYPE]
+    assert ("KSampler", "scheduler") in snapshot.by_input_type[COMBO_TYPE]
+    assert ("CustomNode00002", "mask") in snapshot.by_input_type["MASK"]
+    assert "CheckpointLoaderSimple" in snapshot.by_output_type["VAE"]
+    assert snapshot.by_category["sampling"] == ("KSampler",)
+    assert json.loads(snapshot.to_json()) == object_info
+    assert snapshot.to_json() is snapshot.to_json()
+
+    # 共享视图只读
+    # Shared views are read-only
+    try:
+        snapshot.nodes["KSampler"] = {}
+        raise AssertionError("expected TypeError")
+    except TypeError:
+        pass
+
+
+def test_store_parses_once():
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        path = os.path.join(object_info_dir, '127.0.0.1_8188_object_info.json')
+        store = ObjectInfoStore(path)
+        assert not store.get()
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_object_info(node_count=2), f)
+        first = store.get()
+        assert "CustomNode00001" in first
+        assert store.get() is first
+
+        # 文件更新后重新加载
+        # Reloaded after the file is updated
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_object_info(node_count=5), f)
+        os.utime(path, ns=(os.stat(path).st_atime_ns, first.mtime_ns + 1_000_000))
+        assert "CustomNode00004" in store.get()
+
+
+def main():
+    test_indexes()
+    test_store_parses_once()
+    print("所有节点描述存储测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import sys
+import asyncio
+import dataclasses
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import admission, backends
+from mcp_server.admission import AdmissionController
+from mcp_server.backends import BackendPool
+from mcp_server.completion import close_completion_trackers
+from mcp_server.executor import run_prompt, submission_listener
+from mcp_server.http_client import client_manager
+from mcp_server.priority import HIGH, LOW, NORMAL, current_lane, priority_lane, set_priority
+from mcp_server.settings import CONFIG_PATH, read_settings, settings_manager
+from mcp_server.validation import ValidationError
+from test.fake_comfyui import FakeComfyUI
+
+SAVE_IMAGE_PROMPT = {"9": {"class_type": "SaveImage", "inputs": {}}}
+
+
+async def _lanes():
+    controller = AdmissionController(max_concurrent=1, max_queue_depth=0, max_wait=10, starvation_after=0)
+    finished = []
+
+    async def job(lane, name, hold=0.02):
+        async with controller.admit(name, 1.0, lane):
+            await asyncio.sleep(hold)
+            finished.append(name)
+
+    tasks = [asyncio.create_task(job(LOW, f"low{i}")) for i in range(3)]
+    await asyncio.sleep(0.005)
+    tasks.append(asyncio.create_task(job(NORMAL, "normal")))
+    tasks.append(asyncio.create_task(job(HIGH, "high")))
+    await asyncio.gather(*tasks)
+    # 第一个低优先级任务已在执行，之后高优先级先于普通、普通先于其余低优先级 | after the running low job, high goes before normal and normal before the other low jobs
+    assert finished == ["low0", "high", "normal", "low1", "low2"], finished
+
+
+async def _starvation():
+    controller = AdmissionController(max_concurrent=1, max_queue_depth=0, max_wait=10, starvation_after=0.1)
+    finished = []
+
+    async def job(lane, name):
+        async with controller.admit(name, 1.0, lane):
+            await asyncio.sleep(0.03)
+            finished.append(name)
+
+    tasks = [asyncio.create_task(job(HIGH, "first"))]
+    await asyncio.sleep(0.005)
+    tasks.append(asyncio.create_task(job(LOW, "low")))
+    # 高优先级请求源源不断，低优先级请求等待超过0.1秒后仍会被执行 | a steady stream of high jobs, the low job still runs once it waited 0.1s
+    for i in range(10):
+        tasks.append(asyncio.create_task(job(HIGH, f"high{i}")))
+    await asyncio.gather(*tasks)
+    assert finished.index("low") < finished.index("high9"), finished
+    assert finished.index("low") > finished.index("high0"), finished
+
+
+async def _starvation_with_defaults():
+    # 按发布的默认配置等比例缩短时间 | the shipped defaults, scaled down in time
+    settings, scale = read_settings(CONFIG_PATH), 0.01
+    controller = AdmissionController(max_concurrent=1, max_queue_depth=0,
+                                     max_wait=settings.admission.max_wait * scale,
+                                     starvation_after=settings.priority.starvation_after * scale)
+    hold = settings.admission.max_wait * scale / 10
+    finished = []
+
+    async def job(lane, name):
+        async with controller.admit(name, 1.0, lane):
+            await asyncio.sleep(hold)
+            finished.append(name)
+
+    tasks = [asyncio.create_task(job(HIGH, "first"))]
+    await asyncio.sleep(0.005)
+    tasks.append(asyncio.create_task(job(LOW, "low")))
+    for i in range(30):
+        tasks.append(asyncio.create_task(job(HIGH, f"high{i}")))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    # 高优先级请求持续超过等待上限，低优先级请求在超时之前被优先准入 | with high jobs outlasting the wait limit, the low job is admitted before it times out
+    assert not isinstance(results[1], Exception), results[1]
+    assert "low" in finished
+
+
+def test_lane_order():
+    asyncio.run(_lanes())
+
+
+def test_starvation_protection():
+    asyncio.run(_starvation())
+
+
+def test_starvation_with_defaults():
+    asyncio.run(_starvation_with_defaults())
+
+
+def test_lane_resolution():
+    settings = settings_manager.current
+    try:
+        assert current_lane() == NORMAL
+        settings_manager._settings = dataclasses.replace(
+            settings, priority=dataclasses.replace(settings.priority, client_lanes=(("local", LOW),)))
+        assert current_lane() == LOW
+
+        async def explicit():
+            set_priority("HIGH")
+            return current_lane()
+
+        assert asyncio.run(explicit()) == HIGH
+        try:
+            set_priority("urgent")
+            raise AssertionError("expected ValidationError")
+        except ValidationError as e:
+            assert e.slot == "priority" and HIGH in e.suggestions
+    finally:
+        settings_manager._settings = settings
+
+
+async def _front_of_queue():
+    comfyui = await FakeComfyUI(exec_time=0.15).start()
+    previous_pool, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)])
+    admission._controller = None
+    try:
+        client = client_manager.get_client()
+        others = set()
+        for _ in range(3):
+            resp = await client.post(f"{comfyui.url}/api/prompt", json={"client_id": "other", "prompt": SAVE_IMAGE_PROMPT})
+            others.add(resp.json()["prompt_id"])
+
+        async def interactive():
+            priority_lane.set(HIGH)
+            return await run_prompt(SAVE_IMAGE_PROMPT, timeout=10)
+
+        await interactive()
+        # 以 front 标志插到等待队列最前面，只需等待正在执行的任务 | the front flag puts it ahead of the pending jobs, only the running job is waited for
+        finished = list(comfyui.history)
+        assert len(finished) <= 2 and all(prompt_id in others for prompt_id in finished[:-1]), finished
+    finally:
+        admission._controller = None
+        backends._pool = previous_pool
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+async def _front_keeps_own_lower_lanes():
+    comfyui = await FakeComfyUI(exec_time=0.15).start()
+    previous_pool, backends._pool = backends._pool, BackendPool([("127.0.0.1", comfyui.port)])
+    admission._controller = None
+    try:
+        client = client_manager.get_client()
+        await client.post(f"{comfyui.url}/api/prompt", json={"client_id": "other", "prompt": SAVE_IMAGE_PROMPT})
+
+        submitted = {}
+
+        async def call(lane):
+            priority_lane.set(lane)
+            submission_listener.set(lambda comfyui_host, prompt_id: submitted.setdefault(lane, prompt_id))
+            return await run_prompt(SAVE_IMAGE_PROMPT, timeout=10)
+
+        bulk = asyncio.ensure_future(call(LOW))
+        while LOW not in submitted:
+            await asyncio.sleep(0.01)
+        await call(HIGH)
+        await bulk
+        # 本服务已提交的低优先级任务不会被 front 插队 | the low-lane job this server already submitted is not overtaken through front
+        finished = list(comfyui.history)
+        assert finished.index(submitted[LOW]) < finished.index(submitted[HIGH]), (finished, submitted)
+    finally:
+        admission._controller = None
+        backends._pool = previous_pool
+        await close_completion_trackers()
+        await client_manager.aclose()
+        await comfyui.stop()
+
+
+def test_front_of_queue():
+    asyncio.run(_front_of_queue())
+
+
+def test_front_keeps_own_lower_lanes():
+    asyncio.run(_front_keeps_own_lower_lanes())
+
+
+def main():
+    test_lane_order()
+    test_starvation_protection()
+    test_starvation_with_defaults()
+    test_lane_resolution()
+    test_front_of_queue()
+    test_front_keeps_own_lower_lanes()
+    print("所有优先级通道测试通过")
+
+
+if __name__ == "__main__":
+    main()
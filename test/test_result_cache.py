@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import dataclasses
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import result_cache as result_cache_module
+from mcp_server.settings import settings_manager
+from mcp_server.result_cache import ResultCache, run_cached, workflow_key
+from mcp_server.templates import get_template
+
+IMAGES = [{"filename": "ComfyUI_00001_.png", "subfolder": "", "type": "output"}]
+
+
+def test_workflow_key():
+    template = get_template('txt2img')
+    first = template.instantiate(prompt="a cat", seed=42)
+    second = template.instantiate(prompt="a cat", seed=42)
+    assert workflow_key(first) == workflow_key(second)
+
+    # 固定seed后所有seed输入取同一个值 | a pinned seed fills every seed input
+    for node_id, input_name in template.slots['seeds']:
+        assert first[node_id]["inputs"][input_name] == 42
+
+    # 不影响结果的 _meta 不参与哈希 | _meta does not take part in the hash
+    for node in second.values():
+        node["_meta"] = {"title": "renamed"}
+    assert workflow_key(first) == workflow_key(second)
+
+    assert workflow_key(first) != workflow_key(template.instantiate(prompt="a cat", seed=43))
+    assert workflow_key(first) != workflow_key(template.instantiate(prompt="a dog", seed=42))
+
+
+async def _lru_scenario(path):
+    cache = ResultCache(path, max_entries=2, ttl=0)
+    try:
+        await cache.put("a", "127.0.0.1:8188", IMAGES)
+        time.sleep(0.01)
+        await cache.put("b", "127.0.0.1:8188", IMAGES)
+        time.sleep(0.01)
+        # 访问 a 后 b 成为最久未使用 | after reading a, b is the least recently used
+        assert await cache.get("a") == ("127.0.0.1:8188", IMAGES)
+        time.sleep(0.01)
+        await cache.put("c", "127.0.0.1:8188", IMAGES)
+        assert len(cache) == 2
+        assert await cache.get("b") is None
+        assert await cache.get("a") is not None
+        assert await cache.get("c") is not None
+        assert (cache.hits, cache.misses) == (3, 1)
+    finally:
+        cache.close()
+
+    # 结果在重启后仍然可用 | results survive a restart
+    cache = ResultCache(path, max_entries=2, ttl=0)
+    try:
+        assert await cache.get("c") == ("127.0.0.1:8188", IMAGES)
+    finally:
+        cache.close()
+
+
+def test_lru_eviction():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        asyncio.run(_lru_scenario(os.path.join(cache_dir, "results.sqlite")))
+
+
+async def _ttl_scenario(path):
+    cache = ResultCache(path, max_entries=10, ttl=0.05)
+    try:
+        await cache.put("a", "127.0.0.1:8188", IMAGES)
+        assert await cache.get("a") is not None
+        time.sleep(0.1)
+        assert await cache.get("a") is None
+        assert len(cache) == 0
+    finally:
+        cache.close()
+
+
+def test_ttl_expiry():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        asyncio.run(_ttl_scenario(os.path.join(cache_dir, "results.sqlite")))
+
+
+async def _run_cached_scenario():
+    calls = []
+
+    async def run():
+        calls.append(1)
+        return "127.0.0.1:8188", IMAGES
+
+    workflow = get_template('txt2img').instantiate(prompt="a cat", seed=7)
+    assert await run_cached(workflow, run) == ("127.0.0.1:8188", IMAGES)
+    assert await run_cached(dict(workflow), run) == ("127.0.0.1:8188", IMAGES)
+    assert len(calls) == 1
+
+    await run_cached(get_template('txt2img').instantiate(prompt="a cat", seed=8), run)
+    assert len(calls) == 2
+
+
+def test_run_cached():
+    previous = settings_manager.current
+    with tempfile.TemporaryDirectory() as cache_dir:
+        config = dataclasses.replace(previous.result_cache, enabled=True, path=os.path.join(cache_dir, "results.sqlite"))
+        settings_manager._settings = dataclasses.replace(previous, result_cache=config)
+        try:
+            asyncio.run(_run_cached_scenario())
+
+            # 关闭缓存时每次都执行 | with the cache disabled every call runs
+            settings_manager._settings = dataclasses.replace(previous, result_cache=dataclasses.replace(config, enabled=False))
+            assert result_cache_module.get_result_cache() is None
+        finally:
+            settings_manager._settings = previous
+            if result_cache_module._cache is not None:
+                result_cache_module._cache.close()
+                result_cache_module._cache = None
+
+
+def main():
+    test_workflow_key()
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_run_cached()
+    print("所有结果缓存测试通过")
+
+
+if __name__ == "__main__":
+    main()
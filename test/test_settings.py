@@ -0,0 +1,139 @@
+import os
+import sys
+import shutil
+import asyncio
+import threading
+import tempfile
+import configparser
+import dataclasses
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import settings as settings_module
+from mcp_server.settings import CONFIG_PATH, SettingsManager, parse_settings, read_settings
+
+
+def _parser(text):
+    parser = configparser.ConfigParser()
+    parser.read_string(text)
+    return parser
+
+
+def test_parse_shipped_config():
+    settings = read_settings(CONFIG_PATH)
+    assert settings.comfyui_server.backends == (("127.0.0.1", "8188"),)
+    assert settings.batching.window == 0.05
+    assert settings.mcp_server.transport == "streamable-http"
+    assert os.path.isabs(settings.logging.log_path)
+    # 防饿死在等待超时之前生效 | starvation protection kicks in before the wait times out
+    assert 0 < settings.priority.starvation_after < settings.admission.max_wait
+    try:
+        settings.completion.job_timeout = 1
+        raise AssertionError("expected FrozenInstanceError")
+    except dataclasses.FrozenInstanceError:
+        pass
+
+
+def test_validation():
+    settings = parse_settings(_parser("[comfyui_server]\nbackends = http://10.0.0.1:8188/, 10.0.0.2\n"))
+    assert settings.comfyui_server.backends == (("10.0.0.1", "8188"), ("10.0.0.2", "8188"))
+    for text in ("[completion]\npoll_interval = 0\n", "[mcp_server]\ntransport = websocket\n",
+                 "[scheduler]\naffinity_max_imbalance = two\n",
+                 "[admission]\nmax_wait = 30\n[priority]\nstarvation_after = 30\n"):
+        try:
+            parse_settings(_parser(text))
+            raise AssertionError(f"expected ValueError for {text!r}")
+        except ValueError:
+            pass
+
+
+def test_hot_reload():
+    with tempfile.TemporaryDirectory() as config_dir:
+        path = os.path.join(config_dir, 'config.ini')
+        shutil.copy(CONFIG_PATH, path)
+        manager = SettingsManager(path)
+        first = manager.current
+        changes = []
+        manager.subscribe(lambda old, new: changes.append((old, new)))
+
+        # 文件未变化时不重新解析
+        # Nothing is re-parsed while the file is unchanged
+        assert not manager.reload()
+        assert manager.current is first
+
+        parser = configparser.ConfigParser()
+        parser.read(path, encoding='utf-8')
+        parser.set('completion', 'job_timeout', '30')
+        with open(path, 'w', encoding='utf-8') as f:
+            parser.write(f)
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+        assert manager.reload()
+        assert manager.current.completion.job_timeout == 30
+        assert first.completion.job_timeout == 600
+        assert len(changes) == 1 and changes[0][1] is manager.current
+
+        # 无效配置保留旧快照
+        # An invalid configuration keeps the previous snapshot
+        parser.set('completion', 'job_timeout', '-1')
+        with open(path, 'w', encoding='utf-8') as f:
+            parser.write(f)
+        current = manager.current
+        assert not manager.reload(force=True)
+        assert manager.current is current
+
+
+async def _watch_reloads_off_loop(path):
+    parser = configparser.ConfigParser()
+    parser.read(path, encoding='utf-8')
+    parser.set('mcp_server', 'config_reload_interval', '0.05')
+    with open(path, 'w', encoding='utf-8') as f:
+        parser.write(f)
+    manager = SettingsManager(path)
+    manager.current
+    loop_thread = threading.current_thread()
+    read_threads, callback_threads = [], []
+    read = settings_module.read_settings
+
+    def recording_read(config_path):
+        read_threads.append(threading.current_thread())
+        return read(config_path)
+
+    settings_module.read_settings = recording_read
+    manager.subscribe(lambda old, new: callback_threads.append(threading.current_thread()))
+    await manager.start()
+    try:
+        parser.set('completion', 'job_timeout', '30')
+        with open(path, 'w', encoding='utf-8') as f:
+            parser.write(f)
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+        for _ in range(100):
+            if manager.current.completion.job_timeout == 30:
+                break
+            await asyncio.sleep(0.02)
+        assert manager.current.completion.job_timeout == 30
+        # 解析在线程中执行，回调仍在事件循环中执行 | parsing runs in a thread, callbacks still run on the event loop
+        assert read_threads and loop_thread not in read_threads
+        assert callback_threads == [loop_thread]
+    finally:
+        settings_module.read_settings = read
+        await manager.close()
+
+
+def test_watch_reloads_off_loop():
+    with tempfile.TemporaryDirectory() as config_dir:
+        path = os.path.join(config_dir, 'config.ini')
+        shutil.copy(CONFIG_PATH, path)
+        asyncio.run(_watch_reloads_off_loop(path))
+
+
+def main():
+    test_parse_shipped_config()
+    test_validation()
+    test_hot_reload()
+    test_watch_reloads_off_loop()
+    print("所有配置测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import os
+import sys
+import asyncio
+import dataclasses
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import singleflight
+from mcp_server.settings import settings_manager
+from mcp_server.singleflight import SingleFlight, request_key, run_once
+from mcp_server.validation import ValidationError
+
+RESULT = ("http://127.0.0.1:8188", [{"filename": "ComfyUI_00001_.png", "subfolder": "", "type": "output"}])
+
+
+def _set_singleflight(**changes):
+    current = settings_manager.current
+    settings_manager._settings = dataclasses.replace(
+        current, singleflight=dataclasses.replace(current.singleflight, **changes))
+    return current
+
+
+class _Runner:
+    def __init__(self, delay: float = 0.05, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("job failed")
+        return RESULT
+
+
+def test_request_key():
+    assert request_key("txt2img", {"prompt": "a cat", "width": 512}) == request_key("txt2img", {"width": 512, "prompt": "a cat"})
+    assert request_key("txt2img", {"prompt": "a cat"}) != request_key("img2img", {"prompt": "a cat"})
+    assert request_key("txt2img", {"prompt": "a cat"}) != request_key("txt2img", {"prompt": "a dog"})
+
+
+async def _coalesce_scenario():
+    flight, runner = SingleFlight(), _Runner()
+    results = await asyncio.gather(*(flight.do("k", runner) for _ in range(5)))
+    assert results == [RESULT] * 5
+    assert runner.calls == 1 and flight.coalesced == 4
+    assert len(flight) == 0
+
+    # 没有幂等键时完成后不重放 | without an idempotency key nothing is replayed after completion
+    await flight.do("k", runner)
+    assert runner.calls == 2
+
+    # 失败由所有等待方共同收到 | every waiter receives the failure
+    failing = _Runner(fail=True)
+    results = await asyncio.gather(flight.do("f", failing), flight.do("f", failing), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert failing.calls == 1
+
+
+def test_coalesce_concurrent_calls():
+    asyncio.run(_coalesce_scenario())
+
+
+async def _cancel_scenario():
+    flight, runner = SingleFlight(), _Runner(delay=0.1)
+    first = asyncio.ensure_future(flight.do("k", runner))
+    second = asyncio.ensure_future(flight.do("k", runner))
+    await asyncio.sleep(0.01)
+
+    # 一个等待方取消时执行继续 | the execution continues when one waiter cancels
+    first.cancel()
+    assert await second == RESULT
+    assert runner.cancelled == 0
+
+    # 所有等待方取消时执行被取消 | the execution is cancelled once every waiter has gone
+    only = asyncio.ensure_future(flight.do("k", runner))
+    await asyncio.sleep(0.01)
+    only.cancel()
+    await asyncio.sleep(0.01)
+    assert runner.cancelled == 1
+    assert len(flight) == 0
+
+
+def test_cancellation():
+    asyncio.run(_cancel_scenario())
+
+
+async def _replay_scenario():
+    runner, failing = _Runner(), _Runner(fail=True)
+    assert await run_once("txt2img", {"prompt": "a cat"}, runner, idempotency_key="retry-1") == RESULT
+    # 同一幂等键在重放窗口内直接返回结果 | the same key replays within the window
+    assert await run_once("txt2img", {"prompt": "a cat"}, runner, idempotency_key="retry-1") == RESULT
+    assert runner.calls == 1
+    # 同一幂等键用于不同参数时被拒绝 | reusing the key with different arguments is rejected
+    try:
+        await run_once("txt2img", {"prompt": "a dog"}, runner, idempotency_key="retry-1")
+        raise AssertionError("expected ValidationError")
+    except ValidationError as e:
+        assert e.slot == "idempotency_key"
+    assert runner.calls == 1
+
+    # 其他客户端使用相同的幂等键时不共享结果 | another client using the same key does not share the result
+    previous = singleflight.current_client
+    singleflight.current_client = lambda: "key:other"
+    try:
+        assert await run_once("txt2img", {"prompt": "a dog"}, runner, idempotency_key="retry-1") == RESULT
+        assert runner.calls == 2
+    finally:
+        singleflight.current_client = previous
+
+    await run_once("txt2img", {"prompt": "a cat"}, runner, idempotency_key="retry-2")
+    assert runner.calls == 3
+
+    # 失败不重放 | failures are not replayed
+    for _ in range(2):
+        try:
+            await run_once("txt2img", {"prompt": "a cat"}, failing, idempotency_key="retry-3")
+            raise AssertionError("expected RuntimeError")
+        except RuntimeError:
+            pass
+    assert failing.calls == 2
+
+    await asyncio.sleep(0.15)
+    await run_once("txt2img", {"prompt": "a cat"}, runner, idempotency_key="retry-1")
+    assert runner.calls == 4
+
+
+async def _disabled_scenario():
+    runner = _Runner()
+    await asyncio.gather(run_once("txt2img", {"prompt": "a cat"}, runner), run_once("txt2img", {"prompt": "a cat"}, runner))
+    assert runner.calls == 2
+
+
+def test_idempotency_replay():
+    previous = _set_singleflight(enabled=True, replay_window=0.1)
+    try:
+        asyncio.run(_replay_scenario())
+        _set_singleflight(enabled=False)
+        asyncio.run(_disabled_scenario())
+    finally:
+        settings_manager._settings = previous
+
+
+def main():
+    test_request_key()
+    test_coalesce_concurrent_calls()
+    test_cancellation()
+    test_idempotency_replay()
+    print("所有重复请求合并测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.templates import TemplateRegistry, get_template
+
+
+def test_slots():
+    txt2img = get_template('txt2img')
+    assert txt2img.slots['prompt'] == ("6", "text")
+    assert txt2img.slots['negative_prompt'] == ("7", "text")
+    assert txt2img.slots['width'] == ("5", "width")
+    assert txt2img.slots['batch_size'] == ("5", "batch_size")
+    assert txt2img.slots['checkpoint'] == ("4", "ckpt_name")
+    assert txt2img.slots['seeds'] == [("3", "seed")]
+
+    img2img = get_template('img2img')
+    assert img2img.slots['checkpoint'] == ("14", "ckpt_name")
+    assert img2img.slots['image'] == ("10", "image")
+    assert 'width' not in img2img.slots
+
+
+def test_instantiate_is_copy_on_write():
+    template = get_template('txt2img')
+    original = json.dumps(template.workflow, sort_keys=True)
+    workflow = template.instantiate(prompt="a cat", width=768, checkpoint="flux1-dev.safetensors")
+
+    assert workflow["6"]["inputs"]["text"] == "a cat"
+    assert workflow["5"]["inputs"]["width"] == 768
+    assert workflow["4"]["inputs"]["ckpt_name"] == "flux1-dev.safetensors"
+    assert workflow["3"]["inputs"]["seed"] != template.workflow["3"]["inputs"]["seed"]
+    # 模板本身不变，未填充的节点与模板共享
+    # The template itself is unchanged, unpatched nodes are shared with it
+    assert json.dumps(template.workflow, sort_keys=True) == original
+    assert workflow["8"] is template.workflow["8"]
+    assert workflow["6"] is not template.workflow["6"]
+
+    try:
+        template.instantiate(image="example.png")
+        raise AssertionError("expected KeyError")
+    except KeyError:
+        pass
+
+
+def test_reload_on_change():
+    with tempfile.TemporaryDirectory() as template_dir:
+        path = os.path.join(template_dir, 'demo_api.json')
+        workflow = {"6": {"class_type": "CLIPTextEncode", "inputs": {"text": "old"}},
+                    "3": {"class_type": "KSampler", "inputs": {"seed": 1, "positive": ["6", 0]}}}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(workflow, f)
+        registry = TemplateRegistry(template_dir)
+        first = registry.get('demo')
+        assert registry.get('demo') is first
+        assert first.value('prompt') == "old"
+
+        workflow["6"]["inputs"]["text"] = "new"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(workflow, f)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, first.mtime_ns + 1_000_000))
+        assert registry.get('demo').value('prompt') == "new"
+
+
+def main():
+    test_slots()
+    test_instantiate_is_copy_on_write()
+    test_reload_on_change()
+    print("所有工作流模板测试通过")
+
+
+if __name__ == "__main__":
+    main()
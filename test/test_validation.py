@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+# 将父目录添加到路径以便导入mcp_server模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server import object_info as object_info_module
+from mcp_server.object_info import ObjectInfoStore, write_object_info_pack
+from mcp_server.templates import get_template
+from mcp_server.utils import load_comfyui_backends
+from mcp_server.validation import ValidationError, WorkflowValidator, validate_arguments
+from test.fake_comfyui import make_object_info
+
+ALIASES = {'width': 'pic_width', 'height': 'pic_height', 'checkpoint': 'model'}
+
+
+def _validator():
+    object_info = make_object_info(node_count=0)
+    return WorkflowValidator(get_template('txt2img'), object_info.get)
+
+
+def _rejects(validator, values, slot):
+    try:
+        validator.validate(values, ALIASES)
+        raise AssertionError(f"expected ValidationError for {values!r}")
+    except ValidationError as e:
+        assert e.slot == slot
+        return e
+
+
+def test_validator_rules():
+    validator = _validator()
+    assert set(validator.rules) >= {"checkpoint", "width", "height", "batch_size", "prompt"}
+
+    checked = validator.validate({"width": "768", "height": 512.0, "batch_size": "2", "checkpoint": "v1-5-pruned.safetensors"}, ALIASES)
+    assert checked == {"width": 768, "height": 512, "batch_size": 2, "checkpoint": "v1-5-pruned.safetensors"}
+
+    # 拼错的模型名给出相近建议
+    # A misspelled model name comes with near matches
+    error = _rejects(validator, {"checkpoint": "sd_xl_base_1.0.safetensor"}, "checkpoint")
+    assert error.suggestions[0] == "sd_xl_base_1.0.safetensors"
+    assert "model" in str(error)
+    assert _rejects(validator, {"checkpoint": "V1-5-PRUNED.safetensors"}, "checkpoint").suggestions[0] == "v1-5-pruned.safetensors"
+
+    assert "pic_width" in str(_rejects(validator, {"width": "wide"}, "width"))
+    _rejects(validator, {"width": "512.5"}, "width")
+    _rejects(validator, {"height": 20000}, "height")
+    _rejects(validator, {"height": "8"}, "height")
+    _rejects(validator, {"batch_size": "8"}, "batch_size")
+    _rejects(validator, {"prompt": 42}, "prompt")
+
+
+def test_validation_is_fast():
+    validator = _validator()
+    values = {"prompt": "a cat", "negative_prompt": "text", "width": "512", "height": "512",
+              "batch_size": "1", "checkpoint": "sd_xl_base_1.0.safetensors"}
+    rounds = 10000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        validator.validate(values, ALIASES)
+    per_call = (time.perf_counter() - start) / rounds
+    print(f"每次校验 {per_call * 1000000:.1f}us")
+    assert per_call < 0.0005
+
+
+async def _compiled_once_scenario(object_info_dir):
+    host, port = load_comfyui_backends()[0]
+    store = ObjectInfoStore(os.path.join(object_info_dir, f"{host}_{port}_object_info.json"))
+    write_object_info_pack(store.pack_path, make_object_info(node_count=100))
+    previous = dict(object_info_module._stores)
+    object_info_module._stores[(host, str(port))] = store
+    try:
+        from mcp_server import validation
+        validation._validators.pop('txt2img', None)
+        assert (await validate_arguments('txt2img', {"checkpoint": "v1-5-pruned.safetensors"}))["checkpoint"] == "v1-5-pruned.safetensors"
+        validator = validation._validators['txt2img']
+        try:
+            await validate_arguments('txt2img', {"checkpoint": "missing.safetensors"})
+            raise AssertionError("expected ValidationError")
+        except ValidationError:
+            pass
+        assert validation._validators['txt2img'] is validator
+        # 只从打包文件解码模板用到的节点类型
+        # Only the template's classes are decoded from the pack
+        assert store._snapshot is None
+    finally:
+        object_info_module._stores.clear()
+        object_info_module._stores.update(previous)
+        if store._pack is not None:
+            store._pack.close()
+
+
+def test_validator_compiled_once():
+    with tempfile.TemporaryDirectory() as object_info_dir:
+        asyncio.run(_compiled_once_scenario(object_info_dir))
+
+
+def main():
+    test_validator_rules()
+    test_validation_is_fast()
+    test_validator_compiled_once()
+    print("所有参数校验测试通过")
+
+
+if __name__ == "__main__":
+    main()